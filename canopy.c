@@ -21,7 +21,7 @@
 #include "canopy.h"
 
 void canopy(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
-            params *p, state *s) {
+            params *p, state *s, int doy) {
     /*
         Canopy module consists of two parts:
         (1) a radiation sub-model to calculate apar of sunlit/shaded leaves
@@ -39,11 +39,24 @@ void canopy(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
         * Wang & Leuning (1998) Agricultural & Forest Meterorology, 91, 89-111.
         * Dai et al. (2004) Journal of Climate, 17, 2281-2299.
         * De Pury & Farquhar (1997) PCE, 20, 537-557.
+
+        With [control] leaf_solver = warm, each leaf solve starts from the
+        previous half hour's converged departure of Tleaf, Cs and dleaf from
+        the air values rather than from the air values themselves, and
+        after the first pass the leaf temperature is updated with a secant
+        step on the energy balance residual. The warm start is dropped at
+        night and at the start of each day, so days still don't depend on
+        each other. Every solve is counted in cw->leaf_iter_hist by the
+        number of passes it took (--leaf-iterations).
+
+        doy is the driver's (0 based) day of year, so that the sub-daily
+        output labels the day as the daily output does.
     */
-    int    hod, iter = 0, itermax = 100, dummy=0, sunlight_hrs;
+    int    hod, iter, dummy=0, sunlight_hrs;
     int    debug = TRUE;
-    double doy, year, dummy2=0.0, previous_sw, current_sw, gsv;
+    double year, dummy2=0.0, previous_sw, current_sw, gsv;
     double previous_cs, current_cs, relk;
+    double tleaf_next, tleaf_prev = 0.0, resid, resid_prev = 0.0;
 
     // Hydraulic conductance of the entire soil-to-leaf pathway
     // - this is only used in hydraulics, so set it to zero.
@@ -53,8 +66,8 @@ void canopy(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
     /* loop through the day */
     zero_carbon_day_fluxes(f);
     sunlight_hrs = 0;
-    doy = ma->doy[c->hour_idx];
     year = ma->year[c->hour_idx];
+    zero_leaf_offsets(cw);
 
     for (hod = 0; hod < c->num_hlf_hrs; hod++) {
         unpack_met_data(c, f, ma, m, hod, dummy2);
@@ -64,6 +77,8 @@ void canopy(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
 
         /* Is the sun up? */
         if (cw->elevation > 0.0 && m->par > 20.0) {
+            if (c->prof != NULL)
+                c->prof->daylight_steps++;
             calculate_absorbed_radiation(cw, p, s, m->par);
             calculate_top_of_canopy_leafn(cw, p, s);
             calc_leaf_to_canopy_scalar(cw, p);
@@ -73,18 +88,23 @@ void canopy(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
 
                 /* initialise values of Tleaf, Cs, dleaf at the leaf surface */
                 initialise_leaf_surface(cw, m);
+                if (c->leaf_solver == WARM_START) {
+                    warm_start_leaf_surface(cw);
+                }
 
                 /* Leaf temperature loop */
+                iter = 0;
                 while (TRUE) {
 
                     if (c->ps_pathway == C3) {
                         photosynthesis_C3(c, cw, m, p, s);
-                        
+
                     } else {
                         /* Nothing implemented */
                         fprintf(stderr, "C4 photosynthesis not implemented\n");
                         exit(EXIT_FAILURE);
                     }
+                    iter++;
 
                     if (cw->an_leaf[cw->ileaf] > 1E-04) {
 
@@ -95,23 +115,39 @@ void canopy(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
                         break;
                     }
 
-                    if (iter >= itermax) {
+                    resid = cw->tleaf_new - cw->tleaf[cw->ileaf];
+                    if (fabs(resid) < 0.02) {
+                        break;
+                    } else if (iter >= LEAF_ITERMAX) {
                         fprintf(stderr, "No convergence in canopy loop:\n");
                         exit(EXIT_FAILURE);
-                    } else if (fabs(cw->tleaf[cw->ileaf] - cw->tleaf_new) < 0.02) {
-                        break;
                     }
 
                     /* Update temperature & do another iteration */
-                    cw->tleaf[cw->ileaf] = cw->tleaf_new;
-                    iter++;
+                    if (c->leaf_solver == WARM_START && iter > 1) {
+                        tleaf_next = secant_tleaf(cw->tleaf[cw->ileaf], resid,
+                                                  tleaf_prev, resid_prev);
+                    } else {
+                        tleaf_next = cw->tleaf_new;
+                    }
+                    tleaf_prev = cw->tleaf[cw->ileaf];
+                    resid_prev = resid;
+                    cw->tleaf[cw->ileaf] = tleaf_next;
                 } /* end of leaf temperature loop */
 
+                cw->leaf_iter_hist[iter]++;
+                if (c->leaf_solver == WARM_START) {
+                    store_leaf_offsets(cw, m);
+                }
+
             } /* end of sunlit/shaded leaf loop */
 
         } else {
 
             zero_hourly_fluxes(cw);
+            zero_leaf_offsets(cw);
+            if (c->prof != NULL)
+                c->prof->night_steps++;
 
             /* set tleaf to tair during the night */
             cw->tleaf[SUNLIT] = m->tair;
@@ -122,6 +158,10 @@ void canopy(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
         scale_leaf_to_canopy(c, cw, s);
         sum_hourly_carbon_fluxes(cw, f, p);
 
+        if (c->out_sd != NULL) {
+            write_subdaily_output(c, cw, m, year, doy, hod);
+        }
+
         c->hour_idx++;
         sunlight_hrs++;
     } /* end of hour loop */
@@ -146,21 +186,25 @@ void solve_leaf_energy_balance(control *c, canopy_wk *cw, fluxes *f, met *m,
 
     */
     int    idx;
-    double omega, transpiration, LE, Tdiff, gv, gbc, gh, sw_rad, trans_mmol;
+    double sw_rad;
 
     idx = cw->ileaf;
     sw_rad = cw->apar_leaf[idx] * PAR_2_SW; /* W m-2 */
     cw->rnet_leaf[idx] = calc_leaf_net_rad(p, s, m->tair, m->vpd, sw_rad);
 
-    /* store in structure */
-    cw->omega_leaf[idx] = omega;
+    /*
+     * No conductances yet, so no decoupling coefficient either: leave the
+     * leaf fully coupled (omega = 0), as it is at night
+     */
+    cw->omega_leaf[idx] = 0.0;
 
     /*
-     * Assume Tair = Tleaf
+     * Assume Tair = Tleaf; the conductances aren't solved for yet, so Cs
+     * and dleaf stay at their air values too (gbc and gv are unset)
      */
     cw->tleaf_new = m->tair;
-    cw->Cs = m->Ca - cw->an_leaf[idx] / gbc;
-    cw->dleaf = cw->trans_leaf[idx] * m->press / gv;
+    cw->Cs = m->Ca;
+    cw->dleaf = m->vpd;
 
     return;
 }
@@ -291,6 +335,120 @@ void initialise_leaf_surface(canopy_wk *cw, met *m) {
     cw->Cs = m->Ca;
 }
 
+void warm_start_leaf_surface(canopy_wk *cw) {
+    /*
+        Shift the air values set by initialise_leaf_surface by how far the
+        leaf was from them when it last converged. Carrying the departure,
+        rather than the last Tleaf itself, follows the change in the
+        forcing, and zero offsets give exactly the cold start.
+    */
+    int idx = cw->ileaf;
+
+    cw->tleaf[idx] += cw->tleaf_offset[idx];
+    cw->Cs += cw->Cs_offset[idx];
+    cw->dleaf += cw->dleaf_offset[idx];
+
+    return;
+}
+
+void store_leaf_offsets(canopy_wk *cw, met *m) {
+    /* keep the converged leaf state for the next half hour's warm start */
+    int idx = cw->ileaf;
+
+    cw->tleaf_offset[idx] = cw->tleaf[idx] - m->tair;
+    cw->Cs_offset[idx] = cw->Cs - m->Ca;
+    cw->dleaf_offset[idx] = cw->dleaf - m->vpd;
+
+    return;
+}
+
+void zero_leaf_offsets(canopy_wk *cw) {
+
+    int i;
+
+    for (i = 0; i < NUM_LEAVES; i++) {
+        cw->tleaf_offset[i] = 0.0;
+        cw->Cs_offset[i] = 0.0;
+        cw->dleaf_offset[i] = 0.0;
+    }
+
+    return;
+}
+
+double secant_tleaf(double tleaf, double resid, double tleaf_prev,
+                    double resid_prev) {
+    /*
+        Next leaf temperature from the last two passes of the fixed point
+        iteration Tleaf -> Tleaf_new, a secant step on the residual
+        r = Tleaf_new - Tleaf (the same as Aitken's delta-squared on the
+        plain iterates). Falls back to the plain update, tleaf + resid, if
+        the secant points the other way or goes more than
+        SECANT_MAX_STRETCH times as far.
+
+        Parameters:
+        ----------
+        tleaf, resid : float
+            this pass's leaf temperature (deg C) and residual (K)
+        tleaf_prev, resid_prev : float
+            the same for the pass before
+
+        Returns:
+        --------
+        tleaf : float
+            leaf temperature for the next pass (deg C)
+    */
+    double step, dr = resid - resid_prev;
+
+    if (dr != 0.0) {
+        step = -resid * (tleaf - tleaf_prev) / dr;
+        if (step * resid > 0.0 &&
+            fabs(step) <= SECANT_MAX_STRETCH * fabs(resid)) {
+            return (tleaf + step);
+        }
+    }
+
+    return (tleaf + resid);
+}
+
+void zero_leaf_iterations(canopy_wk *cw) {
+
+    int i;
+
+    for (i = 0; i <= LEAF_ITERMAX; i++) {
+        cw->leaf_iter_hist[i] = 0;
+    }
+
+    return;
+}
+
+void print_leaf_iterations(FILE *fp, canopy_wk *cw, control *c) {
+    /*
+        --leaf-iterations: the leaf solves done, by the number of passes
+        round the leaf temperature loop each took
+    */
+    long   total = 0, npasses = 0;
+    int    i;
+
+    for (i = 1; i <= LEAF_ITERMAX; i++) {
+        total += cw->leaf_iter_hist[i];
+        npasses += i * cw->leaf_iter_hist[i];
+    }
+
+    fprintf(fp, "leaf temperature solves (leaf_solver = %s): %ld, "
+                "%ld passes, %.3f per solve\n",
+            c->leaf_solver == WARM_START ? "warm" : "cold", total, npasses,
+            total > 0 ? (double)npasses / total : 0.0);
+    fprintf(fp, "%8s %12s %10s\n", "passes", "solves", "fraction");
+    for (i = 1; i <= LEAF_ITERMAX; i++) {
+        if (cw->leaf_iter_hist[i] > 0) {
+            fprintf(fp, "%8d %12ld %10.6f\n", i, cw->leaf_iter_hist[i],
+                    (double)cw->leaf_iter_hist[i] / total);
+        }
+    }
+
+    return;
+}
+
 void calc_leaf_to_canopy_scalar(canopy_wk *cw, params *p) {
     /*
         Calculate scalar to transform leaf Vcmax and Jmax values to big leaf
@@ -12,9 +12,11 @@
 
 #include "canopy_scaling.h"
 
+#ifndef CANOPY_LIBRARY
 int main(int argc, char **argv)
 {
     int error = 0;
+    double t0 = 0.0;
 
     /*
      * Setup structures, initialise stuff, e.g. zero fluxes.
@@ -80,77 +82,100 @@ int main(int argc, char **argv)
     initialise_params(p);
     initialise_fluxes(f);
     initialise_state(s);
+    cw->tresp = NULL;
+    zero_leaf_iterations(cw);
 
     clparser(argc, argv, c);
+    start_profile(c);
     /*
      * Read .ini parameter file and meterological data
      */
+    if (c->prof != NULL)
+        t0 = profile_clock();
     error = parse_ini_file(c, p, s);
     if (error != 0) {
         prog_error("Error reading .INI file on line", __LINE__);
     }
+    if (c->prof != NULL)
+        profile_add(c->prof, PROF_PARSE_CFG, t0);
     strcpy(c->git_code_ver, build_git_sha);
     if (c->PRINT_GIT) {
         fprintf(stderr, "\n%s\n", c->git_code_ver);
         exit(EXIT_FAILURE);
     }
-    if (c->sub_daily) {
-        read_subdaily_met_data(argv, c, ma);
-        fill_up_solar_arrays(cw, c, ma, p);
+    if (c->PRINT_PARAMS) {
+        dump_params(stdout, c, p, s);
+        exit(EXIT_SUCCESS);
+    }
+    if (c->CHECK_TEMP_RESPONSE) {
+        check_temp_response(stdout, c, p);
+        exit(EXIT_SUCCESS);
+    }
+    open_output_files(c);
+    if (c->sub_daily && c->stream_met) {
+        if (*c->runs_fname != '\0' || c->num_threads > 1) {
+            fprintf(stderr, "stream_met can't be used with --runs or -t\n");
+            exit(EXIT_FAILURE);
+        }
+        memset(ma, 0, sizeof(met_arrays));
+        reset_run_state(cw, c, p, s);
+        run_sim_streamed(argv, cw, c, f, m, p, s);
 
     } else {
-        read_daily_met_data(argv, c, ma);
-    }
+        if (c->prof != NULL)
+            t0 = profile_clock();
+        if (c->sub_daily) {
+            read_subdaily_met_data(argv, c, ma);
+        } else {
+            read_daily_met_data(argv, c, ma);
+        }
+        if (c->prof != NULL)
+            profile_add(c->prof, PROF_READ_MET, t0);
 
-    s->wtfac_topsoil = 1.0;
-    s->wtfac_root = 1.0;
+        if (c->sub_daily) {
+            if (c->prof != NULL)
+                t0 = profile_clock();
+            fill_up_solar_arrays(cw, c, ma, p);
+            if (c->prof != NULL)
+                profile_add(c->prof, PROF_SOLAR, t0);
+        }
 
-    if (c->ncycle == FALSE)
-        s->shootnc = p->prescribed_leaf_NC;
-    s->lai = p->fix_lai;
+        if (*c->runs_fname != '\0') {
+            run_table(cw, c, f, ma, m, p, s);
+        } else {
+            reset_run_state(cw, c, p, s);
+            run_sim(cw, c, f, ma, m, p, s);
+        }
+    }
 
-    run_sim(cw, c, f, ma, m, p, s);
+    if (c->PRINT_LEAF_ITER) {
+        print_leaf_iterations(stderr, cw, c);
+    }
 
     /* clean up */
-    fclose(c->ofp);
-    if (c->print_options == SUBDAILY ) {
-        fclose(c->ofp_sd);
+    if (c->prof != NULL)
+        t0 = profile_clock();
+    close_output_files(c);
+    if (c->prof != NULL)
+        profile_add(c->prof, PROF_OUTPUT, t0);
+    write_profile(c, cw, p);
+    if (c->ofp != NULL) {
+        fclose(c->ofp);
     }
     fclose(c->ifp);
-    if (c->output_ascii == FALSE) {
+    if (c->output_ascii == FALSE && c->ofp_hdr != NULL) {
         fclose(c->ofp_hdr);
     }
 
-    free(cw);
-    free(c);
-    free(ma->year);
-    free(ma->tair);
-    free(ma->rain);
-    free(ma->tsoil);
-    free(ma->co2);
-    free(ma->ndep);
-    free(ma->wind);
-    free(ma->press);
-    free(ma->par);
+    free_met_arrays(c, ma);
     if (c->sub_daily) {
-        free(ma->vpd);
-        free(ma->doy);
-        free(cw->cz_store);
-        free(cw->ele_store);
-        free(cw->df_store);
-    } else {
-        free(ma->prjday);
-        free(ma->tam);
-        free(ma->tpm);
-        free(ma->tmin);
-        free(ma->tmax);
-        free(ma->vpd_am);
-        free(ma->vpd_pm);
-        free(ma->wind_am);
-        free(ma->wind_pm);
-        free(ma->par_am);
-        free(ma->par_pm);
+        free_solar_arrays(cw);
     }
+    free_temp_response(cw);
+    free(cw);
+    free(c->override_args);
+    free(c->prof);
+    free(c);
     free(s->day_length);
     free(ma);
     free(m);
@@ -160,17 +185,184 @@ int main(int argc, char **argv)
 
     exit(EXIT_SUCCESS);
 }
+#endif /* CANOPY_LIBRARY */
+
+void reset_run_state(canopy_wk *cw, control *c, params *p, state *s) {
+    /* starting state for a run, once the parameters are set */
+
+    s->wtfac_topsoil = 1.0;
+    s->wtfac_root = 1.0;
+
+    if (c->ncycle == FALSE)
+        s->shootnc = p->prescribed_leaf_NC;
+    s->lai = p->fix_lai;
+
+    /* the leaf kinetics depend on the parameters, so tabulate them here */
+    build_temp_response(cw, c, p);
+
+    return;
+}
+
+void run_table(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
+               params *p, state *s) {
+    /*
+        Multi-run mode (--runs fname): run the model once for each row of a
+        CSV table of parameter sets, sharing the forcing and solar geometry
+        that have already been loaded. The header row is "run_id" followed
+        by the keys to override (key or section.key, as for --set). Every
+        run starts again from the param file (plus any --set overrides) and
+        the daily output is written in long format keyed by run id.
+    */
+    FILE   *fp;
+    char    line[STRING_LENGTH];
+    char    header[STRING_LENGTH];
+    char    setting[STRING_LENGTH * 2];
+    char   *keys[STRING_LENGTH / 2];
+    char   *values[STRING_LENGTH / 2];
+    int     nkeys, nvalues, i, num, size, line_number = 1;
+    double  solar_lat, solar_lon, t0 = 0.0;
+    control *c0;
+    params  *p0;
+    state   *s0;
+    param_override *ov = NULL;
+
+    if ((fp = fopen(c->runs_fname, "r")) == NULL) {
+        fprintf(stderr, "Error opening runs table %s\n", c->runs_fname);
+        exit(EXIT_FAILURE);
+    }
+    if (fgets(header, sizeof(header), fp) == NULL) {
+        fprintf(stderr, "Runs table %s is empty\n", c->runs_fname);
+        exit(EXIT_FAILURE);
+    }
+    nkeys = split_csv_line(header, keys, ARRAY_SIZE(keys));
+    if (nkeys < 1) {
+        fprintf(stderr, "Runs table %s has no header\n", c->runs_fname);
+        exit(EXIT_FAILURE);
+    }
+
+    /* everything each run starts from */
+    c0 = (control *)malloc(sizeof(control));
+    p0 = (params *)malloc(sizeof(params));
+    s0 = (state *)malloc(sizeof(state));
+    if (c0 == NULL || p0 == NULL || s0 == NULL) {
+        fprintf(stderr, "run table: Not allocated enough memory!\n");
+        exit(EXIT_FAILURE);
+    }
+    *c0 = *c;
+    *p0 = *p;
+    *s0 = *s;
+    solar_lat = p->latitude;
+    solar_lon = p->longitude;
+
+    c0->run_idx = -1;
+    while (fgets(line, sizeof(line), fp) != NULL) {
+        line_number++;
+        if (*lskip(rstrip(line)) == '\0')
+            continue;
+
+        nvalues = split_csv_line(line, values, ARRAY_SIZE(values));
+        if (nvalues != nkeys) {
+            fprintf(stderr, "Runs table %s line %d: expected %d values, "
+                            "got %d\n", c->runs_fname, line_number, nkeys,
+                            nvalues);
+            exit(EXIT_FAILURE);
+        }
+
+        *c = *c0;
+        *p = *p0;
+        *s = *s0;
+        initialise_fluxes(f);
+
+        num = size = 0;
+        for (i = 1; i < nkeys; i++) {
+            snprintf(setting, sizeof(setting), "%s=%s", keys[i], values[i]);
+            add_param_override(&ov, &num, &size, "", setting);
+        }
+        if (resolve_param_overrides(c, &ov, &num) > 0) {
+            for (i = 0; i < num; i++) {
+                if (*ov[i].section == '\0')
+                    fprintf(stderr, "Runs table %s: %s is not in the param "
+                                    "file\n", c->runs_fname, ov[i].name);
+            }
+            exit(EXIT_FAILURE);
+        }
+        apply_param_overrides(ov, num, c, p, s);
+
+        if (c->sub_daily != c0->sub_daily ||
+            strcmp(c->met_fname, c0->met_fname) != 0) {
+            fprintf(stderr, "Runs table %s: the forcing is shared between "
+                            "runs, so sub_daily/met_fname can't be changed\n",
+                            c->runs_fname);
+            exit(EXIT_FAILURE);
+        }
+
+        /* the solar geometry only needs redoing if the site moves */
+        if (c->sub_daily && (p->latitude != solar_lat ||
+                             p->longitude != solar_lon)) {
+            if (c->prof != NULL)
+                t0 = profile_clock();
+            free_solar_arrays(cw);
+            fill_up_solar_arrays(cw, c, ma, p);
+            if (c->prof != NULL)
+                profile_add(c->prof, PROF_SOLAR, t0);
+            solar_lat = p->latitude;
+            solar_lon = p->longitude;
+        }
+
+        strncpy0(c->run_id, values[0], sizeof(c->run_id));
+        c->run_idx = ++c0->run_idx;
+        reset_run_state(cw, c, p, s);
+        run_sim(cw, c, f, ma, m, p, s);
+    }
+    fclose(fp);
+
+    /* leave the caller's structures as they found them */
+    *c = *c0;
+    free(ov);
+    free(c0);
+    free(p0);
+    free(s0);
+
+    return;
+}
+
+int split_csv_line(char *line, char **fields, int max_fields) {
+    /*
+        Split a comma separated line in place, stripping whitespace around
+        each field. Returns the number of fields.
+    */
+    int   n = 0;
+    char *start = line;
+    char *end;
+
+    rstrip(line);
+    while (n < max_fields) {
+        end = strchr(start, ',');
+        if (end != NULL)
+            *end = '\0';
+        fields[n++] = rstrip(lskip(start));
+        if (end == NULL)
+            break;
+        start = end + 1;
+    }
+
+    return n;
+}
 
 void run_sim(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
              params *p, state *s) {
 
-    int    nyr, doy, window_size, i, dummy = 0;
-    int    fire_found = FALSE;;
-    int    num_disturbance_yrs = 0;
-
-    double nitfac, year;
-    double leafn, fc, ncontent;
+    int    nyr, doy;
+    long   d, ndays = c->total_num_days;
+    double year;
+    double *day_year, *day_doy, *day_len;
 
+    if ((day_year = (double *)malloc(ndays * sizeof(double))) == NULL ||
+        (day_doy = (double *)malloc(ndays * sizeof(double))) == NULL ||
+        (day_len = (double *)malloc(ndays * sizeof(double))) == NULL) {
+        fprintf(stderr, "Error allocating space for the model calendar\n");
+        exit(EXIT_FAILURE);
+    }
 
     /* ====================== **
     **   Y E A R    L O O P   **
@@ -178,14 +370,17 @@ void run_sim(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
     c->day_idx = 0;
     c->hour_idx = 0;
 
-    printf("year,doy,gpp,apar\n");
-
+    /*
+        Given the forcing, days don't depend on each other, so first lay out
+        the calendar, then run the days (in order, or spread over threads)
+    */
+    d = 0;
     for (nyr = 0; nyr < c->num_years; nyr++) {
 
         if (c->sub_daily) {
-            year = ma->year[c->hour_idx];
+            year = ma->year[d * c->num_hlf_hrs];
         } else {
-            year = ma->year[c->day_idx];
+            year = ma->year[d];
         }
 
         if (is_leap_year(year))
@@ -195,69 +390,253 @@ void run_sim(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma, met *m,
 
         calculate_daylength(s, c->num_days, p->latitude);
 
-        /* =================== **
-        **   D A Y   L O O P   **
-        ** =================== */
         for (doy = 0; doy < c->num_days; doy++) {
+            day_year[d] = year;
+            day_doy[d] = doy;
+            day_len[d] = s->day_length[doy];
+            d++;
+        }
+    }
 
-            if (! c->sub_daily) {
-                unpack_met_data(c, f, ma, m, dummy, s->day_length[doy]);
-            }
+    /* =================== **
+    **   D A Y   L O O P   **
+    ** =================== */
+    if (c->num_threads > 1 && ndays > 1) {
+        run_days_threaded(cw, c, f, ma, p, s, day_year, day_doy, day_len);
+    } else {
+        for (d = 0; d < ndays; d++) {
+            simulate_day(cw, c, f, ma, m, p, s, d, (int)day_doy[d],
+                         day_len[d]);
+            write_daily_output(c, f, day_year[d], (int)day_doy[d]);
+        }
+    }
+    c->day_idx = ndays;
+    c->hour_idx = ndays * c->num_hlf_hrs;
+    /* ========================= **
+    **   E N D   O F   Y E A R   **
+    ** ========================= */
 
-            if (c->sub_daily) {
-                canopy(cw, c, f, ma, m, p, s);
+    free(day_year);
+    free(day_doy);
+    free(day_len);
 
-            } else {
+    return;
 
-                if (s->lai > 0.0) {
-                    /* average leaf nitrogen content (g N m-2 leaf) */
-                    leafn = (s->shootnc * p->cfracts / p->sla * KG_AS_G);
 
-                    /* total nitrogen content of the canopy */
-                    ncontent = leafn * s->lai;
-                } else {
-                    ncontent = 0.0;
-                }
+}
+
+void simulate_day(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma,
+                  met *m, params *p, state *s, long day_idx, int doy,
+                  double day_length) {
+    /*
+        run a single day of the forcing, the results are left in f. doy is
+        the (0 based) day of year the driver writes to the daily output,
+        passed on to canopy() for the sub-daily output.
+    */
+
+    int    dummy = 0;
+    double leafn, fc, ncontent, t0 = 0.0;
+
+    c->day_idx = day_idx;
+    c->hour_idx = day_idx * c->num_hlf_hrs;
+    if (c->prof != NULL) {
+        c->prof->days++;
+        t0 = profile_clock();
+    }
+
+    if (! c->sub_daily) {
+        unpack_met_data(c, f, ma, m, dummy, day_length);
+    }
+
+    if (c->sub_daily) {
+        canopy(cw, c, f, ma, m, p, s, doy);
+        if (c->prof != NULL)
+            profile_add(c->prof, PROF_CANOPY, t0);
+
+    } else {
+
+        if (s->lai > 0.0) {
+            /* average leaf nitrogen content (g N m-2 leaf) */
+            leafn = (s->shootnc * p->cfracts / p->sla * KG_AS_G);
+
+            /* total nitrogen content of the canopy */
+            ncontent = leafn * s->lai;
+        } else {
+            ncontent = 0.0;
+        }
+
+        /*
+            When canopy is not closed, canopy light interception is
+            reduced - calculate the fractional ground cover
+        */
+        //if (s->lai < p->lai_closed) {
+        //    /* discontinuous canopies */
+        //    fc = s->lai / p->lai_closed;
+        //} else {
+        //    fc = 1.0;
+        //}
+        fc = 1.0;
+
+        /*
+            fIPAR - the fraction of intercepted PAR = IPAR/PAR incident
+            at the top of the canopy, accounting for partial closure based on Jackson and Palmer (1979).
+        */
+        if (s->lai > 0.0)
+            s->fipar = ((1.0 - exp(-p->kext * s->lai / fc)) * fc);
+        else
+            s->fipar = 0.0;
+
+        mate_C3_photosynthesis(c, f, m, p, s, day_length, ncontent);
+        if (c->prof != NULL)
+            profile_add(c->prof, PROF_MATE, t0);
+    }
+
+    return;
+}
+
+void run_days_threaded(canopy_wk *cw, control *c, fluxes *f, met_arrays *ma,
+                       params *p, state *s, double *day_year,
+                       double *day_doy, double *day_len) {
+    /*
+        Split the days into one contiguous block per thread (-t N). Each
+        thread works on its own copy of the scratch structures (control,
+        canopy_wk, met, fluxes, state), sharing the read-only forcing, solar
+        arrays and parameters. The daily results are written out in order
+        once all the threads are done, so the output matches a serial run
+        bit for bit, and the leaf solver counts and any --profile timers
+        are added up.
+    */
+    int    t, i, nthreads = c->num_threads;
+    long   d, ndays = c->total_num_days;
+    double *gpp, *apar;
+    pthread_t  *threads;
+    day_block  *blocks;
+
+    if (nthreads > ndays)
+        nthreads = ndays;
+
+    gpp = (double *)malloc(ndays * sizeof(double));
+    apar = (double *)malloc(ndays * sizeof(double));
+    threads = (pthread_t *)malloc(nthreads * sizeof(pthread_t));
+    blocks = (day_block *)malloc(nthreads * sizeof(day_block));
+    if (gpp == NULL || apar == NULL || threads == NULL || blocks == NULL) {
+        fprintf(stderr, "Error allocating space for threads\n");
+        exit(EXIT_FAILURE);
+    }
 
-                /*
-                    When canopy is not closed, canopy light interception is
-                    reduced - calculate the fractional ground cover
-                */
-                //if (s->lai < p->lai_closed) {
-                //    /* discontinuous canopies */
-                //    fc = s->lai / p->lai_closed;
-                //} else {
-                //    fc = 1.0;
-                //}
-                fc = 1.0;
-
-                /*
-                    fIPAR - the fraction of intercepted PAR = IPAR/PAR incident
-                    at the top of the canopy, accounting for partial closure based on Jackson and Palmer (1979).
-                */
-                if (s->lai > 0.0)
-                    s->fipar = ((1.0 - exp(-p->kext * s->lai / fc)) * fc);
-                else
-                    s->fipar = 0.0;
-
-                mate_C3_photosynthesis(c, f, m, p, s, s->day_length[doy],
-                                       ncontent);
+    for (t = 0; t < nthreads; t++) {
+        blocks[t].c = (control *)malloc(sizeof(control));
+        blocks[t].cw = (canopy_wk *)malloc(sizeof(canopy_wk));
+        blocks[t].f = (fluxes *)malloc(sizeof(fluxes));
+        blocks[t].m = (met *)malloc(sizeof(met));
+        blocks[t].s = (state *)malloc(sizeof(state));
+        if (blocks[t].c == NULL || blocks[t].cw == NULL ||
+            blocks[t].f == NULL || blocks[t].m == NULL ||
+            blocks[t].s == NULL) {
+            fprintf(stderr, "Error allocating space for threads\n");
+            exit(EXIT_FAILURE);
+        }
+        *blocks[t].c = *c;
+        *blocks[t].cw = *cw;
+        zero_leaf_iterations(blocks[t].cw);
+        *blocks[t].f = *f;
+        *blocks[t].s = *s;
+        if (c->prof != NULL) {
+            blocks[t].c->prof = (run_profile *)calloc(1, sizeof(run_profile));
+            if (blocks[t].c->prof == NULL) {
+                fprintf(stderr, "Error allocating space for threads\n");
+                exit(EXIT_FAILURE);
             }
-            printf("%d,%d,%lf,%lf\n", (int)year, doy, f->gpp*100., f->apar);
-            c->day_idx++;
-            /* ======================= **
-            **   E N D   O F   D A Y   **
-            ** ======================= */
         }
+        blocks[t].ma = ma;
+        blocks[t].p = p;
+        blocks[t].first_day = ndays * t / nthreads;
+        blocks[t].last_day = ndays * (t + 1) / nthreads;
+        blocks[t].day_doy = day_doy;
+        blocks[t].day_len = day_len;
+        blocks[t].gpp = gpp;
+        blocks[t].apar = apar;
+
+        if (pthread_create(&threads[t], NULL, simulate_day_block,
+                           &blocks[t]) != 0) {
+            fprintf(stderr, "Error starting thread %d\n", t);
+            exit(EXIT_FAILURE);
+        }
+    }
 
+    for (t = 0; t < nthreads; t++) {
+        pthread_join(threads[t], NULL);
+        for (i = 0; i <= LEAF_ITERMAX; i++)
+            cw->leaf_iter_hist[i] += blocks[t].cw->leaf_iter_hist[i];
+        if (c->prof != NULL) {
+            merge_profile(c->prof, blocks[t].c->prof);
+            free(blocks[t].c->prof);
+        }
+        free(blocks[t].c);
+        free(blocks[t].cw);
+        free(blocks[t].f);
+        free(blocks[t].m);
+        free(blocks[t].s);
     }
-    /* ========================= **
-    **   E N D   O F   Y E A R   **
-    ** ========================= */
+
+    for (d = 0; d < ndays; d++) {
+        c->day_idx = d;
+        f->gpp = gpp[d];
+        f->apar = apar[d];
+        write_daily_output(c, f, day_year[d], (int)day_doy[d]);
+    }
+
+    free(gpp);
+    free(apar);
+    free(threads);
+    free(blocks);
 
     return;
+}
+
+void *simulate_day_block(void *arg) {
+    /* thread body for run_days_threaded */
+
+    day_block *b = (day_block *)arg;
+    long d;
+
+    for (d = b->first_day; d < b->last_day; d++) {
+        simulate_day(b->cw, b->c, b->f, b->ma, b->m, b->p, b->s, d,
+                     (int)b->day_doy[d], b->day_len[d]);
+        b->gpp[d] = b->f->gpp;
+        b->apar[d] = b->f->apar;
+    }
+
+    return NULL;
+}
 
+void write_daily_output(control *c, fluxes *f, double year, int doy) {
+    /* print the day's fluxes, or keep them if running as a library */
+
+    output_store *o = c->store;
+    double values[5], t0 = 0.0;
+    int    n = 0;
+
+    if (c->prof != NULL)
+        t0 = profile_clock();
+    if (o == NULL && c->out != NULL) {
+        if (c->out->ncols == 5)
+            values[n++] = c->run_idx;
+        values[n++] = year;
+        values[n++] = doy;
+        values[n++] = f->gpp * 100.;
+        values[n++] = f->apar;
+        write_output_row(c->out, c->run_id, values);
+    } else if (o != NULL && c->day_idx < o->ndays) {
+        o->year[c->day_idx] = year;
+        o->doy[c->day_idx] = doy;
+        o->gpp[c->day_idx] = f->gpp * 100.;
+        o->apar[c->day_idx] = f->apar;
+    }
+    if (c->prof != NULL)
+        profile_add(c->prof, PROF_OUTPUT, t0);
 
+    return;
 }
 
 void clparser(int argc, char **argv, control *c) {
@@ -265,7 +644,51 @@ void clparser(int argc, char **argv, control *c) {
 
     for (i = 1; i < argc; i++) {
         if (*argv[i] == '-') {
-            if (!strncasecmp(argv[i], "-p", 2)) {
+            if (!strcasecmp(argv[i], "--set")) {
+                if (i + 1 >= argc) {
+                    fprintf(stderr, "%s: --set expects key=value\n", argv[0]);
+                    exit(EXIT_FAILURE);
+                }
+                if (c->override_args == NULL) {
+                    c->override_args = (char **)malloc(argc * sizeof(char *));
+                    if (c->override_args == NULL) {
+                        fprintf(stderr, "Error allocating override args\n");
+                        exit(EXIT_FAILURE);
+                    }
+                }
+                c->override_args[c->num_override_args++] = argv[++i];
+            } else if (!strcasecmp(argv[i], "--stdin")) {
+                c->override_stdin = TRUE;
+            } else if (!strcasecmp(argv[i], "--runs")) {
+                if (i + 1 >= argc) {
+                    fprintf(stderr, "%s: --runs expects a filename\n",
+                            argv[0]);
+                    exit(EXIT_FAILURE);
+                }
+                strcpy(c->runs_fname, argv[++i]);
+            } else if (!strcasecmp(argv[i], "-t") ||
+                       !strcasecmp(argv[i], "--threads")) {
+                if (i + 1 >= argc || atoi(argv[i+1]) < 1) {
+                    fprintf(stderr, "%s: %s expects a thread count\n",
+                            argv[0], argv[i]);
+                    exit(EXIT_FAILURE);
+                }
+                c->num_threads = atoi(argv[++i]);
+            } else if (!strcasecmp(argv[i], "--dump-params")) {
+                c->PRINT_PARAMS = TRUE;
+            } else if (!strcasecmp(argv[i], "--check-temp-response")) {
+                c->CHECK_TEMP_RESPONSE = TRUE;
+            } else if (!strcasecmp(argv[i], "--profile")) {
+                if (i + 1 >= argc) {
+                    fprintf(stderr, "%s: --profile expects a filename\n",
+                            argv[0]);
+                    exit(EXIT_FAILURE);
+                }
+                strncpy0(c->profile_fname, argv[++i],
+                         sizeof(c->profile_fname));
+            } else if (!strcasecmp(argv[i], "--leaf-iterations")) {
+                c->PRINT_LEAF_ITER = TRUE;
+            } else if (!strncasecmp(argv[i], "-p", 2)) {
 			    strcpy(c->cfg_fname, argv[++i]);
             } else if (!strncasecmp(argv[i], "-s", 2)) {
                 c->spin_up = TRUE;
@@ -298,6 +721,14 @@ void usage(char **argv) {
     fprintf(stderr, "[-ver          \t] Print the git hash tag.]\n");
     fprintf(stderr, "[-p       fname\t] Location of parameter file (.ini/.cfg).]\n");
     fprintf(stderr, "[-s            \t] Spin-up GDAY, when it the model is finished it will print the final state to the param file.]\n");
+    fprintf(stderr, "[--set key=val \t] Override a parameter after reading the param file, key or section.key, may be repeated.]\n");
+    fprintf(stderr, "[--stdin       \t] Read key = value overrides (optionally under [section] headers) from the standard in.]\n");
+    fprintf(stderr, "[--runs   fname\t] Run once per row of a CSV table of parameter sets (run_id,key,...), sharing the forcing.]\n");
+    fprintf(stderr, "[--dump-params \t] Print every parameter as set by the param file and any overrides, then exit.]\n");
+    fprintf(stderr, "[-t           N\t] Spread the days over N threads, output is identical to a serial run.]\n");
+    fprintf(stderr, "[--check-temp-response\t] Report how far the tabulated leaf temperature responses (temp_response_tol) are from the exact ones, then exit.]\n");
+    fprintf(stderr, "[--profile fname\t] Time each stage of the run and count the hot path calls, written to fname as JSON at the end (- for the standard error).]\n");
+    fprintf(stderr, "[--leaf-iterations\t] Print a histogram of the passes each leaf temperature solve took (see leaf_solver) to the standard error at the end.]\n");
     fprintf(stderr, "\n++Print this message:\n" );
     fprintf(stderr, "[-u/-h         \t] usage/help]\n");
 
@@ -373,22 +804,30 @@ void unpack_met_data(control *c, fluxes *f, met_arrays *ma, met *m, int hod,
 void fill_up_solar_arrays(canopy_wk *cw, control *c, met_arrays *ma, params *p) {
 
     // This is a suprisingly big time hog. So I'm going to unpack it once into
-    // an array which we can then access during spinup to save processing time
+    // an array which we can then access during spinup to save processing time.
+    // The geometry (but not the diffuse fraction, which depends on PAR) can
+    // also come from an on disk cache, see solar_cache.c
 
-    int    nyr, doy, hod;
+    int    nyr, cached;
     long   ntimesteps = c->total_num_days * 48;
-    double year, sw_rad;
+    double year;
 
-    cw->cz_store = malloc(ntimesteps * sizeof(double));
-    if (cw->cz_store == NULL) {
-        fprintf(stderr, "malloc failed allocating cz store\n");
-        exit(EXIT_FAILURE);
-    }
+    cw->solar_map_base = NULL;
+    cw->solar_map_len = 0;
+    cached = load_solar_cache(cw, c, ma, p);
 
-    cw->ele_store = malloc(ntimesteps * sizeof(double));
-    if (cw->ele_store == NULL) {
-        fprintf(stderr, "malloc failed allocating ele store\n");
-        exit(EXIT_FAILURE);
+    if (!cached) {
+        cw->cz_store = malloc(ntimesteps * sizeof(double));
+        if (cw->cz_store == NULL) {
+            fprintf(stderr, "malloc failed allocating cz store\n");
+            exit(EXIT_FAILURE);
+        }
+
+        cw->ele_store = malloc(ntimesteps * sizeof(double));
+        if (cw->ele_store == NULL) {
+            fprintf(stderr, "malloc failed allocating ele store\n");
+            exit(EXIT_FAILURE);
+        }
     }
 
     cw->df_store = malloc(ntimesteps * sizeof(double));
@@ -397,6 +836,7 @@ void fill_up_solar_arrays(canopy_wk *cw, control *c, met_arrays *ma, params *p)
         exit(EXIT_FAILURE);
     }
 
+    /* a year at a time, the per-day terms are hoisted out of the hours */
     c->hour_idx = 0;
     for (nyr = 0; nyr < c->num_years; nyr++) {
         year = ma->year[c->hour_idx];
@@ -405,18 +845,25 @@ void fill_up_solar_arrays(canopy_wk *cw, control *c, met_arrays *ma, params *p)
             c->num_days = 366;
         else
             c->num_days = 365;
-        for (doy = 0; doy < c->num_days; doy++) {
-            for (hod = 0; hod < c->num_hlf_hrs; hod++) {
-
-                calculate_solar_geometry(cw, p, doy, hod);
-                sw_rad = ma->par[c->hour_idx] * PAR_2_SW; /* W m-2 */
-                get_diffuse_frac(cw, doy, sw_rad);
-                cw->cz_store[c->hour_idx] = cw->cos_zenith;
-                cw->ele_store[c->hour_idx] = cw->elevation;
-                cw->df_store[c->hour_idx] = cw->diffuse_frac;
-                c->hour_idx++;
-            }
+        if (!cached) {
+            calculate_solar_geometry_days(p, 0, c->num_days, c->num_hlf_hrs,
+                                          cw->cz_store + c->hour_idx,
+                                          cw->ele_store + c->hour_idx);
         }
+        calculate_diffuse_frac_days(0, c->num_days, c->num_hlf_hrs,
+                                    cw->cz_store + c->hour_idx,
+                                    ma->par + c->hour_idx,
+                                    cw->df_store + c->hour_idx);
+        c->hour_idx += (long)c->num_days * c->num_hlf_hrs;
+    }
+
+    /* leave the last half hour's values in cw, as the per-timestep calls
+       did; canopy() takes direct_frac from here */
+    if (c->hour_idx > 0)
+        set_last_solar_values(cw, c->hour_idx - 1);
+
+    if (!cached) {
+        save_solar_cache(cw, c, ma, p);
     }
     return;
 
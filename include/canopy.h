@@ -13,12 +13,21 @@
 #include "photosynthesis.h"
 
 /* C stuff */
+/* largest secant step, as a multiple of the plain fixed point step */
+#define SECANT_MAX_STRETCH 10.0
+
 void    initialise_leaf_surface(canopy_wk *, met *);
+void    warm_start_leaf_surface(canopy_wk *);
+void    store_leaf_offsets(canopy_wk *, met *);
+void    zero_leaf_offsets(canopy_wk *);
+double  secant_tleaf(double, double, double, double);
+void    zero_leaf_iterations(canopy_wk *);
+void    print_leaf_iterations(FILE *, canopy_wk *, control *);
 void    zero_carbon_day_fluxes(fluxes *);
 void    zero_hourly_fluxes(canopy_wk *);
 void    update_daily_carbon_fluxes(fluxes *, params *, double, double);
 void    canopy(canopy_wk *, control *, fluxes *, met_arrays *, met *,
-               params *, state *);
+               params *, state *, int);
 void    solve_leaf_energy_balance(control *, canopy_wk *, fluxes *, met *,
                                   params *, state *, double);
 void    sum_hourly_carbon_fluxes(canopy_wk *, fluxes *, params *);
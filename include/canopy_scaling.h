@@ -7,6 +7,7 @@
 #include <ctype.h>
 #include <unistd.h>
 #include <math.h>
+#include <pthread.h>
 
 
 #define EPSILON 1E-08
@@ -70,6 +71,21 @@
 #define BRUTE 0
 #define SAS 1
 
+/* Leaf temperature solver, see canopy.c */
+#define COLD_START 0
+#define WARM_START 1
+#define LEAF_ITERMAX 100
+
+/* --profile timers, see profile.c */
+#define PROF_PARSE_CFG 0
+#define PROF_READ_MET 1
+#define PROF_SOLAR 2
+#define PROF_CANOPY 3
+#define PROF_MATE 4
+#define PROF_OUTPUT 5
+#define PROF_OUTPUT_SD 6
+#define PROF_NTIMERS 7
+
 /* Spinup array index */
 #define AF 0
 #define AR 1
@@ -91,13 +107,28 @@
 #include "read_met_file.h"
 #include "version.h"
 #include "canopy.h"
+#include "solar_cache.h"
+#include "met_stream.h"
+#include "write_output_file.h"
+#include "temp_response.h"
+#include "profile.h"
 
 void   clparser(int, char **, control *);
 void   usage(char **);
 
 void   run_sim(canopy_wk *, control *, fluxes *, met_arrays *, met *,
                params *p, state *);
-
+void   run_table(canopy_wk *, control *, fluxes *, met_arrays *, met *,
+                 params *, state *);
+void   simulate_day(canopy_wk *, control *, fluxes *, met_arrays *, met *,
+                    params *, state *, long, int, double);
+void   run_days_threaded(canopy_wk *, control *, fluxes *, met_arrays *,
+                         params *, state *, double *, double *, double *);
+void  *simulate_day_block(void *);
+void   reset_run_state(canopy_wk *, control *, params *, state *);
+int    split_csv_line(char *, char **, int);
+
+void   write_daily_output(control *, fluxes *, double, int);
 void   unpack_met_data(control *, fluxes *f, met_arrays *, met *, int, double);
 void   fill_up_solar_arrays(canopy_wk *, control *, met_arrays *, params *);
 
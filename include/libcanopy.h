@@ -0,0 +1,49 @@
+#ifndef LIBCANOPY_H
+#define LIBCANOPY_H
+
+#include "canopy_scaling.h"
+
+/*
+** Library interface to the canopy model, so that it can be driven from
+** another process (e.g. python via ctypes) without going through the cfg
+** file rewrite -> process spawn -> CSV output round trip for every run.
+*/
+typedef struct {
+    control      *c;
+    canopy_wk    *cw;
+    fluxes       *f;
+    met_arrays   *ma;
+    met          *m;
+    params       *p;
+    state        *s;
+    output_store *out;
+    long          nmet;         /* rows set through canopy_set_met_column */
+    int           prepared;     /* forcing checked & solar arrays filled */
+} canopy_model;
+
+canopy_model *canopy_init(const char *);
+void   canopy_free(canopy_model *);
+void   canopy_set_param(canopy_model *, const char *, const char *,
+                        const char *);
+int    canopy_get_param(canopy_model *, const char *, const char *, char *,
+                        long);
+void   canopy_clear_met(canopy_model *);
+int    canopy_load_met_file(canopy_model *, const char *);
+const char *canopy_met_column_name(canopy_model *, int);
+int    canopy_set_met_column(canopy_model *, const char *, const double *,
+                             long);
+int    canopy_prepare(canopy_model *);
+int    canopy_run(canopy_model *);
+int    canopy_write_results(canopy_model *, const char *);
+long   canopy_num_days(canopy_model *);
+int    canopy_get_results(canopy_model *, double *, double *, double *,
+                          double *);
+int    canopy_leaf_iterations(canopy_model *, long *, int);
+void   canopy_leaf_C3_batch(canopy_model *, int, double, double, long,
+                            const double *, const double *, const double *,
+                            const double *, double *, double *, double *);
+void   canopy_solar_geometry(canopy_model *, int, int, double *, double *);
+void   canopy_diffuse_frac(canopy_model *, int, int, const double *,
+                           const double *, double *);
+
+#endif /* LIBCANOPY_H */
@@ -0,0 +1,37 @@
+#ifndef MET_STREAM_H
+#define MET_STREAM_H
+
+#include "canopy_scaling.h"
+#include "utilities.h"
+
+/* sub-daily forcing read a day at a time, see met_stream.c */
+typedef struct {
+    control        *c;
+    char          **argv;
+    FILE           *fp;         /* CSV forcing, or */
+    met_arrays      map;        /* ...a memory-mapped binary one */
+    long            map_days;
+    int             ncols;
+    int             num_hlf_hrs;
+    int             nslots;
+    long            day_len;    /* doubles per slot, ncols * num_hlf_hrs */
+    double         *slots;
+    long            produced;   /* days written by the reader */
+    long            consumed;   /* days finished by the model */
+    int             done;       /* the reader has hit the end of the file */
+    pthread_mutex_t lock;
+    pthread_cond_t  not_full;
+    pthread_cond_t  not_empty;
+    pthread_t       reader;
+} met_stream;
+
+void   open_met_stream(met_stream *, char **, control *);
+void   close_met_stream(met_stream *);
+int    next_met_day(met_stream *, control *, met_arrays *);
+void   release_met_day(met_stream *);
+void  *met_stream_reader(void *);
+void   fill_up_solar_day(canopy_wk *, control *, met_arrays *, params *, int);
+void   run_sim_streamed(char **, canopy_wk *, control *, fluxes *, met *,
+                        params *, state *);
+
+#endif /* MET_STREAM_H */
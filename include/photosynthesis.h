@@ -5,14 +5,27 @@
 #include "constants.h"
 #include "utilities.h"
 
+/* leaves per block in photosynthesis_C3_batch */
+#define LEAF_BATCH 256
+
 /* Sub-daily funcs */
 void   photosynthesis_C3(control *, canopy_wk *, met *m, params *, state *);
+void   photosynthesis_C3_batch(control *, canopy_wk *, params *, state *,
+                               long, const double *, const double *,
+                               const double *, const double *, double *,
+                               double *, double *);
+int    solve_leaf_C3(double, double, double, double, double, double, double,
+                     double, double, double, double *, double *, double *,
+                     long *);
 void   photosynthesis_C3_emax(control *, canopy_wk *, met *m, params *,
                               state *, double, double);
 double calc_co2_compensation_point(params *, double);
 double calculate_michaelis_menten(params *, double);
 void   calculate_jmaxt_vcmaxt(control *, canopy_wk *, params *, state *,
                               double, double *, double *);
+void   calculate_jmax25_vcmax25(control *, canopy_wk *, params *, double *,
+                                double *);
+void   adjust_jmax_vcmax(control *, state *, double, double *, double *);
 double arrhenius(double, double, double, double);
 double peaked_arrhenius(double, double, double, double, double, double);
 double calc_leaf_day_respiration(double, double);
@@ -0,0 +1,14 @@
+#ifndef PROFILE_H
+#define PROFILE_H
+
+#include <time.h>
+
+#include "canopy_scaling.h"
+
+double profile_clock(void);
+void   start_profile(control *);
+void   profile_add(run_profile *, int, double);
+void   merge_profile(run_profile *, const run_profile *);
+void   write_profile(control *, canopy_wk *, params *);
+
+#endif /* PROFILE_H */
@@ -14,10 +14,17 @@
 /* utilities */
 double day_angle(int);
 void   calculate_solar_geometry(canopy_wk *, params *, double, double);
+void   calculate_solar_geometry_days(params *, int, int, int, double *,
+                                     double *);
+void   set_last_solar_values(canopy_wk *, long);
 double calculate_solar_declination(int, double);
 double calculate_eqn_of_time(double);
 void   get_diffuse_frac(canopy_wk *, int, double);
 void   spitters(canopy_wk *, int, double);
+double spitters_diffuse_frac(double, double);
+void   calculate_diffuse_frac_days(int, int, int, const double *,
+                                   const double *, double *);
+double extra_terrestrial_scale(double);
 double calc_extra_terrestrial_rad(double, double);
 double estimate_clearness(double, double);
 void   calculate_absorbed_radiation(canopy_wk *, params *, state *, double);
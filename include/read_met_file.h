@@ -3,12 +3,35 @@
 
 #include <stdio.h>
 #include <stdlib.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 #include "canopy_scaling.h"
 #include "utilities.h"
 
 void    read_daily_met_data(char **, control *, met_arrays *);
 void    read_subdaily_met_data(char **, control *, met_arrays *);
+int     is_binary_met_file(char *);
+void    read_binary_met_data(char **, control *, met_arrays *);
+void    free_met_arrays(control *, met_arrays *);
+const char *met_column_name(control *, int);
+double **get_met_column(control *, met_arrays *, const char *);
+int     check_met_columns(control *, met_arrays *);
+int     parse_met_fields(char *, double *, long, int, int);
+
+/* binary met forcing layout, see read_met_file.c */
+#define MET_BIN_MAGIC "CSMETBIN"
+#define MET_BIN_MAGIC_LEN 8
+#define MET_BIN_VERSION 1
+#define MET_BIN_HEADER_LEN 32
+#define MET_BIN_NAME_LEN 16
+
+/* text met reader: stdio buffer, and rows allocated to start with */
+#define MET_READ_BUFSIZE (1 << 20)
+#define MET_READ_ROWS 4096
 
 
 #endif /* READ_MET_H */
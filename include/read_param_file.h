@@ -1,12 +1,60 @@
 #ifndef READ_PARAM_H
 #define READ_PARAM_H
 
+#include <stddef.h>
+
 #include "canopy_scaling.h"
 #include "utilities.h"
 
+/* A key = value pair given with --set or on the standard in */
+typedef struct {
+    char section[STRING_LENGTH];
+    char name[STRING_LENGTH];
+    char value[STRING_LENGTH];
+    int  found;
+} param_override;
+
+/* Which structure a registered parameter lives in */
+#define IN_CONTROL 0
+#define IN_PARAMS 1
+#define IN_STATE 2
+
+/* How its value is parsed */
+#define PARAM_DOUBLE 0
+#define PARAM_INT 1
+#define PARAM_STRING 2
+#define PARAM_ENUM 3
+
+/* One allowed value of an enum (or true/false) parameter */
+typedef struct {
+    const char *name;
+    int         value;
+} param_option;
 
+/* A param file key and the structure field it sets */
+typedef struct {
+    const char         *section;
+    const char         *name;
+    int                 owner;
+    int                 type;
+    size_t              offset;
+    const param_option *options;    /* PARAM_ENUM, NULL name terminated */
+    const char         *what;       /* "Unknown <what>: <value>" message */
+} param_entry;
 
 int  parse_ini_file(control *, params *, state *);
 int  handler(char *, char *, char *, control *, params *, state *);
+int  get_param_overrides(control *, param_override **);
+int  add_param_override(param_override **, int *, int *, char *, char *);
+char *match_param_override(param_override *, int, char *, char *, char *);
+void apply_param_overrides(param_override *, int, control *, params *,
+                           state *);
+int  resolve_param_overrides(control *, param_override **, int *);
+const param_entry *find_param(const char *, const char *);
+void set_param_value(const param_entry *, char *, control *, params *,
+                     state *);
+void format_param_value(const param_entry *, char *, size_t, control *,
+                        params *, state *);
+void dump_params(FILE *, control *, params *, state *);
 
 #endif /* READ_PARAM_H */
@@ -0,0 +1,29 @@
+#ifndef SOLAR_CACHE_H
+#define SOLAR_CACHE_H
+
+#include <stdint.h>
+#include <dirent.h>
+#include <fcntl.h>
+#include <utime.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+#include "canopy_scaling.h"
+#include "utilities.h"
+
+/* solar geometry cache file layout, see solar_cache.c */
+#define SOLAR_CACHE_MAGIC "CSSOLGEO"
+#define SOLAR_CACHE_MAGIC_LEN 8
+#define SOLAR_CACHE_VERSION 1
+#define SOLAR_CACHE_HEADER_LEN 48
+#define SOLAR_CACHE_PREFIX "solar_"
+#define SOLAR_CACHE_SUFFIX ".bin"
+
+uint64_t solar_cache_key(control *, met_arrays *, params *);
+int    solar_cache_fname(control *, uint64_t, char *, size_t);
+int    load_solar_cache(canopy_wk *, control *, met_arrays *, params *);
+void   save_solar_cache(canopy_wk *, control *, met_arrays *, params *);
+void   evict_solar_cache(control *, char *);
+void   free_solar_arrays(canopy_wk *);
+
+#endif /* SOLAR_CACHE_H */
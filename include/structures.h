@@ -3,10 +3,48 @@
 
 #include "canopy_scaling.h"
 
+/* Daily results kept in memory when the model is driven as a library */
+typedef struct {
+    long    ndays;
+    double *year;
+    double *doy;
+    double *gpp;
+    double *apar;
+} output_store;
+
+/* Where the model output goes, see write_output_file.c */
+typedef struct {
+    FILE   *fp;
+    int     format;         /* OUTPUT_CSV, OUTPUT_BINARY or OUTPUT_NPY */
+    int     ncols;
+    int     int_cols;       /* leading columns written as integers (CSV) */
+    const char **names;
+    const char  *label;     /* name of a leading text column (CSV only) */
+    long    nrows;
+    char    fname[STRING_LENGTH];
+    char    hdr_fname[STRING_LENGTH];
+    char   *buf;            /* CSV text waiting to be written */
+    size_t  buf_used;
+    double *cols;           /* binary: a block of OUTPUT_ROWS rows */
+    int     block_rows;     /* rows in that block so far */
+    long    npy_header_len;
+} output_sink;
+
+/* --profile: time spent in each stage and counts from the hot paths */
+typedef struct {
+    double start;                   /* clock at the start of the run (s) */
+    char   cfg_fname[STRING_LENGTH];/* as given, the cfg may reset it */
+    double seconds[PROF_NTIMERS];
+    long   calls[PROF_NTIMERS];
+    long   days;
+    long   daylight_steps;
+    long   night_steps;
+    long   quad_failures;
+} run_profile;
+
 typedef struct {
     FILE *ifp;
     FILE *ofp;
-    FILE *ofp_sd;
     FILE *ofp_hdr;
     char  cfg_fname[STRING_LENGTH];
     char  met_fname[STRING_LENGTH];
@@ -56,6 +94,29 @@ typedef struct {
     int   pdebug;
     int   spinup_method;
     int   soil_drainage;
+    char  **override_args;
+    int   num_override_args;
+    int   override_stdin;
+    output_store *store;
+    output_sink  *out;
+    output_sink  *out_sd;
+    unsigned long long print_sd_mask;
+    char  runs_fname[STRING_LENGTH];
+    char  run_id[STRING_LENGTH];
+    long  run_idx;
+    char  solar_cache_dir[STRING_LENGTH];
+    double solar_cache_max_mb;
+    int   num_threads;
+    int   PRINT_PARAMS;
+    int   CHECK_TEMP_RESPONSE;
+    int   stream_met;
+    int   stream_buffer_days;
+    int   temp_response_table;
+    double temp_response_tol;
+    int   leaf_solver;
+    int   PRINT_LEAF_ITER;
+    char  profile_fname[STRING_LENGTH];
+    run_profile *prof;
 } control;
 
 
@@ -415,6 +476,13 @@ typedef struct {
     double *doy;
     double *diffuse_frac;
 
+    /* set when the columns point into a memory-mapped binary met file */
+    void   *map_base;
+    size_t  map_len;
+
+    /* set when the columns point into one block read from a CSV file */
+    double *block;
+
 
 } met_arrays;
 
@@ -649,6 +717,13 @@ typedef struct {
 
 } fluxes;
 
+typedef struct {
+    long    n;              /* leaf temperatures tabulated */
+    double  step;           /* spacing of those temperatures (deg C) */
+    double  inv_step;
+    double *values;         /* TR_NVALUES at each, see temp_response.c */
+} temp_response;
+
 typedef struct {
     /* 2 member arrays are for the sunlit (0) and shaded (1) components */
     int    ileaf;           /* sunlit (0) or shaded (1) leaf index */
@@ -684,6 +759,13 @@ typedef struct {
     double *cz_store;       /* Array to hold coz zenith angles */
     double *ele_store;      /* Array to hold elevations */
     double *df_store;       /* Array to hold diffuse fractions */
+    void   *solar_map_base; /* set when cz/ele_store are a mapped cache file */
+    size_t  solar_map_len;
+    temp_response *tresp;   /* tabulated temperature responses, or NULL */
+    double tleaf_offset[2]; /* last converged Tleaf - Tair, for warm starts */
+    double Cs_offset[2];    /* ...Cs - Ca */
+    double dleaf_offset[2]; /* ...dleaf - VPD */
+    long   leaf_iter_hist[LEAF_ITERMAX + 1]; /* leaf solves by passes taken */
 
     // Used in the hydraulics calculations when water is limiting //
     double ts_Cs;           // Temporary variable to store Cs //
@@ -751,4 +833,21 @@ typedef struct {
     double passivesoil_nc;
 } fast_spinup;
 
+/* A block of days for one thread, see run_days_threaded */
+typedef struct {
+    control    *c;
+    canopy_wk  *cw;
+    fluxes     *f;
+    met_arrays *ma;
+    met        *m;
+    params     *p;
+    state      *s;
+    long        first_day;
+    long        last_day;
+    double     *day_doy;
+    double     *day_len;
+    double     *gpp;
+    double     *apar;
+} day_block;
+
 #endif
@@ -0,0 +1,29 @@
+#ifndef TEMP_RESPONSE_H
+#define TEMP_RESPONSE_H
+
+#include "canopy_scaling.h"
+#include "photosynthesis.h"
+
+/* leaf temperature range tabulated (deg C), outside it the exact path */
+#define TR_TMIN -50.0
+#define TR_TMAX 70.0
+
+/* coarsest and finest grid spacing tried (deg C) */
+#define TR_MAX_STEP 1.0
+#define TR_MIN_STEP (1.0 / 1024.0)
+
+/* the values held at each temperature */
+#define TR_GAMMA_STAR 0
+#define TR_KM 1
+#define TR_VCMAX 2
+#define TR_JMAX 3
+#define TR_NVALUES 4
+
+void   build_temp_response(canopy_wk *, control *, params *);
+void   free_temp_response(canopy_wk *);
+void   check_temp_response(FILE *, control *, params *);
+int    temp_response_at(const temp_response *, double, double *);
+void   temp_response_batch(const temp_response *, long, const double *,
+                           double *, double *, double *, double *, int *);
+
+#endif /* TEMP_RESPONSE_H */
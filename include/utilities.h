@@ -25,6 +25,7 @@ char   *rstrip(char *);
 char   *lskip(char *);
 char   *find_char_or_comment(char*, char);
 char   *strncpy0(char*, char*, size_t);
+double parse_double(const char *, char **);
 char   *strip_first_and_last_character(char);
 
 #endif /* UTILITIES_H */
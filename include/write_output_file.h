@@ -0,0 +1,37 @@
+#ifndef WRITE_OUTPUT_FILE_H
+#define WRITE_OUTPUT_FILE_H
+
+#include <stdint.h>
+
+#include "canopy_scaling.h"
+#include "utilities.h"
+
+/* output_sink formats */
+#define OUTPUT_CSV 0
+#define OUTPUT_BINARY 1
+#define OUTPUT_NPY 2
+
+#define OUTPUT_BUFSIZE (1 << 20)
+#define OUTPUT_FIELD_MAX 512   /* longest CSV field, %f of DBL_MAX is 317 */
+#define FIXED6_FAST_LEN 16     /* longest format_fixed6 without printf, + 1 */
+#define OUTPUT_ROWS 4096
+#define NPY_MAGIC "\x93NUMPY"
+#define NPY_MAGIC_LEN 6
+
+output_sink *open_output_sink(int, const char *, const char *,
+                              const char **, int, int, const char *);
+void   write_output_row(output_sink *, const char *, const double *);
+int    close_output_sink(output_sink *);
+int    output_format(control *);
+void   open_output_files(control *);
+void   close_output_files(control *);
+void   open_daily_output(control *);
+void   open_subdaily_output(control *);
+int    select_subdaily_var(control *, const char *, const char *);
+const char *subdaily_var_name(int);
+void   write_subdaily_output(control *, canopy_wk *, met *, double, double,
+                             int);
+int    write_output_store(output_store *, int, const char *);
+int    format_fixed6(char *, size_t, double);
+
+#endif /* WRITE_OUTPUT_FILE_H */
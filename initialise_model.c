@@ -51,6 +51,29 @@ void initialise_control(control *c) {
     c->num_days = 0;                /* Number of days in a year: 365/366 */
     c->total_num_days = 0;          /* Total number of days  */
     c->PRINT_GIT = FALSE;           /* print the git hash to the cmd line and exit? Called from cmd line parsar */
+    c->override_args = NULL;        /* --set key=value strings, from the cmd line */
+    c->num_override_args = 0;
+    c->override_stdin = FALSE;      /* read a key = value block from stdin? */
+    c->store = NULL;                /* keep daily output in memory, not stdout */
+    c->out = NULL;                  /* the daily output, opened once the met is read */
+    c->out_sd = NULL;               /* ...and the sub-daily output */
+    c->print_sd_mask = 0;           /* sub-daily variables asked for in [print] */
+    strcpy(c->runs_fname, "");      /* table of param sets to run in turn */
+    strcpy(c->run_id, "");          /* id of the current row of that table */
+    c->run_idx = 0;                 /* ...and its row number, from 0 */
+    strcpy(c->solar_cache_dir, ""); /* cache solar geometry here, "" = off */
+    c->solar_cache_max_mb = 256.0;  /* size cap on that cache directory */
+    c->num_threads = 1;             /* threads to spread the days over (-t) */
+    c->PRINT_PARAMS = FALSE;        /* print the parameters as read and exit? */
+    c->stream_met = FALSE;          /* read sub-daily forcing a day at a time */
+    c->temp_response_table = FALSE; /* interpolate the leaf kinetics? */
+    c->temp_response_tol = 1E-06;   /* largest relative error allowed */
+    c->CHECK_TEMP_RESPONSE = FALSE; /* report the table's error and exit? */
+    c->stream_buffer_days = 8;      /* days the met reader may get ahead by */
+    c->leaf_solver = COLD_START;    /* start each leaf solve from air values? */
+    c->PRINT_LEAF_ITER = FALSE;     /* report leaf solver passes at the end? */
+    strcpy(c->profile_fname, "");   /* --profile JSON summary, "" = off */
+    c->prof = NULL;                 /* ...and what goes in it */
 
     c->sub_daily = FALSE;           /* Run at daily or 30 minute timestep */
     c->num_hlf_hrs = 48;
@@ -0,0 +1,417 @@
+/* ============================================================================
+* Shared library interface to the canopy model: read a cfg once, then set
+* parameters and forcing in memory and run as many times as needed, picking
+* the daily GPP/APAR up from arrays rather than stdout.
+*
+* Build with "make lib", see test/simulations/libcanopy.py for the python
+* wrapper.
+*
+* =========================================================================== */
+
+#include "libcanopy.h"
+
+static char *lib_argv[] = {"libcanopy", NULL};
+
+/* cfg keys canopy_prepare's work depends on, see canopy_set_param */
+static const char *prepare_keys[] = {"latitude", "longitude", "sub_daily",
+                                     "solar_cache_dir", "solar_cache_max_mb",
+                                     NULL};
+
+canopy_model *canopy_init(const char *cfg_fname)
+{
+    /*
+        Allocate the model structures and read the parameter file. Returns
+        NULL if the parameter file could not be parsed.
+    */
+    canopy_model *mod;
+    int error = 0;
+
+    if ((mod = (canopy_model *)calloc(1, sizeof(canopy_model))) == NULL) {
+        fprintf(stderr, "canopy model: Not allocated enough memory!\n");
+        exit(EXIT_FAILURE);
+    }
+    mod->c = (control *)malloc(sizeof(control));
+    mod->cw = (canopy_wk *)calloc(1, sizeof(canopy_wk));
+    mod->f = (fluxes *)malloc(sizeof(fluxes));
+    mod->ma = (met_arrays *)calloc(1, sizeof(met_arrays));
+    mod->m = (met *)malloc(sizeof(met));
+    mod->p = (params *)malloc(sizeof(params));
+    mod->s = (state *)malloc(sizeof(state));
+    mod->out = (output_store *)calloc(1, sizeof(output_store));
+    if (mod->c == NULL || mod->cw == NULL || mod->f == NULL ||
+        mod->ma == NULL || mod->m == NULL || mod->p == NULL ||
+        mod->s == NULL || mod->out == NULL) {
+        fprintf(stderr, "canopy model: Not allocated enough memory!\n");
+        exit(EXIT_FAILURE);
+    }
+
+    if ((mod->s->day_length = (double *)calloc(366, sizeof(double))) == NULL) {
+        fprintf(stderr,"Error allocating space for day_length\n");
+        exit(EXIT_FAILURE);
+    }
+
+    initialise_control(mod->c);
+    initialise_params(mod->p);
+    initialise_fluxes(mod->f);
+    initialise_state(mod->s);
+
+    strncpy0(mod->c->cfg_fname, (char *)cfg_fname,
+             sizeof(mod->c->cfg_fname));
+    error = parse_ini_file(mod->c, mod->p, mod->s);
+    fclose(mod->c->ifp);
+    mod->c->ifp = NULL;
+    if (error != 0) {
+        fprintf(stderr, "Error reading %s on line %d\n", cfg_fname, error);
+        canopy_free(mod);
+        return NULL;
+    }
+    strcpy(mod->c->git_code_ver, build_git_sha);
+    mod->c->store = mod->out;
+
+    return mod;
+}
+
+void canopy_free(canopy_model *mod)
+{
+    if (mod == NULL)
+        return;
+
+    free_met_arrays(mod->c, mod->ma);
+    free_solar_arrays(mod->cw);
+    free_temp_response(mod->cw);
+    free(mod->out->year);
+    free(mod->out->doy);
+    free(mod->out->gpp);
+    free(mod->out->apar);
+    free(mod->out);
+    free(mod->s->day_length);
+    free(mod->cw);
+    free(mod->c);
+    free(mod->ma);
+    free(mod->m);
+    free(mod->p);
+    free(mod->s);
+    free(mod->f);
+    free(mod);
+
+    return;
+}
+
+void canopy_set_param(canopy_model *mod, const char *section,
+                      const char *name, const char *value)
+{
+    /*
+        Set a single cfg value, e.g. ("params", "g1", "4.0"), through the
+        same handler the parameter file goes through. The forcing only has
+        to be prepared again (the solar arrays refilled) if the key is one
+        of prepare_keys, as in run_table, so a parameter sweep doesn't pay
+        for that on every run.
+    */
+    char sect[STRING_LENGTH];
+    char key[STRING_LENGTH];
+    char val[STRING_LENGTH];
+    int  i;
+
+    strncpy0(sect, (char *)section, sizeof(sect));
+    strncpy0(key, (char *)name, sizeof(key));
+    strncpy0(val, (char *)value, sizeof(val));
+    handler(sect, key, val, mod->c, mod->p, mod->s);
+    for (i = 0; prepare_keys[i] != NULL; i++) {
+        if (strcasecmp(key, prepare_keys[i]) == 0)
+            mod->prepared = FALSE;
+    }
+
+    return;
+}
+
+int canopy_get_param(canopy_model *mod, const char *section,
+                     const char *name, char *buf, long len)
+{
+    /*
+        Current value of a cfg key, formatted as it would be in the param
+        file. Returns FALSE if the model has no such key.
+    */
+    const param_entry *e;
+
+    if ((e = find_param(section, name)) == NULL)
+        return FALSE;
+    format_param_value(e, buf, (size_t)len, mod->c, mod->p, mod->s);
+
+    return TRUE;
+}
+
+void canopy_clear_met(canopy_model *mod)
+{
+    /*
+        Drop the forcing, from a file or from arrays, so that forcing of
+        another length can be loaded into the same model.
+    */
+
+    free_met_arrays(mod->c, mod->ma);
+    mod->nmet = 0;
+    mod->prepared = FALSE;
+
+    return;
+}
+
+int canopy_load_met_file(canopy_model *mod, const char *fname)
+{
+    /*
+        Read a CSV or binary forcing file, as set up for the current
+        sub_daily. Returns -1, leaving any forcing already loaded in place,
+        if the file can't be opened; the readers exit on a malformed file,
+        so that still ends the process.
+    */
+    FILE *fp;
+
+    if ((fp = fopen(fname, "rb")) == NULL) {
+        fprintf(stderr, "Error opening met file %s\n", fname);
+        return -1;
+    }
+    fclose(fp);
+    canopy_clear_met(mod);
+    strncpy0(mod->c->met_fname, (char *)fname, sizeof(mod->c->met_fname));
+
+    if (mod->c->sub_daily) {
+        read_subdaily_met_data(lib_argv, mod->c, mod->ma);
+    } else {
+        read_daily_met_data(lib_argv, mod->c, mod->ma);
+    }
+
+    return 0;
+}
+
+const char *canopy_met_column_name(canopy_model *mod, int i)
+{
+    /* forcing columns needed for the current sub_daily setting */
+
+    return met_column_name(mod->c, i);
+}
+
+int canopy_set_met_column(canopy_model *mod, const char *name,
+                          const double *data, long n)
+{
+    /*
+        Copy one forcing column in. All columns must have the same length,
+        and any forcing read from file is dropped first. Returns -1 for an
+        unknown column or a length mismatch.
+    */
+    double **col;
+
+    /* nmet is only set for array forcing, so this is forcing from a file */
+    if (mod->nmet == 0 && mod->ma->year != NULL) {
+        free_met_arrays(mod->c, mod->ma);
+    }
+    if ((col = get_met_column(mod->c, mod->ma, name)) == NULL) {
+        fprintf(stderr, "Unknown met column: %s\n", name);
+        return -1;
+    }
+    if (mod->nmet > 0 && n != mod->nmet) {
+        fprintf(stderr, "Met column %s has %ld rows, expected %ld\n", name,
+                n, mod->nmet);
+        return -1;
+    }
+
+    if (*col == NULL && (*col = (double *)malloc(n * sizeof(double))) == NULL) {
+        fprintf(stderr, "Error allocating space for met column %s\n", name);
+        exit(EXIT_FAILURE);
+    }
+    mod->prepared = FALSE;
+    memcpy(*col, data, n * sizeof(double));
+    mod->nmet = n;
+
+    return 0;
+}
+
+int canopy_prepare(canopy_model *mod)
+{
+    /*
+        Check the loaded forcing, count its days and fill the solar arrays
+        for it. canopy_run does this itself when the forcing or the site
+        has changed since the last time (see canopy_set_param), so this
+        only needs calling to do that work separately, e.g. to time it.
+        Returns 0 on success, -1 if the forcing is incomplete.
+    */
+    control      *c = mod->c;
+    canopy_wk    *cw = mod->cw;
+    met_arrays   *ma = mod->ma;
+    output_store *o = mod->out;
+    params       *p = mod->p;
+    long          i;
+
+    if (!check_met_columns(c, ma))
+        return -1;
+
+    if (mod->nmet > 0) {
+        /* forcing came in as arrays, so count the days & years ourselves */
+        if (c->sub_daily && mod->nmet % c->num_hlf_hrs != 0) {
+            fprintf(stderr, "Sub-daily met forcing isn't whole days\n");
+            return -1;
+        }
+        c->total_num_days = c->sub_daily ? mod->nmet / c->num_hlf_hrs :
+                                           mod->nmet;
+        c->num_years = 1;
+        for (i = 1; i < mod->nmet; i++) {
+            if (ma->year[i] != ma->year[i-1])
+                c->num_years++;
+        }
+    }
+
+    if (c->sub_daily) {
+        free_solar_arrays(cw);
+        fill_up_solar_arrays(cw, c, ma, p);
+    }
+
+    if (o->ndays != c->total_num_days) {
+        o->ndays = c->total_num_days;
+        o->year = (double *)realloc(o->year, o->ndays * sizeof(double));
+        o->doy = (double *)realloc(o->doy, o->ndays * sizeof(double));
+        o->gpp = (double *)realloc(o->gpp, o->ndays * sizeof(double));
+        o->apar = (double *)realloc(o->apar, o->ndays * sizeof(double));
+        if (o->year == NULL || o->doy == NULL || o->gpp == NULL ||
+            o->apar == NULL) {
+            fprintf(stderr, "Error allocating space for model output\n");
+            exit(EXIT_FAILURE);
+        }
+    }
+    mod->prepared = TRUE;
+
+    return 0;
+}
+
+int canopy_run(canopy_model *mod)
+{
+    /*
+        Run the model over the loaded forcing. Returns 0 on success, -1 if
+        the forcing is incomplete.
+    */
+    control      *c = mod->c;
+    canopy_wk    *cw = mod->cw;
+    params       *p = mod->p;
+    state        *s = mod->s;
+
+    if (!mod->prepared && canopy_prepare(mod) != 0)
+        return -1;
+
+    /* same starting point as a fresh canopy_scaling run */
+    initialise_fluxes(mod->f);
+    reset_run_state(cw, c, p, s);
+    zero_leaf_iterations(cw);
+
+    run_sim(cw, c, mod->f, mod->ma, mod->m, p, s);
+
+    return 0;
+}
+
+int canopy_write_results(canopy_model *mod, const char *fname)
+{
+    /*
+        Write the last run's daily output to fname, as canopy_scaling
+        would: NumPy if it ends in .npy, CSV if it ends in .csv, otherwise
+        float64 columns with the layout in fname.hdr. Returns -1 if the
+        file can't be written.
+    */
+    size_t n = strlen(fname);
+    int    format = OUTPUT_BINARY;
+
+    if (n >= 4 && strcasecmp(fname + n - 4, ".npy") == 0)
+        format = OUTPUT_NPY;
+    else if (n >= 4 && strcasecmp(fname + n - 4, ".csv") == 0)
+        format = OUTPUT_CSV;
+
+    return write_output_store(mod->out, format, fname);
+}
+
+long canopy_num_days(canopy_model *mod)
+{
+    return mod->out->ndays;
+}
+
+int canopy_get_results(canopy_model *mod, double *year, double *doy,
+                       double *gpp, double *apar)
+{
+    /*
+        Copy the last run's daily output into caller arrays of length
+        canopy_num_days, any of which may be NULL.
+    */
+    output_store *o = mod->out;
+    size_t nbytes = o->ndays * sizeof(double);
+
+    if (year != NULL)
+        memcpy(year, o->year, nbytes);
+    if (doy != NULL)
+        memcpy(doy, o->doy, nbytes);
+    if (gpp != NULL)
+        memcpy(gpp, o->gpp, nbytes);
+    if (apar != NULL)
+        memcpy(apar, o->apar, nbytes);
+
+    return 0;
+}
+
+int canopy_leaf_iterations(canopy_model *mod, long *counts, int n)
+{
+    /*
+        The last run's leaf temperature solves by the number of passes they
+        took: counts[i] solves took i passes, for i up to n - 1. Returns the
+        length that holds them all (LEAF_ITERMAX + 1), so a call with n = 0
+        gives the size to allocate.
+    */
+    int i;
+
+    for (i = 0; i < n && i <= LEAF_ITERMAX; i++)
+        counts[i] = mod->cw->leaf_iter_hist[i];
+
+    return LEAF_ITERMAX + 1;
+}
+
+void canopy_leaf_C3_batch(canopy_model *mod, int ileaf, double N0,
+                          double cscalar, long n, const double *apar,
+                          const double *Cs, const double *tleaf,
+                          const double *dleaf, double *an, double *gsc,
+                          double *rd)
+{
+    /*
+        Leaf photosynthesis for n (apar, Cs, tleaf, dleaf) combinations with
+        the current parameters, see photosynthesis_C3_batch. ileaf (SUNLIT
+        or SHADED), N0 and cscalar set the canopy layer.
+    */
+    canopy_wk *cw = mod->cw;
+
+    reset_run_state(cw, mod->c, mod->p, mod->s);
+    cw->ileaf = ileaf;
+    cw->N0 = N0;
+    cw->cscalar[ileaf] = cscalar;
+    photosynthesis_C3_batch(mod->c, cw, mod->p, mod->s, n, apar, Cs, tleaf,
+                            dleaf, an, gsc, rd);
+
+    return;
+}
+
+void canopy_solar_geometry(canopy_model *mod, int doy, int ndays,
+                           double *cos_zenith, double *elevation)
+{
+    /*
+        cos_zenith and elevation for ndays whole days from doy (0 based) at
+        the current latitude/longitude, num_hlf_hrs values a day, see
+        calculate_solar_geometry_days.
+    */
+    calculate_solar_geometry_days(mod->p, doy, ndays, mod->c->num_hlf_hrs,
+                                  cos_zenith, elevation);
+
+    return;
+}
+
+void canopy_diffuse_frac(canopy_model *mod, int doy, int ndays,
+                         const double *cos_zenith, const double *par,
+                         double *diffuse_frac)
+{
+    /*
+        Spitters diffuse fraction for ndays whole days from doy (0 based),
+        see calculate_diffuse_frac_days.
+    */
+    calculate_diffuse_frac_days(doy, ndays, mod->c->num_hlf_hrs, cos_zenith,
+                                par, diffuse_frac);
+
+    return;
+}
@@ -0,0 +1,271 @@
+/*
+** Streamed sub-daily forcing
+**
+** With [control] stream_met = true the forcing isn't loaded up front.
+** A reader thread parses the met file a day (num_hlf_hrs rows) at a time
+** into a ring of stream_buffer_days slots, keeping ahead of the model,
+** which runs each day straight out of its slot and then hands the slot
+** back. The solar geometry is worked out for the day being run only, so
+** the memory used doesn't depend on the length of the record.
+**
+** A binary met file is memory-mapped as usual and copied into the ring a
+** day at a time.
+*/
+
+#include "met_stream.h"
+
+void open_met_stream(met_stream *ms, char **argv, control *c) {
+    /* Set up the ring and start the reader thread */
+
+    memset(ms, 0, sizeof(met_stream));
+    ms->c = c;
+    ms->argv = argv;
+    ms->num_hlf_hrs = c->num_hlf_hrs;
+    ms->nslots = MAX(2, c->stream_buffer_days);
+    while (met_column_name(c, ms->ncols) != NULL)
+        ms->ncols++;
+    ms->day_len = (long)ms->ncols * ms->num_hlf_hrs;
+
+    if (is_binary_met_file(c->met_fname)) {
+        read_binary_met_data(argv, c, &ms->map);
+        ms->map_days = c->total_num_days;
+    } else {
+        if ((ms->fp = fopen(c->met_fname, "r")) == NULL) {
+            fprintf(stderr, "Error: couldn't open sub-daily Met file %s "
+                            "for read\n", c->met_fname);
+            exit(EXIT_FAILURE);
+        }
+        setvbuf(ms->fp, NULL, _IOFBF, MET_READ_BUFSIZE);
+    }
+
+    ms->slots = (double *)malloc(ms->nslots * ms->day_len * sizeof(double));
+    if (ms->slots == NULL) {
+        fprintf(stderr, "Error allocating space for the met stream\n");
+        exit(EXIT_FAILURE);
+    }
+
+    pthread_mutex_init(&ms->lock, NULL);
+    pthread_cond_init(&ms->not_full, NULL);
+    pthread_cond_init(&ms->not_empty, NULL);
+    if (pthread_create(&ms->reader, NULL, met_stream_reader, ms) != 0) {
+        fprintf(stderr, "Error starting the met reader thread\n");
+        exit(EXIT_FAILURE);
+    }
+
+    return;
+}
+
+void close_met_stream(met_stream *ms) {
+    /* Wait for the reader to finish and release everything */
+
+    pthread_join(ms->reader, NULL);
+    if (ms->fp != NULL) {
+        fclose(ms->fp);
+    }
+    if (ms->map.map_base != NULL) {
+        free_met_arrays(ms->c, &ms->map);
+    }
+    free(ms->slots);
+    pthread_mutex_destroy(&ms->lock);
+    pthread_cond_destroy(&ms->not_full);
+    pthread_cond_destroy(&ms->not_empty);
+
+    return;
+}
+
+static double *wait_for_free_slot(met_stream *ms) {
+    double *slot;
+
+    pthread_mutex_lock(&ms->lock);
+    while (ms->produced - ms->consumed >= ms->nslots)
+        pthread_cond_wait(&ms->not_full, &ms->lock);
+    slot = ms->slots + (ms->produced % ms->nslots) * ms->day_len;
+    pthread_mutex_unlock(&ms->lock);
+
+    return slot;
+}
+
+static void publish_slot(met_stream *ms) {
+    pthread_mutex_lock(&ms->lock);
+    ms->produced++;
+    pthread_cond_signal(&ms->not_empty);
+    pthread_mutex_unlock(&ms->lock);
+
+    return;
+}
+
+void *met_stream_reader(void *arg) {
+    /*
+        Reader thread: fill the free slots a day at a time, each slot
+        holding the day column by column. A part day at the end of the
+        file is dropped, as the non-streamed reader does.
+    */
+    met_stream *ms = (met_stream *)arg;
+    char    line[STRING_LENGTH];
+    double *slot = NULL;
+    double **col;
+    long    d;
+    int     j, hod = 0, line_number = 0;
+    int     nh = ms->num_hlf_hrs;
+    int     nvars = ms->ncols + 1;  /* plus the unused hour of day column */
+
+    if (ms->fp != NULL) {
+        while (fgets(line, STRING_LENGTH, ms->fp) != NULL) {
+            line_number++;
+
+            /* ignore comment line */
+            if (*line == '#')
+                continue;
+
+            if (hod == 0)
+                slot = wait_for_free_slot(ms);
+            if (parse_met_fields(line, slot + hod, nh, nvars, 2) != nvars) {
+                fprintf(stderr, "%s: badly formatted input in met file on line %d %d\n",
+                        *ms->argv, line_number, nvars);
+                exit(EXIT_FAILURE);
+            }
+            if (++hod == nh) {
+                publish_slot(ms);
+                hod = 0;
+            }
+        }
+    } else {
+        for (d = 0; d < ms->map_days; d++) {
+            slot = wait_for_free_slot(ms);
+            for (j = 0; j < ms->ncols; j++) {
+                col = get_met_column(ms->c, &ms->map,
+                                     met_column_name(ms->c, j));
+                memcpy(slot + j * nh, *col + d * nh, nh * sizeof(double));
+            }
+            publish_slot(ms);
+        }
+    }
+
+    pthread_mutex_lock(&ms->lock);
+    ms->done = TRUE;
+    pthread_cond_signal(&ms->not_empty);
+    pthread_mutex_unlock(&ms->lock);
+
+    return NULL;
+}
+
+int next_met_day(met_stream *ms, control *c, met_arrays *ma) {
+    /*
+        Point the ma columns at the next day of forcing, waiting for the
+        reader if need be. Returns FALSE once the forcing is used up.
+    */
+    double *slot;
+    int     j;
+
+    pthread_mutex_lock(&ms->lock);
+    while (ms->produced == ms->consumed && !ms->done)
+        pthread_cond_wait(&ms->not_empty, &ms->lock);
+    if (ms->produced == ms->consumed) {
+        pthread_mutex_unlock(&ms->lock);
+        return FALSE;
+    }
+    slot = ms->slots + (ms->consumed % ms->nslots) * ms->day_len;
+    pthread_mutex_unlock(&ms->lock);
+
+    for (j = 0; j < ms->ncols; j++) {
+        *get_met_column(c, ma, met_column_name(c, j)) = slot +
+                                                        j * ms->num_hlf_hrs;
+    }
+
+    return TRUE;
+}
+
+void release_met_day(met_stream *ms) {
+    /* hand the current day's slot back to the reader */
+
+    pthread_mutex_lock(&ms->lock);
+    ms->consumed++;
+    pthread_cond_signal(&ms->not_full);
+    pthread_mutex_unlock(&ms->lock);
+
+    return;
+}
+
+void fill_up_solar_day(canopy_wk *cw, control *c, met_arrays *ma, params *p,
+                       int doy) {
+    /* fill_up_solar_arrays, but for a single day of forcing */
+
+    calculate_solar_geometry_days(p, doy, 1, c->num_hlf_hrs, cw->cz_store,
+                                  cw->ele_store);
+    calculate_diffuse_frac_days(doy, 1, c->num_hlf_hrs, cw->cz_store, ma->par,
+                                cw->df_store);
+    set_last_solar_values(cw, c->num_hlf_hrs - 1);
+
+    return;
+}
+
+void run_sim_streamed(char **argv, canopy_wk *cw, control *c, fluxes *f,
+                      met *m, params *p, state *s) {
+    /*
+        run_sim for streamed forcing. Years are laid out as they are in
+        run_sim: each starts with the year of its first day and runs for
+        365 or 366 days.
+    */
+    met_stream ms;
+    met_arrays day;
+    long   d = 0;
+    int    doy = 0, more;
+    double year = 0.0, t0 = 0.0;
+
+    memset(&day, 0, sizeof(met_arrays));
+    cw->solar_map_base = NULL;
+    cw->solar_map_len = 0;
+    cw->cz_store = (double *)malloc(c->num_hlf_hrs * sizeof(double));
+    cw->ele_store = (double *)malloc(c->num_hlf_hrs * sizeof(double));
+    cw->df_store = (double *)malloc(c->num_hlf_hrs * sizeof(double));
+    if (cw->cz_store == NULL || cw->ele_store == NULL ||
+        cw->df_store == NULL) {
+        fprintf(stderr, "malloc failed allocating solar stores\n");
+        exit(EXIT_FAILURE);
+    }
+
+    open_met_stream(&ms, argv, c);
+    c->num_years = 0;
+    while (TRUE) {
+        /* time spent waiting on the reader counts as reading the met */
+        if (c->prof != NULL)
+            t0 = profile_clock();
+        more = next_met_day(&ms, c, &day);
+        if (c->prof != NULL)
+            profile_add(c->prof, PROF_READ_MET, t0);
+        if (!more)
+            break;
+
+        if (d == 0 || doy == c->num_days) {
+            year = day.year[0];
+            if (is_leap_year(year))
+                c->num_days = 366;
+            else
+                c->num_days = 365;
+            calculate_daylength(s, c->num_days, p->latitude);
+            c->num_years++;
+            doy = 0;
+        }
+
+        if (c->prof != NULL)
+            t0 = profile_clock();
+        fill_up_solar_day(cw, c, &day, p, doy);
+        if (c->prof != NULL)
+            profile_add(c->prof, PROF_SOLAR, t0);
+        simulate_day(cw, c, f, &day, m, p, s, 0, doy, s->day_length[doy]);
+        release_met_day(&ms);
+
+        c->day_idx = d;
+        write_daily_output(c, f, year, doy);
+        doy++;
+        d++;
+    }
+    close_met_stream(&ms);
+
+    c->total_num_days = d;
+    c->day_idx = d;
+    c->hour_idx = d * c->num_hlf_hrs;
+    free_solar_arrays(cw);
+
+    return;
+}
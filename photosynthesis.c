@@ -15,6 +15,126 @@
 * =========================================================================== */
 #include "photosynthesis.h"
 
+static inline double quad_root(double a, double b, double c, bool large,
+                               int *error) {
+    /*
+        quad without branches: every case is worked out and the right one
+        picked, so that it inlines into a loop the compiler can vectorise.
+        *error is set TRUE, as by quad, if there is no real root.
+    */
+    double d, root, linear;
+
+    /* discriminant */
+    d = (b * b) - 4.0 * a * c;
+    if (large) {
+        root = (-b + sqrt(d)) / (2.0 * a);
+    } else {
+        root = (-b - sqrt(d)) / (2.0 * a);
+    }
+    root = ((a == 0.0) & (b == 0.0)) ? 0.0 : root;
+    linear = -c / b;
+    root = ((a == 0.0) & (b > 0.0)) ? linear : root;
+    *error |= (d < 0.0) | ((a == 0.0) & (b == 0.0) & (c != 0.0));
+
+    return (root);
+}
+
+static inline void scale_jmax_vcmax(double tleaf, double stress, double *jmax,
+                                    double *vcmax) {
+    /*
+        adjust_jmax_vcmax with the moisture stress factor given (1 for no
+        stress), written as selects rather than branches
+    */
+    double lower_bound = 0.0;
+    double upper_bound = 10.0;
+    double ramp;
+
+    /* Jmax/Vcmax forced linearly to zero at low T */
+    ramp = (tleaf - lower_bound) / (upper_bound - lower_bound);
+    ramp = (tleaf < upper_bound) ? ramp : 1.0;
+    *jmax = (tleaf < lower_bound) ? 0.0 : *jmax * stress * ramp;
+    *vcmax = (tleaf < lower_bound) ? 0.0 : *vcmax * stress * ramp;
+
+    return;
+}
+
+static inline int leaf_C3_core(double par, double Cs, double dleaf,
+                               double gamma_star, double km, double jmax,
+                               double vcmax, double theta, double alpha_j,
+                               double g1, double *an, double *gsc,
+                               double *rd, int *nfail) {
+    /*
+        The body of solve_leaf_C3. Both limitations and the extreme case
+        are always worked out and the answer selected at the end, without
+        branches, so that photosynthesis_C3_batch's solve loop vectorises.
+        The quad calls that fail are added to *nfail (the last two only if
+        the leaf isn't an extreme case, as they are never reached then).
+    */
+    double J, Vj, gs_over_a, g0, A, B, C, Ci, Ac, Aj, Aj_cs, dleaf_kpa;
+    double rd_leaf, an_leaf;
+    int    ok, err_j = FALSE, err_c = FALSE, err_j2 = FALSE;
+    double g0_zero = 1E-09; /* numerical issues, don't use zero */
+
+    /* leaf respiration in the light, Collatz et al. 1991 */
+    rd_leaf = 0.015 * vcmax;
+
+    /* actual electron transport rate */
+    J = quad_root(theta, -(alpha_j * par + jmax), alpha_j * par * jmax, FALSE,
+                  &err_j);
+
+    /* RuBP regeneration rate */
+    Vj = J / 4.0;
+
+    /* Extreme cases, an = -rd */
+    ok = !((jmax <= 0.0) | (vcmax <= 0.0) | isnan(J));
+
+    /* Hardwiring this for Medlyn gs model for the moment, till I figure
+    out the best structure */
+
+    /* For the medlyn model this is already in conductance to CO2, so the
+       1.6 from the corrigendum to Medlyn et al 2011 is missing here */
+    dleaf_kpa = dleaf * PA_2_KPA;
+    dleaf_kpa = (dleaf_kpa < 0.05) ? 0.05 : dleaf_kpa;
+    gs_over_a = (1.0 + g1 / sqrt(dleaf_kpa)) / Cs;
+    g0 = g0_zero;
+
+    /* Solution when Rubisco activity is limiting */
+    A = g0 + gs_over_a * (vcmax - rd_leaf);
+    B = ( (1.0 - Cs * gs_over_a) * (vcmax - rd_leaf) + g0 * (km - Cs) -
+           gs_over_a * (vcmax * gamma_star + km * rd_leaf) );
+    C = ( -(1.0 - Cs * gs_over_a) * (vcmax * gamma_star + km * rd_leaf) -
+           g0 * km * Cs );
+
+    /* intercellular CO2 concentration */
+    Ci = quad_root(A, B, C, TRUE, &err_c);
+    Ac = vcmax * (Ci - gamma_star) / (Ci + km);
+    Ac = (err_c | (Ci <= 0.0) | (Ci > Cs)) ? 0.0 : Ac;
+
+    /* Solution when electron transport rate is limiting */
+    A = g0 + gs_over_a * (Vj - rd_leaf);
+    B = ( (1. - Cs * gs_over_a) * (Vj - rd_leaf) + g0 *
+          (2. * gamma_star - Cs) - gs_over_a *
+          (Vj * gamma_star + 2.0 * gamma_star * rd_leaf) );
+    C = ( -(1.0 - Cs * gs_over_a) * gamma_star * (Vj + 2.0 * rd_leaf) -
+           g0 * 2.0 * gamma_star * Cs );
+
+    /* Intercellular CO2 concentration */
+    Ci = quad_root(A, B, C, TRUE, &err_j2);
+    Aj = Vj * (Ci - gamma_star) / (Ci + 2.0 * gamma_star);
+
+    /* Below light compensation point? Then Ci = Cs */
+    Aj_cs = Vj * (Cs - gamma_star) / (Cs + 2.0 * gamma_star);
+    Aj = (Aj - rd_leaf < 1E-6) ? Aj_cs : Aj;
+
+    an_leaf = ok ? MIN(Ac, Aj) - rd_leaf : -rd_leaf;
+    *an = an_leaf;
+    *gsc = ok ? MAX(g0, g0 + gs_over_a * an_leaf) : g0_zero;
+    *rd = rd_leaf;
+    *nfail += err_j + ok * (err_c + err_j2);
+
+    return ok;
+}
+
 void photosynthesis_C3(control *c, canopy_wk *cw, met *m, params *p, state *s) {
     /*
         Calculate photosynthesis following Farquhar & von Caemmerer, this is an
@@ -29,11 +149,10 @@ void photosynthesis_C3(control *c, canopy_wk *cw, met *m, params *p, state *s) {
         * Medlyn et al. (2002) PCE, 25, 1167-1179, see pg. 1170.
     */
 
-    double gamma_star, km, jmax, vcmax, rd, J, Vj, gs_over_a, g0, par;
-    double A, B, C, Ci, Ac, Aj, Cs, tleaf, dleaf, dleaf_kpa;
-    /*double Rd0 = 0.92;  Dark respiration rate make a paramater! */
-    int    idx, qudratic_error = FALSE, large_root;
-    double g0_zero = 1E-09; /* numerical issues, don't use zero */
+    double gamma_star, km, jmax, vcmax, rd, an, gsc, g1, par;
+    double Cs, tleaf, dleaf;
+    double tr[TR_NVALUES];
+    int    idx;
 
     /* unpack some stuff */
     idx = cw->ileaf;
@@ -43,89 +162,36 @@ void photosynthesis_C3(control *c, canopy_wk *cw, met *m, params *p, state *s) {
     dleaf = cw->dleaf;
 
     /* Calculate photosynthetic parameters from leaf temperature. */
-    gamma_star = calc_co2_compensation_point(p, tleaf);
-    km = calculate_michaelis_menten(p, tleaf);
-    calculate_jmaxt_vcmaxt(c, cw, p, s, tleaf, &jmax, &vcmax);
-
-    /* leaf respiration in the light, Collatz et al. 1991 */
-    rd = 0.015 * vcmax;
-    /*rd = calc_leaf_day_respiration(tleaf, Rd0); */
-
-    /* actual electron transport rate */
-    qudratic_error = FALSE;
-    large_root = FALSE;
-    J = quad(p->theta, -(p->alpha_j * par + jmax),
-             p->alpha_j * par * jmax, large_root, &qudratic_error);
-
-    /* RuBP regeneration rate */
-    Vj = J / 4.0;
-
-    /* Deal with extreme cases */
-    if (jmax <= 0.0 || vcmax <= 0.0 || isnan(J)) {
-        cw->an_leaf[idx] = -rd;
-        cw->gsc_leaf[idx] = g0_zero;
-    } else {
-        /* Hardwiring this for Medlyn gs model for the moment, till I figure
-        out the best structure */
-
-        /* For the medlyn model this is already in conductance to CO2, so the
-           1.6 from the corrigendum to Medlyn et al 2011 is missing here */
-        dleaf_kpa = dleaf * PA_2_KPA;
-        if (dleaf_kpa < 0.05) {
-            dleaf_kpa = 0.05;
+    if (cw->tresp != NULL && temp_response_at(cw->tresp, tleaf, tr)) {
+        gamma_star = tr[TR_GAMMA_STAR];
+        km = tr[TR_KM];
+        calculate_jmax25_vcmax25(c, cw, p, &jmax, &vcmax);
+        if (c->modeljm != 0) {
+            jmax *= tr[TR_JMAX];
+            vcmax *= tr[TR_VCMAX];
         }
+        adjust_jmax_vcmax(c, s, tleaf, &jmax, &vcmax);
+    } else {
+        gamma_star = calc_co2_compensation_point(p, tleaf);
+        km = calculate_michaelis_menten(p, tleaf);
+        calculate_jmaxt_vcmaxt(c, cw, p, s, tleaf, &jmax, &vcmax);
+    }
 
-        // This is calculated by SPA hydraulics so we don't need to account for
-        // water stress on gs.
-        if (c->water_balance == HYDRAULICS) {
-            gs_over_a = (1.0 + p->g1 / sqrt(dleaf_kpa)) / Cs;
-        } else {
-            gs_over_a = (1.0 + (p->g1 * s->wtfac_root) / sqrt(dleaf_kpa)) / Cs;
-        }
-        g0 = g0_zero;
-
-        /* Solution when Rubisco activity is limiting */
-        A = g0 + gs_over_a * (vcmax - rd);
-        B = ( (1.0 - Cs * gs_over_a) * (vcmax - rd) + g0 * (km - Cs) -
-               gs_over_a * (vcmax * gamma_star + km * rd) );
-        C = ( -(1.0 - Cs * gs_over_a) * (vcmax * gamma_star + km * rd) -
-               g0 * km * Cs );
-
-        /* intercellular CO2 concentration */
-        qudratic_error = FALSE;
-        large_root = TRUE;
-        Ci = quad(A, B, C, large_root, &qudratic_error);
-
-        if (qudratic_error || Ci <= 0.0 || Ci > Cs) {
-            Ac = 0.0;
-        } else {
-            Ac = vcmax * (Ci - gamma_star) / (Ci + km);
-        }
+    // This is calculated by SPA hydraulics so we don't need to account for
+    // water stress on gs.
+    if (c->water_balance == HYDRAULICS) {
+        g1 = p->g1;
+    } else {
+        g1 = p->g1 * s->wtfac_root;
+    }
 
-        /* Solution when electron transport rate is limiting */
-        A = g0 + gs_over_a * (Vj - rd);
-        B = ( (1. - Cs * gs_over_a) * (Vj - rd) + g0 *
-              (2. * gamma_star - Cs) - gs_over_a *
-              (Vj * gamma_star + 2.0 * gamma_star * rd) );
-        C = ( -(1.0 - Cs * gs_over_a) * gamma_star * (Vj + 2.0 * rd) -
-               g0 * 2.0 * gamma_star * Cs );
-
-        /* Intercellular CO2 concentration */
-        qudratic_error = FALSE;
-        large_root = TRUE;
-        Ci = quad(A, B, C, large_root, &qudratic_error);
-
-        Aj = Vj * (Ci - gamma_star) / (Ci + 2.0 * gamma_star);
-
-        /* Below light compensation point? */
-        if (Aj - rd < 1E-6) {
-            Ci = Cs;
-            Aj = Vj * (Ci - gamma_star) / (Ci + 2.0 * gamma_star);
-        }
-        cw->an_leaf[idx] = MIN(Ac, Aj) - rd;
+    if (solve_leaf_C3(par, Cs, dleaf, gamma_star, km, jmax, vcmax, p->theta,
+                      p->alpha_j, g1, &an, &gsc, &rd,
+                      c->prof != NULL ? &c->prof->quad_failures : NULL)) {
         cw->rd_leaf[idx] = rd;
-        cw->gsc_leaf[idx] = MAX(g0, g0 + gs_over_a * cw->an_leaf[idx]);
     }
+    cw->an_leaf[idx] = an;
+    cw->gsc_leaf[idx] = gsc;
 
     // Pack calculated values into a temporary array as we may need to
     // recalculate A if water is limiting, i.e. the Emax case below
@@ -141,6 +207,132 @@ void photosynthesis_C3(control *c, canopy_wk *cw, met *m, params *p, state *s) {
     return;
 }
 
+void photosynthesis_C3_batch(control *c, canopy_wk *cw, params *p, state *s,
+                             long n, const double *apar, const double *Cs,
+                             const double *tleaf, const double *dleaf,
+                             double *an, double *gsc, double *rd) {
+    /*
+        photosynthesis_C3 for n leaves at once, e.g. a year of timesteps or
+        an offline sensitivity grid, all in the canopy layer given by
+        cw->ileaf, cw->N0 and cw->cscalar. Inputs and outputs are plain
+        arrays (structure of arrays) and everything that doesn't depend on
+        the leaf is worked out once, outside the loop.
+
+        The leaves go LEAF_BATCH at a time through two passes: the first
+        fills gamma_star, km, Jmax and Vcmax for the block from tleaf
+        (batched table lookups where the table covers tleaf, the exact
+        functions elsewhere), the second is the branch free leaf solve,
+        leaf_C3_core, over those arrays.
+
+        Parameters:
+        ----------
+        apar : array
+            absorbed PAR (umol m-2 s-1)
+        Cs : array
+            CO2 at the leaf surface (umol mol-1)
+        tleaf : array
+            leaf temperature (deg C)
+        dleaf : array
+            leaf to air VPD (Pa)
+
+        Returns:
+        -------
+        an, gsc, rd : arrays
+            net assimilation (umol m-2 s-1), stomatal conductance to CO2
+            (mol m-2 s-1) and leaf day respiration (umol m-2 s-1)
+    */
+    long   start, i, m;
+    double jmax25, vcmax25, g1, stress;
+    double gamma_star[LEAF_BATCH], km[LEAF_BATCH];
+    double jmax[LEAF_BATCH], vcmax[LEAF_BATCH];
+    int    exact[LEAF_BATCH];
+    int    nfail = 0;
+    const double *t;
+    double theta = p->theta;
+    double alpha_j = p->alpha_j;
+    double tref = p->measurement_temp;
+
+    calculate_jmax25_vcmax25(c, cw, p, &jmax25, &vcmax25);
+    if (c->water_balance == HYDRAULICS) {
+        g1 = p->g1;
+    } else {
+        g1 = p->g1 * s->wtfac_root;
+    }
+    stress = (c->water_balance == BUCKET) ? s->wtfac_root : 1.0;
+
+    for (start = 0; start < n; start += LEAF_BATCH) {
+        m = MIN(LEAF_BATCH, n - start);
+        t = tleaf + start;
+
+        /* Photosynthetic parameters from leaf temperature */
+        if (cw->tresp != NULL) {
+            temp_response_batch(cw->tresp, m, t, gamma_star, km, vcmax, jmax,
+                                exact);
+            if (c->modeljm != 0) {
+                for (i = 0; i < m; i++) {
+                    vcmax[i] = vcmax25 * vcmax[i];
+                    jmax[i] = jmax25 * jmax[i];
+                }
+            }
+        } else {
+            for (i = 0; i < m; i++)
+                exact[i] = TRUE;
+        }
+        for (i = 0; i < m; i++) {
+            if (!exact[i])
+                continue;
+            gamma_star[i] = calc_co2_compensation_point(p, t[i]);
+            km[i] = calculate_michaelis_menten(p, t[i]);
+            if (c->modeljm != 0) {
+                vcmax[i] = arrhenius(vcmax25, p->eav, t[i], tref);
+                jmax[i] = peaked_arrhenius(jmax25, p->eaj, t[i], tref,
+                                           p->delsj, p->edj);
+            }
+        }
+        if (c->modeljm == 0) {
+            for (i = 0; i < m; i++) {
+                jmax[i] = jmax25;
+                vcmax[i] = vcmax25;
+            }
+        }
+        for (i = 0; i < m; i++)
+            scale_jmax_vcmax(t[i], stress, &jmax[i], &vcmax[i]);
+
+        /* Coupled photosynthesis/stomatal conductance */
+        for (i = 0; i < m; i++)
+            leaf_C3_core(apar[start + i], Cs[start + i], dleaf[start + i],
+                         gamma_star[i], km[i], jmax[i], vcmax[i], theta,
+                         alpha_j, g1, &an[start + i], &gsc[start + i],
+                         &rd[start + i], &nfail);
+    }
+
+    return;
+}
+
+int solve_leaf_C3(double par, double Cs, double dleaf, double gamma_star,
+                  double km, double jmax, double vcmax, double theta,
+                  double alpha_j, double g1, double *an, double *gsc,
+                  double *rd, long *quad_failures) {
+    /*
+        Coupled photosynthesis/Medlyn stomatal conductance for one leaf,
+        once the temperature dependent parameters are known. This is the
+        part shared by photosynthesis_C3 and photosynthesis_C3_batch, see
+        leaf_C3_core.
+
+        Returns FALSE for the extreme cases (no capacity or no electron
+        transport solution), where an = -rd and gsc is ~zero. Any quad
+        calls that fail are added to quad_failures, unless it is NULL.
+    */
+    int nfail = 0, ok;
+
+    ok = leaf_C3_core(par, Cs, dleaf, gamma_star, km, jmax, vcmax, theta,
+                      alpha_j, g1, an, gsc, rd, &nfail);
+    if (quad_failures != NULL)
+        *quad_failures += nfail;
+
+    return ok;
+}
+
 
 
 double calc_co2_compensation_point(params *p, double tleaf) {
@@ -221,65 +413,59 @@ void calculate_jmaxt_vcmaxt(control *c, canopy_wk *cw, params *p, state *s,
             the maximum Rubisco activity at the leaf temperature (umol m-2 s-1)
     */
     double jmax25, vcmax25;
-    double lower_bound = 0.0;
-    double upper_bound = 10.0;
     double tref = p->measurement_temp;
-    double cscalar = cw->cscalar[cw->ileaf];
-
 
+    calculate_jmax25_vcmax25(c, cw, p, &jmax25, &vcmax25);
     if (c->modeljm == 0) {
-        if (cw->ileaf == SUNLIT) {
-            *jmax = p->jmax * cscalar;
-            *vcmax = p->vcmax * cscalar;
-        } else {
-            *jmax = p->jmax * cscalar;
-            *vcmax = p->vcmax * cscalar;
-        }
-    } else if (c->modeljm == 1) {
-        if (cw->ileaf == SUNLIT) {
-            vcmax25 = (p->vcmaxna * cw->N0 + p->vcmaxnb) * cscalar;
-            jmax25 = (p->jmaxna * cw->N0 + p->jmaxnb) * cscalar;
-        } else {
-            vcmax25 = (p->vcmaxna * cw->N0 + p->vcmaxnb) * cscalar;
-            jmax25 = (p->jmaxna * cw->N0 + p->jmaxnb) * cscalar;
-        }
+        *jmax = jmax25;
+        *vcmax = vcmax25;
+    } else {
         *vcmax = arrhenius(vcmax25, p->eav, tleaf, tref);
         *jmax = peaked_arrhenius(jmax25, p->eaj, tleaf, tref, p->delsj, p->edj);
+    }
+    adjust_jmax_vcmax(c, s, tleaf, jmax, vcmax);
+
+    return;
+}
+
+void calculate_jmax25_vcmax25(control *c, canopy_wk *cw, params *p,
+                              double *jmax25, double *vcmax25) {
+    /*
+        Jmax and Vcmax at the reference temperature for the current leaf
+        (cw->ileaf), scaled to the canopy. For modeljm = 0 there is no
+        temperature response, so these are the final values.
+    */
+    double cscalar = cw->cscalar[cw->ileaf];
+
+    if (c->modeljm == 0) {
+        *jmax25 = p->jmax * cscalar;
+        *vcmax25 = p->vcmax * cscalar;
+    } else if (c->modeljm == 1) {
+        *vcmax25 = (p->vcmaxna * cw->N0 + p->vcmaxnb) * cscalar;
+        *jmax25 = (p->jmaxna * cw->N0 + p->jmaxnb) * cscalar;
     } else if (c->modeljm == 2) {
         /* NB when using the fixed JV reln, we only apply scalar to Vcmax */
-        if (cw->ileaf == SUNLIT) {
-            vcmax25 = (p->vcmaxna * cw->N0 + p->vcmaxnb) * cscalar;
-            jmax25 = (p->jv_slope * vcmax25 - p->jv_intercept);
-        } else {
-            vcmax25 = (p->vcmaxna * cw->N0 + p->vcmaxnb) * cscalar;
-            jmax25 = (p->jv_slope * vcmax25 - p->jv_intercept);
-        }
-        *vcmax = arrhenius(vcmax25, p->eav, tleaf, tref);
-        *jmax = peaked_arrhenius(jmax25, p->eaj, tleaf, tref, p->delsj, p->edj);
+        *vcmax25 = (p->vcmaxna * cw->N0 + p->vcmaxnb) * cscalar;
+        *jmax25 = (p->jv_slope * *vcmax25 - p->jv_intercept);
     } else if (c->modeljm == 3) {
-        jmax25 = p->jmax * cscalar;
-        vcmax25 = p->vcmax * cscalar;
-        *vcmax = arrhenius(vcmax25, p->eav, tleaf, tref);
-        *jmax = peaked_arrhenius(jmax25, p->eaj, tleaf, tref, p->delsj, p->edj);
+        *jmax25 = p->jmax * cscalar;
+        *vcmax25 = p->vcmax * cscalar;
     } else {
         fprintf(stderr, "You haven't set Jmax/Vcmax model: modeljm \n");
         exit(EXIT_FAILURE);
     }
 
-    /* reduce photosynthetic capacity with moisture stress */
-    if (c->water_balance == BUCKET) {
-        *jmax *= s->wtfac_root;
-        *vcmax *= s->wtfac_root;
-    } // Should add non-stomal limitation here
+    return;
+}
 
-    /* Jmax/Vcmax forced linearly to zero at low T */
-    if (tleaf < lower_bound) {
-        *jmax = 0.0;
-        *vcmax = 0.0;
-    } else if (tleaf < upper_bound) {
-        *jmax *= (tleaf - lower_bound) / (upper_bound - lower_bound);
-        *vcmax *= (tleaf - lower_bound) / (upper_bound - lower_bound);
-    }
+void adjust_jmax_vcmax(control *c, state *s, double tleaf, double *jmax,
+                       double *vcmax) {
+    /* moisture stress and the low temperature ramp on Jmax & Vcmax */
+
+    /* reduce photosynthetic capacity with moisture stress */
+    // Should add non-stomal limitation here
+    scale_jmax_vcmax(tleaf, (c->water_balance == BUCKET) ? s->wtfac_root : 1.0,
+                     jmax, vcmax);
 
     return;
 }
@@ -420,45 +606,7 @@ double quad(double a, double b, double c, bool large, int *error) {
     root : float
 
     */
-    double d, root;
-
-    /* discriminant */
-    d = (b * b) - 4.0 * a * c;
-    if (d < 0.0) {
-        /*fprintf(stderr, "imaginary root found\n");
-        exit(EXIT_FAILURE);*/
-        *error = TRUE;
-    }
-
-    if (large) {
-        if (a == 0.0 && b > 0.0) {
-            root = -c / b;
-        } else if (a == 0.0 && b == 0.0) {
-            root = 0.0;
-            if (c != 0.0) {
-                /*fprintf(stderr, "Can't solve quadratic\n");
-                exit(EXIT_FAILURE);*/
-                *error = TRUE;
-            }
-        } else {
-            root = (-b + sqrt(d)) / (2.0 * a);
-        }
-
-    } else {
-        if (a == 0.0 && b > 0.0) {
-            root = -c / b;
-        } else if (a == 0.0 && b == 0.0) {
-            root = 0.0;
-            if (c != 0.0) {
-                /*fprintf(stderr, "Can't solve quadratic\n");
-                exit(EXIT_FAILURE);*/
-                *error = TRUE;
-            }
-        } else {
-            root = (-b - sqrt(d)) / (2.0 * a);
-        }
-    }
-    return (root);
+    return (quad_root(a, b, c, large, error));
 }
 
 
@@ -0,0 +1,165 @@
+/* ============================================================================
+* Stage timers and hot path counters (--profile fname)
+*
+* With --profile, c->prof is set and the driver adds the monotonic clock
+* time spent in each stage, cfg parsing, met reading, the solar arrays,
+* canopy(), mate_C3_photosynthesis and writing the output, and counts
+* daylight and night half hours and failed quadratic solutions (quad). The
+* leaf temperature solves come from cw->leaf_iter_hist. A JSON summary is
+* written to fname ("-" for the standard error) at the end of the run.
+* Without it c->prof is NULL and every timer is a skipped branch.
+*
+* With -t the stages run on several threads at once, so their times are
+* summed over the threads and can add up to more than the wall time.
+*
+* =========================================================================== */
+#include "profile.h"
+
+static const char *timer_names[PROF_NTIMERS] = {
+    "parse_cfg", "read_met", "solar_arrays", "canopy", "mate",
+    "output_daily", "output_subdaily"
+};
+
+double profile_clock(void) {
+    /* monotonic clock (s) */
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+
+    return (ts.tv_sec + ts.tv_nsec * 1E-9);
+}
+
+void start_profile(control *c) {
+    /* turn the timers on, if --profile was given */
+
+    if (*c->profile_fname == '\0')
+        return;
+
+    if ((c->prof = (run_profile *)calloc(1, sizeof(run_profile))) == NULL) {
+        fprintf(stderr, "Error allocating space for the profile\n");
+        exit(EXIT_FAILURE);
+    }
+    c->prof->start = profile_clock();
+    strcpy(c->prof->cfg_fname, c->cfg_fname);
+
+    return;
+}
+
+void profile_add(run_profile *prof, int timer, double t0) {
+    /* add the time since t0 (from profile_clock) to a timer */
+
+    prof->seconds[timer] += profile_clock() - t0;
+    prof->calls[timer]++;
+
+    return;
+}
+
+void merge_profile(run_profile *dst, const run_profile *src) {
+    /* add a thread's timers and counts into the run's */
+    int i;
+
+    for (i = 0; i < PROF_NTIMERS; i++) {
+        dst->seconds[i] += src->seconds[i];
+        dst->calls[i] += src->calls[i];
+    }
+    dst->days += src->days;
+    dst->daylight_steps += src->daylight_steps;
+    dst->night_steps += src->night_steps;
+    dst->quad_failures += src->quad_failures;
+
+    return;
+}
+
+static void write_json_string(FILE *fp, const char *s) {
+    /* s as a JSON string */
+
+    fputc('"', fp);
+    for (; *s != '\0'; s++) {
+        if (*s == '"' || *s == '\\')
+            fprintf(fp, "\\%c", *s);
+        else if ((unsigned char)*s < 0x20)
+            fprintf(fp, "\\u%04x", (unsigned char)*s);
+        else
+            fputc(*s, fp);
+    }
+    fputc('"', fp);
+
+    return;
+}
+
+void write_profile(control *c, canopy_wk *cw, params *p) {
+    /*
+        Write the JSON summary. canopy() writes the sub-daily output itself,
+        so that time is taken off the canopy timer here.
+    */
+    run_profile *prof = c->prof;
+    FILE   *fp;
+    double  seconds;
+    long    nsolves = 0, npasses = 0;
+    int     i, first = TRUE;
+
+    if (prof == NULL)
+        return;
+
+    if (strcmp(c->profile_fname, "-") == 0) {
+        fp = stderr;
+    } else if ((fp = fopen(c->profile_fname, "w")) == NULL) {
+        fprintf(stderr, "Error opening profile %s for write\n",
+                c->profile_fname);
+        exit(EXIT_FAILURE);
+    }
+
+    for (i = 1; i <= LEAF_ITERMAX; i++) {
+        nsolves += cw->leaf_iter_hist[i];
+        npasses += i * cw->leaf_iter_hist[i];
+    }
+
+    fprintf(fp, "{\n  \"cfg\": ");
+    write_json_string(fp, c->prof->cfg_fname);
+    fprintf(fp, ",\n  \"met\": ");
+    write_json_string(fp, c->met_fname);
+    fprintf(fp, ",\n  \"git\": ");
+    write_json_string(fp, c->git_code_ver);
+    fprintf(fp, ",\n  \"model\": \"%s\",\n", c->sub_daily ? "twoleaf" :
+                                                            "mate");
+    fprintf(fp, "  \"leaf_solver\": \"%s\",\n",
+            c->leaf_solver == WARM_START ? "warm" : "cold");
+    fprintf(fp, "  \"latitude\": %.6f,\n  \"longitude\": %.6f,\n",
+            p->latitude, p->longitude);
+    fprintf(fp, "  \"threads\": %d,\n  \"runs\": %ld,\n", c->num_threads,
+            *c->runs_fname != '\0' ? c->run_idx + 1 : 1);
+    fprintf(fp, "  \"days\": %ld,\n", prof->days);
+    fprintf(fp, "  \"wall_seconds\": %.6f,\n", profile_clock() - prof->start);
+
+    fprintf(fp, "  \"timers\": {\n");
+    for (i = 0; i < PROF_NTIMERS; i++) {
+        seconds = prof->seconds[i];
+        if (i == PROF_CANOPY)
+            seconds -= prof->seconds[PROF_OUTPUT_SD];
+        fprintf(fp, "    \"%s\": {\"seconds\": %.6f, \"calls\": %ld}%s\n",
+                timer_names[i], seconds, prof->calls[i],
+                (i < PROF_NTIMERS - 1) ? "," : "");
+    }
+    fprintf(fp, "  },\n");
+
+    fprintf(fp, "  \"counters\": {\n");
+    fprintf(fp, "    \"daylight_steps\": %ld,\n", prof->daylight_steps);
+    fprintf(fp, "    \"night_steps\": %ld,\n", prof->night_steps);
+    fprintf(fp, "    \"quad_failures\": %ld,\n", prof->quad_failures);
+    fprintf(fp, "    \"leaf_solves\": %ld,\n", nsolves);
+    fprintf(fp, "    \"leaf_passes\": %ld,\n", npasses);
+    fprintf(fp, "    \"leaf_passes_hist\": {");
+    for (i = 1; i <= LEAF_ITERMAX; i++) {
+        if (cw->leaf_iter_hist[i] > 0) {
+            fprintf(fp, "%s\"%d\": %ld", first ? "" : ", ", i,
+                    cw->leaf_iter_hist[i]);
+            first = FALSE;
+        }
+    }
+    fprintf(fp, "}\n  }\n}\n");
+
+    if (fp != stderr)
+        fclose(fp);
+
+    return;
+}
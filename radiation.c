@@ -40,7 +40,7 @@ void spitters(canopy_wk *cw, int doy, double sw_rad) {
           Components of incoming radiation. Agricultural Forest Meteorol.,
           38:217-229.
     */
-    double So, tau, R, K, cos_zen_sq;
+    double So, tau;
 
     /* sine of the elev of the sun above the horizon is the same as cos_zen */
     So = calc_extra_terrestrial_rad(doy, cw->cos_zenith);
@@ -48,39 +48,86 @@ void spitters(canopy_wk *cw, int doy, double sw_rad) {
     /* atmospheric transmisivity */
     tau = estimate_clearness(sw_rad, So);
 
-    cos_zen_sq = cw->cos_zenith * cw->cos_zenith;
+    cw->diffuse_frac = spitters_diffuse_frac(cw->cos_zenith, tau);
+    cw->direct_frac = 1.0 - cw->diffuse_frac;
+
+    return;
+
+}
+
+double spitters_diffuse_frac(double cos_zenith, double tau) {
+    /*
+        The diffuse fraction for a given sun height and atmospheric
+        transmisivity, Spitters et al. (1986) eqn 20a-d, see spitters
+    */
+    double diffuse_frac, R, K, cos_zen_sq;
+
+    cos_zen_sq = cos_zenith * cos_zenith;
 
     /* For zenith angles > 80 degrees, diffuse_frac = 1.0 */
-    if (cw->cos_zenith > 0.17) {
+    if (cos_zenith > 0.17) {
 
         /* Spitters formula */
-        R = 0.847 - 1.61 * cw->cos_zenith + 1.04 * cos_zen_sq;
+        R = 0.847 - 1.61 * cos_zenith + 1.04 * cos_zen_sq;
         K = (1.47 - R) / 1.66;
         if (tau <= 0.22) {
-            cw->diffuse_frac = 1.0;
+            diffuse_frac = 1.0;
         } else if (tau > 0.22 && tau <= 0.35) {
-            cw->diffuse_frac = 1.0 - 6.4 * (tau - 0.22) * (tau - 0.22);
+            diffuse_frac = 1.0 - 6.4 * (tau - 0.22) * (tau - 0.22);
         } else if (tau > 0.35 && tau <= K) {
-            cw->diffuse_frac = 1.47 - 1.66 * tau;
+            diffuse_frac = 1.47 - 1.66 * tau;
         } else {
-            cw->diffuse_frac = R;
+            diffuse_frac = R;
         }
 
     } else {
-        cw->diffuse_frac = 1.0;
+        diffuse_frac = 1.0;
     }
 
     /* doubt we need this, should check */
-    if (cw->diffuse_frac <= 0.0) {
-        cw->diffuse_frac = 0.0;
-    } else if (cw->diffuse_frac >= 1.0) {
-        cw->diffuse_frac = 1.0;
+    if (diffuse_frac <= 0.0) {
+        diffuse_frac = 0.0;
+    } else if (diffuse_frac >= 1.0) {
+        diffuse_frac = 1.0;
     }
 
-    cw->direct_frac = 1.0 - cw->diffuse_frac;
+    return (diffuse_frac);
+}
 
-    return;
+void calculate_diffuse_frac_days(int doy, int ndays, int num_hlf_hrs,
+                                 const double *cos_zenith, const double *par,
+                                 double *diffuse_frac) {
+    /*
+        get_diffuse_frac for ndays whole days from doy (0 based, as the
+        drivers count), num_hlf_hrs values a day. The extra-terrestrial
+        radiation only changes with the day, so the orbit term is worked out
+        once per day. Gives the same values, to the bit, as calling
+        get_diffuse_frac every half hour.
 
+        Parameters:
+        ----------
+        cos_zenith : array
+            cosine of the solar zenith angle, ndays * num_hlf_hrs
+        par : array
+            incident PAR (umol m-2 s-1), ndays * num_hlf_hrs
+        diffuse_frac : array
+            diffuse fraction of the incident radiation (returned)
+    */
+    double So_scale, So, sw_rad, tau;
+    int    d, hod;
+    long   i = 0;
+
+    for (d = doy; d < doy + ndays; d++) {
+        So_scale = extra_terrestrial_scale(d);
+        for (hod = 0; hod < num_hlf_hrs; hod++, i++) {
+            So = cos_zenith[i] > 0.0 ? So_scale * cos_zenith[i] : 0.0;
+            sw_rad = par[i] * PAR_2_SW; /* W m-2 */
+            tau = estimate_clearness(sw_rad, So);
+            diffuse_frac[i] = spitters_diffuse_frac(cos_zenith[i], tau);
+        }
+    }
+
+    return;
 }
 
 void calculate_absorbed_radiation(canopy_wk *cw, params *p, state *s,
@@ -228,6 +275,71 @@ void calculate_solar_geometry(canopy_wk *cw, params *p, double doy,
     return;
 }
 
+void calculate_solar_geometry_days(params *p, int doy, int ndays,
+                                   int num_hlf_hrs, double *cos_zenith,
+                                   double *elevation) {
+    /*
+        calculate_solar_geometry for ndays whole days from doy (0 based, as
+        the drivers count), num_hlf_hrs values a day. The declination,
+        equation of time and solar noon only depend on the day, so they are
+        worked out once per day rather than every half hour, leaving a
+        cosine and an arccosine per timestep. Gives the same values, to the
+        bit, as calling calculate_solar_geometry every half hour.
+
+        Parameters:
+        ----------
+        cos_zenith : array
+            cosine of the solar zenith angle, ndays * num_hlf_hrs (returned)
+        elevation : array
+            solar elevation (degrees), ndays * num_hlf_hrs (returned)
+    */
+    double rdec, et, t0, h, gamma, rlat, sin_lat, cos_lat, a, b, cz;
+    int    d, hod;
+    long   i = 0;
+
+    rlat = DEG2RAD(p->latitude);
+    sin_lat = sin(rlat);
+    cos_lat = cos(rlat);
+
+    for (d = doy; d < doy + ndays; d++) {
+        gamma = day_angle(d);
+        rdec = calculate_solar_declination(d, gamma);
+        et = calculate_eqn_of_time(gamma);
+        t0 = calculate_solar_noon(et, p->longitude);
+
+        /* A13 - De Pury & Farquhar, split into the day and the hour terms */
+        a = sin_lat * sin(rdec);
+        b = cos_lat * cos(rdec);
+
+        for (hod = 0; hod < num_hlf_hrs; hod++, i++) {
+            /* need to convert 30 min data, 0-47 to 0-23.5 */
+            h = calculate_hour_angle(hod / 2.0, t0);
+            cz = a + b * cos(h);
+            if (cz > 1.0)
+                cz = 1.0;
+            else if (cz < 0.0)
+                cz = 0.0;
+            cos_zenith[i] = cz;
+            elevation[i] = 90.0 - RAD2DEG(acos(cz));
+        }
+    }
+
+    return;
+}
+
+void set_last_solar_values(canopy_wk *cw, long i) {
+    /*
+        Leave the i'th half hour of the solar stores in cw, as filling them
+        one calculate_solar_geometry/get_diffuse_frac call at a time did
+    */
+    cw->cos_zenith = cw->cz_store[i];
+    cw->elevation = cw->ele_store[i];
+    cw->diffuse_frac = cw->df_store[i];
+    cw->direct_frac = 1.0 - cw->diffuse_frac;
+
+    return;
+}
+
 double calculate_solar_noon(double et, double longitude) {
     /* Calculation solar noon - De Pury & Farquhar, '97: eqn A16
 
@@ -360,6 +472,20 @@ double calculate_eqn_of_time(double gamma) {
 
 
 
+double extra_terrestrial_scale(double doy) {
+    /*
+        Extra-terrestrial radiation normal to the sun's beam (J m-2 s-1), the
+        solar constant corrected for the earth's orbit; the part of
+        calc_extra_terrestrial_rad that only depends on the day.
+    */
+    double Sc;
+
+    /* Solar constant (J m-2 s-1) */
+    Sc = 1370.0;
+
+    return (Sc * (1.0 + 0.033 * cos(doy / 365.0 * 2.0 * M_PI)));
+}
+
 double calc_extra_terrestrial_rad(double doy, double cos_zenith) {
     /* Solar radiation incident outside the earth's atmosphere, e.g.
     extra-terrestrial radiation. The value varies a little with the earths
@@ -385,17 +511,14 @@ double calc_extra_terrestrial_rad(double doy, double cos_zenith) {
     * Spitters et al. (1986) AFM, 38, 217-229, equation 1.
     */
 
-    double So, Sc;
-
-    /* Solar constant (J m-2 s-1) */
-    Sc = 1370.0;
+    double So;
 
     if (cos_zenith > 0.0) {
         /*
         ** remember sin_beta = cos_zenith; trig funcs are cofuncs of each other
         ** sin(x) = cos(90-x) and cos(x) = sin(90-x).
         */
-        So = Sc * (1.0 + 0.033 * cos(doy / 365.0 * 2.0 * M_PI)) * cos_zenith;
+        So = extra_terrestrial_scale(doy) * cos_zenith;
     } else {
         So = 0.0;
     }
@@ -1,312 +1,436 @@
 #include "read_met_file.h"
 
+/*
+** Binary met forcing
+**
+** A compact alternative to the CSV forcing that is memory-mapped straight
+** into the met_arrays columns, so there is no text parsing at startup.
+** Everything is little-endian:
+**
+**   char    magic[8]             "CSMETBIN"
+**   int32   version              MET_BIN_VERSION
+**   int32   nvars
+**   int64   ntimesteps           rows, i.e. days or half-hours
+**   int32   num_years
+**   int32   steps_per_day        1 (daily) or 48 (sub-daily)
+**   char    names[nvars][16]     NUL padded variable names
+**   float64 data[nvars][ntimesteps]
+**
+** The header is a multiple of 8 bytes so each column is aligned. The
+** forcing generators in test/met_data write this via binary_met.py.
+*/
+typedef struct {
+    const char *name;
+    size_t      offset;
+} met_column;
+
+static const met_column daily_columns[] = {
+    {"year", offsetof(met_arrays, year)},
+    {"doy", offsetof(met_arrays, prjday)},
+    {"tair", offsetof(met_arrays, tair)},
+    {"rain", offsetof(met_arrays, rain)},
+    {"tsoil", offsetof(met_arrays, tsoil)},
+    {"tam", offsetof(met_arrays, tam)},
+    {"tpm", offsetof(met_arrays, tpm)},
+    {"tmin", offsetof(met_arrays, tmin)},
+    {"tmax", offsetof(met_arrays, tmax)},
+    {"tday", offsetof(met_arrays, tday)},
+    {"vpd_am", offsetof(met_arrays, vpd_am)},
+    {"vpd_pm", offsetof(met_arrays, vpd_pm)},
+    {"co2", offsetof(met_arrays, co2)},
+    {"ndep", offsetof(met_arrays, ndep)},
+    {"nfix", offsetof(met_arrays, nfix)},
+    {"wind", offsetof(met_arrays, wind)},
+    {"pres", offsetof(met_arrays, press)},
+    {"wind_am", offsetof(met_arrays, wind_am)},
+    {"wind_pm", offsetof(met_arrays, wind_pm)},
+    {"par_am", offsetof(met_arrays, par_am)},
+    {"par_pm", offsetof(met_arrays, par_pm)},
+};
+
+static const met_column subdaily_columns[] = {
+    {"year", offsetof(met_arrays, year)},
+    {"doy", offsetof(met_arrays, doy)},
+    {"rain", offsetof(met_arrays, rain)},
+    {"par", offsetof(met_arrays, par)},
+    {"tair", offsetof(met_arrays, tair)},
+    {"tsoil", offsetof(met_arrays, tsoil)},
+    {"vpd", offsetof(met_arrays, vpd)},
+    {"co2", offsetof(met_arrays, co2)},
+    {"ndep", offsetof(met_arrays, ndep)},
+    {"nfix", offsetof(met_arrays, nfix)},
+    {"wind", offsetof(met_arrays, wind)},
+    {"press", offsetof(met_arrays, press)},
+};
+
+static long read_text_met_data(char **, control *, met_arrays *,
+                               const met_column *, int, int, const char *);
+static double *grow_met_block(double *, int, long, long *);
+
 void read_daily_met_data(char **argv, control *c, met_arrays *ma)
 {
-    FILE  *fp;
-    char   line[STRING_LENGTH];
-    int    file_len = 0;
-    int    i = 0;
-    int    nvars = 21;
-    int    skipped_lines = 0;
-    double current_yr = -999.9;
+    if (is_binary_met_file(c->met_fname)) {
+        read_binary_met_data(argv, c, ma);
+        return;
+    }
+    c->total_num_days = read_text_met_data(argv, c, ma, daily_columns,
+                                           ARRAY_SIZE(daily_columns), -1,
+                                           "daily");
+    return;
+}
+
+void read_subdaily_met_data(char **argv, control *c, met_arrays *ma)
+{
+    long nrows;
 
+    if (is_binary_met_file(c->met_fname)) {
+        read_binary_met_data(argv, c, ma);
+        return;
+    }
+    /* the CSV has an hour of the day column (2) the model doesn't use */
+    nrows = read_text_met_data(argv, c, ma, subdaily_columns,
+                               ARRAY_SIZE(subdaily_columns), 2, "sub-daily");
+
+    /* output is daily, so correct for n_timesteps */
+    c->total_num_days = nrows / c->num_hlf_hrs;
+    return;
+}
+
+static long read_text_met_data(char **argv, control *c, met_arrays *ma,
+                               const met_column *cols, int ncols,
+                               int skip_field, const char *what)
+{
+    /*
+        Read a CSV met file in a single pass. Each row is parsed straight
+        into one column-major block, which is grown (and the columns spread
+        out) as needed, so there is no counting pass and no rewind, and the
+        columns are then pointed into the block. skip_field is a field in
+        the file that isn't stored, -1 for none. Returns the number of rows.
+    */
+    FILE   *fp;
+    char    line[STRING_LENGTH];
+    double *block = NULL;
+    double  current_yr = -999.9;
+    long    nrows = 0, size = 0;
+    int     j, line_number = 0;
+    int     nvars = ncols + (skip_field >= 0);
+
+    ma->map_base = NULL;
+    ma->block = NULL;
     if ((fp = fopen(c->met_fname, "r")) == NULL) {
-		fprintf(stderr, "Error: couldn't open daily Met file %s for read\n",
-                c->met_fname);
+		fprintf(stderr, "Error: couldn't open %s Met file %s for read\n",
+                what, c->met_fname);
 		exit(EXIT_FAILURE);
 	 }
+    setvbuf(fp, NULL, _IOFBF, MET_READ_BUFSIZE);
 
-    /* work out how big the file is */
-    file_len = 0;
+    c->num_years = 0;
     while (fgets(line, STRING_LENGTH, fp) != NULL) {
+        line_number++;
+
         /* ignore comment line */
         if (*line == '#')
             continue;
-        file_len++;
-    }
-    rewind(fp);
-    c->total_num_days = file_len;
-
-    /* allocate memory for meteorological arrays */
-    if ((ma->year = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for year array\n");
-		exit(EXIT_FAILURE);
-    }
 
-    if ((ma->prjday = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for prjday array\n");
-		exit(EXIT_FAILURE);
-    }
+        if (nrows == size) {
+            block = grow_met_block(block, ncols, nrows, &size);
+        }
 
-    if ((ma->tair = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tair array\n");
-		exit(EXIT_FAILURE);
-    }
+        if (parse_met_fields(line, block + nrows, size, nvars,
+                             skip_field) != nvars) {
+            fprintf(stderr, "%s: badly formatted input in met file on line %d %d\n", \
+                    *argv, line_number, nvars);
+            exit(EXIT_FAILURE);
+        }
 
-    if ((ma->rain = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for rain array\n");
-		exit(EXIT_FAILURE);
+        /* Build an array of the unique years as we loop over the input file */
+        if (current_yr != block[nrows]) {
+            c->num_years++;
+            current_yr = block[nrows];
+        }
+        nrows++;
     }
+    fclose(fp);
 
-    if ((ma->tsoil = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tsoil array\n");
-		exit(EXIT_FAILURE);
+    for (j = 0; j < ncols; j++) {
+        *(double **)((char *)ma + cols[j].offset) = block + j * size;
     }
+    ma->block = block;
 
-    if ((ma->tam = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tam array\n");
-		exit(EXIT_FAILURE);
-    }
+    return nrows;
+}
 
-    if ((ma->tpm = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tpm array\n");
-		exit(EXIT_FAILURE);
+int parse_met_fields(char *line, double *out, long stride, int nvars,
+                     int skip_field)
+{
+    /*
+        Parse a line of comma separated numbers, storing field i (skipping
+        skip_field) at out[i * stride]. Returns the number of fields read,
+        so anything but nvars means the line is badly formatted.
+    */
+    char  *ptr = line;
+    char  *end;
+    double value;
+    int    i, j;
+
+    for (i = 0, j = 0; i < nvars; i++) {
+        value = parse_double(ptr, &end);
+        if (end == ptr)
+            break;
+        ptr = end;
+        if (i < nvars - 1) {
+            while (*ptr == ' ' || *ptr == '\t')
+                ptr++;
+            if (*ptr++ != ',')
+                break;
+        }
+        if (i != skip_field)
+            out[j++ * stride] = value;
     }
 
-    if ((ma->tmin = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tmin array\n");
-		exit(EXIT_FAILURE);
-    }
+    return i;
+}
 
-    if ((ma->tmax = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tmax array\n");
-		exit(EXIT_FAILURE);
-    }
+static double *grow_met_block(double *block, int ncols, long nrows,
+                              long *size)
+{
+    /*
+        Double the rows the column-major block can hold. The columns are
+        moved out to the new stride last first, so none is overwritten
+        before it has been moved.
+    */
+    long new_size = (*size == 0) ? MET_READ_ROWS : *size * 2;
+    int  j;
 
-    if ((ma->tday = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tday array\n");
+    block = (double *)realloc(block, ncols * new_size * sizeof(double));
+    if (block == NULL) {
+        fprintf(stderr,"Error allocating space for met arrays\n");
 		exit(EXIT_FAILURE);
     }
-
-    if ((ma->vpd_am = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for vpd_am array\n");
-		exit(EXIT_FAILURE);
+    for (j = ncols - 1; j > 0; j--) {
+        memmove(block + j * new_size, block + j * *size,
+                nrows * sizeof(double));
     }
+    *size = new_size;
 
-    if ((ma->vpd_pm = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for vpd_pm array\n");
-		exit(EXIT_FAILURE);
-    }
+    return block;
+}
 
-    if ((ma->co2 = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for co2 array\n");
-		exit(EXIT_FAILURE);
-    }
+int is_binary_met_file(char *fname) {
+    /* Does the met file start with the binary forcing magic? */
+    FILE *fp;
+    char  magic[MET_BIN_MAGIC_LEN];
+    int   is_binary = FALSE;
 
-    if ((ma->ndep = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for ndep array\n");
-		exit(EXIT_FAILURE);
+    if ((fp = fopen(fname, "rb")) == NULL) {
+        return (FALSE);
     }
-
-    if ((ma->nfix = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for nfix array\n");
-		exit(EXIT_FAILURE);
+    if (fread(magic, 1, MET_BIN_MAGIC_LEN, fp) == MET_BIN_MAGIC_LEN &&
+        memcmp(magic, MET_BIN_MAGIC, MET_BIN_MAGIC_LEN) == 0) {
+        is_binary = TRUE;
     }
+    fclose(fp);
 
-    if ((ma->wind = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for wind array\n");
-		exit(EXIT_FAILURE);
-    }
+    return (is_binary);
+}
 
-    if ((ma->press = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for press array\n");
-		exit(EXIT_FAILURE);
+void read_binary_met_data(char **argv, control *c, met_arrays *ma)
+{
+    /*
+        Memory-map a binary met forcing file and point the met_arrays
+        columns straight at the mapped data, see the format description at
+        the top of the file.
+    */
+    int     fd, i, j, nvars, num_years, steps_per_day, ncols, found;
+    int32_t version;
+    int64_t ntimesteps;
+    size_t  header_len;
+    char   *base, *names;
+    double *data;
+    const met_column *cols;
+    struct stat sb;
+
+    if ((fd = open(c->met_fname, O_RDONLY)) == -1) {
+        fprintf(stderr, "Error: couldn't open binary Met file %s for read\n",
+                c->met_fname);
+        exit(EXIT_FAILURE);
     }
-
-    if ((ma->wind_am = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for wind_am array\n");
-		exit(EXIT_FAILURE);
+    if (fstat(fd, &sb) == -1 || sb.st_size < MET_BIN_HEADER_LEN) {
+        fprintf(stderr, "%s: binary met file %s is truncated\n", *argv,
+                c->met_fname);
+        exit(EXIT_FAILURE);
     }
 
-    if ((ma->wind_pm = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for wind_pm array\n");
-		exit(EXIT_FAILURE);
+    base = mmap(NULL, sb.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (base == MAP_FAILED) {
+        fprintf(stderr, "Error: couldn't map binary Met file %s\n",
+                c->met_fname);
+        exit(EXIT_FAILURE);
     }
+    close(fd);
 
-    if ((ma->par = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for par array\n");
-		exit(EXIT_FAILURE);
-    }
+    memcpy(&version, base + 8, sizeof(int32_t));
+    memcpy(&nvars, base + 12, sizeof(int32_t));
+    memcpy(&ntimesteps, base + 16, sizeof(int64_t));
+    memcpy(&num_years, base + 24, sizeof(int32_t));
+    memcpy(&steps_per_day, base + 28, sizeof(int32_t));
 
-    if ((ma->par_am = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for par_am array\n");
-		exit(EXIT_FAILURE);
+    if (version != MET_BIN_VERSION) {
+        fprintf(stderr, "%s: unsupported binary met version %d in %s\n",
+                *argv, (int)version, c->met_fname);
+        exit(EXIT_FAILURE);
     }
 
-    if ((ma->par_pm = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for par_pm array\n");
-		exit(EXIT_FAILURE);
+    header_len = MET_BIN_HEADER_LEN + (size_t)nvars * MET_BIN_NAME_LEN;
+    if ((size_t)sb.st_size != header_len +
+                              (size_t)nvars * ntimesteps * sizeof(double)) {
+        fprintf(stderr, "%s: binary met file %s has the wrong size\n", *argv,
+                c->met_fname);
+        exit(EXIT_FAILURE);
     }
 
-
-    i = 0;
-    c->num_years = 0;
-    skipped_lines = 0;
-    while (fgets(line, STRING_LENGTH, fp) != NULL) {
-        /* ignore comment line */
-        if (*line == '#') {
-            skipped_lines++;
-            continue;
+    if (c->sub_daily) {
+        if (steps_per_day != c->num_hlf_hrs) {
+            fprintf(stderr, "%s: %s is not a sub-daily met file\n", *argv,
+                    c->met_fname);
+            exit(EXIT_FAILURE);
         }
-
-        if (sscanf(line, "%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf,%lf,\
-                          %lf,%lf",\
-                          &(ma->year[i]), &(ma->prjday[i]), \
-                          &(ma->tair[i]), &(ma->rain[i]), &(ma->tsoil[i]), \
-                          &(ma->tam[i]), &(ma->tpm[i]), &(ma->tmin[i]), \
-                          &(ma->tmax[i]), &(ma->tday[i]), &(ma->vpd_am[i]), \
-                          &(ma->vpd_pm[i]), &(ma->co2[i]), &(ma->ndep[i]), \
-                          &(ma->nfix[i]),  &(ma->wind[i]), &(ma->press[i]), \
-                          &(ma->wind_am[i]), &(ma->wind_pm[i]), \
-                          &(ma->par_am[i]), &(ma->par_pm[i])) != nvars) {
-            fprintf(stderr, "%s: badly formatted input in met file on line %d %d\n", \
-                    *argv, (int)i+1+skipped_lines, nvars);
+        cols = subdaily_columns;
+        ncols = ARRAY_SIZE(subdaily_columns);
+        c->total_num_days = ntimesteps / c->num_hlf_hrs;
+    } else {
+        if (steps_per_day != 1) {
+            fprintf(stderr, "%s: %s is not a daily met file\n", *argv,
+                    c->met_fname);
             exit(EXIT_FAILURE);
         }
-
-        /* Build an array of the unique years as we loop over the input file */
-        if (current_yr != ma->year[i]) {
-            c->num_years++;
-            current_yr = ma->year[i];
+        cols = daily_columns;
+        ncols = ARRAY_SIZE(daily_columns);
+        c->total_num_days = ntimesteps;
+    }
+    c->num_years = num_years;
+
+    /* hook each column we need up to its slice of the mapping */
+    names = base + MET_BIN_HEADER_LEN;
+    data = (double *)(base + header_len);
+    for (i = 0; i < ncols; i++) {
+        found = FALSE;
+        for (j = 0; j < nvars; j++) {
+            if (strncmp(names + j * MET_BIN_NAME_LEN, cols[i].name,
+                        MET_BIN_NAME_LEN) == 0) {
+                *(double **)((char *)ma + cols[i].offset) = data +
+                                                            j * ntimesteps;
+                found = TRUE;
+                break;
+            }
+        }
+        if (!found) {
+            fprintf(stderr, "%s: %s missing from binary met file %s\n",
+                    *argv, cols[i].name, c->met_fname);
+            exit(EXIT_FAILURE);
         }
-        i++;
-    }
-    fclose(fp);
-    return;
-}
-
-void read_subdaily_met_data(char **argv, control *c, met_arrays *ma)
-{
-    FILE  *fp;
-    char   line[STRING_LENGTH];
-    int    i = 0;
-    int    nvars = 13;
-    int    skipped_lines = 0;
-    double current_yr, temp_HOD;
-    long   file_len;
-
-    if ((fp = fopen(c->met_fname, "r")) == NULL) {
-		fprintf(stderr, "Error: couldn't open sub-daily Met file %s for read\n",
-                c->met_fname);
-		exit(EXIT_FAILURE);
-	 }
-
-    /* work out how big the file is */
-    file_len = 0;
-    while (fgets(line, STRING_LENGTH, fp) != NULL) {
-        /* ignore comment line */
-        if (*line == '#')
-            continue;
-        file_len++;
-    }
-    rewind(fp);
-
-    /* output is daily, so correct for n_timesteps */
-    c->total_num_days = file_len / 48;
-
-    /* allocate memory for meteorological arrays */
-    if ((ma->year = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for year array\n");
-		exit(EXIT_FAILURE);
-    }
-
-    if ((ma->doy = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for doy array\n");
-		exit(EXIT_FAILURE);
-    }
-
-    if ((ma->rain = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for rain array\n");
-		exit(EXIT_FAILURE);
     }
 
-    if ((ma->par = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for par array\n");
-		exit(EXIT_FAILURE);
-    }
+    ma->map_base = base;
+    ma->map_len = sb.st_size;
+    ma->block = NULL;
 
-    if ((ma->tair = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tair array\n");
-		exit(EXIT_FAILURE);
-    }
+    return;
+}
 
-    if ((ma->tsoil = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for tsoil array\n");
-		exit(EXIT_FAILURE);
-    }
+const char *met_column_name(control *c, int i) {
+    /* name of the i'th forcing column for the current time step, or NULL */
 
-    if ((ma->vpd = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for vpd array\n");
-		exit(EXIT_FAILURE);
+    if (c->sub_daily) {
+        if (i < 0 || i >= (int)ARRAY_SIZE(subdaily_columns))
+            return NULL;
+        return subdaily_columns[i].name;
+    } else {
+        if (i < 0 || i >= (int)ARRAY_SIZE(daily_columns))
+            return NULL;
+        return daily_columns[i].name;
     }
+}
 
-    if ((ma->co2 = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for co2 array\n");
-		exit(EXIT_FAILURE);
-    }
+double **get_met_column(control *c, met_arrays *ma, const char *name) {
+    /* address of the met_arrays column called name, or NULL if unknown */
 
-    if ((ma->ndep = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for ndep array\n");
-		exit(EXIT_FAILURE);
-    }
+    const met_column *cols;
+    int    i, ncols;
 
-    if ((ma->nfix = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for nfix array\n");
-		exit(EXIT_FAILURE);
+    if (c->sub_daily) {
+        cols = subdaily_columns;
+        ncols = ARRAY_SIZE(subdaily_columns);
+    } else {
+        cols = daily_columns;
+        ncols = ARRAY_SIZE(daily_columns);
     }
-
-    if ((ma->wind = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for wind array\n");
-		exit(EXIT_FAILURE);
+    for (i = 0; i < ncols; i++) {
+        if (strcmp(cols[i].name, name) == 0)
+            return (double **)((char *)ma + cols[i].offset);
     }
 
-    if ((ma->press = (double *)calloc(file_len, sizeof(double))) == NULL) {
-        fprintf(stderr,"Error allocating space for press array\n");
-		exit(EXIT_FAILURE);
-    }
+    return NULL;
+}
 
-    current_yr = ma->year[0];
+int check_met_columns(control *c, met_arrays *ma) {
+    /* are all the columns the model reads set? */
 
-    i = 0;
-    c->num_years = 0;
-    skipped_lines = 0;
+    const char *name;
+    int    i;
 
-    while (fgets(line, STRING_LENGTH, fp) != NULL) {
-        /* ignore comment line */
-        if (*line == '#') {
-            skipped_lines++;
-            continue;
+    for (i = 0; (name = met_column_name(c, i)) != NULL; i++) {
+        if (*get_met_column(c, ma, name) == NULL) {
+            fprintf(stderr, "Met forcing is missing %s\n", name);
+            return FALSE;
         }
+    }
 
-        if (sscanf(line, "%lf,%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf,%lf,%lf,\
-                          %lf", \
-                          &(ma->year[i]), &(ma->doy[i]), &temp_HOD, \
-                          &(ma->rain[i]), &(ma->par[i]), &(ma->tair[i]), \
-                          &(ma->tsoil[i]), &(ma->vpd[i]), &(ma->co2[i]), \
-                          &(ma->ndep[i]), &(ma->nfix[i]), &(ma->wind[i]), \
-                          &(ma->press[i])) != nvars) {
-            fprintf(stderr, "%s: badly formatted input in met file on line %d %d\n", \
-                    *argv, (int)i+1+skipped_lines, nvars);
-            exit(EXIT_FAILURE);
-        }
+    return TRUE;
+}
 
-        /* Build an array of the unique years as we loop over the input file */
-        if (current_yr != ma->year[i]) {
-            c->num_years++;
-            current_yr = ma->year[i];
-        }
-        i++;
-    }
+void free_met_arrays(control *c, met_arrays *ma) {
+    /* release whatever the met readers set up */
+
+    if (ma->map_base != NULL) {
+        munmap(ma->map_base, ma->map_len);
+        memset(ma, 0, sizeof(met_arrays));
+        return;
+    }
+    if (ma->block != NULL) {
+        free(ma->block);
+        memset(ma, 0, sizeof(met_arrays));
+        return;
+    }
+
+    free(ma->year);
+    free(ma->tair);
+    free(ma->rain);
+    free(ma->tsoil);
+    free(ma->co2);
+    free(ma->ndep);
+    free(ma->nfix);
+    free(ma->wind);
+    free(ma->press);
+    if (c->sub_daily) {
+        free(ma->par);
+        free(ma->vpd);
+        free(ma->doy);
+    } else {
+        free(ma->prjday);
+        free(ma->tam);
+        free(ma->tpm);
+        free(ma->tmin);
+        free(ma->tmax);
+        free(ma->tday);
+        free(ma->vpd_am);
+        free(ma->vpd_pm);
+        free(ma->wind_am);
+        free(ma->wind_pm);
+        free(ma->par_am);
+        free(ma->par_pm);
+    }
+    memset(ma, 0, sizeof(met_arrays));
 
-    fclose(fp);
     return;
 }
@@ -21,10 +21,13 @@ int parse_ini_file(control *c, params *p, state *s)
 
     int error = 0;
     int line_number = 0;
+    int num_overrides = 0;
+    param_override *ov = NULL;
 
     if ((c->ifp = fopen(c->cfg_fname, "r")) == NULL){
         prog_error("Error opening param file for read on line", __LINE__);
     }
+    num_overrides = get_param_overrides(c, &ov);
 
     while (fgets(line, sizeof(line), c->ifp) != NULL) {
         line_number++;
@@ -63,6 +66,8 @@ int parse_ini_file(control *c, params *p, state *s)
 
                 /* Valid name[=:]value pair found, call handler */
                 strncpy0(prev_name, name, sizeof(prev_name));
+                value = match_param_override(ov, num_overrides, section, name,
+                                             value);
 
                 if (!handler(section, name, value, c, p, s) && !error)
                     error = line_number;
@@ -75,6 +80,11 @@ int parse_ini_file(control *c, params *p, state *s)
         }
     }
 
+    if (num_overrides > 0) {
+        apply_param_overrides(ov, num_overrides, c, p, s);
+        free(ov);
+    }
+
     if (c->print_options == END) {
         /* we need to re-read this file to dump the final state */
         rewind(c->ifp);
@@ -85,846 +95,779 @@ int parse_ini_file(control *c, params *p, state *s)
 
 }
 
-
-
-int handler(char *section, char *name, char *value, control *c,
-            params *p, state *s)
+int get_param_overrides(control *c, param_override **ov)
 {
     /*
+        Collect the parameter overrides given on the command line with
+        --set key=value (or --set section.key=value) and, with --stdin, as
+        an ini style block on the standard in. Returns the number found.
+    */
+    char line[STRING_LENGTH];
+    char section[STRING_LENGTH] = "";
+    char *start;
+    char *end;
+    int  i, num = 0, size = 0;
 
-    Assigns the values from the .INI file straight into the various
-    structures
+    for (i = 0; i < c->num_override_args; i++) {
+        strncpy0(line, c->override_args[i], sizeof(line));
+        if (!add_param_override(ov, &num, &size, "", line)) {
+            fprintf(stderr, "Expected --set key=value, got: %s\n",
+                    c->override_args[i]);
+            exit(EXIT_FAILURE);
+        }
+    }
 
-    */
-    char *temp = value;
+    if (c->override_stdin) {
+        while (fgets(line, sizeof(line), stdin) != NULL) {
+            start = lskip(rstrip(line));
+            if (*start == '\0' || *start == ';' || *start == '#') {
+                continue;
+            } else if (*start == '[') {
+                end = find_char_or_comment(start + 1, ']');
+                if (*end != ']') {
+                    fprintf(stderr, "No ']' on stdin section line: %s\n",
+                            start);
+                    exit(EXIT_FAILURE);
+                }
+                *end = '\0';
+                strncpy0(section, start + 1, sizeof(section));
+            } else if (!add_param_override(ov, &num, &size, section, start)) {
+                fprintf(stderr, "Expected key = value on stdin, got: %s\n",
+                        start);
+                exit(EXIT_FAILURE);
+            }
+        }
+    }
 
-    #define MATCH(s, n) strcasecmp(section, s) == 0 && strcasecmp(name, n) == 0
+    return num;
+}
 
+int add_param_override(param_override **ov, int *num, int *size,
+                       char *section, char *line)
+{
     /*
-    ** GIT
+        Split a name[=:]value string and append it to the override list,
+        growing the list as needed. A "section.name" key pins the override
+        to that section, otherwise the section passed in is used (empty
+        means whichever section the key turns up in).
     */
-    if (MATCH("git", "git_hash")) {
-        strcpy(c->git_hash, temp);
+    char *start;
+    char *end;
+    char *name;
+    char *value;
+    char *dot;
+    param_override *o;
+
+    start = lskip(rstrip(line));
+    end = find_char_or_comment(start, '=');
+    if (*end != '=') {
+        end = find_char_or_comment(start, ':');
+    }
+    if (*end != '=' && *end != ':') {
+        return FALSE;
+    }
+    *end = '\0';
+    name = rstrip(start);
+    value = lskip(end + 1);
+    end = find_char_or_comment(value, '\0');
+    if (*end == ';')
+        *end = '\0';
+    rstrip(value);
+
+    if (*name == '\0') {
+        return FALSE;
+    }
+
+    if (*num == *size) {
+        *size = (*size == 0) ? 16 : *size * 2;
+        *ov = (param_override *)realloc(*ov, *size * sizeof(param_override));
+        if (*ov == NULL) {
+            fprintf(stderr, "Error allocating space for param overrides\n");
+            exit(EXIT_FAILURE);
+        }
+    }
+    o = &(*ov)[*num];
+
+    if ((dot = strchr(name, '.')) != NULL) {
+        *dot = '\0';
+        strncpy0(o->section, name, sizeof(o->section));
+        name = dot + 1;
+    } else {
+        strncpy0(o->section, section, sizeof(o->section));
     }
+    strncpy0(o->name, name, sizeof(o->name));
+    strncpy0(o->value, value, sizeof(o->value));
+    o->found = FALSE;
+    (*num)++;
+
+    return TRUE;
+}
 
+char *match_param_override(param_override *ov, int num, char *section,
+                           char *name, char *value)
+{
     /*
-    ** FILES
+        Swap in the override value for a key read from the cfg file. A bare
+        key is replaced in every section it appears in, matching what
+        adjust_param_file does to the file. The last matching override wins.
     */
-    if (MATCH("files", "cfg_fname")) {
-        /* remove quotation marks around the string
-	    temp++;  removes first quote
-	    temp[strlen(temp)-1] = 0;  removes last quote */
-        strcpy(c->cfg_fname, temp);
-    } else if (MATCH("files", "met_fname")) {
-        strcpy(c->met_fname, temp);
-    } else if (MATCH("files", "out_fname")) {
-        strcpy(c->out_fname, temp);
-    } else if (MATCH("files", "out_subdaily_fname")) {
-        strcpy(c->out_subdaily_fname, temp);
-    } else if (MATCH("files", "out_fname_hdr")) {
-        strcpy(c->out_fname_hdr, temp);
-    } else if (MATCH("files", "out_param_fname")) {
-        strcpy(c->out_param_fname, temp);
+    int i;
+
+    for (i = num - 1; i >= 0; i--) {
+        if (strcasecmp(ov[i].name, name) == 0 &&
+            (*ov[i].section == '\0' ||
+             strcasecmp(ov[i].section, section) == 0)) {
+            ov[i].found = TRUE;
+            return ov[i].value;
+        }
     }
 
+    return value;
+}
+
+void apply_param_overrides(param_override *ov, int num, control *c,
+                           params *p, state *s)
+{
     /*
-    ** CONTROL
+        Section qualified overrides for keys that were not in the cfg file
+        are passed to the handler once the file has been read. A bare key
+        needs the file to tell us its section, so, as with adjust_param_file,
+        one that is not found is skipped (with a warning).
     */
-    if (MATCH("control", "adjust_rtslow")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->adjust_rtslow = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->adjust_rtslow = TRUE;
-        else {
-            fprintf(stderr, "Unknown adjust_rtslow option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "alloc_model")) {
-        if (strcmp(temp, "FIXED") == 0||
-            strcmp(temp, "fixed") == 0)
-            c->alloc_model = FIXED;
-        else if (strcmp(temp, "GRASSES") == 0 || strcmp(temp, "grasses") == 0)
-            c->alloc_model = GRASSES;
-        else if (strcmp(temp, "ALLOMETRIC") == 0 ||
-                 strcmp(temp, "allometric") == 0)
-            c->alloc_model = ALLOMETRIC;
-        else {
-            fprintf(stderr, "Unknown alloc model: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "assim_model")) {
-        if (strcmp(temp, "BEWDY") == 0||
-            strcmp(temp, "bewdy") == 0)
-            c->assim_model = BEWDY;
-        else if (strcmp(temp, "MATE") == 0||
-                 strcmp(temp, "mate") == 0)
-            c->assim_model = MATE;
-        else {
-            fprintf(stderr, "Unknown photosynthesis model: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "calc_sw_params")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->calc_sw_params = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->calc_sw_params = TRUE;
-        else {
-            fprintf(stderr, "Unknown SW param option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "deciduous_model")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->deciduous_model = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->deciduous_model = TRUE;
-        else {
-            fprintf(stderr, "Unknown deciduous option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "disturbance")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->disturbance = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->disturbance = TRUE;
-        else {
-            fprintf(stderr, "Unknown disturbance option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "exudation")) {
-            if (strcmp(temp, "False") == 0 ||
-                strcmp(temp, "FALSE") == 0 ||
-                strcmp(temp, "false") == 0)
-                c->exudation = FALSE;
-            else if (strcmp(temp, "True") == 0 ||
-                strcmp(temp, "TRUE") == 0 ||
-                strcmp(temp, "true") == 0)
-                c->exudation = TRUE;
-            else {
-                fprintf(stderr, "Unknown exudation option: %s\n", temp);
-                exit(EXIT_FAILURE);
-            }
-    } else if (MATCH("control", "fixed_stem_nc")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->fixed_stem_nc = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->fixed_stem_nc = TRUE;
-        else {
-            fprintf(stderr, "Unknown fixed_stem_nc option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "fixed_lai")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->fixed_lai = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->fixed_lai = TRUE;
-        else {
-            fprintf(stderr, "Unknown fixed_lai option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "fixleafnc")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->fixleafnc = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->fixleafnc = TRUE;
-        else {
-            fprintf(stderr, "Unknown fixleafnc option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "grazing")) {
-        c->grazing = atoi(value);
-    } else if (MATCH("control", "gs_model")) {
-        if (strcmp(temp, "MEDLYN") == 0||
-            strcmp(temp, "medlyn") == 0)
-            c->gs_model = MEDLYN;
-        else {
-            fprintf(stderr, "Unknown gs model: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "hurricane")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->hurricane = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->hurricane = TRUE;
-        else {
-            fprintf(stderr, "Unknown hurricane option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "model_optroot")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->model_optroot = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->model_optroot = TRUE;
-        else {
-            fprintf(stderr, "Unknown model_optroot option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "modeljm")) {
-        c->modeljm = atoi(value);
-    } else if (MATCH("control", "ncycle")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->ncycle = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->ncycle = TRUE;
-        else {
-            fprintf(stderr, "Unknown ncycle option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "nuptake_model")) {
-        c->nuptake_model = atoi(value);
-    } else if (MATCH("control", "output_ascii")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->output_ascii = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->output_ascii = TRUE;
-        else {
-            fprintf(stderr, "Unknown output_ascii option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "passiveconst")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->passiveconst = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->passiveconst = TRUE;
-        else {
-            fprintf(stderr, "Unknown passiveconst option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "print_options")) {
-        if (strcmp(temp, "Subdaily") == 0 ||
-            strcmp(temp, "SUBDAILY") == 0 ||
-            strcmp(temp, "subdaily") == 0)
-            c->print_options = SUBDAILY;
-        else if (strcmp(temp, "Daily") == 0 ||
-            strcmp(temp, "DAILY") == 0 ||
-            strcmp(temp, "daily") == 0)
-            c->print_options = DAILY;
-        else if (strcmp(temp, "End") == 0 ||
-            strcmp(temp, "END") == 0 ||
-            strcmp(temp, "end") == 0)
-            c->print_options = END;
-        else {
-            fprintf(stderr, "Unknown print option: %s\n", temp);
-            exit(EXIT_FAILURE);
-        }
-    } else if (MATCH("control", "ps_pathway")) {
-        if (strcmp(temp, "C3") == 0 ||
-            strcmp(temp, "c3") == 0)
-            c->ps_pathway = C3;
-        else if (strcmp(temp, "End") == 0 ||
-            strcmp(temp, "C4") == 0 ||
-            strcmp(temp, "c4") == 0)
-            c->ps_pathway = C4;
-        else {
-            fprintf(stderr, "Unknown ps pathway : %s\n", temp);
-            exit(EXIT_FAILURE);
+    int i;
+
+    for (i = 0; i < num; i++) {
+        if (ov[i].found) {
+            continue;
         }
-     } else if (MATCH("control", "respiration_model")) {
-         if (strcmp(temp, "FIXED") == 0||
-             strcmp(temp, "fixed") == 0)
-             c->respiration_model = FIXED;
-         else if (strcmp(temp, "VARY") == 0||
-             strcmp(temp, "vary") == 0)
-             c->respiration_model = VARY;
-         else {
-             fprintf(stderr, "Unknown respiration model: %s\n", temp);
-             exit(EXIT_FAILURE);
-         }
-    } else if (MATCH("control", "spinup_method")) {
-        if (strcmp(temp, "BRUTE") == 0 || strcmp(temp, "brute") == 0)
-            c->spinup_method = BRUTE;
-        else if (strcmp(temp, "SAS") == 0 || strcmp(temp, "sas") == 0)
-            c->spinup_method = SAS;
-        else {
-            fprintf(stderr, "Unknown spinup method: %s\n", temp);
-            exit(EXIT_FAILURE);
+        if (*ov[i].section == '\0') {
+            fprintf(stderr, "Override key not found in param file, "
+                            "ignoring: %s\n", ov[i].name);
+            continue;
         }
-    } else if (MATCH("control", "soil_drainage")) {
-        if (strcmp(temp, "GRAVITY") == 0||
-            strcmp(temp, "gravity") == 0)
-            c->soil_drainage = GRAVITY;
-        else if (strcmp(temp, "CASCADING") == 0||
-            strcmp(temp, "cascading") == 0)
-            c->soil_drainage = CASCADING;
-        else {
-            fprintf(stderr, "Unknown soil_drainage option: %s\n", temp);
-            exit(EXIT_FAILURE);
+        if (strcasecmp(ov[i].section, "print") != 0 &&
+            find_param(ov[i].section, ov[i].name) == NULL) {
+            fprintf(stderr, "Unknown override key, ignoring: %s.%s\n",
+                    ov[i].section, ov[i].name);
+            continue;
         }
-    } else if (MATCH("control", "sub_daily")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0) {
-            c->sub_daily = FALSE;
-        } else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0) {
-            c->sub_daily = TRUE;
-        } else {
-            fprintf(stderr, "Unknown sub_daily option: %s\n", temp);
-            exit(EXIT_FAILURE);
+        handler(ov[i].section, ov[i].name, ov[i].value, c, p, s);
+    }
+
+    return;
+}
+
+
+
+/*
+** Parameter registry
+**
+** Every key the param file may set, with the structure and field it lands
+** in and how the value is parsed. The handler finds keys through an open
+** addressing hash of the table (built once), rather than comparing the key
+** against every name in turn, and the same table drives the --set/--runs
+** overrides and --dump-params.
+*/
+static const param_option bool_opts[] = {
+    {"false", FALSE}, {"true", TRUE}, {NULL, 0}
+};
+static const param_option alloc_model_opts[] = {
+    {"fixed", FIXED}, {"grasses", GRASSES}, {"allometric", ALLOMETRIC},
+    {NULL, 0}
+};
+static const param_option assim_model_opts[] = {
+    {"mate", MATE}, {"bewdy", BEWDY}, {NULL, 0}
+};
+static const param_option leaf_solver_opts[] = {
+    {"cold", COLD_START}, {"warm", WARM_START}, {NULL, 0}
+};
+static const param_option gs_model_opts[] = {
+    {"medlyn", MEDLYN}, {NULL, 0}
+};
+static const param_option print_options_opts[] = {
+    {"subdaily", SUBDAILY}, {"daily", DAILY}, {"end", END}, {NULL, 0}
+};
+static const param_option ps_pathway_opts[] = {
+    {"c3", C3}, {"c4", C4}, {NULL, 0}
+};
+static const param_option respiration_model_opts[] = {
+    {"fixed", FIXED}, {"vary", VARY}, {NULL, 0}
+};
+static const param_option spinup_method_opts[] = {
+    {"brute", BRUTE}, {"sas", SAS}, {NULL, 0}
+};
+static const param_option soil_drainage_opts[] = {
+    {"gravity", GRAVITY}, {"cascading", CASCADING}, {NULL, 0}
+};
+/* anything but hydraulics is a bucket */
+static const param_option water_balance_opts[] = {
+    {"hydraulics", HYDRAULICS}, {NULL, BUCKET}
+};
+
+#define PARAM_ENTRY(sec, owner, type, st, field, opts, what) \
+    {sec, #field, owner, type, offsetof(st, field), opts, what}
+#define C_STR(sec, f) \
+    PARAM_ENTRY(sec, IN_CONTROL, PARAM_STRING, control, f, NULL, NULL)
+#define C_INT(f) \
+    PARAM_ENTRY("control", IN_CONTROL, PARAM_INT, control, f, NULL, NULL)
+#define C_DBL(f) \
+    PARAM_ENTRY("control", IN_CONTROL, PARAM_DOUBLE, control, f, NULL, NULL)
+#define C_ENUM(f, opts, what) \
+    PARAM_ENTRY("control", IN_CONTROL, PARAM_ENUM, control, f, opts, what)
+#define C_BOOL(f, what) C_ENUM(f, bool_opts, what)
+#define P_STR(f) \
+    PARAM_ENTRY("params", IN_PARAMS, PARAM_STRING, params, f, NULL, NULL)
+#define P_INT(f) \
+    PARAM_ENTRY("params", IN_PARAMS, PARAM_INT, params, f, NULL, NULL)
+#define P_DBL(f) \
+    PARAM_ENTRY("params", IN_PARAMS, PARAM_DOUBLE, params, f, NULL, NULL)
+#define S_DBL(f) \
+    PARAM_ENTRY("state", IN_STATE, PARAM_DOUBLE, state, f, NULL, NULL)
+
+static const param_entry param_table[] = {
+    C_STR("git", git_hash),
+    C_STR("files", cfg_fname),
+    C_STR("files", met_fname),
+    C_STR("files", out_fname),
+    C_STR("files", out_subdaily_fname),
+    C_STR("files", out_fname_hdr),
+    C_STR("files", out_param_fname),
+    C_STR("files", solar_cache_dir),
+    C_BOOL(adjust_rtslow, "adjust_rtslow option"),
+    C_ENUM(alloc_model, alloc_model_opts, "alloc model"),
+    C_ENUM(assim_model, assim_model_opts, "photosynthesis model"),
+    C_BOOL(calc_sw_params, "SW param option"),
+    C_BOOL(deciduous_model, "deciduous option"),
+    C_BOOL(disturbance, "disturbance option"),
+    C_BOOL(exudation, "exudation option"),
+    C_BOOL(fixed_stem_nc, "fixed_stem_nc option"),
+    C_BOOL(fixed_lai, "fixed_lai option"),
+    C_BOOL(fixleafnc, "fixleafnc option"),
+    C_INT(grazing),
+    C_ENUM(gs_model, gs_model_opts, "gs model"),
+    C_BOOL(hurricane, "hurricane option"),
+    C_ENUM(leaf_solver, leaf_solver_opts, "leaf_solver option"),
+    C_BOOL(model_optroot, "model_optroot option"),
+    C_INT(modeljm),
+    C_BOOL(ncycle, "ncycle option"),
+    C_INT(nuptake_model),
+    C_BOOL(output_ascii, "output_ascii option"),
+    C_BOOL(passiveconst, "passiveconst option"),
+    C_ENUM(print_options, print_options_opts, "print option"),
+    C_ENUM(ps_pathway, ps_pathway_opts, "ps pathway"),
+    C_ENUM(respiration_model, respiration_model_opts, "respiration model"),
+    C_ENUM(spinup_method, spinup_method_opts, "spinup method"),
+    C_ENUM(soil_drainage, soil_drainage_opts, "soil_drainage option"),
+    C_DBL(solar_cache_max_mb),
+    C_INT(stream_buffer_days),
+    C_BOOL(stream_met, "stream_met option"),
+    C_BOOL(sub_daily, "sub_daily option"),
+    C_INT(strfloat),
+    C_INT(sw_stress_model),
+    C_BOOL(temp_response_table, "temp_response_table option"),
+    C_DBL(temp_response_tol),
+    C_INT(use_eff_nc),
+    C_ENUM(water_balance, water_balance_opts, NULL),
+    C_BOOL(water_store, "water_store option"),
+    C_BOOL(water_stress, "water stress option"),
+    S_DBL(activesoil),
+    S_DBL(activesoiln),
+    S_DBL(age),
+    S_DBL(avg_albranch),
+    S_DBL(avg_alcroot),
+    S_DBL(avg_alleaf),
+    S_DBL(avg_alroot),
+    S_DBL(avg_alstem),
+    S_DBL(branch),
+    S_DBL(branchn),
+    S_DBL(canht),
+    S_DBL(croot),
+    S_DBL(crootn),
+    S_DBL(cstore),
+    S_DBL(inorgn),
+    S_DBL(lai),
+    S_DBL(metabsoil),
+    S_DBL(metabsoiln),
+    S_DBL(metabsurf),
+    S_DBL(metabsurfn),
+    S_DBL(nstore),
+    S_DBL(passivesoil),
+    S_DBL(passivesoiln),
+    S_DBL(pawater_root),
+    S_DBL(pawater_topsoil),
+    S_DBL(prev_sma),
+    S_DBL(root),
+    S_DBL(root_depth),
+    S_DBL(rootn),
+    S_DBL(sapwood),
+    S_DBL(shoot),
+    S_DBL(shootn),
+    S_DBL(sla),
+    S_DBL(slowsoil),
+    S_DBL(slowsoiln),
+    S_DBL(stem),
+    S_DBL(stemn),
+    S_DBL(stemnimm),
+    S_DBL(stemnmob),
+    S_DBL(structsoil),
+    S_DBL(structsoiln),
+    S_DBL(structsurf),
+    S_DBL(structsurfn),
+    P_DBL(actncmax),
+    P_DBL(actncmin),
+    P_DBL(a0rhizo),
+    P_DBL(a1rhizo),
+    P_DBL(adapt),
+    P_DBL(ageold),
+    P_DBL(ageyoung),
+    P_DBL(albedo),
+    P_DBL(alpha_c4),
+    P_DBL(alpha_j),
+    P_DBL(b_root),
+    P_DBL(b_topsoil),
+    P_DBL(bdecay),
+    P_DBL(branch0),
+    P_DBL(branch1),
+    P_DBL(capac),
+    P_DBL(c_alloc_bmax),
+    P_DBL(c_alloc_bmin),
+    P_DBL(c_alloc_cmax),
+    P_DBL(c_alloc_fmax),
+    P_DBL(c_alloc_fmin),
+    P_DBL(c_alloc_rmax),
+    P_DBL(c_alloc_rmin),
+    P_DBL(cfracts),
+    P_DBL(crdecay),
+    P_DBL(cretrans),
+    P_DBL(croot0),
+    P_DBL(croot1),
+    P_DBL(ctheta_root),
+    P_DBL(ctheta_topsoil),
+    P_DBL(cue),
+    P_DBL(d0),
+    P_DBL(d0x),
+    P_DBL(d1),
+    P_DBL(delsj),
+    P_DBL(density),
+    P_DBL(direct_frac),
+    P_DBL(displace_ratio),
+    P_INT(disturbance_doy),
+    P_DBL(dz0v_dh),
+    P_DBL(eac),
+    P_DBL(eag),
+    P_DBL(eaj),
+    P_DBL(eao),
+    P_DBL(eav),
+    P_DBL(edj),
+    P_DBL(faecescn),
+    P_DBL(faecesn),
+    P_DBL(fdecay),
+    P_DBL(fdecaydry),
+    P_DBL(fhw),
+    P_DBL(finesoil),
+    P_DBL(fix_lai),
+    P_DBL(fracfaeces),
+    P_DBL(fracteaten),
+    P_DBL(fractosoil),
+    P_DBL(fractup_soil),
+    P_DBL(fretrans),
+    P_DBL(g1),
+    P_DBL(gamstar25),
+    P_DBL(growth_efficiency),
+    P_DBL(gs_min),
+    P_DBL(height0),
+    P_DBL(height1),
+    P_DBL(heighto),
+    P_DBL(htpower),
+    P_DBL(intercep_frac),
+    P_DBL(jmax),
+    P_DBL(jmaxna),
+    P_DBL(jmaxnb),
+    P_DBL(jv_intercept),
+    P_DBL(jv_slope),
+    P_DBL(kp),
+    P_DBL(kc25),
+    P_DBL(kdec1),
+    P_DBL(kdec2),
+    P_DBL(kdec3),
+    P_DBL(kdec4),
+    P_DBL(kdec5),
+    P_DBL(kdec6),
+    P_DBL(kdec7),
+    P_DBL(ko25),
+    P_DBL(kq10),
+    P_DBL(kr),
+    P_DBL(kn),
+    P_DBL(lad),
+    P_DBL(lai_closed),
+    P_DBL(latitude),
+    P_DBL(layer_thickness),
+    P_DBL(leafsap0),
+    P_DBL(leafsap1),
+    P_DBL(ligfaeces),
+    P_DBL(ligroot),
+    P_DBL(ligshoot),
+    P_DBL(liteffnc),
+    P_DBL(longitude),
+    P_DBL(max_depth),
+    P_DBL(max_intercep_lai),
+    P_DBL(measurement_temp),
+    P_DBL(min_lwp),
+    P_DBL(ncbnew),
+    P_DBL(ncbnewz),
+    P_DBL(nccnew),
+    P_DBL(nccnewz),
+    P_DBL(ncmaxfold),
+    P_DBL(ncmaxfyoung),
+    P_DBL(ncmaxr),
+    P_DBL(ncrfac),
+    P_DBL(ncwimm),
+    P_DBL(ncwimmz),
+    P_DBL(ncwnew),
+    P_DBL(ncwnewz),
+    P_DBL(nf_crit),
+    P_DBL(nf_min),
+    P_INT(soil_layers),
+    P_DBL(nmax),
+    P_DBL(nmin),
+    P_DBL(nmin0),
+    P_DBL(nmincrit),
+    P_DBL(ntheta_root),
+    P_DBL(ntheta_topsoil),
+    P_DBL(nuptakez),
+    P_DBL(oi),
+    P_DBL(passivesoilnz),
+    P_DBL(passivesoilz),
+    P_DBL(passncmax),
+    P_DBL(passncmin),
+    P_DBL(prescribed_leaf_NC),
+    P_DBL(previous_ncd),
+    P_DBL(psi_sat_root),
+    P_DBL(psi_sat_topsoil),
+    P_DBL(prime_y),
+    P_DBL(prime_z),
+    P_DBL(p50),
+    P_DBL(plc_shape),
+    P_DBL(qs),
+    P_DBL(r0),
+    P_DBL(rateloss),
+    P_DBL(rateuptake),
+    P_DBL(rdecay),
+    P_DBL(rdecaydry),
+    P_DBL(resp_coeff),
+    P_DBL(retransmob),
+    P_DBL(rfmult),
+    P_DBL(rooting_depth),
+    P_DBL(root_resist),
+    P_STR(rootsoil_type),
+    P_DBL(root_exu_CUE),
+    P_DBL(root_k),
+    P_DBL(root_density),
+    P_DBL(root_radius),
+    P_DBL(rretrans),
+    P_DBL(sapturnover),
+    P_DBL(sla),
+    P_DBL(slamax),
+    P_DBL(slazero),
+    P_DBL(slowncmax),
+    P_DBL(slowncmin),
+    P_DBL(store_transfer_len),
+    P_DBL(structcn),
+    P_DBL(structrat),
+    P_DBL(targ_sens),
+    P_DBL(theta),
+    P_DBL(theta_fc_root),
+    P_DBL(theta_fc_topsoil),
+    P_DBL(theta_sp_root),
+    P_DBL(theta_sp_topsoil),
+    P_DBL(theta_wp_root),
+    P_DBL(theta_wp_topsoil),
+    P_DBL(topsoil_depth),
+    P_STR(topsoil_type),
+    P_DBL(vcmax),
+    P_DBL(vcmaxna),
+    P_DBL(vcmaxnb),
+    P_DBL(watdecaydry),
+    P_DBL(watdecaywet),
+    P_DBL(wcapac_root),
+    P_DBL(wcapac_topsoil),
+    P_DBL(wdecay),
+    P_DBL(wetloss),
+    P_DBL(wretrans),
+    P_DBL(z0h_z0m),
+};
+
+#define NUM_PARAMS ARRAY_SIZE(param_table)
+#define PARAM_HASH_SIZE 1024        /* power of 2, > 2 * NUM_PARAMS */
+
+static int param_slots[PARAM_HASH_SIZE]; /* table index + 1, 0 = empty */
+static pthread_once_t param_hash_once = PTHREAD_ONCE_INIT;
+
+static unsigned int param_hash(const char *section, const char *name) {
+    /* case folded FNV-1a of "section.name" */
+
+    unsigned int hash = 2166136261u;
+    const char  *ch;
+
+    for (ch = section; *ch != '\0'; ch++) {
+        hash ^= (unsigned char)tolower((unsigned char)*ch);
+        hash *= 16777619u;
+    }
+    hash ^= '.';
+    hash *= 16777619u;
+    for (ch = name; *ch != '\0'; ch++) {
+        hash ^= (unsigned char)tolower((unsigned char)*ch);
+        hash *= 16777619u;
+    }
+
+    return hash;
+}
+
+static void build_param_hash(void) {
+    size_t       i;
+    unsigned int slot;
+
+    for (i = 0; i < NUM_PARAMS; i++) {
+        slot = param_hash(param_table[i].section, param_table[i].name) &
+               (PARAM_HASH_SIZE - 1);
+        while (param_slots[slot] != 0)
+            slot = (slot + 1) & (PARAM_HASH_SIZE - 1);
+        param_slots[slot] = (int)i + 1;
+    }
+
+    return;
+}
+
+const param_entry *find_param(const char *section, const char *name) {
+    /* Returns the registry entry for section/name, NULL if there isn't one */
+
+    const param_entry *e;
+    unsigned int slot;
+
+    pthread_once(&param_hash_once, build_param_hash);
+
+    slot = param_hash(section, name) & (PARAM_HASH_SIZE - 1);
+    while (param_slots[slot] != 0) {
+        e = &param_table[param_slots[slot] - 1];
+        if (strcasecmp(e->name, name) == 0 &&
+            strcasecmp(e->section, section) == 0)
+            return e;
+        slot = (slot + 1) & (PARAM_HASH_SIZE - 1);
+    }
+
+    return NULL;
+}
+
+static char *param_field(const param_entry *e, control *c, params *p,
+                         state *s) {
+    char *base;
+
+    if (e->owner == IN_CONTROL)
+        base = (char *)c;
+    else if (e->owner == IN_PARAMS)
+        base = (char *)p;
+    else
+        base = (char *)s;
+
+    return base + e->offset;
+}
+
+void set_param_value(const param_entry *e, char *value, control *c,
+                     params *p, state *s) {
+    /*
+        Parse value into the field e describes. An enum (or true/false)
+        value that isn't one of the options is fatal, unless the option
+        list has a fallback (what == NULL).
+    */
+    char *field = param_field(e, c, p, s);
+    const param_option *o;
+
+    switch (e->type) {
+    case PARAM_DOUBLE:
+        *(double *)field = atof(value);
+        break;
+    case PARAM_INT:
+        *(int *)field = atoi(value);
+        break;
+    case PARAM_STRING:
+        strncpy0(field, value, STRING_LENGTH);
+        break;
+    case PARAM_ENUM:
+        for (o = e->options; o->name != NULL; o++) {
+            if (strcasecmp(o->name, value) == 0)
+                break;
         }
-    } else if (MATCH("control", "strfloat")) {
-        c->strfloat = atoi(value);
-        /*if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->strfloat = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->strfloat = TRUE;
-        else {
-            fprintf(stderr, "Unknown strfloat option: %s\n", temp);
+        if (o->name == NULL && e->what != NULL) {
+            fprintf(stderr, "Unknown %s: %s\n", e->what, value);
             exit(EXIT_FAILURE);
-        }*/
-    } else if (MATCH("control", "sw_stress_model")) {
-        c->sw_stress_model = atoi(value);
-    } else if (MATCH("control", "use_eff_nc")) {
-        c->use_eff_nc = atoi(value);
-    } else if (MATCH("control", "water_balance")) {
-        if (strcmp(temp, "hydraulics") == 0||
-            strcmp(temp, "HYDRAULICS") == 0)
-            c->water_balance = HYDRAULICS;
-        else {
-            c->water_balance = BUCKET;
         }
-    } else if (MATCH("control", "water_store")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0)
-            c->water_store = FALSE;
-        else if (strcmp(temp, "True") == 0 ||
-            strcmp(temp, "TRUE") == 0 ||
-            strcmp(temp, "true") == 0)
-            c->water_store = TRUE;
-        else {
-            fprintf(stderr, "Unknown water_store option: %s\n", temp);
-            exit(EXIT_FAILURE);
+        *(int *)field = o->value;
+        break;
+    }
+
+    if (e->owner == IN_CONTROL &&
+        e->offset == offsetof(control, water_stress) &&
+        c->water_stress == FALSE) {
+        fprintf(stderr, "\nYou have turned off the drought stress??\n");
+    }
+
+    return;
+}
+
+void format_param_value(const param_entry *e, char *buf, size_t len,
+                        control *c, params *p, state *s) {
+    /*
+        Write the current value of a parameter as it would appear in the
+        param file. Doubles get the shortest form that reads back exactly.
+    */
+    char *field = param_field(e, c, p, s);
+    const param_option *o;
+    double val;
+
+    switch (e->type) {
+    case PARAM_DOUBLE:
+        val = *(double *)field;
+        snprintf(buf, len, "%.15g", val);
+        if (strtod(buf, NULL) != val)
+            snprintf(buf, len, "%.17g", val);
+        break;
+    case PARAM_INT:
+        snprintf(buf, len, "%d", *(int *)field);
+        break;
+    case PARAM_STRING:
+        snprintf(buf, len, "%s", field);
+        break;
+    case PARAM_ENUM:
+        for (o = e->options; o->name != NULL; o++) {
+            if (o->value == *(int *)field)
+                break;
         }
-    } else if (MATCH("control", "water_stress")) {
-        if (strcmp(temp, "False") == 0 ||
-            strcmp(temp, "FALSE") == 0 ||
-            strcmp(temp, "false") == 0) {
-            c->water_stress = FALSE;
-            fprintf(stderr, "\nYou have turned off the drought stress??\n");
-        } else if (strcmp(temp, "True") == 0 ||
-                   strcmp(temp, "TRUE") == 0 ||
-                   strcmp(temp, "true") == 0) {
-            c->water_stress = TRUE;
-        } else {
-            fprintf(stderr, "Unknown water stress option: %s\n", temp);
-            exit(EXIT_FAILURE);
+        if (o->name != NULL)
+            snprintf(buf, len, "%s", o->name);
+        else
+            snprintf(buf, len, "%d", *(int *)field);
+        break;
+    }
+
+    return;
+}
+
+void dump_params(FILE *fp, control *c, params *p, state *s) {
+    /* Print every registered parameter in param file format */
+
+    char value[STRING_LENGTH];
+    const char *section = "";
+    size_t i;
+
+    for (i = 0; i < NUM_PARAMS; i++) {
+        if (strcmp(param_table[i].section, section) != 0) {
+            section = param_table[i].section;
+            fprintf(fp, "%s[%s]\n", (i == 0) ? "" : "\n", section);
         }
+        format_param_value(&param_table[i], value, sizeof(value), c, p, s);
+        fprintf(fp, "%s = %s\n", param_table[i].name, value);
     }
 
+    /* the sub-daily output selection, see write_output_file.c */
+    fprintf(fp, "\n[print]\n");
+    for (i = 0; subdaily_var_name(i) != NULL; i++) {
+        if ((c->print_sd_mask >> i) & 1ULL)
+            fprintf(fp, "%s = yes\n", subdaily_var_name(i));
+    }
+
+    return;
+}
+
+int handler(char *section, char *name, char *value, control *c,
+            params *p, state *s)
+{
+    /*
+
+    Assigns the values from the .INI file straight into the various
+    structures. Keys the model doesn't know about are ignored.
 
+    */
+    const param_entry *e;
 
+    if (strcasecmp(section, "print") == 0)
+        select_subdaily_var(c, name, value);
+    else if ((e = find_param(section, name)) != NULL)
+        set_param_value(e, value, c, p, s);
+
+    return (1);
+}
+
+int resolve_param_overrides(control *c, param_override **ov, int *num)
+{
     /*
-    ** State
+        Pin each bare key to the section(s) it appears in within the param
+        file (c->ifp, which is still open), so the overrides can be applied
+        straight through the handler without reparsing the file. A key found
+        in several sections gets one override per section. Returns the
+        number of bare keys not found, which are left without a section.
     */
-    if (MATCH("state", "activesoil")) {
-        s->activesoil = atof(value);
-    } else if (MATCH("state", "activesoiln")) {
-        s->activesoiln = atof(value);
-    } else if (MATCH("state", "age")) {
-        s->age = atof(value);
-    } else if (MATCH("state", "avg_albranch")) {
-        s->avg_albranch = atof(value);
-    } else if (MATCH("state", "avg_alcroot")) {
-        s->avg_alcroot = atof(value);
-    } else if (MATCH("state", "avg_alleaf")) {
-        s->avg_alleaf = atof(value);
-    } else if (MATCH("state", "avg_alroot")) {
-        s->avg_alroot = atof(value);
-    } else if (MATCH("state", "avg_alstem")) {
-        s->avg_alstem = atof(value);
-    } else if (MATCH("state", "branch")) {
-        s->branch = atof(value);
-    } else if (MATCH("state", "branchn")) {
-        s->branchn = atof(value);
-    } else if (MATCH("state", "canht")) {
-        s->canht = atof(value);
-    } else if (MATCH("state", "croot")) {
-        s->croot = atof(value);
-    } else if (MATCH("state", "crootn")) {
-        s->crootn = atof(value);
-    } else if (MATCH("state", "cstore")) {
-        s->cstore = atof(value);
-    } else if (MATCH("state", "inorgn")) {
-        s->inorgn = atof(value);
-    } else if (MATCH("state", "lai")) {
-        s->lai = atof(value);
-    } else if (MATCH("state", "metabsoil")) {
-        s->metabsoil = atof(value);
-    } else if (MATCH("state", "metabsoiln")) {
-        s->metabsoiln = atof(value);
-    } else if (MATCH("state", "metabsurf")) {
-        s->metabsurf = atof(value);
-    } else if (MATCH("state", "metabsurfn")) {
-        s->metabsurfn = atof(value);
-    } else if (MATCH("state", "nstore")) {
-        s->nstore = atof(value);
-    } else if (MATCH("state", "passivesoil")) {
-        s->passivesoil = atof(value);
-    } else if (MATCH("state", "passivesoiln")) {
-        s->passivesoiln = atof(value);
-    } else if (MATCH("state", "pawater_root")) {
-        s->pawater_root = atof(value);
-    } else if (MATCH("state", "pawater_topsoil")) {
-        s->pawater_topsoil = atof(value);
-    } else if (MATCH("state", "prev_sma")) {
-        s->prev_sma = atof(value);
-    } else if (MATCH("state", "root")) {
-        s->root = atof(value);
-    } else if (MATCH("state", "root_depth")) {
-        s->root_depth = atof(value);
-    } else if (MATCH("state", "rootn")) {
-        s->rootn = atof(value);
-    } else if (MATCH("state", "sapwood")) {
-        s->sapwood = atof(value);
-    } else if (MATCH("state", "shoot")) {
-        s->shoot = atof(value);
-    } else if (MATCH("state", "shootn")) {
-        s->shootn = atof(value);
-    } else if (MATCH("state", "sla")) {
-        s->sla = atof(value);
-    } else if (MATCH("state", "slowsoil")) {
-        s->slowsoil = atof(value);
-    } else if (MATCH("state", "slowsoiln")) {
-        s->slowsoiln = atof(value);
-    } else if (MATCH("state", "stem")) {
-        s->stem = atof(value);
-    } else if (MATCH("state", "stemn")) {
-        s->stemn = atof(value);
-    } else if (MATCH("state", "stemnimm")) {
-        s->stemnimm = atof(value);
-    } else if (MATCH("state", "stemnmob")) {
-        s->stemnmob = atof(value);
-    } else if (MATCH("state", "structsoil")) {
-        s->structsoil = atof(value);
-    } else if (MATCH("state", "structsoiln")) {
-        s->structsoiln = atof(value);
-    } else if (MATCH("state", "structsurf")) {
-        s->structsurf = atof(value);
-    } else if (MATCH("state", "structsurfn")) {
-        s->structsurfn = atof(value);
+    char line[STRING_LENGTH];
+    char section[STRING_LENGTH] = "";
+    char pinned[STRING_LENGTH * 3];
+    char *start;
+    char *end;
+    int  i, size, num_bare, unresolved = 0;
+    int  *seen;
+
+    num_bare = *num;
+    size = *num;
+    if ((seen = (int *)calloc(num_bare + 1, sizeof(int))) == NULL) {
+        fprintf(stderr, "Error allocating space for param overrides\n");
+        exit(EXIT_FAILURE);
+    }
+
+    rewind(c->ifp);
+    while (fgets(line, sizeof(line), c->ifp) != NULL) {
+        start = lskip(rstrip(line));
+        if (*start == '[') {
+            end = find_char_or_comment(start + 1, ']');
+            if (*end == ']') {
+                *end = '\0';
+                strncpy0(section, start + 1, sizeof(section));
+            }
+            continue;
+        } else if (*start == '\0' || *start == ';' || *start == '#') {
+            continue;
+        }
+        end = find_char_or_comment(start, '=');
+        if (*end != '=') {
+            end = find_char_or_comment(start, ':');
+        }
+        if (*end != '=' && *end != ':') {
+            continue;
+        }
+        *end = '\0';
+        rstrip(start);
+
+        for (i = 0; i < num_bare; i++) {
+            if (*(*ov)[i].section != '\0' && !seen[i])
+                continue;
+            if (strcasecmp((*ov)[i].name, start) != 0)
+                continue;
+
+            if (!seen[i]) {
+                strncpy0((*ov)[i].section, section,
+                         sizeof((*ov)[i].section));
+                seen[i] = TRUE;
+            } else if (strcasecmp((*ov)[i].section, section) != 0) {
+                snprintf(pinned, sizeof(pinned), "%s.%s=%s", section,
+                         (*ov)[i].name, (*ov)[i].value);
+                add_param_override(ov, num, &size, "", pinned);
+            }
+        }
     }
+    rewind(c->ifp);
 
-    /* Params */
-    if (MATCH("params", "actncmax")) {
-        p->actncmax = atof(value);
-    } else if (MATCH("params", "actncmin")) {
-        p->actncmin = atof(value);
-    } else if (MATCH("params", "a0rhizo")) {
-        p->a0rhizo = atof(value);
-    } else if (MATCH("params", "a1rhizo")) {
-        p->a1rhizo = atof(value);
-    } else if (MATCH("params", "adapt")) {
-        p->adapt = atof(value);
-    } else if (MATCH("params", "ageold")) {
-        p->ageold = atof(value);
-    } else if (MATCH("params", "ageyoung")) {
-        p->ageyoung = atof(value);
-    } else if (MATCH("params", "albedo")) {
-        p->albedo = atof(value);
-    } else if (MATCH("params", "alpha_c4")) {
-        p->alpha_c4 = atof(value);
-    } else if (MATCH("params", "alpha_j")) {
-        p->alpha_j = atof(value);
-    } else if (MATCH("params", "b_root")) {
-        p->b_root = atof(value);
-    } else if (MATCH("params", "b_topsoil")) {
-        p->b_topsoil = atof(value);
-    } else if (MATCH("params", "bdecay")) {
-        p->bdecay = atof(value);
-    } else if (MATCH("params", "branch0")) {
-        p->branch0 = atof(value);
-    } else if (MATCH("params", "branch1")) {
-        p->branch1 = atof(value);
-    } else if (MATCH("params", "capac")) {
-        p->capac = atof(value);
-    } else if (MATCH("params", "c_alloc_bmax")) {
-        p->c_alloc_bmax = atof(value);
-    } else if (MATCH("params", "c_alloc_bmin")) {
-        p->c_alloc_bmin = atof(value);
-    } else if (MATCH("params", "c_alloc_cmax")) {
-        p->c_alloc_cmax = atof(value);
-    } else if (MATCH("params", "c_alloc_fmax")) {
-        p->c_alloc_fmax = atof(value);
-    } else if (MATCH("params", "c_alloc_fmin")) {
-        p->c_alloc_fmin = atof(value);
-    } else if (MATCH("params", "c_alloc_rmax")) {
-        p->c_alloc_rmax = atof(value);
-    } else if (MATCH("params", "c_alloc_rmin")) {
-        p->c_alloc_rmin = atof(value);
-    } else if (MATCH("params", "cfracts")) {
-        p->cfracts = atof(value);
-    } else if (MATCH("params", "crdecay")) {
-        p->crdecay = atof(value);
-    } else if (MATCH("params", "cretrans")) {
-        p->cretrans = atof(value);
-    } else if (MATCH("params", "croot0")) {
-        p->croot0 = atof(value);
-    } else if (MATCH("params", "croot1")) {
-        p->croot1 = atof(value);
-    } else if (MATCH("params", "ctheta_root")) {
-        p->ctheta_root = atof(value);
-    } else if (MATCH("params", "ctheta_topsoil")) {
-        p->ctheta_topsoil = atof(value);
-    } else if (MATCH("params", "cue")) {
-        p->cue = atof(value);
-    } else if (MATCH("params", "d0")) {
-        p->d0 = atof(value);
-    } else if (MATCH("params", "d0x")) {
-        p->d0x = atof(value);
-    } else if (MATCH("params", "d1")) {
-        p->d1 = atof(value);
-    } else if (MATCH("params", "delsj")) {
-        p->delsj = atof(value);
-    } else if (MATCH("params", "density")) {
-        p->density = atof(value);
-    } else if (MATCH("params", "direct_frac")) {
-        p->direct_frac = atof(value);
-    } else if (MATCH("params", "displace_ratio")) {
-        p->displace_ratio = atof(value);
-    } else if (MATCH("params", "disturbance_doy")) {
-        p->disturbance_doy = atoi(value);
-    } else if (MATCH("params", "dz0v_dh")) {
-        p->dz0v_dh = atof(value);
-    } else if (MATCH("params", "eac")) {
-        p->eac = atof(value);
-    } else if (MATCH("params", "eag")) {
-        p->eag = atof(value);
-    } else if (MATCH("params", "eaj")) {
-        p->eaj = atof(value);
-    } else if (MATCH("params", "eao")) {
-        p->eao = atof(value);
-    } else if (MATCH("params", "eav")) {
-        p->eav = atof(value);
-    } else if (MATCH("params", "edj")) {
-        p->edj = atof(value);
-    } else if (MATCH("params", "faecescn")) {
-        p->faecescn = atof(value);
-    } else if (MATCH("params", "faecesn")) {
-        p->faecesn = atof(value);
-    } else if (MATCH("params", "fdecay")) {
-        p->fdecay = atof(value);
-    } else if (MATCH("params", "fdecaydry")) {
-        p->fdecaydry = atof(value);
-    } else if (MATCH("params", "fhw")) {
-        p->fhw = atof(value);
-    } else if (MATCH("params", "finesoil")) {
-        p->finesoil = atof(value);
-    } else if (MATCH("params", "fix_lai")) {
-        p->fix_lai = atof(value);
-    } else if (MATCH("params", "fracfaeces")) {
-        p->fracfaeces = atof(value);
-    } else if (MATCH("params", "fracteaten")) {
-        p->fracteaten = atof(value);
-    } else if (MATCH("params", "fractosoil")) {
-        p->fractosoil = atof(value);
-    } else if (MATCH("params", "fractup_soil")) {
-        p->fractup_soil = atof(value);
-    } else if (MATCH("params", "fretrans")) {
-        p->fretrans = atof(value);
-    } else if (MATCH("params", "g1")) {
-        p->g1 = atof(value);
-    } else if (MATCH("params", "gamstar25")) {
-        p->gamstar25 = atof(value);
-    } else if (MATCH("params", "growth_efficiency")) {
-        p->growth_efficiency = atof(value);
-    } else if (MATCH("params", "gamstar25")) {
-        p->gamstar25 = atof(value);
-    } else if (MATCH("params", "gs_min")) {
-        p->gs_min = atof(value);
-    } else if (MATCH("params", "height0")) {
-        p->height0 = atof(value);
-    } else if (MATCH("params", "height1")) {
-        p->height1 = atof(value);
-    } else if (MATCH("params", "heighto")) {
-        p->heighto = atof(value);
-    } else if (MATCH("params", "htpower")) {
-        p->htpower = atof(value);
-    } else if (MATCH("params", "intercep_frac")) {
-        p->intercep_frac = atof(value);
-    } else if (MATCH("params", "jmax")) {
-        p->jmax = atof(value);
-    } else if (MATCH("params", "jmaxna")) {
-        p->jmaxna = atof(value);
-    } else if (MATCH("params", "jmaxnb")) {
-        p->jmaxnb = atof(value);
-    } else if (MATCH("params", "jv_intercept")) {
-        p->jv_intercept = atof(value);
-    } else if (MATCH("params", "jv_slope")) {
-        p->jv_slope = atof(value);
-    } else if (MATCH("params", "kp")) {
-        p->kp = atof(value);
-    } else if (MATCH("params", "kc25")) {
-        p->kc25 = atof(value);
-    } else if (MATCH("params", "kdec1")) {
-        p->kdec1 = atof(value);
-    } else if (MATCH("params", "kdec2")) {
-        p->kdec2 = atof(value);
-    } else if (MATCH("params", "kdec3")) {
-        p->kdec3 = atof(value);
-    } else if (MATCH("params", "kdec4")) {
-        p->kdec4 = atof(value);
-    } else if (MATCH("params", "kdec5")) {
-        p->kdec5 = atof(value);
-    } else if (MATCH("params", "kdec6")) {
-        p->kdec6 = atof(value);
-    } else if (MATCH("params", "kdec7")) {
-        p->kdec7 = atof(value);
-    } else if (MATCH("params", "ko25")) {
-        p->ko25 = atof(value);
-    } else if (MATCH("params", "kq10")) {
-        p->kq10 = atof(value);
-    } else if (MATCH("params", "kr")) {
-        p->kr = atof(value);
-    } else if (MATCH("params", "kn")) {
-        p->kn = atof(value);
-    } else if (MATCH("params", "lad")) {
-        p->lad = atof(value);
-    } else if (MATCH("params", "lai_closed")) {
-        p->lai_closed = atof(value);
-    } else if (MATCH("params", "latitude")) {
-        p->latitude = atof(value);
-    } else if (MATCH("params", "layer_thickness")) {
-        p->layer_thickness = atof(value);
-    } else if (MATCH("params", "leafsap0")) {
-        p->leafsap0 = atof(value);
-    } else if (MATCH("params", "leafsap1")) {
-        p->leafsap1 = atof(value);
-    } else if (MATCH("params", "ligfaeces")) {
-        p->ligfaeces = atof(value);
-    } else if (MATCH("params", "ligroot")) {
-        p->ligroot = atof(value);
-    } else if (MATCH("params", "ligshoot")) {
-        p->ligshoot = atof(value);
-    } else if (MATCH("params", "liteffnc")) {
-        p->liteffnc = atof(value);
-    } else if (MATCH("params", "longitude")) {
-        p->longitude = atof(value);
-    } else if (MATCH("params", "max_depth")) {
-        p->max_depth = atof(value);
-    } else if (MATCH("params", "max_intercep_lai")) {
-        p->max_intercep_lai = atof(value);
-    } else if (MATCH("params", "measurement_temp")) {
-        p->measurement_temp = atof(value);
-    } else if (MATCH("params", "min_lwp")) {
-        p->min_lwp = atof(value);
-    } else if (MATCH("params", "ncbnew")) {
-        p->ncbnew = atof(value);
-    } else if (MATCH("params", "ncbnewz")) {
-        p->ncbnewz = atof(value);
-    } else if (MATCH("params", "nccnew")) {
-        p->nccnew = atof(value);
-    } else if (MATCH("params", "nccnewz")) {
-        p->nccnewz = atof(value);
-    } else if (MATCH("params", "ncmaxfold")) {
-        p->ncmaxfold = atof(value);
-    } else if (MATCH("params", "ncmaxfyoung")) {
-        p->ncmaxfyoung = atof(value);
-    } else if (MATCH("params", "ncmaxr")) {
-        p->ncmaxr = atof(value);
-    } else if (MATCH("params", "ncrfac")) {
-        p->ncrfac = atof(value);
-    } else if (MATCH("params", "ncwimm")) {
-        p->ncwimm = atof(value);
-    } else if (MATCH("params", "ncwimmz")) {
-        p->ncwimmz = atof(value);
-    } else if (MATCH("params", "ncwnew")) {
-        p->ncwnew = atof(value);
-    } else if (MATCH("params", "ncwnewz")) {
-        p->ncwnewz = atof(value);
-    } else if (MATCH("params", "nf_crit")) {
-        p->nf_crit = atof(value);
-    } else if (MATCH("params", "nf_min")) {
-        p->nf_min = atof(value);
-    } else if (MATCH("params", "soil_layers")) {
-        p->soil_layers = atof(value);
-    } else if (MATCH("params", "nmax")) {
-        p->nmax = atof(value);
-    } else if (MATCH("params", "nmin")) {
-        p->nmin = atof(value);
-    } else if (MATCH("params", "nmin0")) {
-        p->nmin0 = atof(value);
-    } else if (MATCH("params", "nmincrit")) {
-        p->nmincrit = atof(value);
-    } else if (MATCH("params", "ntheta_root")) {
-        p->ntheta_root = atof(value);
-    } else if (MATCH("params", "ntheta_topsoil")) {
-        p->ntheta_topsoil = atof(value);
-    } else if (MATCH("params", "nuptakez")) {
-        p->nuptakez = atof(value);
-    } else if (MATCH("params", "oi")) {
-        p->oi = atof(value);
-    } else if (MATCH("params", "passivesoilnz")) {
-        p->passivesoilnz = atof(value);
-    } else if (MATCH("params", "passivesoilz")) {
-        p->passivesoilz = atof(value);
-    } else if (MATCH("params", "passncmax")) {
-        p->passncmax = atof(value);
-    } else if (MATCH("params", "passncmin")) {
-        p->passncmin = atof(value);
-    } else if (MATCH("params", "prescribed_leaf_NC")) {
-        p->prescribed_leaf_NC = atof(value);
-    } else if (MATCH("params", "previous_ncd")) {
-        p->previous_ncd = atof(value);
-    } else if (MATCH("params", "psi_sat_root")) {
-        p->psi_sat_root = atof(value);
-    } else if (MATCH("params", "psi_sat_topsoil")) {
-        p->psi_sat_topsoil = atof(value);
-    } else if (MATCH("params", "prime_y")) {
-        p->prime_y = atof(value);
-    } else if (MATCH("params", "prime_z")) {
-        p->prime_z = atof(value);
-    } else if (MATCH("params", "p50")) {
-        p->p50 = atof(value);
-    } else if (MATCH("params", "plc_shape")) {
-        p->plc_shape = atof(value);
-    } else if (MATCH("params", "qs")) {
-        p->qs = atof(value);
-    } else if (MATCH("params", "r0")) {
-        p->r0 = atof(value);
-    } else if (MATCH("params", "rateloss")) {
-        p->rateloss = atof(value);
-    } else if (MATCH("params", "rateuptake")) {
-        p->rateuptake = atof(value);
-    } else if (MATCH("params", "rdecay")) {
-        p->rdecay = atof(value);
-    } else if (MATCH("params", "rdecaydry")) {
-        p->rdecaydry = atof(value);
-    } else if (MATCH("params", "resp_coeff")) {
-        p->resp_coeff = atof(value);
-    } else if (MATCH("params", "retransmob")) {
-        p->retransmob = atof(value);
-    } else if (MATCH("params", "rfmult")) {
-        p->rfmult = atof(value);
-    } else if (MATCH("params", "rooting_depth")) {
-        p->rooting_depth = atof(value);
-    } else if (MATCH("params", "root_resist")) {
-        p->root_resist = atof(value);
-    } else if (MATCH("params", "rootsoil_type")) {
-        strcpy(p->rootsoil_type, value);
-    } else if (MATCH("params", "root_exu_CUE")) {
-        p->root_exu_CUE = atof(value);
-    } else if (MATCH("params", "root_k")) {
-        p->root_k = atof(value);
-    } else if (MATCH("params", "root_density")) {
-        p->root_density = atof(value);
-    } else if (MATCH("params", "root_radius")) {
-        p->root_radius = atof(value);
-    } else if (MATCH("params", "rretrans")) {
-        p->rretrans = atof(value);
-    } else if (MATCH("params", "sapturnover")) {
-        p->sapturnover = atof(value);
-    } else if (MATCH("params", "sla")) {
-        p->sla = atof(value);
-    } else if (MATCH("params", "slamax")) {
-        p->slamax = atof(value);
-    } else if (MATCH("params", "slazero")) {
-        p->slazero = atof(value);
-    } else if (MATCH("params", "slowncmax")) {
-        p->slowncmax = atof(value);
-    } else if (MATCH("params", "slowncmin")) {
-        p->slowncmin = atof(value);
-    } else if (MATCH("params", "store_transfer_len")) {
-        p->store_transfer_len = atof(value);
-    } else if (MATCH("params", "structcn")) {
-        p->structcn = atof(value);
-    } else if (MATCH("params", "structrat")) {
-        p->structrat = atof(value);
-    } else if (MATCH("params", "targ_sens")) {
-        p->targ_sens = atof(value);
-    } else if (MATCH("params", "theta")) {
-        p->theta = atof(value);
-    } else if (MATCH("params", "theta_fc_root")) {
-        p->theta_fc_root = atof(value);
-    } else if (MATCH("params", "theta_fc_topsoil")) {
-        p->theta_fc_topsoil = atof(value);
-    } else if (MATCH("params", "theta_sp_root")) {
-        p->theta_sp_root = atof(value);
-    } else if (MATCH("params", "theta_sp_topsoil")) {
-        p->theta_sp_topsoil = atof(value);
-    } else if (MATCH("params", "theta_wp_root")) {
-        p->theta_wp_root = atof(value);
-    } else if (MATCH("params", "theta_wp_topsoil")) {
-        p->theta_wp_topsoil = atof(value);
-    } else if (MATCH("params", "topsoil_depth")) {
-        p->topsoil_depth = atof(value);
-    } else if (MATCH("params", "topsoil_type")) {
-        strcpy(p->topsoil_type, value);
-    } else if (MATCH("params", "vcmax")) {
-        p->vcmax = atof(value);
-    } else if (MATCH("params", "vcmaxna")) {
-        p->vcmaxna = atof(value);
-    } else if (MATCH("params", "vcmaxnb")) {
-        p->vcmaxnb = atof(value);
-    } else if (MATCH("params", "watdecaydry")) {
-        p->watdecaydry = atof(value);
-    } else if (MATCH("params", "watdecaywet")) {
-        p->watdecaywet = atof(value);
-    } else if (MATCH("params", "wcapac_root")) {
-        p->wcapac_root = atof(value);
-    } else if (MATCH("params", "wcapac_topsoil")) {
-        p->wcapac_topsoil = atof(value);
-    } else if (MATCH("params", "wdecay")) {
-        p->wdecay = atof(value);
-    } else if (MATCH("params", "wetloss")) {
-        p->wetloss = atof(value);
-    } else if (MATCH("params", "wretrans")) {
-        p->wretrans = atof(value);
-    } else if (MATCH("params", "z0h_z0m")) {
-        p->z0h_z0m = atof(value);
+    for (i = 0; i < num_bare; i++) {
+        if (*(*ov)[i].section == '\0')
+            unresolved++;
     }
+    free(seen);
 
-    return (1);
+    return unresolved;
 }
@@ -0,0 +1,279 @@
+/*
+** Solar geometry cache
+**
+** cos(zenith) and the sun elevation only depend on the site and the
+** calendar, so they are written to a cache file the first time a site is
+** run and memory-mapped by later runs, rather than recomputed. The diffuse
+** fraction also depends on the PAR series, so it is always recomputed.
+**
+** Files live in [files] solar_cache_dir, named by a hash of latitude,
+** longitude, the number of half-hours a day and the run of year lengths.
+** The directory is kept under [control] solar_cache_max_mb by deleting the
+** least recently used files (hits refresh the file's mtime). Layout:
+**
+**   char    magic[8]             "CSSOLGEO"
+**   int32   version              SOLAR_CACHE_VERSION
+**   int32   num_hlf_hrs
+**   int64   ntimesteps
+**   float64 latitude
+**   float64 longitude
+**   uint64  key
+**   float64 cos_zenith[ntimesteps]
+**   float64 elevation[ntimesteps]
+*/
+
+#include "solar_cache.h"
+
+typedef struct {
+    char   fname[STRING_LENGTH];
+    time_t mtime;
+    off_t  size;
+} cache_entry;
+
+static void fnv1a(uint64_t *hash, const void *data, size_t len) {
+    const unsigned char *b = data;
+    size_t i;
+
+    for (i = 0; i < len; i++) {
+        *hash ^= b[i];
+        *hash *= 1099511628211ULL;
+    }
+}
+
+uint64_t solar_cache_key(control *c, met_arrays *ma, params *p) {
+    /* hash of everything the cached geometry depends on */
+
+    uint64_t hash = 14695981039346656037ULL;
+    long     idx = 0;
+    int      nyr, num_days;
+
+    fnv1a(&hash, &p->latitude, sizeof(double));
+    fnv1a(&hash, &p->longitude, sizeof(double));
+    fnv1a(&hash, &c->num_hlf_hrs, sizeof(int));
+    fnv1a(&hash, &c->num_years, sizeof(int));
+    for (nyr = 0; nyr < c->num_years; nyr++) {
+        num_days = is_leap_year(ma->year[idx]) ? 366 : 365;
+        fnv1a(&hash, &num_days, sizeof(int));
+        idx += num_days * c->num_hlf_hrs;
+    }
+
+    return hash;
+}
+
+int solar_cache_fname(control *c, uint64_t key, char *fname, size_t len) {
+    /*
+        The cache file for key. Returns FALSE if the name doesn't fit in
+        len, so that a cut short path is never used.
+    */
+    int n;
+
+    n = snprintf(fname, len, "%s/%s%016llx%s", c->solar_cache_dir,
+                 SOLAR_CACHE_PREFIX, (unsigned long long)key,
+                 SOLAR_CACHE_SUFFIX);
+
+    return (n >= 0 && (size_t)n < len);
+}
+
+int load_solar_cache(canopy_wk *cw, control *c, met_arrays *ma, params *p) {
+    /*
+        Point cz_store and ele_store at a cached copy of the geometry, if
+        there is one. Returns TRUE on a hit.
+    */
+    char     fname[STRING_LENGTH];
+    char    *base;
+    int      fd;
+    int32_t  version, num_hlf_hrs;
+    int64_t  ntimesteps;
+    uint64_t key, file_key;
+    double   lat, lon;
+    long     nsteps = (long)c->total_num_days * c->num_hlf_hrs;
+    size_t   len = SOLAR_CACHE_HEADER_LEN + 2 * nsteps * sizeof(double);
+    struct stat sb;
+
+    if (*c->solar_cache_dir == '\0')
+        return FALSE;
+
+    key = solar_cache_key(c, ma, p);
+    if (!solar_cache_fname(c, key, fname, sizeof(fname)))
+        return FALSE;
+    if ((fd = open(fname, O_RDONLY)) == -1)
+        return FALSE;
+    if (fstat(fd, &sb) == -1 || (size_t)sb.st_size != len) {
+        close(fd);
+        return FALSE;
+    }
+    base = mmap(NULL, len, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (base == MAP_FAILED)
+        return FALSE;
+
+    memcpy(&version, base + 8, sizeof(int32_t));
+    memcpy(&num_hlf_hrs, base + 12, sizeof(int32_t));
+    memcpy(&ntimesteps, base + 16, sizeof(int64_t));
+    memcpy(&lat, base + 24, sizeof(double));
+    memcpy(&lon, base + 32, sizeof(double));
+    memcpy(&file_key, base + 40, sizeof(uint64_t));
+    if (memcmp(base, SOLAR_CACHE_MAGIC, SOLAR_CACHE_MAGIC_LEN) != 0 ||
+        version != SOLAR_CACHE_VERSION || num_hlf_hrs != c->num_hlf_hrs ||
+        ntimesteps != nsteps || lat != p->latitude ||
+        lon != p->longitude || file_key != key) {
+        munmap(base, len);
+        return FALSE;
+    }
+
+    cw->cz_store = (double *)(base + SOLAR_CACHE_HEADER_LEN);
+    cw->ele_store = cw->cz_store + nsteps;
+    cw->solar_map_base = base;
+    cw->solar_map_len = len;
+
+    /* keep it at the front of the LRU queue */
+    utime(fname, NULL);
+
+    return TRUE;
+}
+
+void save_solar_cache(canopy_wk *cw, control *c, met_arrays *ma, params *p) {
+    /*
+        Write the freshly computed geometry to the cache. This goes via a
+        temporary file and a rename so that concurrent runs never see a part
+        written file. Failing to write the cache isn't fatal.
+    */
+    char     fname[STRING_LENGTH];
+    char     tmp_fname[STRING_LENGTH + 32];
+    char     header[SOLAR_CACHE_HEADER_LEN];
+    FILE    *fp;
+    int32_t  version = SOLAR_CACHE_VERSION, num_hlf_hrs = c->num_hlf_hrs;
+    int64_t  ntimesteps = (int64_t)c->total_num_days * c->num_hlf_hrs;
+    uint64_t key;
+    int      ok;
+
+    if (*c->solar_cache_dir == '\0')
+        return;
+
+    key = solar_cache_key(c, ma, p);
+    if (!solar_cache_fname(c, key, fname, sizeof(fname))) {
+        fprintf(stderr, "solar_cache_dir %s is too long, not caching\n",
+                c->solar_cache_dir);
+        return;
+    }
+    /* fname is shorter than STRING_LENGTH, so this always fits */
+    snprintf(tmp_fname, sizeof(tmp_fname), "%s.%ld.tmp", fname,
+             (long)getpid());
+
+    memcpy(header, SOLAR_CACHE_MAGIC, SOLAR_CACHE_MAGIC_LEN);
+    memcpy(header + 8, &version, sizeof(int32_t));
+    memcpy(header + 12, &num_hlf_hrs, sizeof(int32_t));
+    memcpy(header + 16, &ntimesteps, sizeof(int64_t));
+    memcpy(header + 24, &p->latitude, sizeof(double));
+    memcpy(header + 32, &p->longitude, sizeof(double));
+    memcpy(header + 40, &key, sizeof(uint64_t));
+
+    if ((fp = fopen(tmp_fname, "wb")) == NULL) {
+        fprintf(stderr, "Couldn't write solar cache file %s\n", tmp_fname);
+        return;
+    }
+    ok = fwrite(header, 1, SOLAR_CACHE_HEADER_LEN, fp) ==
+                SOLAR_CACHE_HEADER_LEN &&
+         fwrite(cw->cz_store, sizeof(double), ntimesteps, fp) ==
+                (size_t)ntimesteps &&
+         fwrite(cw->ele_store, sizeof(double), ntimesteps, fp) ==
+                (size_t)ntimesteps;
+    ok = (fclose(fp) == 0) && ok;
+    if (!ok || rename(tmp_fname, fname) != 0) {
+        fprintf(stderr, "Couldn't write solar cache file %s\n", fname);
+        remove(tmp_fname);
+        return;
+    }
+
+    evict_solar_cache(c, fname);
+
+    return;
+}
+
+static int compare_mtime(const void *a, const void *b) {
+    const cache_entry *x = a;
+    const cache_entry *y = b;
+
+    return (x->mtime > y->mtime) - (x->mtime < y->mtime);
+}
+
+void evict_solar_cache(control *c, char *keep) {
+    /*
+        Delete the least recently used cache files until the directory is
+        under solar_cache_max_mb, never removing the file just written.
+    */
+    DIR           *dir;
+    struct dirent *ent;
+    struct stat    sb;
+    cache_entry   *entries = NULL;
+    size_t         plen = strlen(SOLAR_CACHE_PREFIX);
+    size_t         slen = strlen(SOLAR_CACHE_SUFFIX);
+    size_t         nlen;
+    int            n = 0, size = 0, i;
+    double         total = 0.0;
+    double         max_bytes = c->solar_cache_max_mb * 1024.0 * 1024.0;
+
+    if ((dir = opendir(c->solar_cache_dir)) == NULL)
+        return;
+
+    while ((ent = readdir(dir)) != NULL) {
+        nlen = strlen(ent->d_name);
+        if (nlen <= plen + slen ||
+            strncmp(ent->d_name, SOLAR_CACHE_PREFIX, plen) != 0 ||
+            strcmp(ent->d_name + nlen - slen, SOLAR_CACHE_SUFFIX) != 0)
+            continue;
+
+        if (n == size) {
+            size = (size == 0) ? 64 : size * 2;
+            entries = (cache_entry *)realloc(entries,
+                                             size * sizeof(cache_entry));
+            if (entries == NULL) {
+                fprintf(stderr, "Error allocating space for solar cache\n");
+                exit(EXIT_FAILURE);
+            }
+        }
+        /* skip any name that doesn't fit rather than remove another file */
+        nlen = snprintf(entries[n].fname, sizeof(entries[n].fname), "%s/%s",
+                        c->solar_cache_dir, ent->d_name);
+        if (nlen >= sizeof(entries[n].fname) ||
+            stat(entries[n].fname, &sb) != 0)
+            continue;
+        entries[n].mtime = sb.st_mtime;
+        entries[n].size = sb.st_size;
+        total += sb.st_size;
+        n++;
+    }
+    closedir(dir);
+
+    if (total > max_bytes) {
+        qsort(entries, n, sizeof(cache_entry), compare_mtime);
+        for (i = 0; i < n && total > max_bytes; i++) {
+            if (strcmp(entries[i].fname, keep) == 0)
+                continue;
+            if (remove(entries[i].fname) == 0)
+                total -= entries[i].size;
+        }
+    }
+    free(entries);
+
+    return;
+}
+
+void free_solar_arrays(canopy_wk *cw) {
+    /* release the solar arrays, however fill_up_solar_arrays got them */
+
+    if (cw->solar_map_base != NULL) {
+        munmap(cw->solar_map_base, cw->solar_map_len);
+    } else {
+        free(cw->cz_store);
+        free(cw->ele_store);
+    }
+    free(cw->df_store);
+    cw->cz_store = NULL;
+    cw->ele_store = NULL;
+    cw->df_store = NULL;
+    cw->solar_map_base = NULL;
+    cw->solar_map_len = 0;
+
+    return;
+}
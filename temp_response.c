@@ -0,0 +1,224 @@
+/* ============================================================================
+* Tabulated temperature responses for the leaf solver
+*
+* The CO2 compensation point, the Michaelis-Menten coefficient and the
+* Arrhenius terms of Vcmax and Jmax only depend on leaf temperature once the
+* parameters are set, but photosynthesis_C3 recomputes them (five exps) every
+* time round the leaf energy balance loop. With [control]
+* temp_response_table = true they are tabulated on a uniform tleaf grid at
+* the start of each run and linearly interpolated instead. The grid is
+* halved until the largest relative error at the interval midpoints is
+* within temp_response_tol; leaf temperatures outside TR_TMIN-TR_TMAX use the
+* exact functions. Run with --check-temp-response to see the deviation from
+* the exact path for a given param file.
+*
+* The Vcmax and Jmax columns hold the response to a unit rate at the
+* reference temperature, so that one table serves every canopy layer.
+*
+* =========================================================================== */
+#include "temp_response.h"
+
+static void exact_temp_response(params *p, double tleaf, double *values) {
+    /* the functions being tabulated, as photosynthesis_C3 works them out */
+
+    double tref = p->measurement_temp;
+
+    values[TR_GAMMA_STAR] = calc_co2_compensation_point(p, tleaf);
+    values[TR_KM] = calculate_michaelis_menten(p, tleaf);
+    values[TR_VCMAX] = arrhenius(1.0, p->eav, tleaf, tref);
+    values[TR_JMAX] = peaked_arrhenius(1.0, p->eaj, tleaf, tref, p->delsj,
+                                       p->edj);
+
+    return;
+}
+
+static double fill_temp_response(temp_response *tr, params *p, double step) {
+    /*
+        Tabulate at the given spacing, returning the largest relative error
+        of the interpolation at the interval midpoints
+    */
+    double exact[TR_NVALUES], interp[TR_NVALUES];
+    double err, max_err = 0.0;
+    long   i;
+    int    k;
+
+    tr->n = (long)((TR_TMAX - TR_TMIN) / step + 0.5) + 1;
+    tr->step = step;
+    tr->inv_step = 1.0 / step;
+    tr->values = (double *)realloc(tr->values,
+                                   tr->n * TR_NVALUES * sizeof(double));
+    if (tr->values == NULL) {
+        fprintf(stderr, "Error allocating space for temperature responses\n");
+        exit(EXIT_FAILURE);
+    }
+
+    for (i = 0; i < tr->n; i++)
+        exact_temp_response(p, TR_TMIN + i * step, tr->values + i * TR_NVALUES);
+
+    for (i = 0; i < tr->n - 1; i++) {
+        exact_temp_response(p, TR_TMIN + (i + 0.5) * step, exact);
+        temp_response_at(tr, TR_TMIN + (i + 0.5) * step, interp);
+        for (k = 0; k < TR_NVALUES; k++) {
+            if (exact[k] == 0.0)
+                continue;
+            err = fabs(interp[k] - exact[k]) / fabs(exact[k]);
+            if (err > max_err)
+                max_err = err;
+        }
+    }
+
+    return max_err;
+}
+
+void build_temp_response(canopy_wk *cw, control *c, params *p) {
+    /*
+        (Re)build cw->tresp for the current parameters, or drop it if the
+        table isn't wanted. Called at the start of every run, as the
+        parameters may have changed.
+    */
+    temp_response *tr;
+    double step, err;
+
+    free_temp_response(cw);
+    if (!c->temp_response_table)
+        return;
+
+    if (c->temp_response_tol <= 0.0) {
+        fprintf(stderr, "temp_response_tol must be > 0, got %g\n",
+                c->temp_response_tol);
+        exit(EXIT_FAILURE);
+    }
+
+    if ((tr = (temp_response *)calloc(1, sizeof(temp_response))) == NULL) {
+        fprintf(stderr, "Error allocating space for temperature responses\n");
+        exit(EXIT_FAILURE);
+    }
+
+    for (step = TR_MAX_STEP; ; step *= 0.5) {
+        err = fill_temp_response(tr, p, step);
+        if (err <= c->temp_response_tol)
+            break;
+        if (step * 0.5 < TR_MIN_STEP) {
+            fprintf(stderr, "temp_response_tol = %g can't be met, the finest "
+                            "grid (%g deg C) is out by %g\n",
+                    c->temp_response_tol, step, err);
+            exit(EXIT_FAILURE);
+        }
+    }
+    cw->tresp = tr;
+
+    return;
+}
+
+void free_temp_response(canopy_wk *cw) {
+    if (cw->tresp != NULL) {
+        free(cw->tresp->values);
+        free(cw->tresp);
+        cw->tresp = NULL;
+    }
+
+    return;
+}
+
+int temp_response_at(const temp_response *tr, double tleaf, double *values) {
+    /*
+        Linear interpolation in the table. Returns FALSE, leaving values
+        alone, if tleaf is outside it.
+    */
+    const double *lo;
+    double x, w;
+    long   i;
+    int    k;
+
+    x = (tleaf - TR_TMIN) * tr->inv_step;
+    if (!(x >= 0.0 && x < tr->n - 1))
+        return FALSE;
+    i = (long)x;
+    w = x - i;
+    lo = tr->values + i * TR_NVALUES;
+    for (k = 0; k < TR_NVALUES; k++)
+        values[k] = lo[k] + w * (lo[k + TR_NVALUES] - lo[k]);
+
+    return TRUE;
+}
+
+void temp_response_batch(const temp_response *tr, long n, const double *tleaf,
+                         double *gamma_star, double *km, double *vcmax,
+                         double *jmax, int *outside) {
+    /*
+        temp_response_at for n leaf temperatures, a value to each array,
+        without branches. outside[i] is set TRUE where tleaf[i] is off the
+        table, and the values there are meaningless.
+    */
+    const double *lo;
+    double x, w;
+    long   i, j;
+
+    for (i = 0; i < n; i++) {
+        x = (tleaf[i] - TR_TMIN) * tr->inv_step;
+        outside[i] = !(x >= 0.0 && x < tr->n - 1);
+        j = outside[i] ? 0 : (long)x;
+        w = x - j;
+        lo = tr->values + j * TR_NVALUES;
+        gamma_star[i] = lo[TR_GAMMA_STAR] + w * (lo[TR_GAMMA_STAR + TR_NVALUES]
+                                                 - lo[TR_GAMMA_STAR]);
+        km[i] = lo[TR_KM] + w * (lo[TR_KM + TR_NVALUES] - lo[TR_KM]);
+        vcmax[i] = lo[TR_VCMAX] + w * (lo[TR_VCMAX + TR_NVALUES] -
+                                       lo[TR_VCMAX]);
+        jmax[i] = lo[TR_JMAX] + w * (lo[TR_JMAX + TR_NVALUES] - lo[TR_JMAX]);
+    }
+
+    return;
+}
+
+void check_temp_response(FILE *fp, control *c, params *p) {
+    /*
+        --check-temp-response: build the table for these parameters and
+        report the largest deviation of each tabulated value from the exact
+        functions, sampling every interval 16 times.
+    */
+    const char *names[TR_NVALUES] = {"gamma_star", "km", "vcmax", "jmax"};
+    double exact[TR_NVALUES], interp[TR_NVALUES];
+    double max_abs[TR_NVALUES] = {0.0}, max_rel[TR_NVALUES] = {0.0};
+    double at[TR_NVALUES] = {0.0};
+    double tleaf, dev;
+    canopy_wk cw;
+    long   i, nsamples;
+    int    k, use_table = c->temp_response_table;
+
+    cw.tresp = NULL;
+    c->temp_response_table = TRUE;
+    build_temp_response(&cw, c, p);
+    c->temp_response_table = use_table;
+
+    nsamples = (cw.tresp->n - 1) * 16;
+    for (i = 0; i < nsamples; i++) {
+        tleaf = TR_TMIN + (i + 0.5) * cw.tresp->step / 16.0;
+        exact_temp_response(p, tleaf, exact);
+        temp_response_at(cw.tresp, tleaf, interp);
+        for (k = 0; k < TR_NVALUES; k++) {
+            dev = fabs(interp[k] - exact[k]);
+            if (dev > max_abs[k])
+                max_abs[k] = dev;
+            if (exact[k] != 0.0 && dev / fabs(exact[k]) > max_rel[k]) {
+                max_rel[k] = dev / fabs(exact[k]);
+                at[k] = tleaf;
+            }
+        }
+    }
+
+    fprintf(fp, "temperature response table: %ld points, %g to %g deg C "
+                "every %g deg C (temp_response_tol = %g)\n", cw.tresp->n,
+            TR_TMIN, TR_TMAX, cw.tresp->step, c->temp_response_tol);
+    fprintf(fp, "%-12s %14s %14s %10s\n", "value", "max abs dev",
+            "max rel dev", "at tleaf");
+    for (k = 0; k < TR_NVALUES; k++)
+        fprintf(fp, "%-12s %14.6e %14.6e %10.4f\n", names[k], max_abs[k],
+                max_rel[k], at[k]);
+    fprintf(fp, "(vcmax and jmax relative to their value at "
+                "measurement_temp)\n");
+
+    free_temp_response(&cw);
+
+    return;
+}
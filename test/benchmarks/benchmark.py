@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+
+"""
+Benchmark suite for canopy_scaling.
+
+Generates synthetic forcing of 1, 10 and 100 years, daily (MATE) and
+half-hourly (two-leaf), and times each stage of a run separately through
+libcanopy (make lib):
+
+    read_met       read_daily_met_data / read_subdaily_met_data
+    solar_arrays   fill_up_solar_arrays (nothing to do for MATE)
+    run_sim        the model itself, into memory
+    output         writing the daily output (--out-format)
+    process        a whole canopy_scaling run, cfg to output file (--exe)
+
+Each stage is timed --repeat times and the best and median times are
+written as JSON along with the machine, the build and the settings. Given
+a --baseline (a results file from an earlier run), every stage is
+compared with it (on the standard error) and the script exits non-zero
+if any is slower by more than --threshold, ignoring differences below
+--noise seconds.
+
+    ./benchmark.py -o before.json
+    ... change things, make && make lib ...
+    ./benchmark.py --baseline before.json -o after.json
+
+The forcing is deterministic (--seed) and kept in --work-dir, so it is
+only written the first time.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import calendar
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "simulations"))
+sys.path.insert(0, os.path.join(HERE, "..", "met_data"))
+import libcanopy
+from binary_met import write_binary_met
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+ROOT = os.path.join(HERE, "..", "..")
+CFG_FNAME = os.path.join(ROOT, "params", "base_start.cfg")
+EXE = os.path.join(ROOT, "canopy_scaling")
+
+STAGES = ["read_met", "solar_arrays", "run_sim", "output", "process"]
+START_YEAR = 2001
+
+# the EucFACE set up of run_simulations.py
+SITE_PARAMS = {"latitude": "-35.6566", "longitude": "148.152",
+               "fix_lai": "1.2", "g1": "3.8667", "jmax": "55.0",
+               "vcmax": "110.0", "jmaxna": "110.0", "vcmaxna": "55.0",
+               "sla": "4.37", "slamax": "4.37", "slazero": "4.37"}
+SITE_CONTROL = {"fixed_lai": "true", "ncycle": "false",
+                "water_stress": "false", "output_ascii": "true",
+                "print_options": "daily"}
+ALPHA_J = {"mate": "0.26", "twoleaf": "0.308"}
+
+DAILY_VARS = ["year", "doy", "tair", "rain", "tsoil", "tam", "tpm", "tmin",
+              "tmax", "tday", "vpd_am", "vpd_pm", "co2", "ndep", "nfix",
+              "wind", "pres", "wind_am", "wind_pm", "par_am", "par_pm"]
+SUBDAILY_VARS = ["year", "doy", "hod", "rain", "par", "tair", "tsoil", "vpd",
+                 "co2", "ndep", "nfix", "wind", "press"]
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    clock = time.time
+
+def make_forcing(nyears, sub_daily, seed=0):
+    """ Synthetic forcing: a seasonal and (half-hourly) diurnal cycle with
+    some day to day noise.
+
+    Parameters:
+    ----------
+    nyears : int
+        years of forcing, from START_YEAR
+    sub_daily : logical
+        half-hourly (two-leaf) rather than daily (MATE) forcing
+    seed : int
+        random seed for the noise
+
+    Returns:
+    --------
+    (names, columns, num_years) : tuple
+        variable names and one array per variable
+
+    """
+    rng = np.random.RandomState(seed)
+    years = np.concatenate([np.repeat(float(yr),
+                                      366 if calendar.isleap(yr) else 365)
+                            for yr in range(START_YEAR, START_YEAR + nyears)])
+    doy = np.concatenate([np.arange(1.0, (366 if calendar.isleap(yr) else
+                                          365) + 1.0)
+                          for yr in range(START_YEAR, START_YEAR + nyears)])
+    ndays = len(doy)
+
+    # southern hemisphere: warmest and brightest at the start of the year
+    season = np.cos(2.0 * np.pi * (doy - 15.0) / 365.25)
+    tday = 15.0 + 6.0 * season + rng.normal(0.0, 2.0, ndays)
+    vpd = np.maximum(0.1, 1.2 + 0.6 * season + rng.normal(0.0, 0.2, ndays))
+    cloud = rng.uniform(0.6, 1.0, ndays)
+    rain = rng.exponential(2.0, ndays) * (rng.uniform(size=ndays) < 0.3)
+
+    if not sub_daily:
+        par = 6.0 * (1.0 + 0.4 * season) * cloud   # MJ m-2 half a day
+        columns = [years, doy, tday, rain, tday, tday - 2.5, tday + 2.5,
+                   tday - 6.0, tday + 6.0, tday, vpd * 0.8, vpd * 1.2,
+                   np.full(ndays, 400.0), np.full(ndays, -999.9),
+                   np.full(ndays, -999.9), np.full(ndays, 1.5),
+                   np.full(ndays, 101.3), np.full(ndays, 1.4),
+                   np.full(ndays, 1.6), par, par]
+        return (DAILY_VARS, columns, nyears)
+
+    hod = np.tile(np.arange(48.0), ndays)
+    hour = hod / 2.0
+    sun = np.maximum(0.0, np.sin(np.pi * (hour - 6.0) / 12.0))
+    diurnal = np.cos(2.0 * np.pi * (hour - 15.0) / 24.0)
+    par = (np.repeat(1800.0 * (1.0 + 0.2 * season) * cloud, 48) * sun)
+    tair = np.repeat(tday, 48) + 5.0 * diurnal
+    half_vpd = np.maximum(0.05, np.repeat(vpd, 48) * (1.0 + 0.5 * diurnal))
+    n = len(hod)
+    columns = [np.repeat(years, 48), np.repeat(doy, 48), hod,
+               np.repeat(rain / 48.0, 48), par, tair, np.repeat(tday, 48),
+               half_vpd, np.full(n, 400.0), np.full(n, -999.9),
+               np.full(n, -999.9), np.full(n, 1.5), np.full(n, 101.3)]
+
+    return (SUBDAILY_VARS, columns, nyears)
+
+def forcing_file(work_dir, model, nyears, met_format="csv", seed=0):
+    """ Name of the forcing file for a case, written if it isn't there """
+    ext = "bin" if met_format == "binary" else "csv"
+    fname = os.path.join(work_dir, "%s_%dyr_seed%d.%s" % (model, nyears,
+                                                          seed, ext))
+    if os.path.exists(fname):
+        return fname
+
+    (names, columns, num_years) = make_forcing(nyears, model == "twoleaf",
+                                               seed)
+    tmp_fname = fname + ".tmp"
+    if met_format == "binary":
+        write_binary_met(tmp_fname, names, columns, num_years,
+                         48 if model == "twoleaf" else 1)
+    else:
+        header = "\n".join(["# synthetic %s forcing, %d years, seed %d" % \
+                            (model, nyears, seed),
+                            "# written by benchmark.py", "#",
+                            "#" + ",".join(names)])
+        np.savetxt(tmp_fname, np.column_stack(columns), fmt="%.6g",
+                   delimiter=",", header=header, comments="")
+    os.rename(tmp_fname, fname)
+
+    return fname
+
+def case_settings(model):
+    """ (section, key, value) settings for a model on top of the cfg """
+    settings = [("params", k, v) for (k, v) in sorted(SITE_PARAMS.items())]
+    settings += [("control", k, v) for (k, v) in sorted(SITE_CONTROL.items())]
+    settings.append(("params", "alpha_j", ALPHA_J[model]))
+    settings.append(("control", "sub_daily",
+                     "true" if model == "twoleaf" else "false"))
+
+    return settings
+
+def time_stages(lib, cfg_fname, model, met_fname, out_fname, exe=None,
+                repeat=3):
+    """ Time each stage of a run repeat times.
+
+    Returns:
+    --------
+    times : dictionary
+        stage name -> list of wall times (s)
+    ndays : int
+        days simulated
+
+    """
+    times = dict((stage, []) for stage in STAGES)
+    settings = case_settings(model)
+
+    mod = libcanopy.CanopyModel(cfg_fname, lib=lib)
+    try:
+        for (section, key, value) in settings:
+            mod.set_param(key, value, section=section)
+
+        for i in range(repeat):
+            t0 = clock()
+            mod.load_met_file(met_fname)
+            t1 = clock()
+            mod.prepare()
+            t2 = clock()
+            out = mod.run()
+            t3 = clock()
+            mod.write_results(out_fname)
+            t4 = clock()
+            for (stage, t) in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2,
+                                           t4 - t3)):
+                times[stage].append(t)
+        ndays = len(out["gpp"])
+    finally:
+        mod.close()
+
+    if exe is not None:
+        cmd = [exe, "-p", cfg_fname,
+               "--set", "files.met_fname=%s" % (met_fname)]
+        for (section, key, value) in settings:
+            cmd += ["--set", "%s.%s=%s" % (section, key, value)]
+        for i in range(repeat):
+            with open(out_fname, "w") as f:
+                t0 = clock()
+                subprocess.check_call(cmd, stdout=f, stderr=subprocess.PIPE)
+                times["process"].append(clock() - t0)
+
+    return (times, ndays)
+
+def machine_info():
+    """ What the numbers were measured on """
+    info = {"hostname": platform.node(), "system": platform.system(),
+            "release": platform.release(), "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "python": platform.python_version(), "numpy": np.__version__}
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    info["processor"] = line.split(":", 1)[1].strip()
+                    break
+    except IOError:
+        pass
+    if hasattr(os, "getloadavg"):
+        info["load_average"] = os.getloadavg()[0]
+
+    return info
+
+def build_info(lib_fname, exe):
+    """ The commit the tree is at, and whether it has local changes """
+    info = {"lib": os.path.abspath(lib_fname),
+            "exe": os.path.abspath(exe) if exe is not None else None}
+    try:
+        info["git_sha"] = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT,
+            stderr=subprocess.PIPE).decode().strip()
+        info["dirty"] = subprocess.check_output(
+            ["git", "status", "--porcelain", "-uno"], cwd=ROOT,
+            stderr=subprocess.PIPE).decode().strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        info["git_sha"] = None
+
+    return info
+
+def compare(results, baseline, threshold=0.1, noise=0.002):
+    """ Compare the best times with those of a baseline results file.
+
+    Parameters:
+    ----------
+    results, baseline : dictionary
+        as written by main
+    threshold : float
+        fractional slowdown counted as a regression
+    noise : float
+        differences smaller than this (s) are never counted
+
+    Returns:
+    --------
+    rows : list
+        (model, years, stage, baseline s, now s, ratio, regressed) for
+        every stage in both
+
+    """
+    old = dict(((r["model"], r["years"], r["stage"]), r["min"])
+               for r in baseline["results"])
+    rows = []
+    for r in results["results"]:
+        key = (r["model"], r["years"], r["stage"])
+        if key not in old:
+            continue
+        ratio = r["min"] / old[key] if old[key] > 0.0 else float("inf")
+        regressed = (r["min"] > old[key] * (1.0 + threshold) and
+                     r["min"] - old[key] > noise)
+        rows.append(key + (old[key], r["min"], ratio, regressed))
+
+    return rows
+
+def main(years=(1, 10, 100), models=("mate", "twoleaf"), repeat=3,
+         cfg_fname=CFG_FNAME, lib_fname=libcanopy.LIB_FNAME, exe=EXE,
+         work_dir=None, met_format="csv", out_format="csv", seed=0):
+
+    if work_dir is None:
+        work_dir = os.path.join(tempfile.gettempdir(), "canopy_benchmark")
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    if exe is not None and not os.path.exists(exe):
+        sys.stderr.write("%s not found, skipping the process stage\n" % exe)
+        exe = None
+    lib = libcanopy.load_library(lib_fname)
+
+    out_dir = tempfile.mkdtemp()
+    rows = []
+    try:
+        for model in models:
+            for nyears in years:
+                met_fname = forcing_file(work_dir, model, nyears, met_format,
+                                         seed)
+                out_fname = os.path.join(out_dir, "out.%s" % (out_format))
+                (times, ndays) = time_stages(lib, cfg_fname, model,
+                                             met_fname, out_fname, exe,
+                                             repeat)
+                for stage in STAGES:
+                    if not times[stage]:
+                        continue
+                    rows.append({"model": model, "years": nyears,
+                                 "days": ndays, "stage": stage,
+                                 "min": min(times[stage]),
+                                 "median": float(np.median(times[stage])),
+                                 "times": times[stage]})
+                    sys.stderr.write("%-8s %4d yr %-13s %10.4f s\n" % \
+                                     (model, nyears, stage,
+                                      min(times[stage])))
+    finally:
+        shutil.rmtree(out_dir)
+
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "machine": machine_info(), "build": build_info(lib_fname, exe),
+            "settings": {"repeat": repeat, "cfg": os.path.abspath(cfg_fname),
+                         "met_format": met_format, "out_format": out_format,
+                         "seed": seed},
+            "results": rows}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--models", nargs="+", default=["mate", "twoleaf"],
+                        choices=["mate", "twoleaf"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cfg", default=CFG_FNAME)
+    parser.add_argument("--lib", default=libcanopy.LIB_FNAME)
+    parser.add_argument("--exe", default=EXE,
+                        help="canopy_scaling for the process stage, "
+                             "'none' to skip it")
+    parser.add_argument("--work-dir", default=None,
+                        help="where the forcing is kept")
+    parser.add_argument("--met-format", default="csv",
+                        choices=["csv", "binary"])
+    parser.add_argument("--out-format", default="csv",
+                        choices=["csv", "npy", "bin"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results here (JSON), else stdout")
+    parser.add_argument("--baseline", default=None,
+                        help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--noise", type=float, default=0.002)
+    args = parser.parse_args()
+
+    exe = None if args.exe.lower() == "none" else args.exe
+    results = main(years=args.years, models=args.models, repeat=args.repeat,
+                   cfg_fname=args.cfg, lib_fname=args.lib, exe=exe,
+                   work_dir=args.work_dir, met_format=args.met_format,
+                   out_format=args.out_format, seed=args.seed)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    ok = True
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for (what, keys) in (("settings", ("met_format", "out_format",
+                                           "repeat", "seed", "cfg")),
+                             ("machine", ("hostname", "processor"))):
+            for k in keys:
+                if baseline[what].get(k) != results[what].get(k):
+                    sys.stderr.write("warning: baseline %s %s is %s, "
+                                     "now %s\n" % (what, k,
+                                                   baseline[what].get(k),
+                                                   results[what].get(k)))
+        rows = compare(results, baseline, args.threshold, args.noise)
+        sys.stderr.write("%-8s %5s %-13s %10s %10s %7s\n" % \
+                         ("model", "years", "stage", "baseline", "now",
+                          "ratio"))
+        for (model, nyears, stage, old, new, ratio, regressed) in rows:
+            sys.stderr.write("%-8s %5d %-13s %10.4f %10.4f %7.3f%s\n" % \
+                             (model, nyears, stage, old, new, ratio,
+                              "  SLOWER" if regressed else ""))
+        ok = not any(row[-1] for row in rows)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+Read/write the binary met forcing format understood by canopy_scaling.
+
+The layout (little-endian) is a 32 byte header, a block of 16 byte variable
+names and then one contiguous float64 column per variable:
+
+    char    magic[8]          "CSMETBIN"
+    int32   version
+    int32   nvars
+    int64   ntimesteps
+    int32   num_years
+    int32   steps_per_day     1 (daily) or 48 (sub-daily)
+    char    names[nvars][16]
+    float64 data[nvars][ntimesteps]
+
+canopy_scaling memory-maps this straight into its met arrays, so a forcing
+that is reused across many runs is never parsed as text.
+
+That's all folks.
+"""
+__author__ = "Martin De Kauwe"
+__version__ = "1.0 (17.01.2017)"
+__email__ = "mdekauwe@gmail.com"
+
+import struct
+import numpy as np
+
+MAGIC = b"CSMETBIN"
+VERSION = 1
+HEADER_FMT = "<8siiqii"
+NAME_LEN = 16
+
+
+class BinaryMetWriter(object):
+    """ Write a binary met file, optionally a block of rows at a time """
+
+    def __init__(self, ofname, var_names, ntimesteps, num_years,
+                 steps_per_day):
+
+        self.var_names = [var.lstrip("#") for var in var_names]
+        self.ntimesteps = ntimesteps
+        for var in self.var_names:
+            if len(var) >= NAME_LEN:
+                raise ValueError('Variable name too long: "%s"' % var)
+
+        try:
+            self.ofp = open(ofname, 'wb')
+        except IOError:
+            raise IOError('Could not write met file: "%s"' % ofname)
+
+        self.ofp.write(struct.pack(HEADER_FMT, MAGIC, VERSION,
+                                   len(self.var_names), ntimesteps,
+                                   num_years, steps_per_day))
+        for var in self.var_names:
+            self.ofp.write(var.encode("ascii").ljust(NAME_LEN, b"\0"))
+        self.data_start = self.ofp.tell()
+
+        # size the file up front so blocks can be dropped into any column
+        self.ofp.truncate(self.data_start +
+                          len(self.var_names) * ntimesteps * 8)
+
+    def write(self, columns, row0=0):
+        """ Write one block of rows, columns in var_names order """
+        if len(columns) != len(self.var_names):
+            raise ValueError("Expected %d columns, got %d" % \
+                             (len(self.var_names), len(columns)))
+
+        for j, col in enumerate(columns):
+            col = np.ascontiguousarray(col, dtype="<f8")
+            if row0 + len(col) > self.ntimesteps:
+                raise ValueError("Block runs past the end of the file")
+            self.ofp.seek(self.data_start + (j * self.ntimesteps + row0) * 8)
+            self.ofp.write(col.tobytes())
+
+    def close(self):
+        self.ofp.close()
+
+
+def write_binary_met(ofname, var_names, columns, num_years, steps_per_day):
+    """ Write a whole forcing file in one go
+
+    Parameters:
+    ----------
+    ofname : string
+        output filename
+    var_names : list
+        variable names, a leading '#' (as in the CSV header) is dropped
+    columns : list
+        one array per variable, all the same length
+    num_years : int
+        number of years in the forcing
+    steps_per_day : int
+        1 for the daily MATE forcing, 48 for half-hourly
+
+    """
+    wr = BinaryMetWriter(ofname, var_names, len(columns[0]), num_years,
+                         steps_per_day)
+    wr.write(columns)
+    wr.close()
+
+
+def read_binary_met(fname):
+    """ Memory-map a binary met file
+
+    Returns:
+    --------
+    header : dictionary
+        num_years, steps_per_day and ntimesteps
+    data : dictionary
+        read-only array for each variable
+
+    """
+    with open(fname, 'rb') as fp:
+        header = fp.read(struct.calcsize(HEADER_FMT))
+        (magic, version, nvars, ntimesteps,
+         num_years, steps_per_day) = struct.unpack(HEADER_FMT, header)
+        if magic != MAGIC:
+            raise IOError('Not a binary met file: "%s"' % fname)
+        if version != VERSION:
+            raise IOError('Unsupported binary met version %d: "%s"' % \
+                          (version, fname))
+        names = [fp.read(NAME_LEN).rstrip(b"\0").decode("ascii") \
+                 for i in range(nvars)]
+        offset = fp.tell()
+
+    block = np.memmap(fname, dtype="<f8", mode="r", offset=offset,
+                      shape=(nvars, ntimesteps))
+    data = dict((var, block[j]) for j, var in enumerate(names))
+    header = {"num_years": num_years, "steps_per_day": steps_per_day,
+              "ntimesteps": ntimesteps}
+
+    return header, data
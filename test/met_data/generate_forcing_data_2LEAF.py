@@ -22,6 +22,7 @@ try:
 except ImportError:
     from io import StringIO
 import datetime as dt
+from binary_met import BinaryMetWriter
 
 
 class CreateMetData(object):
@@ -47,14 +48,48 @@ class CreateMetData(object):
         self.SW_2_PAR = 2.3
 
 
-    def main(self, ofname, scheme, co2_conc=None):
-
-        df = pd.read_csv(self.fname, sep=" ")
-
-        yr_sequence = np.unique(df.year)
+    def main(self, ofname, scheme, co2_conc=None, chunksize=None,
+             binary=False):
+        """ Write the 30 min forcing file
+
+        Parameters:
+        ----------
+        ofname : string
+            output forcing filename
+        scheme : string
+            mate or twoleaf
+        co2_conc : float
+            fix CO2 to this value, otherwise use the elevated treatment
+        chunksize : int
+            if set, the met file is read and written this many half-hours at
+            a time, which keeps memory flat for multi-decade records
+        binary : logical
+            write the binary met format (see binary_met.py) rather than CSV
+
+        """
+        if chunksize is None:
+            df = pd.read_csv(self.fname, sep=" ")
+            years = df.year
+        else:
+            years = pd.read_csv(self.fname, sep=" ", usecols=["year"]).year
+        yr_sequence = np.unique(years)
         start_sim = yr_sequence[0]
         end_sim = yr_sequence[-1]
 
+        if binary:
+            wr = BinaryMetWriter(ofname, self.ovar_names, len(years),
+                                 num_years=len(yr_sequence), steps_per_day=48)
+            if chunksize is None:
+                wr.write(self.forcing_columns(df, co2_conc))
+            else:
+                row0 = 0
+                for chunk in pd.read_csv(self.fname, sep=" ",
+                                         chunksize=chunksize):
+                    wr.write(self.forcing_columns(chunk, co2_conc), row0)
+                    row0 += len(chunk)
+            wr.close()
+            return
+
         try:
             ofp = open(ofname, 'wb')
             wr = csv.writer(ofp, delimiter=',', quoting=csv.QUOTE_NONE,
@@ -68,25 +103,56 @@ class CreateMetData(object):
         except IOError:
             raise IOError('Could not write met file: "%s"' % ofname)
 
-
-        for i in range(len(df)):
-            if co2_conc is not None:
-                co2 = co2_conc
-            else:
-                #co2 = df.co2[i]
-                co2 = 390 * 1.3
-
-            if df.vpd[i] < 0.05:
-                vpd = 0.05
-            else:
-                vpd = df.vpd[i]
-            wr.writerow([float(df.year[i]), float(df.doy[i]), float(df.hod[i]),\
-                         df.rain[i],df.par[i], df.tair[i], df.tsoil[i], vpd,\
-                         co2, -999.9, -999.9, df.wind[i],\
-                         df.press[i]])
+        if chunksize is None:
+            self.write_block(wr, df, co2_conc)
+        else:
+            for chunk in pd.read_csv(self.fname, sep=" ",
+                                     chunksize=chunksize):
+                self.write_block(wr, chunk, co2_conc)
 
         ofp.close()
 
+    def forcing_columns(self, df, co2_conc=None):
+        """ Build the 13 forcing columns, in ovar_names order, as arrays
+
+        Parameters:
+        ----------
+        df : DataFrame
+            block of 30 min met data
+        co2_conc : float
+            fix CO2 to this value, otherwise use the elevated treatment
+
+        Returns:
+        --------
+        columns : list
+            one array per output variable
+
+        """
+        n = len(df)
+
+        if co2_conc is not None:
+            co2 = co2_conc
+        else:
+            #co2 = df.co2
+            co2 = 390 * 1.3
+
+        vpd = df.vpd.values
+        vpd = np.where(vpd < 0.05, 0.05, vpd)
+
+        return [df.year.values.astype(float), df.doy.values.astype(float),
+                df.hod.values.astype(float), df.rain.values, df.par.values,
+                df.tair.values, df.tsoil.values, vpd, np.full(n, co2),
+                np.full(n, -999.9), np.full(n, -999.9), df.wind.values,
+                df.press.values]
+
+    def write_block(self, wr, df, co2_conc=None):
+        """ Write a block of half-hours with a single writerows call """
+        columns = self.forcing_columns(df, co2_conc)
+
+        # tolist() hands csv plain python floats, so the text matches what
+        # writing each half-hour on its own produced
+        wr.writerows(zip(*[col.tolist() for col in columns]))
+
 
 if __name__ == "__main__":
 
@@ -22,6 +22,8 @@ try:
 except ImportError:
     from io import StringIO
 import datetime as dt
+import warnings
+from binary_met import write_binary_met
 
 
 class CreateMetData(object):
@@ -51,17 +53,36 @@ class CreateMetData(object):
         self.SW_2_PAR = 2.3
 
 
-    def main(self, ofname, scheme, co2_conc=None):
-        SEC_TO_HFHR = 60.0 * 30.0 # sec/half hr
-        J_TO_UMOL = 4.57
-        UMOL_TO_J = 1.0 / J_TO_UMOL
-        J_TO_MJ = 1.0E-6
+    def main(self, ofname, scheme, co2_conc=None, binary=False):
+        """ Write the daily forcing file
+
+        Parameters:
+        ----------
+        ofname : string
+            output forcing filename
+        scheme : string
+            mate or twoleaf
+        co2_conc : float
+            fix CO2 to this value, otherwise use the elevated treatment
+        binary : logical
+            write the binary met format (see binary_met.py) rather than CSV
+
+        """
         df = pd.read_csv(self.fname, sep=" ")
 
         yr_sequence = np.unique(df.year)
         start_sim = yr_sequence[0]
         end_sim = yr_sequence[-1]
 
+        daily = self.aggregate_to_daily(df, start_sim, end_sim, co2_conc)
+
+        if binary:
+            write_binary_met(ofname, self.ovar_names,
+                             [daily[var] for var in self.ovar_names],
+                             num_years=end_sim - start_sim + 1,
+                             steps_per_day=1)
+            return
+
         try:
             ofp = open(ofname, 'wb')
             wr = csv.writer(ofp, delimiter=',', quoting=csv.QUOTE_NONE,
@@ -75,91 +96,135 @@ class CreateMetData(object):
         except IOError:
             raise IOError('Could not write met file: "%s"' % ofname)
 
-        for yr in range(start_sim, end_sim + 1):
-
-            if calendar.isleap(yr):
-                ndays = 366
-            else:
-                ndays = 365
-
-            for d in range(1, ndays + 1):
-
-                days_data = df[(df.year == yr) & (df.doy == d)]
-
-                morning = days_data[(days_data.hod < 11) &
-                                    (days_data.hod < 24)]
-                afternoon = days_data[(days_data.hod >= 24) &
-                                      (days_data.hod < 37)]
-
-                tair = np.mean(np.hstack((morning["tair"], \
-                                           afternoon["tair"])))
-
-                tam = np.mean(morning["tair"])
-                tpm = np.mean(afternoon["tair"])
-
-                tsoil = np.mean(days_data["tair"])
-
-                # daytime min/max temp
-                tmin = np.min(days_data["tair"])
-                tmax = np.max(days_data["tair"])
-                tday = np.mean(days_data["tair"])
-
-                if len(morning) == 0:
-                    vpd_am = 0.05
-                else:
-                    vpd_am = np.mean(morning.vpd)
-                    if vpd_am < 0.05:
-                        vpd_am = 0.05
-
-                if len(afternoon) == 0:
-                    vpd_pm = 0.05
-                else:
-                    vpd_pm = np.mean(afternoon.vpd)
-                    if vpd_pm < 0.05:
-                        vpd_pm = 0.05
-
-
-                # convert PAR [umol m-2 s-1] -> mj m-2 30min-1
-                conv = UMOL_TO_J * J_TO_MJ * SEC_TO_HFHR
-                par_am = np.sum(morning.par * conv)
-                par_pm = np.sum(afternoon.par * conv)
-
-                # rain -> mm
-                # coversion 1800 seconds to half hours and summed gives day value.
-                # Going to use the whole day including the night data
-                rain = np.sum(days_data.rain)
-
-                # wind speed -> m/s
-                wind = np.mean(np.hstack((morning.wind, afternoon.wind)))
-
-                # odd occasions whne there is no data, so set a very small wind speed.
-                wind_am = np.mean(morning.wind)
-                if len(morning.wind) == 0:
-                    wind_am = 0.1
-                wind_pm = np.mean(afternoon.wind)
-                if len(afternoon.wind) == 0:
-                    wind_pm = 0.1
-
-                # air pressure -> kPa
-                press = 101.32
-
-
-                if co2_conc is not None:
-                    co2 = co2_conc
-                else:
-                    #co2 = np.mean(np.hstack((morning["co2"], \
-                    #                         afternoon["co2"])))
-                    #co22 = np.median(np.hstack((morning["co2"], \
-                    #                         afternoon["co2"])))
-
-                    co2 = 390 * 1.3
-
-                wr.writerow([yr, d, tair, rain, tsoil, tam, tpm, tmin, tmax,\
-                             tday, vpd_am, vpd_pm, co2, -999.9, -999.9, wind, \
-                             press, wind_am, wind_pm, par_am, par_pm])
+        # one bulk write, tolist() hands csv plain python ints/floats so the
+        # text is identical to writing the rows one day at a time
+        wr.writerows(zip(*[daily[var].tolist() for var in self.ovar_names]))
 
         ofp.close()
 
+    def aggregate_to_daily(self, df, start_sim, end_sim, co2_conc=None):
+        """ Aggregate the 30 min met data to the daily MATE forcing in one pass
+
+        Each half-hour is scattered into a (ndays, 48) grid using its position
+        in the calendar, so every daily column comes from a single reduction
+        along the rows rather than re-filtering the frame for every day. Days
+        are laid out from 1 Jan start_sim to 31 Dec end_sim.
+
+        Parameters:
+        ----------
+        df : DataFrame
+            30 min met data, must have year, doy and hod (0-47) columns.
+        start_sim : int
+            first year of the forcing
+        end_sim : int
+            last year of the forcing
+        co2_conc : float
+            fix CO2 to this value, otherwise use the elevated treatment
+
+        Returns:
+        --------
+        daily : dictionary
+            daily forcing columns keyed by the output variable names
+
+        """
+        SEC_TO_HFHR = 60.0 * 30.0 # sec/half hr
+        J_TO_UMOL = 4.57
+        UMOL_TO_J = 1.0 / J_TO_UMOL
+        J_TO_MJ = 1.0E-6
+        NHLFHRS = 48
+
+        years = np.arange(start_sim, end_sim + 1)
+        ndays_in_yr = np.array([366 if calendar.isleap(yr) else 365 \
+                                for yr in years])
+        yr_offset = np.concatenate(([0], np.cumsum(ndays_in_yr)[:-1]))
+        ndays = np.sum(ndays_in_yr)
+
+        # position of every half-hour in the (day, hod) grid
+        day_idx = (yr_offset[df.year.values - start_sim] +
+                   df.doy.values.astype(int) - 1)
+        hod = df.hod.values.astype(int)
+
+        def to_grid(var):
+            grid = np.full((ndays, NHLFHRS), np.nan)
+            grid[day_idx, hod] = df[var].values
+            return grid
+
+        def period(grid, hrs):
+            # keep each day contiguous so the row reductions sum in the same
+            # order as np.mean/np.sum did on a single day's data
+            return np.ascontiguousarray(grid[:, hrs])
+
+        # same periods as always: am is hod < 11, pm is 24 <= hod < 37
+        hours = np.arange(NHLFHRS)
+        am = hours < 11
+        pm = (hours >= 24) & (hours < 37)
+        am_pm = am | pm
+
+        tair = to_grid("tair")
+        vpd = to_grid("vpd")
+        par = to_grid("par")
+        rain = to_grid("rain")
+        wind = to_grid("wind")
+
+        # np.nanmean etc warn on days without any am/pm data, we deal with
+        # those below
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            tday = np.nanmean(tair, axis=1)
+            vpd_am = np.nanmean(period(vpd, am), axis=1)
+            vpd_pm = np.nanmean(period(vpd, pm), axis=1)
+            wind_am = np.nanmean(period(wind, am), axis=1)
+            wind_pm = np.nanmean(period(wind, pm), axis=1)
+
+            daily = {}
+            daily['#year'] = np.repeat(years, ndays_in_yr)
+            daily['doy'] = np.concatenate([np.arange(1, nd + 1) \
+                                           for nd in ndays_in_yr])
+            daily['tair'] = np.nanmean(period(tair, am_pm), axis=1)
+            daily['tam'] = np.nanmean(period(tair, am), axis=1)
+            daily['tpm'] = np.nanmean(period(tair, pm), axis=1)
+            daily['tsoil'] = tday
+            daily['tday'] = tday
+
+            # daytime min/max temp
+            daily['tmin'] = np.nanmin(tair, axis=1)
+            daily['tmax'] = np.nanmax(tair, axis=1)
+
+            # wind speed -> m/s
+            daily['wind'] = np.nanmean(period(wind, am_pm), axis=1)
+
+        # odd occasions when there is no data, so set a small vpd/wind speed.
+        daily['vpd_am'] = np.where(np.isnan(vpd_am) | (vpd_am < 0.05), 0.05,
+                                   vpd_am)
+        daily['vpd_pm'] = np.where(np.isnan(vpd_pm) | (vpd_pm < 0.05), 0.05,
+                                   vpd_pm)
+        daily['wind_am'] = np.where(np.isnan(wind_am), 0.1, wind_am)
+        daily['wind_pm'] = np.where(np.isnan(wind_pm), 0.1, wind_pm)
+
+        # convert PAR [umol m-2 s-1] -> mj m-2 30min-1
+        conv = UMOL_TO_J * J_TO_MJ * SEC_TO_HFHR
+        daily['par_am'] = np.nansum(period(par, am) * conv, axis=1)
+        daily['par_pm'] = np.nansum(period(par, pm) * conv, axis=1)
+
+        # rain -> mm
+        # coversion 1800 seconds to half hours and summed gives day value.
+        # Going to use the whole day including the night data
+        daily['rain'] = np.nansum(rain, axis=1)
+
+        # air pressure -> kPa
+        daily['pres'] = np.full(ndays, 101.32)
+
+        if co2_conc is not None:
+            co2 = co2_conc
+        else:
+            co2 = 390 * 1.3
+        daily['co2'] = np.full(ndays, co2)
+        daily['ndep'] = np.full(ndays, -999.9)
+        daily['nfix'] = np.full(ndays, -999.9)
+
+        return daily
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+Regression check of the NumPy MATE (mate.py) against canopy_scaling.
+
+Runs the C model once with the param file as it stands and once over a
+--runs table of random parameter sets, and the NumPy version over the same
+sets in a single sweep, then reports the largest deviation in daily GPP and
+APAR. Exits non-zero if any day is out by more than atol + rtol * |C value|.
+
+    ./compare_mate.py ../../params/base_start.cfg ../met_data/mate_AMB.csv
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+import mate
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+# parameters varied in the sweep, +/- this fraction of the cfg value
+SWEEP_PARAMS = ["g1", "vcmaxna", "jmaxna", "alpha_j", "fix_lai"]
+SWEEP_SPREAD = 0.25
+
+def run_model(exe, cfg_fname, met_fname, out_fname, runs_fname=None):
+    """ Run canopy_scaling as MATE with .npy output, return the records """
+    cmd = [exe, "-p", cfg_fname,
+           "--set", "control.sub_daily=false",
+           "--set", "control.output_ascii=false",
+           "--set", "files.out_fname=%s" % (out_fname),
+           "--set", "files.met_fname=%s" % (met_fname)]
+    if runs_fname is not None:
+        cmd += ["--runs", runs_fname]
+    subprocess.check_call(cmd, stderr=subprocess.PIPE)
+
+    return np.load(out_fname)
+
+def deviation(c_values, py_values, rtol, atol):
+    """ largest absolute and relative difference, and the number of values
+    outside the tolerance """
+    diff = np.abs(py_values - c_values)
+    scale = np.abs(c_values)
+    rel = np.where(scale > 0.0, diff / np.where(scale > 0.0, scale, 1.0), 0.0)
+    nbad = int(np.sum(diff > atol + rtol * scale))
+
+    return (diff.max(), rel.max(), nbad)
+
+def main(cfg_fname, met_fname, exe=mate.GDAY, nsets=20, rtol=1E-9,
+         atol=1E-12, seed=0):
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        params = mate.read_params(cfg_fname, exe=exe,
+                                  overrides={"control.sub_daily": "false"})
+        met = mate.read_met(met_fname)
+
+        # the param file as it stands
+        c_out = run_model(exe, cfg_fname, met_fname,
+                          os.path.join(tmp_dir, "base.npy"))
+        py_out = mate.run_mate(met, params)
+        rows = [("base", var) + deviation(c_out[var], py_out[var], rtol, atol)
+                for var in ("gpp", "apar")]
+
+        # random parameter sets, through --runs and a single sweep
+        rng = np.random.RandomState(seed)
+        sweep = dict((k, params[k] * rng.uniform(1.0 - SWEEP_SPREAD,
+                                                 1.0 + SWEEP_SPREAD, nsets))
+                     for k in SWEEP_PARAMS)
+        runs_fname = os.path.join(tmp_dir, "runs.csv")
+        with open(runs_fname, "w") as f:
+            f.write(",".join(["run_id"] + SWEEP_PARAMS) + "\n")
+            for i in range(nsets):
+                f.write(",".join(["%d" % (i)] +
+                                 ["%.17g" % (sweep[k][i])
+                                  for k in SWEEP_PARAMS]) + "\n")
+        t0 = time.time()
+        c_out = run_model(exe, cfg_fname, met_fname,
+                          os.path.join(tmp_dir, "runs.npy"), runs_fname)
+        c_time = time.time() - t0
+        t0 = time.time()
+        py_out = mate.run_mate(met, params, sweep=sweep)
+        py_time = time.time() - t0
+        for var in ("gpp", "apar"):
+            c_values = c_out[var].reshape(nsets, -1)
+            rows.append(("sweep",  var) +
+                        deviation(c_values, py_out[var], rtol, atol))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print("%-6s %-5s %14s %14s %8s" % ("run", "var", "max abs dev",
+                                       "max rel dev", "outside"))
+    for (run, var, abs_dev, rel_dev, nbad) in rows:
+        print("%-6s %-5s %14.6e %14.6e %8d" % (run, var, abs_dev, rel_dev,
+                                               nbad))
+    print("%d parameter sets: C %.3f s, NumPy %.3f s (rtol = %g, atol = %g)" % \
+          (nsets, c_time, py_time, rtol, atol))
+
+    return all(row[4] == 0 for row in rows)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cfg_fname", nargs="?",
+                        default="../../params/base_start.cfg")
+    parser.add_argument("met_fname", nargs="?",
+                        default="../met_data/mate_AMB.csv")
+    parser.add_argument("--exe", default=mate.GDAY)
+    parser.add_argument("--nsets", type=int, default=20)
+    parser.add_argument("--rtol", type=float, default=1E-9)
+    parser.add_argument("--atol", type=float, default=1E-12)
+    args = parser.parse_args()
+
+    ok = main(args.cfg_fname, args.met_fname, exe=args.exe, nsets=args.nsets,
+              rtol=args.rtol, atol=args.atol)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+Regression check of the NumPy two-leaf model (twoleaf.py) against
+canopy_scaling.
+
+Runs the C model once with the param file as it stands, writing the
+half-hourly sunlit/shaded fluxes and the solar geometry, and the NumPy
+version on the same forcing and geometry (which is also checked against
+twoleaf.solar_arrays); then both over a --runs table of
+random parameter sets, the NumPy version as a single broadcast call.
+Reports the largest deviation in each half-hourly variable and in daily GPP
+and APAR, and exits non-zero if any value is out by more than
+atol + rtol * |C value|.
+
+    ./compare_twoleaf.py ../../params/base_start.cfg ../met_data/twoleaf_AMB.csv
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+import twoleaf
+from compare_mate import deviation
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+# half-hourly variables compared
+LEAF_VARS = ["an_sunlit", "an_shaded", "gsc_sunlit", "gsc_shaded",
+             "apar_sunlit", "apar_shaded", "tleaf_sunlit", "tleaf_shaded"]
+SOLAR_VARS = ["cos_zenith", "elevation", "diffuse_frac"]
+
+# parameters varied in the sweep, +/- this fraction of the cfg value
+SWEEP_PARAMS = ["g1", "vcmaxna", "jmaxna", "alpha_j", "fix_lai"]
+SWEEP_SPREAD = 0.25
+
+def run_model(exe, cfg_fname, met_fname, out_fname, subdaily_fname=None,
+              runs_fname=None):
+    """ Run canopy_scaling as the two-leaf model with .npy output, return
+    the daily records and, if asked for, the sub-daily ones """
+    cmd = [exe, "-p", cfg_fname,
+           "--set", "control.sub_daily=true",
+           "--set", "control.output_ascii=false",
+           "--set", "control.temp_response_table=false",
+           "--set", "files.out_fname=%s" % (out_fname),
+           "--set", "files.met_fname=%s" % (met_fname)]
+    if subdaily_fname is not None:
+        cmd += ["--set", "control.print_options=subdaily",
+                "--set", "files.out_subdaily_fname=%s" % (subdaily_fname)]
+        for var in LEAF_VARS + SOLAR_VARS:
+            cmd += ["--set", "print.%s=yes" % (var)]
+    if runs_fname is not None:
+        cmd += ["--runs", runs_fname]
+    subprocess.check_call(cmd, stderr=subprocess.PIPE)
+
+    if subdaily_fname is None:
+        return np.load(out_fname)
+    return (np.load(out_fname), np.load(subdaily_fname))
+
+def main(cfg_fname, met_fname, exe=twoleaf.mate.GDAY, nsets=20, rtol=1E-9,
+         atol=1E-12, seed=0):
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        params = twoleaf.read_params(cfg_fname, exe=exe,
+                                     overrides={"control.sub_daily": "true"})
+        met = twoleaf.read_met(met_fname)
+
+        # the param file as it stands, every half hour
+        t0 = time.time()
+        (c_out, c_sd) = run_model(exe, cfg_fname, met_fname,
+                                  os.path.join(tmp_dir, "base.npy"),
+                                  os.path.join(tmp_dir, "base_sd.npy"))
+        c_time = time.time() - t0
+        solar = dict((var, c_sd[var]) for var in SOLAR_VARS)
+        t0 = time.time()
+        py_out = twoleaf.run_twoleaf(met, solar, params)
+        py_time = time.time() - t0
+        rows = [("base", var) + deviation(c_sd[var], py_out[var], rtol, atol)
+                for var in LEAF_VARS]
+        py_solar = twoleaf.solar_arrays(met, params)
+        rows += [("base", var) + deviation(c_sd[var], py_solar[var], rtol,
+                                           atol)
+                 for var in SOLAR_VARS]
+        rows += [("base", var) + deviation(c_out[var], py_out[var], rtol,
+                                           atol)
+                 for var in ("gpp", "apar")]
+        timings = [("base", 1, c_time, py_time)]
+
+        # random parameter sets, through --runs and a single sweep
+        rng = np.random.RandomState(seed)
+        sweep = dict((k, params[k] * rng.uniform(1.0 - SWEEP_SPREAD,
+                                                 1.0 + SWEEP_SPREAD, nsets))
+                     for k in SWEEP_PARAMS)
+        runs_fname = os.path.join(tmp_dir, "runs.csv")
+        with open(runs_fname, "w") as f:
+            f.write(",".join(["run_id"] + SWEEP_PARAMS) + "\n")
+            for i in range(nsets):
+                f.write(",".join(["%d" % (i)] +
+                                 ["%.17g" % (sweep[k][i])
+                                  for k in SWEEP_PARAMS]) + "\n")
+        t0 = time.time()
+        c_out = run_model(exe, cfg_fname, met_fname,
+                          os.path.join(tmp_dir, "runs.npy"),
+                          runs_fname=runs_fname)
+        c_time = time.time() - t0
+        p = dict(params)
+        for k in SWEEP_PARAMS:
+            p[k] = sweep[k][:, None]
+        t0 = time.time()
+        py_out = twoleaf.run_twoleaf(met, solar, p)
+        py_time = time.time() - t0
+        for var in ("gpp", "apar"):
+            c_values = c_out[var].reshape(nsets, -1)
+            rows.append(("sweep",  var) +
+                        deviation(c_values, py_out[var], rtol, atol))
+        timings.append(("sweep", nsets, c_time, py_time))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print("%-6s %-12s %14s %14s %8s" % ("run", "var", "max abs dev",
+                                        "max rel dev", "outside"))
+    for (run, var, abs_dev, rel_dev, nbad) in rows:
+        print("%-6s %-12s %14.6e %14.6e %8d" % (run, var, abs_dev, rel_dev,
+                                                nbad))
+    for (run, n, c_time, py_time) in timings:
+        print("%-6s %d parameter sets: C %.3f s, NumPy %.3f s" % \
+              (run, n, c_time, py_time))
+    print("(rtol = %g, atol = %g)" % (rtol, atol))
+
+    return all(row[4] == 0 for row in rows)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cfg_fname", nargs="?",
+                        default="../../params/base_start.cfg")
+    parser.add_argument("met_fname", nargs="?",
+                        default="../met_data/twoleaf_AMB.csv")
+    parser.add_argument("--exe", default=twoleaf.mate.GDAY)
+    parser.add_argument("--nsets", type=int, default=20)
+    parser.add_argument("--rtol", type=float, default=1E-9)
+    parser.add_argument("--atol", type=float, default=1E-12)
+    args = parser.parse_args()
+
+    ok = main(args.cfg_fname, args.met_fname, exe=args.exe, nsets=args.nsets,
+              rtol=args.rtol, atol=args.atol)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+
+"""
+Parameter ensembles of the canopy model, summarised as they run.
+
+Draws Latin hypercube or Sobol samples over named cfg parameters and runs
+the members at ambient and elevated CO2, a chunk of members per model
+process (a --runs table, see run_simulations.run_sweep) and several
+processes at once. Each chunk's daily GPP, and the ELE/AMB ratio of it,
+is folded into online_stats accumulators and the model output deleted,
+so only the summaries are written and disk use and post-processing stay
+the same whatever the ensemble size:
+
+    out_stem.csv    year, doy and n/mean/sd/quantiles of gpp_AMB, gpp_ELE
+                    and gpp_ratio for each day
+    out_stem.json   how the ensemble was drawn and run
+
+    ./ensemble.py --scheme mate -n 1000 --param g1=2:6 --param vcmaxna \\
+        --param kn=0.2:0.5 -o ensemble_mate
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+import run_simulations as rs
+from mate import parse_params
+from online_stats import DailySummary, quantile_name
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+TREATMENTS = ["AMB", "ELE"]
+DEFAULT_PARAMS = ["g1", "vcmaxna", "jmaxna", "alpha_j", "kn"]
+DEFAULT_SPREAD = 0.25       # +/- fraction of the base value, if no range
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Sobol direction numbers (Joe & Kuo, new-joe-kuo-6.21201) for dimensions
+# 2 onwards: degree s and coefficients a of the primitive polynomial, and
+# the initial direction numbers m_1..m_s. Dimension 1 is van der Corput.
+SOBOL_DIRECTIONS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+SOBOL_BITS = 32
+
+def latin_hypercube(n, ndim, rng):
+    """ n points in the unit cube, one in each of n equal slices of every
+    dimension """
+    strata = np.array([rng.permutation(n) for i in range(ndim)]).T
+
+    return (strata + rng.uniform(size=(n, ndim))) / n
+
+def sobol(n, ndim, rng):
+    """ First n points of the Sobol sequence in ndim dimensions.
+
+    Digitally shifted (each dimension's bits XORed with a random word from
+    rng), which keeps the stratification but moves the first point off the
+    origin. The balance properties hold for n a power of two.
+    """
+    if ndim > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError("Sobol sampling is set up for at most %d "
+                         "parameters" % (len(SOBOL_DIRECTIONS) + 1))
+    if n > 2**SOBOL_BITS:
+        raise ValueError("At most 2**%d Sobol points" % (SOBOL_BITS))
+
+    index = np.arange(n, dtype=np.uint64)
+    gray = index ^ (index >> np.uint64(1))
+    points = np.empty((n, ndim))
+    for dim in range(ndim):
+        v = direction_numbers(dim)
+        x = np.zeros(n, dtype=np.uint64)
+        for bit in range(SOBOL_BITS):
+            on = ((gray >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+            x[on] ^= np.uint64(v[bit])
+        x ^= np.uint64(rng.randint(0, 2**SOBOL_BITS, dtype=np.int64))
+        points[:, dim] = (x + 0.5) / 2.0**SOBOL_BITS
+
+    return points
+
+def direction_numbers(dim):
+    """ Sobol direction numbers v_1..v_SOBOL_BITS for dimension dim (from 0)
+    """
+    if dim == 0:
+        return [1 << (SOBOL_BITS - i) for i in range(1, SOBOL_BITS + 1)]
+
+    (s, a, m) = SOBOL_DIRECTIONS[dim - 1]
+    v = [m[i] << (SOBOL_BITS - i - 1) for i in range(min(s, SOBOL_BITS))]
+    for i in range(s, SOBOL_BITS):
+        vi = v[i - s] ^ (v[i - s] >> s)
+        for k in range(1, s):
+            vi ^= ((a >> (s - 1 - k)) & 1) * v[i - k]
+        v.append(vi)
+
+    return v
+
+def draw_samples(ranges, n, method="lhs", seed=0):
+    """ Sample parameter sets uniformly over the given ranges.
+
+    Parameters:
+    ----------
+    ranges : list
+        (name, low, high) for each parameter
+    n : int
+        number of ensemble members
+    method : string
+        lhs (Latin hypercube) or sobol
+    seed : int
+        random seed, the same seed gives the same members
+
+    Returns:
+    --------
+    values : array
+        (n, nparams) parameter values, in the order of ranges
+
+    """
+    rng = np.random.RandomState(seed)
+    if method == "lhs":
+        unit = latin_hypercube(n, len(ranges), rng)
+    elif method == "sobol":
+        unit = sobol(n, len(ranges), rng)
+    else:
+        raise ValueError("Unknown sampling method: %s" % (method))
+    low = np.array([r[1] for r in ranges])
+    high = np.array([r[2] for r in ranges])
+
+    return low + unit * (high - low)
+
+def parse_param(text):
+    """ "name=low:high" -> (name, low, high), "name" -> (name, None, None) """
+    if "=" not in text:
+        return (text.strip(), None, None)
+    (name, bounds) = text.split("=", 1)
+    try:
+        (low, high) = [float(b) for b in bounds.split(":")]
+    except ValueError:
+        raise ValueError("Expected name=low:high, got %s" % (text))
+
+    return (name.strip(), low, high)
+
+def base_values(spec, names, exe=rs.GDAY):
+    """ Values of the named params for a run as the model sees them, cfg
+    defaults and run_params replacements included (--dump-params) """
+    (cfg_fname, _, replace_dict) = rs.run_params(spec)
+    cmd = [exe, "-p", cfg_fname, "--dump-params"]
+    for key in sorted(replace_dict):
+        cmd += ["--set", "%s=%s" % (key, replace_dict[key])]
+    text = subprocess.check_output(cmd, stderr=subprocess.PIPE)
+    values = {}
+    for section in parse_params(text.decode("utf-8")).values():
+        values.update(section)
+
+    missing = [name for name in names if name not in values]
+    if missing:
+        raise ValueError("Not in the param file: %s" % (", ".join(missing)))
+
+    return dict((name, float(values[name])) for name in names)
+
+def param_ranges(spec, params, spread=DEFAULT_SPREAD, exe=rs.GDAY):
+    """ Fill in the ranges of params given without one, as +/- spread of
+    the base value """
+    need = [name for (name, low, high) in params if low is None]
+    base = base_values(spec, need, exe=exe) if need else {}
+    ranges = []
+    for (name, low, high) in params:
+        if low is None:
+            (low, high) = sorted([base[name] * (1.0 - spread),
+                                  base[name] * (1.0 + spread)])
+        ranges.append((name, low, high))
+
+    return ranges
+
+def run_chunk(specs, names, values, first_id, exe=rs.GDAY):
+    """ Run one chunk of members for each treatment in a scratch directory.
+
+    Returns:
+    --------
+    result : dictionary
+        first_id, nmembers, "gpp" {treatment: (nmembers, ndays) array},
+        year and doy, or "error" if a model run failed
+
+    """
+    param_sets = [(first_id + i, dict(zip(names, row)))
+                  for (i, row) in enumerate(values)]
+    result = {"first_id": first_id, "nmembers": len(values), "gpp": {}}
+    tmp_dir = tempfile.mkdtemp(prefix="ensemble_")
+    try:
+        for (treatment, spec) in sorted(specs.items()):
+            run = rs.run_sweep(spec, param_sets, exe=exe, out_dir=tmp_dir,
+                               binary=True)
+            if run["status"] != 0:
+                result["error"] = "%s: %s" % (run["tag"],
+                                              run["stderr"].strip())
+                return result
+            out = np.load(run["ofname"])
+            result["gpp"][treatment] = out["gpp"].reshape(len(values), -1)
+            result["year"] = out["year"][out["run"] == out["run"][0]]
+            result["doy"] = out["doy"][out["run"] == out["run"][0]]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return result
+
+def run_ensemble(experiment_id, latitude, longitude, scheme, params,
+                 nmembers, method="lhs", seed=0, chunk_size=64, nprocs=None,
+                 exe=rs.GDAY, overrides=None, delta=200.0, verbose=True):
+    """ Run and summarise an ensemble.
+
+    Parameters:
+    ----------
+    experiment_id, latitude, longitude, scheme :
+        as for run_simulations.make_spec
+    params : list
+        (name, low, high) for each sampled parameter, low/high None for
+        +/- DEFAULT_SPREAD of the base value
+    nmembers : int
+        ensemble size
+    method : string
+        lhs or sobol
+    seed : int
+        random seed for the sample
+    chunk_size : int
+        members per model process, which bounds the memory and scratch
+        disk in use at once
+    nprocs : int
+        number of model processes at once, defaults to the number of cores
+    exe : string
+        model executable
+    overrides : dictionary
+        extra parameter file replacements for every member
+    delta : float
+        t-digest compression
+
+    Returns:
+    --------
+    summaries : dictionary
+        {"gpp_AMB", "gpp_ELE", "gpp_ratio": DailySummary}
+    info : dictionary
+        year and doy arrays, the ranges sampled and the failed chunks
+
+    """
+    specs = dict((trt, rs.make_spec(experiment_id, latitude, longitude,
+                                    trt, scheme, overrides=overrides,
+                                    tag="%s_%s_ensemble" % (scheme, trt)))
+                 for trt in TREATMENTS)
+    ranges = param_ranges(specs["AMB"], params, exe=exe)
+    names = [r[0] for r in ranges]
+    values = draw_samples(ranges, nmembers, method=method, seed=seed)
+    chunks = [(i, values[i:i + chunk_size])
+              for i in range(0, nmembers, chunk_size)]
+
+    if nprocs is None:
+        nprocs = rs.multiprocessing.cpu_count()
+    nprocs = max(1, min(nprocs, len(chunks)))
+
+    def worker(chunk):
+        return run_chunk(specs, names, chunk[1], chunk[0], exe=exe)
+
+    summaries = None
+    info = {"ranges": ranges, "failed": [], "nmembers_run": 0}
+    pool = ThreadPool(nprocs)
+    try:
+        for result in pool.imap(worker, chunks):
+            if "error" in result:
+                info["failed"].append({"first_id": result["first_id"],
+                                       "nmembers": result["nmembers"],
+                                       "error": result["error"]})
+                if verbose:
+                    print("members %d-%d failed" % \
+                          (result["first_id"],
+                           result["first_id"] + result["nmembers"] - 1))
+                continue
+
+            gpp = result["gpp"]
+            if summaries is None:
+                ndays = gpp["AMB"].shape[1]
+                summaries = dict((var, DailySummary(ndays, delta))
+                                 for var in ("gpp_AMB", "gpp_ELE",
+                                             "gpp_ratio"))
+                info["year"] = result["year"]
+                info["doy"] = result["doy"]
+            summaries["gpp_AMB"].update(gpp["AMB"])
+            summaries["gpp_ELE"].update(gpp["ELE"])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                summaries["gpp_ratio"].update(gpp["ELE"] / gpp["AMB"])
+            info["nmembers_run"] += result["nmembers"]
+            if verbose:
+                print("%d/%d members" % (info["nmembers_run"], nmembers))
+    finally:
+        pool.close()
+        pool.join()
+
+    if summaries is None:
+        raise RuntimeError("Every ensemble member failed: %s" % \
+                           (info["failed"][0]["error"]))
+
+    return (summaries, info)
+
+def write_summary(out_stem, summaries, info, meta, quantiles=QUANTILES):
+    """ Write out_stem.csv (daily summaries) and out_stem.json (metadata) """
+    columns = [("year", info["year"]), ("doy", info["doy"])]
+    for var in sorted(summaries):
+        summary = summaries[var].summary(quantiles)
+        for stat in ["n", "mean", "sd"] + [quantile_name(q)
+                                           for q in quantiles]:
+            columns.append(("%s_%s" % (var, stat), summary[stat]))
+
+    with open(out_stem + ".csv", "w") as f:
+        f.write(",".join(name for (name, _) in columns) + "\n")
+        for i in range(len(info["year"])):
+            f.write(",".join("%.10g" % (col[i]) for (_, col) in columns) +
+                    "\n")
+
+    meta = dict(meta, ranges=[{"name": name, "low": low, "high": high}
+                              for (name, low, high) in info["ranges"]],
+                nmembers_run=info["nmembers_run"], failed=info["failed"],
+                quantiles=list(quantiles))
+    with open(out_stem + ".json", "w") as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", "--nmembers", type=int, default=256)
+    parser.add_argument("--scheme", default="mate",
+                        choices=["mate", "twoleaf"])
+    parser.add_argument("--param", action="append", default=[],
+                        help="name=low:high, or name for +/- %g of the "
+                             "base value (default %s)" % \
+                             (DEFAULT_SPREAD, ", ".join(DEFAULT_PARAMS)))
+    parser.add_argument("--method", default="lhs", choices=["lhs", "sobol"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("-j", "--nprocs", type=int, default=None)
+    parser.add_argument("--set", action="append", default=[],
+                        metavar="KEY=VALUE",
+                        help="extra param file replacement for every run")
+    parser.add_argument("--delta", type=float, default=200.0,
+                        help="t-digest compression")
+    parser.add_argument("--exe", default=rs.GDAY)
+    parser.add_argument("-o", "--out-stem", default=None)
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args()
+
+    experiment_id = "EucFACE"
+    latitude = -35.6566
+    longitude = 148.152
+
+    params = [parse_param(p) for p in args.param or DEFAULT_PARAMS]
+    overrides = dict(s.split("=", 1) for s in args.set)
+    out_stem = args.out_stem or os.path.join("outputs", "%s_%s_ensemble" % \
+                                             (experiment_id, args.scheme))
+    out_dir = os.path.dirname(out_stem)
+    if out_dir and not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    t0 = time.time()
+    (summaries, info) = run_ensemble(experiment_id, latitude, longitude,
+                                     args.scheme, params, args.nmembers,
+                                     method=args.method, seed=args.seed,
+                                     chunk_size=args.chunk_size,
+                                     nprocs=args.nprocs, exe=args.exe,
+                                     overrides=overrides, delta=args.delta,
+                                     verbose=not args.quiet)
+    meta = {"experiment_id": experiment_id, "scheme": args.scheme,
+            "nmembers": args.nmembers, "method": args.method,
+            "seed": args.seed, "chunk_size": args.chunk_size,
+            "delta": args.delta, "overrides": overrides, "exe": args.exe,
+            "wall_time": time.time() - t0}
+    write_summary(out_stem, summaries, info, meta)
+    if info["failed"]:
+        sys.exit("%d of %d members failed, see %s.json" % \
+                 (args.nmembers - info["nmembers_run"], args.nmembers,
+                  out_stem))
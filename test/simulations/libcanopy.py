@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+
+"""
+ctypes wrapper around libcanopy.so (make lib), so that runs can be driven
+from python with numpy forcing in and daily GPP/APAR arrays out, without
+writing cfg files, spawning processes or parsing CSV output.
+
+    model = CanopyModel("../../params/base_start.cfg")
+    model.set_param("g1", 3.8667)
+    model.load_met_file("../met_data/mate_AMB.csv")
+    out = model.run()
+    out["gpp"]
+"""
+
+import os
+import ctypes
+import numpy as np
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+SUNLIT = 0
+SHADED = 1
+NUM_HLF_HRS = 48
+
+LIB_FNAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "..", "..", "libcanopy.so")
+
+_dbl_p = ctypes.POINTER(ctypes.c_double)
+
+def load_library(fname=LIB_FNAME):
+    """ Load libcanopy and declare the function signatures """
+    lib = ctypes.CDLL(fname)
+
+    lib.canopy_init.argtypes = [ctypes.c_char_p]
+    lib.canopy_init.restype = ctypes.c_void_p
+    lib.canopy_free.argtypes = [ctypes.c_void_p]
+    lib.canopy_free.restype = None
+    lib.canopy_set_param.argtypes = [ctypes.c_void_p, ctypes.c_char_p,
+                                     ctypes.c_char_p, ctypes.c_char_p]
+    lib.canopy_set_param.restype = None
+    lib.canopy_get_param.argtypes = [ctypes.c_void_p, ctypes.c_char_p,
+                                     ctypes.c_char_p, ctypes.c_char_p,
+                                     ctypes.c_long]
+    lib.canopy_get_param.restype = ctypes.c_int
+    lib.canopy_clear_met.argtypes = [ctypes.c_void_p]
+    lib.canopy_clear_met.restype = None
+    lib.canopy_load_met_file.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    lib.canopy_load_met_file.restype = ctypes.c_int
+    lib.canopy_met_column_name.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    lib.canopy_met_column_name.restype = ctypes.c_char_p
+    lib.canopy_set_met_column.argtypes = [ctypes.c_void_p, ctypes.c_char_p,
+                                          _dbl_p, ctypes.c_long]
+    lib.canopy_set_met_column.restype = ctypes.c_int
+    lib.canopy_prepare.argtypes = [ctypes.c_void_p]
+    lib.canopy_prepare.restype = ctypes.c_int
+    lib.canopy_run.argtypes = [ctypes.c_void_p]
+    lib.canopy_run.restype = ctypes.c_int
+    lib.canopy_write_results.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    lib.canopy_write_results.restype = ctypes.c_int
+    lib.canopy_num_days.argtypes = [ctypes.c_void_p]
+    lib.canopy_num_days.restype = ctypes.c_long
+    lib.canopy_get_results.argtypes = [ctypes.c_void_p, _dbl_p, _dbl_p,
+                                       _dbl_p, _dbl_p]
+    lib.canopy_get_results.restype = ctypes.c_int
+    lib.canopy_leaf_iterations.argtypes = [ctypes.c_void_p,
+                                           ctypes.POINTER(ctypes.c_long),
+                                           ctypes.c_int]
+    lib.canopy_leaf_iterations.restype = ctypes.c_int
+    lib.canopy_leaf_C3_batch.argtypes = [ctypes.c_void_p, ctypes.c_int,
+                                         ctypes.c_double, ctypes.c_double,
+                                         ctypes.c_long] + [_dbl_p] * 7
+    lib.canopy_leaf_C3_batch.restype = None
+    lib.canopy_solar_geometry.argtypes = [ctypes.c_void_p, ctypes.c_int,
+                                          ctypes.c_int, _dbl_p, _dbl_p]
+    lib.canopy_solar_geometry.restype = None
+    lib.canopy_diffuse_frac.argtypes = [ctypes.c_void_p, ctypes.c_int,
+                                        ctypes.c_int] + [_dbl_p] * 3
+    lib.canopy_diffuse_frac.restype = None
+
+    return lib
+
+def _bytes(s):
+    return str(s).encode("utf-8")
+
+def _as_pointer(arr):
+    return arr.ctypes.data_as(_dbl_p)
+
+
+class CanopyModel(object):
+    """ One model instance, set up from a cfg file """
+
+    def __init__(self, cfg_fname, lib=None):
+        self.lib = load_library() if lib is None else lib
+        self.mod = self.lib.canopy_init(_bytes(cfg_fname))
+        if not self.mod:
+            raise IOError('Could not read param file: "%s"' % cfg_fname)
+
+    def close(self):
+        if self.mod:
+            self.lib.canopy_free(self.mod)
+            self.mod = None
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def set_param(self, name, value, section="params"):
+        """ Set a cfg value, e.g. set_param("sub_daily", "true", "control").
+
+        Booleans are passed as true/false, everything else via str().
+        """
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        self.lib.canopy_set_param(self.mod, _bytes(section), _bytes(name),
+                                  _bytes(value))
+
+    def get_param(self, name, section="params"):
+        """ Current value of a cfg key, as a string, e.g. "3.8667" """
+        buf = ctypes.create_string_buffer(2000)
+        if not self.lib.canopy_get_param(self.mod, _bytes(section),
+                                         _bytes(name), buf, len(buf)):
+            raise KeyError("%s.%s" % (section, name))
+        return buf.value.decode("utf-8")
+
+    def set_params(self, replacements, section="params"):
+        """ Set several values from a {name: value} dictionary """
+        for name in sorted(replacements):
+            self.set_param(name, replacements[name], section)
+
+    def met_column_names(self):
+        """ Forcing columns needed for the current sub_daily setting """
+        names = []
+        while True:
+            name = self.lib.canopy_met_column_name(self.mod, len(names))
+            if name is None:
+                return names
+            names.append(name.decode("utf-8"))
+
+    def load_met_file(self, fname):
+        """ Read a CSV or binary met file, set sub_daily first """
+        if self.lib.canopy_load_met_file(self.mod, _bytes(fname)) != 0:
+            raise IOError('Could not read met file: "%s"' % fname)
+
+    def set_met(self, columns):
+        """ Hand the forcing over as arrays.
+
+        Parameters:
+        ----------
+        columns : dictionary
+            {name: array} for each of met_column_names(), all the same
+            length. A leading '#' on a name (as in the CSV header) is
+            ignored, as are columns the model doesn't use, so a DataFrame
+            read from a forcing file can be passed straight in (use
+            float_precision="round_trip" to match the C reader exactly).
+            Any forcing loaded before is dropped first, so it needn't be
+            the same length.
+
+        """
+        self.lib.canopy_clear_met(self.mod)
+        needed = self.met_column_names()
+        for name in columns:
+            if name.lstrip("#") not in needed:
+                continue
+            arr = np.ascontiguousarray(columns[name], dtype=np.float64)
+            err = self.lib.canopy_set_met_column(self.mod,
+                                                 _bytes(name.lstrip("#")),
+                                                 _as_pointer(arr), len(arr))
+            if err != 0:
+                raise ValueError("Bad met column: %s" % (name))
+
+    def prepare(self):
+        """ Check the forcing and fill the solar arrays for it. run() does
+        this itself when needed, so this is only for doing it separately
+        (e.g. to time it). """
+        if self.lib.canopy_prepare(self.mod) != 0:
+            raise RuntimeError("Model setup failed, is the forcing complete?")
+
+    def run(self):
+        """ Run the model.
+
+        Returns:
+        --------
+        out : dictionary
+            year, doy, gpp and apar arrays, one value per day
+
+        """
+        if self.lib.canopy_run(self.mod) != 0:
+            raise RuntimeError("Model run failed, is the forcing complete?")
+
+        ndays = self.lib.canopy_num_days(self.mod)
+        out = dict((var, np.empty(ndays))
+                   for var in ["year", "doy", "gpp", "apar"])
+        self.lib.canopy_get_results(self.mod, _as_pointer(out["year"]),
+                                    _as_pointer(out["doy"]),
+                                    _as_pointer(out["gpp"]),
+                                    _as_pointer(out["apar"]))
+        return out
+
+    def write_results(self, fname):
+        """ Write the last run's daily output to fname, in the format
+        canopy_scaling would use for that name (.npy, .csv or float64
+        columns with a .hdr file, see read_output.py) """
+        if self.lib.canopy_write_results(self.mod, _bytes(fname)) != 0:
+            raise IOError('Could not write results file: "%s"' % fname)
+
+    def leaf_iterations(self):
+        """ The last run's leaf temperature solves by the number of passes
+        round the loop they took (see [control] leaf_solver).
+
+        Returns:
+        --------
+        counts : array
+            counts[i] solves took i passes
+
+        """
+        n = self.lib.canopy_leaf_iterations(self.mod, None, 0)
+        counts = np.zeros(n, dtype=np.dtype(ctypes.c_long))
+        self.lib.canopy_leaf_iterations(
+            self.mod, counts.ctypes.data_as(ctypes.POINTER(ctypes.c_long)), n)
+        return counts
+
+    def leaf_photosynthesis(self, apar, Cs, tleaf, dleaf, ileaf=SUNLIT,
+                            N0=1.0, cscalar=1.0):
+        """ Coupled leaf photosynthesis/stomatal conductance, vectorised.
+
+        Runs the model's C3 leaf solver over arrays of inputs in one call,
+        with the current parameters. The inputs are broadcast against each
+        other, so e.g. a grid of apar x tleaf can be passed as an outer
+        product.
+
+        Parameters:
+        ----------
+        apar : array
+            absorbed PAR (umol m-2 s-1)
+        Cs : array
+            CO2 at the leaf surface (umol mol-1)
+        tleaf : array
+            leaf temperature (deg C)
+        dleaf : array
+            leaf to air VPD (Pa)
+        ileaf : int
+            SUNLIT or SHADED
+        N0 : float
+            top of canopy nitrogen (g N m-2), used when modeljm is 1 or 2
+        cscalar : float
+            scaling from leaf to canopy layer
+
+        Returns:
+        --------
+        out : dictionary
+            an, gsc and rd arrays with the broadcast shape
+
+        """
+        ins = [np.ascontiguousarray(x, dtype=np.float64)
+               for x in np.broadcast_arrays(apar, Cs, tleaf, dleaf)]
+        shape = ins[0].shape
+        ins = [x.ravel() for x in ins]
+        out = dict((var, np.empty(ins[0].size)) for var in ["an", "gsc", "rd"])
+        self.lib.canopy_leaf_C3_batch(self.mod, ileaf, N0, cscalar,
+                                      ins[0].size,
+                                      *([_as_pointer(x) for x in ins] +
+                                        [_as_pointer(out[var])
+                                         for var in ["an", "gsc", "rd"]]))
+        return dict((var, out[var].reshape(shape)) for var in out)
+
+    def solar_geometry(self, ndays, doy=0):
+        """ Solar geometry at the current latitude/longitude, whole days.
+
+        Parameters:
+        ----------
+        ndays : int
+            number of days
+        doy : int
+            first day, 0 based as the model counts within each year
+
+        Returns:
+        --------
+        out : dictionary
+            cos_zenith and elevation (degrees), (ndays, NUM_HLF_HRS)
+
+        """
+        out = dict((var, np.empty(ndays * NUM_HLF_HRS))
+                   for var in ["cos_zenith", "elevation"])
+        self.lib.canopy_solar_geometry(self.mod, doy, ndays,
+                                       _as_pointer(out["cos_zenith"]),
+                                       _as_pointer(out["elevation"]))
+        return dict((var, out[var].reshape(ndays, -1)) for var in out)
+
+    def diffuse_frac(self, cos_zenith, par, doy=0):
+        """ Spitters diffuse fraction of the incident radiation.
+
+        Parameters:
+        ----------
+        cos_zenith : array
+            (ndays, NUM_HLF_HRS), e.g. from solar_geometry
+        par : array
+            incident PAR (umol m-2 s-1), the same shape
+        doy : int
+            first day, 0 based
+
+        Returns:
+        --------
+        diffuse_frac : array
+            the same shape
+
+        """
+        cz = np.ascontiguousarray(cos_zenith, dtype=np.float64)
+        par = np.ascontiguousarray(np.broadcast_to(par, cz.shape),
+                                   dtype=np.float64)
+        if cz.ndim != 2 or cz.shape[1] != NUM_HLF_HRS:
+            raise ValueError("Expected whole days, (ndays, %d), got %s" % \
+                             (NUM_HLF_HRS, cz.shape))
+        out = np.empty(cz.shape)
+        self.lib.canopy_diffuse_frac(self.mod, doy, cz.shape[0],
+                                     _as_pointer(cz), _as_pointer(par),
+                                     _as_pointer(out))
+        return out
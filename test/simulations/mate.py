@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+
+"""
+The daily MATE model (mate_C3_photosynthesis) in NumPy, for parameter sweeps.
+
+With the forcing fixed, MATE GPP is a pure function of the daily met and the
+parameters, so rather than launching the model once per parameter set the
+whole ensemble is evaluated in one broadcast call: days along one axis,
+parameter sets along the other.
+
+    met = read_met("../met_data/mate_AMB.csv")
+    params = read_params("../../params/base_start.cfg")
+    out = run_mate(met, params, sweep={"g1": g1s, "vcmaxna": vcmaxnas})
+    out["gpp"]      # (len(g1s), ndays), g C m-2 d-1 as canopy_scaling writes
+
+The arithmetic follows photosynthesis.c step for step, see compare_mate.py
+for the check against the C model.
+"""
+
+import subprocess
+import numpy as np
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+GDAY = "canopy_scaling"
+
+# constants.h
+DEG_TO_KELVIN = 273.15
+RGAS = 8.314
+SECS_IN_HOUR = 3600.0
+UMOL_TO_MOL = 1E-6
+MOL_C_TO_GRAMS_C = 12.0
+G_AS_TONNES = 1E-6
+M2_AS_HA = 1E-4
+KG_AS_G = 1E+3
+PA_2_KPA = 0.001
+KPA_2_PA = 1000.
+J_TO_MJ = 1.0E-6
+MJ_TO_J = 1.0 / J_TO_MJ
+J_2_UMOL = 4.57
+UMOL_2_JOL = 1.0 / J_2_UMOL
+EPSILON = 1E-08
+
+# column order of a daily met CSV, see read_met_file.c
+DAILY_COLUMNS = ["year", "doy", "tair", "rain", "tsoil", "tam", "tpm", "tmin",
+                 "tmax", "tday", "vpd_am", "vpd_pm", "co2", "ndep", "nfix",
+                 "wind", "pres", "wind_am", "wind_pm", "par_am", "par_pm"]
+
+# the parameters the model reads, everything else is ignored
+MATE_PARAMS = ["alpha_j", "cfracts", "delsj", "eac", "eag", "eaj", "eao",
+               "eav", "edj", "fix_lai", "g1", "gamstar25", "jmax", "jmaxna",
+               "jmaxnb", "jv_intercept", "jv_slope", "kc25", "kext", "ko25",
+               "latitude", "measurement_temp", "oi", "prescribed_leaf_NC",
+               "sla", "theta", "vcmax", "vcmaxna", "vcmaxnb"]
+
+# not read from the param file, so always initialise_params' value
+FIXED_PARAMS = {"kext": 0.5}
+
+def read_met(fname):
+    """ Read a daily met CSV into a dictionary of columns.
+
+    Parameters:
+    ----------
+    fname : string
+        daily forcing, '#' lines are skipped as by the model
+
+    Returns:
+    --------
+    met : dictionary
+        array for each of DAILY_COLUMNS
+
+    """
+    data = np.loadtxt(fname, delimiter=",", comments="#", ndmin=2)
+    if data.shape[1] < len(DAILY_COLUMNS):
+        raise ValueError('Expected %d met columns, got %d: "%s"' % \
+                         (len(DAILY_COLUMNS), data.shape[1], fname))
+
+    return dict((var, data[:, j]) for j, var in enumerate(DAILY_COLUMNS))
+
+def parse_params(text):
+    """ Parse param file text into {section: {key: value}}, values as strings
+    """
+    params = {}
+    section = ""
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line == "":
+            continue
+        if line.startswith("["):
+            section = line.strip("[]").strip()
+            params.setdefault(section, {})
+        elif "=" in line:
+            (key, value) = [s.strip() for s in line.split("=", 1)]
+            params.setdefault(section, {})[key] = value
+
+    return params
+
+def read_params(cfg_fname, exe=GDAY, overrides=None, keys=MATE_PARAMS):
+    """ Parameters as the model sees them, cfg file defaults and all.
+
+    Asks the model for them (--dump-params), so anything the cfg file
+    doesn't set comes out with the model's default.
+
+    Parameters:
+    ----------
+    cfg_fname : string
+        param file
+    exe : string
+        model executable
+    overrides : dictionary
+        {key: value} handed over as --set arguments
+    keys : list
+        [params] wanted, MATE_PARAMS unless another model is being run
+
+    Returns:
+    --------
+    params : dictionary
+        keys as floats, plus the control options MATE depends on
+
+    """
+    cmd = [exe, "-p", cfg_fname, "--dump-params"]
+    for key in sorted(overrides or {}):
+        cmd += ["--set", "%s=%s" % (key, overrides[key])]
+    text = subprocess.check_output(cmd, stderr=subprocess.PIPE)
+    sections = parse_params(text.decode("utf-8"))
+
+    params = dict(FIXED_PARAMS)
+    for key in keys:
+        if key in sections["params"]:
+            params[key] = float(sections["params"][key])
+    control = sections["control"]
+    params["modeljm"] = int(control["modeljm"])
+    params["gs_model"] = control["gs_model"].lower()
+    params["ps_pathway"] = control["ps_pathway"].lower()
+    params["ncycle"] = control["ncycle"].lower() in ("true", "yes", "1")
+    params["sub_daily"] = control["sub_daily"].lower() in ("true", "yes", "1")
+
+    return params
+
+def is_leap_year(year):
+    return (year % 4 == 0 and year % 100 != 0) or year % 400 == 0
+
+def day_length(doy, num_days, latitude):
+    """ Daylength (hrs), Leuning et al (1995) PCE, 18, 1183-1200, A4-A6 """
+    deg2rad = np.pi / 180.0
+    latr = latitude * deg2rad
+    sindec = -np.sin(23.5 * deg2rad) * np.cos(2.0 * np.pi * (doy + 10.0) /
+                                              num_days)
+    a = np.sin(latr) * sindec
+    b = np.cos(latr) * np.cos(np.arcsin(sindec))
+
+    return 12.0 * (1.0 + (2.0 / np.pi) * np.arcsin(a / b))
+
+def model_calendar(met, latitude):
+    """ The year, doy (0 based) and daylength of each day, as run_sim lays
+    them out: whole years, starting from the first day of the forcing.
+
+    latitude may be an array (a sweep), the daylength then has a leading
+    parameter set axis.
+    """
+    ndays = len(met["year"])
+    (years, doys, nums) = ([], [], [])
+    d = 0
+    while d < ndays:
+        year = met["year"][d]
+        num_days = 366 if is_leap_year(int(year)) else 365
+        years.append(np.repeat(year, num_days))
+        doys.append(np.arange(num_days, dtype=np.float64))
+        nums.append(np.repeat(float(num_days), num_days))
+        d += num_days
+    (year, doy, num) = [np.concatenate(x)[:ndays] for x in (years, doys, nums)]
+
+    return (year, doy, day_length(doy + 1, num, latitude))
+
+def arrh(mt, k25, Ea, Tk):
+    """ Arrhenius temperature dependence, Medlyn et al. 2002 """
+    return k25 * np.exp((Ea * (Tk - mt)) / (mt * RGAS * Tk))
+
+def peaked_arrh(mt, k25, Ea, Tk, deltaS, Hd):
+    """ Peaked Arrhenius temperature dependence, Medlyn et al. 2002 """
+    arg1 = arrh(mt, k25, Ea, Tk)
+    arg2 = 1.0 + np.exp((mt * deltaS - Hd) / (mt * RGAS))
+    arg3 = 1.0 + np.exp((Tk * deltaS - Hd) / (Tk * RGAS))
+
+    return arg1 * arg2 / arg3
+
+def assim(ci, gamma_star, a1, a2):
+    """ Light or rubisco limited assimilation, zero below gamma_star """
+    return np.where(ci < gamma_star, 0.0, a1 * (ci - gamma_star) / (a2 + ci))
+
+def jmax_and_vcmax(p, modeljm, Tk, N0, mt):
+    """ calculate_jmax_and_vcmax, wtfac_root is 1 at the start of a run """
+    if modeljm == 0:
+        (jmax, vcmax) = (p["jmax"] + 0.0 * Tk, p["vcmax"] + 0.0 * Tk)
+    elif modeljm == 1:
+        jmax = peaked_arrh(mt, p["jmaxna"] * N0 + p["jmaxnb"], p["eaj"], Tk,
+                           p["delsj"], p["edj"])
+        vcmax = arrh(mt, p["vcmaxna"] * N0 + p["vcmaxnb"], p["eav"], Tk)
+    elif modeljm == 2:
+        vcmax25 = p["vcmaxna"] * N0 + p["vcmaxnb"]
+        vcmax = arrh(mt, vcmax25, p["eav"], Tk)
+        jmax = peaked_arrh(mt, p["jv_slope"] * vcmax25 - p["jv_intercept"],
+                           p["eaj"], Tk, p["delsj"], p["edj"])
+    elif modeljm == 3:
+        jmax = peaked_arrh(mt, p["jmax"], p["eaj"], Tk, p["delsj"], p["edj"])
+        vcmax = arrh(mt, p["vcmax"], p["eav"], Tk)
+    else:
+        raise ValueError("Unknown modeljm: %s" % (modeljm))
+
+    # forced linearly to zero at low temperature, adj_for_low_temp
+    Tc = Tk - DEG_TO_KELVIN
+    ramp = np.where(Tc < 0.0, 0.0, np.where(Tc < 10.0, Tc / 10.0, 1.0))
+
+    return (jmax * ramp, vcmax * ramp)
+
+def epsilon(p, asat, par, alpha, daylen):
+    """ Canopy LUE, Sands (1995), the integral in 6 intervals.
+
+    This is most of the work in a sweep, so the loop runs in place over
+    preallocated arrays rather than building new ones each term.
+    """
+    delta = 0.16666666667
+    h = daylen * SECS_IN_HOUR
+    with np.errstate(divide="ignore", invalid="ignore"):
+        q = np.pi * p["kext"] * alpha * par / (2.0 * h * asat)
+        q4theta = 4.0 * p["theta"] * q
+        integral_g = np.zeros(q.shape)
+        (qs, arg2, arg3) = (np.empty(q.shape), np.empty(q.shape),
+                            np.empty(q.shape))
+        for i in range(1, 13, 2):
+            sinx = np.sin(np.pi * i / 24.)
+            np.multiply(q, sinx, out=qs)
+            np.add(qs, 1.0, out=arg2)
+            np.multiply(arg2, arg2, out=arg3)
+            np.subtract(arg3, np.multiply(q4theta, sinx, out=qs), out=arg3)
+            np.sqrt(arg3, out=arg3)
+            np.add(arg2, arg3, out=arg3)
+            np.divide(sinx, arg3, out=arg3)
+            integral_g += arg3
+        integral_g *= delta
+        lue = alpha * integral_g * np.pi
+
+    return np.where(asat > 0.0, lue, 0.0)
+
+def _mate_days(met, p, daylen):
+    """ mate_C3_photosynthesis for every day at once. Parameters are scalars
+    or (nsets, 1) columns, met rows are (ndays,), so results broadcast to
+    (nsets, ndays).
+    """
+    mt = p["measurement_temp"] + DEG_TO_KELVIN
+
+    # reset_run_state and simulate_day, the leaf N:C is prescribed
+    lai = p["fix_lai"]
+    leafn = p["prescribed_leaf_NC"] * p["cfracts"] / p["sla"] * KG_AS_G
+    ncontent = np.where(lai > 0.0, leafn * lai, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fipar = np.where(lai > 0.0, 1.0 - np.exp(-p["kext"] * lai), 0.0)
+        N0 = np.where(lai > 0.0,
+                      ncontent * p["kext"] / (1.0 - np.exp(-p["kext"] * lai)),
+                      0.0)
+
+    # Medlyn et al. 2011, with g0 = 0
+    g1w = p["g1"] * 1.0
+    Ca = met["co2"]
+
+    lue = {}
+    for (tam, vpd, tag) in ((met["tam"], met["vpd_am"], "am"),
+                            (met["tpm"], met["vpd_pm"], "pm")):
+        Tk = tam + DEG_TO_KELVIN
+        gamma_star = arrh(mt, p["gamstar25"], p["eag"], Tk)
+        Km = (arrh(mt, p["kc25"], p["eac"], Tk) *
+              (1.0 + p["oi"] / arrh(mt, p["ko25"], p["eao"], Tk)))
+        (jmax, vcmax) = jmax_and_vcmax(p, p["modeljm"], Tk, N0, mt)
+
+        cica = g1w / (g1w + np.sqrt(vpd * KPA_2_PA * PA_2_KPA))
+        ci = cica * Ca
+
+        alpha = assim(ci, gamma_star, p["alpha_j"] / 4.0, 2.0 * gamma_star)
+        ac = assim(ci, gamma_star, vcmax, Km)
+        aj = assim(ci, gamma_star, jmax / 4.0, 2.0 * gamma_star)
+        asat = np.minimum(aj, ac)
+
+        par = (met["par_am"] + met["par_pm"]) * (MJ_TO_J * J_2_UMOL)
+        lue[tag] = epsilon(p, asat, par, alpha, daylen)
+
+    lue_avg = (lue["am"] + lue["pm"]) / 2.0
+
+    apar = np.where(np.abs(lai - 0.0) <= EPSILON * np.abs(lai), 0.0,
+                    par * fipar)
+    conv = UMOL_TO_MOL * MOL_C_TO_GRAMS_C
+    gpp_gCm2 = apar * lue_avg * conv
+    gpp = gpp_gCm2 * G_AS_TONNES / M2_AS_HA
+
+    return {"gpp": gpp * 100., "apar": apar * (UMOL_2_JOL * J_TO_MJ),
+            "gpp_am": (apar / 2.0) * lue["am"] * conv,
+            "gpp_pm": (apar / 2.0) * lue["pm"] * conv}
+
+def run_mate(met, params, sweep=None, chunk=64, fields=("gpp", "apar")):
+    """ Daily MATE GPP for every day and every parameter set.
+
+    Parameters:
+    ----------
+    met : dictionary or string
+        daily forcing columns (see read_met), or a daily met CSV
+    params : dictionary
+        parameters and control options, see read_params
+    sweep : dictionary
+        {name: array} of parameter values to run, all arrays the same
+        length (the number of parameter sets). Any of MATE_PARAMS can be
+        swept.
+    chunk : int
+        parameter sets evaluated at a time, to bound the temporaries
+    fields : sequence
+        outputs wanted, of gpp (g C m-2 d-1), apar (MJ m-2 d-1), gpp_am
+        and gpp_pm (g C m-2 half-day-1)
+
+    Returns:
+    --------
+    out : dictionary
+        year and doy, (ndays,), as written by the model, then each field,
+        (nsets, ndays), or (ndays,) without a sweep
+
+    """
+    if isinstance(met, str):
+        met = read_met(met)
+    if params.get("sub_daily", False):
+        raise ValueError("MATE is the daily model, sub_daily must be false")
+    if params.get("ncycle", False):
+        raise ValueError("Only a prescribed leaf N:C (ncycle = false) is "
+                         "implemented")
+    if params["ps_pathway"] != "c3":
+        raise ValueError("Only C3 MATE is implemented")
+    if params["gs_model"] != "medlyn":
+        raise ValueError("Only Belindas gs model is implemented")
+
+    met = dict((var, np.asarray(met[var], dtype=np.float64))
+               for var in ("year", "co2", "tam", "tpm", "vpd_am", "vpd_pm",
+                           "par_am", "par_pm"))
+    ndays = len(met["year"])
+
+    if not sweep:
+        (year, doy, daylen) = model_calendar(met, params["latitude"])
+        out = _mate_days(met, params, daylen)
+        result = dict((f, out[f] + np.zeros(ndays)) for f in fields)
+        result["year"] = year
+        result["doy"] = doy
+        return result
+
+    sweep = dict((k, np.asarray(v, dtype=np.float64).ravel())
+                 for (k, v) in sweep.items())
+    unknown = [k for k in sweep if k not in MATE_PARAMS]
+    if unknown:
+        raise KeyError("Not a MATE parameter: %s" % (", ".join(unknown)))
+    nsets = len(next(iter(sweep.values())))
+    if any(len(v) != nsets for v in sweep.values()):
+        raise ValueError("Sweep arrays must all be the same length")
+
+    result = dict((f, np.empty((nsets, ndays))) for f in fields)
+    for start in range(0, nsets, chunk):
+        stop = min(start + chunk, nsets)
+        p = dict(params)
+        for (k, v) in sweep.items():
+            p[k] = v[start:stop, None]
+        (year, doy, daylen) = model_calendar(met, p["latitude"])
+        out = _mate_days(met, p, daylen)
+        for f in fields:
+            result[f][start:stop] = out[f]
+    result["year"] = year
+    result["doy"] = doy
+
+    return result
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+Streaming summaries of daily model output, so that an ensemble can be
+folded in a chunk of members at a time and only the summaries kept.
+
+Welford keeps the count, mean and sum of squared deviations for each day,
+folding in a block of members with Chan et al.'s pairwise update, and
+TDigest (Dunning & Ertl's merging t-digest, with the k1 scale function)
+keeps a few hundred weighted centroids from which any quantile can be
+read. DailySummary holds one of each per day. Non-finite values (e.g. a
+GPP ratio on a day with no ambient GPP) are left out, so the count can
+differ between days.
+"""
+
+import numpy as np
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+class Welford(object):
+    """ Running count, mean and variance of each element of an array """
+
+    def __init__(self, shape):
+        self.n = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, block):
+        """ Fold in a block of members, shape (nmembers,) + shape """
+        block = np.asarray(block, dtype=np.float64)
+        ok = np.isfinite(block)
+        nb = ok.sum(axis=0).astype(np.float64)
+        x = np.where(ok, block, 0.0)
+        mean_b = x.sum(axis=0) / np.maximum(nb, 1.0)
+        m2_b = (np.where(ok, x - mean_b, 0.0)**2).sum(axis=0)
+
+        n = self.n + nb
+        delta = mean_b - self.mean
+        frac = np.where(n > 0.0, nb / np.maximum(n, 1.0), 0.0)
+        self.mean = self.mean + delta * frac
+        self.m2 = self.m2 + m2_b + delta**2 * self.n * frac
+        self.n = n
+
+    def variance(self, ddof=1):
+        """ sample variance (ddof=1), nan where there are too few values """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.n > ddof, self.m2 / (self.n - ddof), np.nan)
+
+class TDigest(object):
+    """ Merging t-digest of a stream of values.
+
+    Values are buffered and merged into the centroids once there are more
+    than buffer_size of them. delta (the compression) bounds the number of
+    centroids, to roughly delta / 2 after each merge.
+    """
+
+    def __init__(self, delta=200.0, buffer_size=None):
+        self.delta = float(delta)
+        self.buffer_size = buffer_size or int(5 * delta)
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.nbuffer = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """ Add an array of values, non-finite ones are dropped """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        self.buffer.append(values)
+        self.nbuffer += values.size
+        if self.nbuffer > self.buffer_size:
+            self.compress()
+
+    def compress(self):
+        """ Merge the buffer into the centroids """
+        if self.nbuffer == 0:
+            return
+        values = np.concatenate(self.buffer)
+        self.buffer = []
+        self.nbuffer = 0
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        means = np.concatenate((self.means, values))
+        weights = np.concatenate((self.weights, np.ones(values.size)))
+        order = np.argsort(means, kind="mergesort")
+        means = means[order]
+        weights = weights[order]
+
+        # group on the k scale, each centroid spanning at most about one
+        # unit of k, so they are small in the tails and large in the middle
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        k = self.delta / (2.0 * np.pi) * np.arcsin(2.0 * q_left - 1.0)
+        group = np.floor(k - k[0]).astype(np.int64)
+        (_, start) = np.unique(group, return_index=True)
+        self.weights = np.add.reduceat(weights, start)
+        self.means = np.add.reduceat(means * weights, start) / self.weights
+
+    def count(self):
+        """ number of values added so far """
+        return self.weights.sum() + self.nbuffer
+
+    def quantile(self, q):
+        """ Estimate the q quantile(s), nan if nothing has been added """
+        self.compress()
+        q = np.asarray(q, dtype=np.float64)
+        if self.weights.size == 0:
+            return np.full(q.shape, np.nan)
+        if self.weights.size == 1:
+            return np.full(q.shape, self.means[0])
+
+        # centroid centres at their cumulative mid points, pinned to the
+        # min and max at either end
+        total = self.weights.sum()
+        mid = (np.cumsum(self.weights) - 0.5 * self.weights) / total
+        xp = np.concatenate(([0.0], mid, [1.0]))
+        fp = np.concatenate(([self.min], self.means, [self.max]))
+
+        return np.interp(q, xp, fp)
+
+class DailySummary(object):
+    """ Mean, variance and quantiles of one output variable on each day """
+
+    def __init__(self, ndays, delta=200.0):
+        self.ndays = ndays
+        self.moments = Welford(ndays)
+        self.digests = [TDigest(delta) for i in range(ndays)]
+
+    def update(self, block):
+        """ Fold in a (nmembers, ndays) block """
+        block = np.asarray(block, dtype=np.float64).reshape(-1, self.ndays)
+        self.moments.update(block)
+        for (day, digest) in enumerate(self.digests):
+            digest.update(block[:, day])
+
+    def summary(self, quantiles=(0.05, 0.5, 0.95)):
+        """ {"n", "mean", "sd", "qNN", ...} arrays of length ndays """
+        out = {"n": self.moments.n.astype(np.int64),
+               "mean": self.moments.mean.copy(),
+               "sd": np.sqrt(self.moments.variance())}
+        qs = np.array([d.quantile(quantiles) for d in self.digests])
+        for (i, q) in enumerate(quantiles):
+            out[quantile_name(q)] = qs[:, i]
+
+        return out
+
+def quantile_name(q):
+    """ column name for a quantile, e.g. 0.05 -> q05, 0.975 -> q97.5 """
+    return "q%s" % (("%g" % (100.0 * q)).zfill(2))
@@ -9,17 +9,20 @@ import os
 import pandas as pd
 import datetime as dt
 
+from results_store import ResultsStore
+
 __author__  = "Martin De Kauwe"
 __version__ = "1.0 (22.02.2016)"
 __email__   = "mdekauwe@gmail.com"
 
-def main():
-
-    fname = "outputs/twoleaf_AMB.csv"
-    dfta = pd.read_csv(fname)
+def main(store_dir="outputs/store", site="EucFACE"):
 
-    fname = "outputs/mate_AMB.csv"
-    dfma = pd.read_csv(fname)
+    # only GPP and APAR are read from the store
+    store = ResultsStore(store_dir)
+    dfta = store.get(["gpp", "apar"], scheme="twoleaf", treatment="AMB",
+                     site=site)
+    dfma = store.get(["gpp", "apar"], scheme="mate", treatment="AMB",
+                     site=site)
 
 
     golden_mean = 0.6180339887498949
@@ -9,23 +9,20 @@ import os
 import pandas as pd
 import datetime as dt
 
+from results_store import ResultsStore
+
 __author__  = "Martin De Kauwe"
 __version__ = "1.0 (22.02.2016)"
 __email__   = "mdekauwe@gmail.com"
 
-def main():
-
-    fname = "outputs/twoleaf_AMB.csv"
-    dfta = pd.read_csv(fname)
-
-    fname = "outputs/twoleaf_ELE.csv"
-    dfte = pd.read_csv(fname)
-
-    fname = "outputs/mate_AMB.csv"
-    dfma = pd.read_csv(fname)
+def main(store_dir="outputs/store", site="EucFACE"):
 
-    fname = "outputs/mate_ELE.csv"
-    dfme = pd.read_csv(fname)
+    # only GPP is read from the store, not the whole of each run
+    store = ResultsStore(store_dir)
+    dfta = store.get("gpp", scheme="twoleaf", treatment="AMB", site=site)
+    dfte = store.get("gpp", scheme="twoleaf", treatment="ELE", site=site)
+    dfma = store.get("gpp", scheme="mate", treatment="AMB", site=site)
+    dfme = store.get("gpp", scheme="mate", treatment="ELE", site=site)
 
 
     golden_mean = 0.6180339887498949
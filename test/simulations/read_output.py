@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""
+Read canopy_scaling output into a DataFrame, whichever way it was written:
+CSV (output_ascii = true), a .npy structured array, or float64 columns,
+written in blocks of rows, with a .hdr file describing them
+(output_ascii = false). The same goes for the sub-daily output.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+def read_output(fname, hdr_fname=None):
+    """ Load a model output file.
+
+    Parameters:
+    ----------
+    fname : string
+        output file, .csv, .npy or raw binary. If it isn't there, the
+        same name with the other extension is tried, so scripts work
+        whichever way run_simulations.py was told to write the output.
+    hdr_fname : string
+        header for raw binary output, defaults to fname.hdr
+
+    Returns:
+    --------
+    df : DataFrame
+        one column per output variable
+
+    """
+    (stem, ext) = os.path.splitext(fname)
+    if not os.path.exists(fname):
+        for other in (".npy", ".csv"):
+            if os.path.exists(stem + other):
+                fname = stem + other
+                break
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == ".npy":
+        return pd.DataFrame(np.load(fname))
+    elif ext in (".csv", ".txt"):
+        return pd.read_csv(fname)
+
+    if hdr_fname is None:
+        hdr_fname = fname + ".hdr"
+    hdr = read_header(hdr_fname)
+    data = np.fromfile(fname, dtype="<f8")
+    (nrows, ncols, block) = (hdr["nrows"], hdr["ncols"], hdr["block_rows"])
+
+    # full blocks are (ncols, block) each, the last one (ncols, nrows % block)
+    nfull = nrows // block
+    full = data[:nfull * ncols * block].reshape(nfull, ncols, block)
+    tail = data[nfull * ncols * block:].reshape(ncols, nrows - nfull * block)
+    data = np.concatenate([full.transpose(1, 0, 2).reshape(ncols, -1), tail],
+                          axis=1)
+
+    return pd.DataFrame(dict(zip(hdr["columns"], data)),
+                        columns=hdr["columns"])
+
+def read_header(hdr_fname):
+    """ Parse the key = value header written next to raw binary output """
+    hdr = {}
+    with open(hdr_fname, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            (key, value) = [s.strip() for s in line.split("=", 1)]
+            hdr[key] = value
+    hdr["nrows"] = int(hdr["nrows"])
+    hdr["ncols"] = int(hdr["ncols"])
+    hdr["block_rows"] = int(hdr["block_rows"])
+    hdr["columns"] = hdr["columns"].split(",")
+
+    return hdr
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+
+"""
+Results store for many model runs: each run's output columns are cut into
+chunks of rows, byte-shuffled and zlib compressed into one file per run,
+and an index (index.json) records for every run its id, scheme,
+treatment, site, cfg hash and other metadata, and where each chunk of
+each column is. A query reads only the chunks of the variables and days
+asked for, so plotting GPP for a couple of years of a dozen runs doesn't
+mean parsing every output file in full.
+
+    store = ResultsStore("outputs/store")
+    store.add_output("outputs/mate_AMB.csv", "EucFACE_mate_AMB",
+                     scheme="mate", treatment="AMB", site="EucFACE")
+    df = store.get("gpp", start=2012, end=(2013, 180), scheme="mate",
+                   treatment="AMB")
+
+The index is rewritten whole (via a rename) whenever a run is added, and
+the store is meant to have one writing process at a time, although
+threads within it may add runs concurrently (run_simulations.run_batch).
+
+    ./results_store.py outputs/store add outputs/mate_AMB.csv \\
+        --scheme mate --treatment AMB --site EucFACE
+    ./results_store.py outputs/store list
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+from read_output import read_output
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+INDEX_FNAME = "index.json"
+CHUNK_ROWS = 1024
+TAGS = ["scheme", "treatment", "site"]
+
+class ResultsStore(object):
+    """ Chunked, compressed column store of model runs """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, level=6):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.lock = threading.Lock()
+        if not os.path.isdir(os.path.join(path, "runs")):
+            os.makedirs(os.path.join(path, "runs"))
+        self.index = self.read_index()
+
+    def read_index(self):
+        fname = os.path.join(self.path, INDEX_FNAME)
+        if not os.path.exists(fname):
+            return {}
+        with open(fname, "r") as f:
+            return dict((run["run_id"], run) for run in json.load(f)["runs"])
+
+    def write_index(self):
+        fname = os.path.join(self.path, INDEX_FNAME)
+        runs = [self.index[run_id] for run_id in sorted(self.index)]
+        with open(fname + ".tmp", "w") as f:
+            json.dump({"version": 1, "runs": runs}, f, indent=1,
+                      sort_keys=True)
+        os.rename(fname + ".tmp", fname)
+
+    def add_run(self, run_id, data, scheme=None, treatment=None, site=None,
+                cfg_hash=None, meta=None):
+        """ Add (or replace) a run.
+
+        Parameters:
+        ----------
+        run_id : string
+            unique name of the run in the store
+        data : DataFrame, structured array or dictionary of arrays
+            the run's output columns, with year and doy among them
+        scheme, treatment, site : string
+            tags the runs are selected by
+        cfg_hash : string
+            hash of the parameters the run was made with, see
+            run_simulations.cfg_hash
+        meta : dictionary
+            anything else worth keeping about the run (JSON-able)
+
+        """
+        columns = output_columns(data)
+        if "year" not in columns or "doy" not in columns:
+            raise ValueError("Run %s has no year/doy columns" % (run_id))
+        nrows = len(columns["year"])
+        bounds = list(range(0, nrows, self.chunk_rows)) or [0]
+        key = time_key(columns["year"], columns["doy"])
+
+        data_fname = os.path.join("runs", "%s.dat" % (safe_name(run_id)))
+        tmp_fname = os.path.join(self.path, data_fname + ".tmp")
+        entry = {"run_id": run_id, "scheme": scheme, "treatment": treatment,
+                 "site": site, "cfg_hash": cfg_hash, "meta": meta or {},
+                 "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                 "data_file": data_fname, "nrows": nrows,
+                 "chunk_rows": self.chunk_rows, "columns": {},
+                 "time": [[int(key[i:i + self.chunk_rows].min()),
+                           int(key[i:i + self.chunk_rows].max())]
+                          for i in bounds if nrows > 0]}
+        offset = 0
+        with open(tmp_fname, "wb") as f:
+            for (name, values) in columns.items():
+                values = np.ascontiguousarray(values)
+                chunks = []
+                for i in bounds:
+                    buf = zlib.compress(shuffle(values[i:i + self.chunk_rows]),
+                                        self.level)
+                    f.write(buf)
+                    chunks.append([offset, len(buf)])
+                    offset += len(buf)
+                entry["columns"][name] = {"dtype": values.dtype.str,
+                                          "chunks": chunks}
+        os.rename(tmp_fname, os.path.join(self.path, data_fname))
+
+        with self.lock:
+            self.index[run_id] = entry
+            self.write_index()
+
+    def add_output(self, fname, run_id, **kwargs):
+        """ Add a model output file (anything read_output reads), keyword
+        arguments as for add_run """
+        df = read_output(fname)
+        self.add_run(run_id, df, **kwargs)
+
+    def remove_run(self, run_id):
+        """ Drop a run and its data file """
+        with self.lock:
+            entry = self.index.pop(run_id)
+            self.write_index()
+        os.remove(os.path.join(self.path, entry["data_file"]))
+
+    def runs(self, run_ids=None, **tags):
+        """ Index entries of the runs matching the tags (scheme, treatment,
+        site, cfg_hash or run_id lists), sorted by run id """
+        if isinstance(run_ids, str):
+            run_ids = [run_ids]
+        selected = []
+        for run_id in sorted(self.index):
+            entry = self.index[run_id]
+            if run_ids is not None and run_id not in run_ids:
+                continue
+            if all(entry.get(tag) == value for (tag, value) in tags.items()
+                   if value is not None):
+                selected.append(entry)
+
+        return selected
+
+    def load(self, entry, variables, start=None, end=None):
+        """ Read variables for one run (an index entry or a run id) between
+        start and end (inclusive), each a year or a (year, doy) tuple """
+        if not isinstance(entry, dict):
+            entry = self.index[entry]
+        if isinstance(variables, str):
+            variables = [variables]
+        missing = [v for v in variables if v not in entry["columns"]]
+        if missing:
+            raise KeyError("Run %s has no %s" % (entry["run_id"],
+                                                 ", ".join(missing)))
+
+        (lo, hi) = (key_bound(start, False), key_bound(end, True))
+        wanted = [i for (i, (first, last)) in enumerate(entry["time"])
+                  if last >= lo and first <= hi]
+        names = ["year", "doy"] + [v for v in variables
+                                   if v not in ("year", "doy")]
+        if "hod" in entry["columns"] and "hod" not in names:
+            names.insert(2, "hod")
+
+        out = {}
+        with open(os.path.join(self.path, entry["data_file"]), "rb") as f:
+            for name in names:
+                column = entry["columns"][name]
+                dtype = np.dtype(column["dtype"])
+                parts = []
+                for i in wanted:
+                    (offset, nbytes) = column["chunks"][i]
+                    f.seek(offset)
+                    parts.append(unshuffle(zlib.decompress(f.read(nbytes)),
+                                           dtype))
+                out[name] = (np.concatenate(parts) if parts else
+                             np.empty(0, dtype=dtype))
+
+        keep = time_key(out["year"], out["doy"])
+        keep = (keep >= lo) & (keep <= hi)
+
+        return pd.DataFrame(dict((name, out[name][keep]) for name in names),
+                            columns=names)
+
+    def query(self, variables, start=None, end=None, run_ids=None, **tags):
+        """ {run_id: DataFrame} for every run matching the tags """
+        return dict((entry["run_id"], self.load(entry, variables, start, end))
+                    for entry in self.runs(run_ids, **tags))
+
+    def get(self, variables, start=None, end=None, run_ids=None, **tags):
+        """ DataFrame of the one run matching the tags """
+        entries = self.runs(run_ids, **tags)
+        if len(entries) != 1:
+            raise KeyError("%d runs in %s match %s" % \
+                           (len(entries), self.path, tags))
+
+        return self.load(entries[0], variables, start, end)
+
+def output_columns(data):
+    """ {name: 1-d array} from a DataFrame, structured array or dictionary,
+    in column order """
+    if isinstance(data, pd.DataFrame):
+        names = list(data.columns)
+    elif isinstance(data, np.ndarray) and data.dtype.names is not None:
+        names = list(data.dtype.names)
+    else:
+        names = list(data.keys())
+
+    return dict((str(name), np.asarray(data[name])) for name in names)
+
+def time_key(year, doy):
+    """ year and day of year as one sortable integer """
+    return (np.asarray(year).astype(np.int64) * 1000 +
+            np.asarray(doy).astype(np.int64))
+
+def key_bound(bound, upper):
+    """ time key of a start/end given as None, a year or (year, doy) """
+    if bound is None:
+        return np.iinfo(np.int64).max if upper else np.iinfo(np.int64).min
+    if isinstance(bound, (tuple, list)):
+        return int(bound[0]) * 1000 + int(bound[1])
+
+    return int(bound) * 1000 + (999 if upper else 0)
+
+def shuffle(values):
+    """ Group the bytes of an array by significance (all the first bytes,
+    then all the second ...), which zlib compresses much better """
+    raw = np.frombuffer(values.tobytes(), dtype=np.uint8)
+
+    return raw.reshape(-1, values.dtype.itemsize).T.tobytes()
+
+def unshuffle(buf, dtype):
+    """ Inverse of shuffle """
+    raw = np.frombuffer(buf, dtype=np.uint8).reshape(dtype.itemsize, -1)
+
+    return np.frombuffer(raw.T.tobytes(), dtype=dtype)
+
+def safe_name(run_id):
+    """ run id as a file name """
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in run_id)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("store")
+    sub = parser.add_subparsers(dest="command")
+    add = sub.add_parser("add", help="add model output files")
+    add.add_argument("fnames", nargs="+")
+    add.add_argument("--run-id", default=None,
+                     help="defaults to the file name without extension")
+    for tag in TAGS + ["cfg_hash"]:
+        add.add_argument("--%s" % (tag.replace("_", "-")), dest=tag)
+    sub.add_parser("list", help="list the runs")
+    rm = sub.add_parser("rm", help="remove runs")
+    rm.add_argument("run_ids", nargs="+")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    if args.command == "add":
+        if args.run_id is not None and len(args.fnames) > 1:
+            sys.exit("--run-id is for a single file")
+        for fname in args.fnames:
+            run_id = (args.run_id or
+                      os.path.splitext(os.path.basename(fname))[0])
+            store.add_output(fname, run_id, scheme=args.scheme,
+                             treatment=args.treatment, site=args.site,
+                             cfg_hash=args.cfg_hash,
+                             meta={"source": os.path.abspath(fname)})
+    elif args.command == "rm":
+        for run_id in args.run_ids:
+            store.remove_run(run_id)
+    else:
+        print("%-30s %-8s %-6s %-10s %-12s %8s" % ("run_id", "scheme", "trt",
+                                                  "site", "cfg_hash", "rows"))
+        for entry in store.runs():
+            print("%-30s %-8s %-6s %-10s %-12s %8d" % \
+                  (entry["run_id"], entry["scheme"] or "-",
+                   entry["treatment"] or "-", entry["site"] or "-",
+                   (entry["cfg_hash"] or "-")[:12], entry["nrows"]))
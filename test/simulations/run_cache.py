@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+"""
+Content-addressed cache of model output, so that a run whose inputs
+haven't changed isn't made again.
+
+Entries are keyed on a hash of everything the output depends on (see
+run_simulations.run_key: the parameters after replace_keys, the met file
+contents and the model executable) and live in cache_dir/ab/abcd...,
+holding the output file and meta.json. An entry is written to a scratch
+directory and renamed into place, so it is only ever seen complete.
+Using an entry touches it, and once the cache is bigger than max_bytes
+the least recently used entries are evicted.
+
+The executable is keyed on its contents, so rebuilding the model after
+a change makes new entries, and the old ones age out. Entries can also be
+dropped by hand, by key or by what meta.json records about the run:
+
+    ./run_cache.py run_cache list
+    ./run_cache.py run_cache invalidate --tag twoleaf_AMB
+    ./run_cache.py run_cache invalidate --site EucFACE --scheme mate
+    ./run_cache.py run_cache invalidate --all
+    ./run_cache.py run_cache prune --max-size 500M
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+META_FNAME = "meta.json"
+MAX_BYTES = 2 * 1024**3
+
+# meta.json fields entries can be invalidated by
+MATCH_FIELDS = ["tag", "site", "scheme", "treatment", "exe_hash"]
+
+class RunCache(object):
+    """ Model output keyed on a hash of the run's inputs """
+
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def entry_dir(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key, ofname):
+        """ Copy the output stored under key to ofname.
+
+        Returns:
+        --------
+        meta : dictionary
+            what was stored with the output, None on a miss
+
+        """
+        entry = self.entry_dir(key)
+        try:
+            with open(os.path.join(entry, META_FNAME), "r") as f:
+                meta = json.load(f)
+            shutil.copyfile(os.path.join(entry, meta["output"]), ofname)
+        except (IOError, OSError, ValueError):
+            return None
+        os.utime(entry, None)
+
+        return meta
+
+    def put(self, key, ofname, meta=None):
+        """ Store a copy of the output file ofname under key, with meta """
+        entry = self.entry_dir(key)
+        if os.path.isdir(entry):
+            return
+        if not os.path.isdir(os.path.dirname(entry)):
+            try:
+                os.makedirs(os.path.dirname(entry))
+            except OSError:
+                pass    # made by another thread in the meantime
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=self.path)
+        output = "output" + os.path.splitext(ofname)[1]
+        meta = dict(meta or {}, key=key, output=output,
+                    created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        try:
+            shutil.copyfile(ofname, os.path.join(tmp_dir, output))
+            with open(os.path.join(tmp_dir, META_FNAME), "w") as f:
+                json.dump(meta, f, indent=1, sort_keys=True)
+            os.rename(tmp_dir, entry)
+        except OSError:
+            # another process stored the same key first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """ (key, entry dir, size in bytes, last used, meta) for every
+        complete entry, least recently used first """
+        found = []
+        for prefix in sorted(os.listdir(self.path)):
+            if len(prefix) != 2:
+                continue
+            for key in os.listdir(os.path.join(self.path, prefix)):
+                entry = os.path.join(self.path, prefix, key)
+                try:
+                    with open(os.path.join(entry, META_FNAME), "r") as f:
+                        meta = json.load(f)
+                    size = sum(os.path.getsize(os.path.join(entry, fname))
+                               for fname in os.listdir(entry))
+                    used = os.path.getmtime(entry)
+                except (IOError, OSError, ValueError):
+                    continue
+                found.append((key, entry, size, used, meta))
+
+        return sorted(found, key=lambda e: e[3])
+
+    def evict(self, max_bytes=None):
+        """ Drop the least recently used entries until the cache fits in
+        max_bytes (self.max_bytes by default), returns the number dropped """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        with self.lock:
+            entries = self.entries()
+            total = sum(e[2] for e in entries)
+            ndropped = 0
+            for (key, entry, size, used, meta) in entries:
+                if total <= max_bytes:
+                    break
+                drop_entry(entry)
+                total -= size
+                ndropped += 1
+
+        return ndropped
+
+    def invalidate(self, keys=None, **match):
+        """ Drop the entries with the given keys and/or whose meta matches
+        every match item (e.g. tag="mate_AMB"); nothing given drops all.
+        Returns the number dropped. """
+        ndropped = 0
+        with self.lock:
+            for (key, entry, size, used, meta) in self.entries():
+                if keys is not None and key not in keys:
+                    continue
+                if any(meta.get(k) != v for (k, v) in match.items()):
+                    continue
+                drop_entry(entry)
+                ndropped += 1
+
+        return ndropped
+
+def drop_entry(entry):
+    """ Remove an entry, and its prefix directory once that is empty """
+    shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(entry))
+    except OSError:
+        pass
+
+def parse_size(text):
+    """ "500M", "2G", "123456" -> bytes """
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+
+    return int(text)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cache_dir")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("list", help="list the entries, least recently used "
+                                "first")
+    inv = sub.add_parser("invalidate", help="drop entries")
+    inv.add_argument("keys", nargs="*")
+    inv.add_argument("--all", action="store_true")
+    for field in MATCH_FIELDS:
+        inv.add_argument("--%s" % (field.replace("_", "-")), dest=field)
+    prune = sub.add_parser("prune", help="evict down to a size")
+    prune.add_argument("--max-size", default="%d" % (MAX_BYTES))
+    args = parser.parse_args()
+
+    cache = RunCache(args.cache_dir)
+    if args.command == "invalidate":
+        match = dict((field, getattr(args, field))
+                     for field in MATCH_FIELDS
+                     if getattr(args, field) is not None)
+        if not (args.keys or match or args.all):
+            sys.exit("Give keys, a --field to match or --all")
+        n = cache.invalidate(keys=args.keys or None, **match)
+        print("%d entries invalidated" % (n))
+    elif args.command == "prune":
+        n = cache.evict(parse_size(args.max_size))
+        print("%d entries evicted" % (n))
+    else:
+        total = 0
+        for (key, entry, size, used, meta) in cache.entries():
+            total += size
+            print("%s %-24s %10d %s" % \
+                  (key[:16], meta.get("tag", "-"), size,
+                   time.strftime("%Y-%m-%d %H:%M", time.localtime(used))))
+        print("%.1f MB" % (total / 1024.0**2))
@@ -13,20 +13,89 @@ CABLE's evergreen broadleaf forest paramaters.
 
 import numpy as np
 import os
+import getpass
+import hashlib
 import shutil
 import sys
 import subprocess
+import time
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 __author__  = "Martin De Kauwe"
 __version__ = "1.0 (31.03.2015)"
 __email__   = "mdekauwe@gmail.com"
 
-USER = os.getlogin()
+USER = getpass.getuser()
 import adjust_gday_param_file as ad
+from results_store import ResultsStore
+from run_cache import RunCache
 
-def main(experiment_id, latitude, longitude, treatment, scheme):
+GDAY = "canopy_scaling"
+
+# replacements that only say where/how the output goes, left out of cfg_hash
+OUTPUT_KEYS = ["cfg_fname", "out_param_fname", "out_fname",
+               "out_subdaily_fname", "output_ascii"]
+
+# file hashes already worked out by this process, see file_hash
+_file_hashes = {}
+
+def make_spec(experiment_id, latitude, longitude, treatment, scheme,
+              overrides=None, tag=None):
+    """ Describe a single model run.
+
+    Parameters:
+    ----------
+    experiment_id : string
+        site/experiment name, e.g. EucFACE
+    latitude : float
+        site latitude (deg)
+    longitude : float
+        site longitude (deg)
+    treatment : string
+        AMB or ELE, selects the met forcing file
+    scheme : string
+        mate or twoleaf
+    overrides : dictionary
+        extra parameter file replacements, applied after the defaults
+    tag : string
+        run name used for the cfg and captured output files, defaults to
+        scheme_treatment
+
+    Returns:
+    --------
+    spec : dictionary
+        run description understood by run_batch
+
+    """
+    if tag is None:
+        tag = "%s_%s" % (scheme, treatment)
+
+    return {"experiment_id": experiment_id, "latitude": latitude,
+            "longitude": longitude, "treatment": treatment, "scheme": scheme,
+            "overrides": dict(overrides or {}), "tag": tag}
+
+def run_params(spec):
+    """ Work out the parameter file changes for one run.
+
+    Parameters:
+    ----------
+    spec : dictionary
+        run description, see make_spec
 
-    GDAY = "canopy_scaling -p "
+    Returns:
+    --------
+    base_cfg : string
+        base parameter file
+    cfg_fname : string
+        name of this run's parameter file, if one is written
+    replace_dict : dictionary
+        parameter replacements, the spec overrides applied last
+
+    """
+    experiment_id = spec["experiment_id"]
+    scheme = spec["scheme"]
+    treatment = spec["treatment"]
 
     # dir names
     base_param_name = "base_start"
@@ -37,10 +106,12 @@ def main(experiment_id, latitude, longitude, treatment, scheme):
     met_dir = os.path.join(base_dir, "met_data")
     run_dir = os.path.join(base_dir, "outputs")
 
-    # copy base files to make two new experiment files
-    shutil.copy(os.path.join(base_param_dir, base_param_name + ".cfg"),
-                os.path.join(param_dir, "%s_model_run.cfg" % \
-                                                (experiment_id)))
+    itag = "%s_%s_model_run" % (experiment_id, spec["tag"])
+    otag = "%s_%s_simulation" % (experiment_id, spec["tag"])
+    mtag = "%s_%s.csv" % (scheme, treatment)
+
+    base_cfg = os.path.join(base_param_dir, base_param_name + ".cfg")
+    cfg_fname = os.path.join(param_dir, itag + ".cfg")
 
     if scheme == "mate":
         sub_daily = "false"
@@ -49,16 +120,9 @@ def main(experiment_id, latitude, longitude, treatment, scheme):
         sub_daily = "true"
         alpha_j = 0.308
 
-    itag = "%s_model_run" % (experiment_id)
-    otag = "%s_simulation" % (experiment_id)
-    mtag = "%s_%s.csv" % (scheme, treatment)
-
-    out_fn = "%s_simulation.csv" % (experiment_id)
     out_param_fname = os.path.join(param_dir, otag + ".cfg")
-    cfg_fname = os.path.join(param_dir, itag + ".cfg")
     met_fname = os.path.join(met_dir, mtag)
-
-    out_fname = os.path.join(run_dir, out_fn)
+    out_fname = os.path.join(run_dir, otag + ".csv")
     replace_dict = {
 
                      # files
@@ -72,8 +136,8 @@ def main(experiment_id, latitude, longitude, treatment, scheme):
                      "alpha_j": "%f" % (alpha_j),
 
                      "max_intercep_lai": "3.0",
-                     "latitude": "%f" % (latitude),
-                     "longitude": "%f" % (longitude),
+                     "latitude": "%f" % (spec["latitude"]),
+                     "longitude": "%f" % (spec["longitude"]),
 
                      "slamax": "4.37",    # 43.7 +/- 1.5 cm2 g 1 dry mass
                      "sla": "4.37",       # 43.7 +/-  1.5 cm2 g 1 dry mass
@@ -106,12 +170,330 @@ def main(experiment_id, latitude, longitude, treatment, scheme):
                      "water_stress": "false",
 
                     }
+    replace_dict.update(spec["overrides"])
+
+    return (base_cfg, cfg_fname, replace_dict)
+
+def effective_params(spec):
+    """ The parameter file a run sees, as text: the base cfg after
+    replace_keys, less the OUTPUT_KEYS lines, with any replacements the
+    file has no line for (section.key, say) added at the end """
+    (base_cfg, _, replace_dict) = run_params(spec)
+    replacements = dict((key, value) for (key, value) in replace_dict.items()
+                        if key not in OUTPUT_KEYS)
+    with open(base_cfg, "r") as f:
+        text = ad.replace_keys(f.read(), replacements)
+
+    lines = []
+    found = set()
+    for line in text.splitlines():
+        key = line.split("=", 1)[0].strip()
+        if key not in OUTPUT_KEYS:
+            lines.append(line)
+            found.add(key)
+    lines += ["%s = %s" % (key, replacements[key])
+              for key in sorted(replacements) if key not in found]
+
+    return "\n".join(lines) + "\n"
+
+def cfg_hash(spec):
+    """ Hash of the parameters a run is made with (effective_params). Runs
+    with the same hash, forcing and model build give the same output. """
+    return hashlib.sha1(effective_params(spec).encode("utf-8")).hexdigest()
+
+def file_hash(fname):
+    """ sha1 of a file's contents, None if it isn't there. Remembered for
+    as long as the file's size and modification time stay the same. """
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None
+    memo = (os.path.abspath(fname), st.st_size, st.st_mtime)
+    if memo not in _file_hashes:
+        sha = hashlib.sha1()
+        with open(fname, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        _file_hashes[memo] = sha.hexdigest()
+
+    return _file_hashes[memo]
+
+def exe_path(exe):
+    """ Where the model executable is, looking along $PATH for a bare name
+    """
+    if os.path.dirname(exe):
+        return exe
+    for path in os.environ.get("PATH", "").split(os.pathsep):
+        fname = os.path.join(path, exe)
+        if os.path.isfile(fname) and os.access(fname, os.X_OK):
+            return fname
+
+    return exe
+
+def exe_hash(exe):
+    """ sha1 of the model executable. version.c isn't rebuilt on every
+    change, so build_git_sha can't be trusted to tell builds apart, but a
+    rebuild after any change to the model gives a different binary. """
+    sha = file_hash(exe_path(exe))
+    if sha is None:
+        raise IOError("Can't find the model executable %s" % (exe))
+
+    return sha
+
+def run_key(spec, exe=GDAY, binary=False):
+    """ Cache key of a run: a hash of its effective parameters, the met
+    file contents, the model executable and the output format """
+    (base_cfg, _, replace_dict) = run_params(spec)
+    sha = hashlib.sha1()
+    sha.update(effective_params(spec).encode("utf-8"))
+    sha.update(("met = %s\nexe = %s\nbinary = %s\n" % \
+                (file_hash(replace_dict["met_fname"]), exe_hash(exe),
+                 binary)).encode("utf-8"))
+
+    return sha.hexdigest()
+
+def store_run(store, spec, result):
+    """ Move a finished run's output into a ResultsStore, as
+    experiment_id_tag, tagged with its scheme, treatment and site """
+    (base_cfg, _, replace_dict) = run_params(spec)
+    run_id = "%s_%s" % (spec["experiment_id"], spec["tag"])
+    meta = {"base_cfg": base_cfg, "replacements": replace_dict,
+            "wall_time": result["wall_time"]}
+    store.add_output(result["ofname"], run_id, scheme=spec["scheme"],
+                     treatment=spec["treatment"], site=spec["experiment_id"],
+                     cfg_hash=cfg_hash(spec), meta=meta)
+    os.remove(result["ofname"])
+
+    return run_id
+
+def setup_run(spec):
+    """ Write the parameter file for one run.
+
+    Each run gets its own cfg file so that runs can proceed concurrently
+    without rewriting each others parameters.
+
+    Returns:
+    --------
+    cfg_fname : string
+        parameter file to hand to the model
+
+    """
+    (base_cfg, cfg_fname, replace_dict) = run_params(spec)
+
+    # copy base file to make the new experiment file
+    shutil.copy(base_cfg, cfg_fname)
     ad.adjust_param_file(cfg_fname, replace_dict)
-    ofname = " > outputs/%s_%s.csv" % (scheme, treatment)
-    #print(cfg_fname)
-    #os.system(GDAY + cfg_fname + ofname)
-    os.system(GDAY + cfg_fname)
 
+    return cfg_fname
+
+def run_one(spec, exe=GDAY, out_dir="outputs", write_cfg=False,
+            binary=False, cache=None):
+    """ Run the model for one spec, capturing stdout to out_dir/tag.csv
+
+    By default the parameter changes are handed to the model as --set
+    arguments on top of the base cfg, so nothing is written to disk. Set
+    write_cfg to get the old behaviour of a rewritten cfg file per run.
+    With binary the model writes out_dir/tag.npy itself instead (see
+    read_output.py), which saves formatting and re-parsing the text.
+
+    With a RunCache, a run whose run_key is in the cache has its output
+    copied from there rather than being made again, and a run that is made
+    successfully is added to it.
+
+    Returns:
+    --------
+    result : dictionary
+        tag, cfg and output filenames, exit status, wall time (s),
+        anything the model wrote to stderr and whether it came from the
+        cache
+
+    """
+    if cache is not None:
+        cache_key = run_key(spec, exe=exe, binary=binary)
+
+    if binary:
+        ofname = os.path.join(out_dir, "%s.npy" % (spec["tag"]))
+        overrides = dict(spec["overrides"], output_ascii="false",
+                         out_fname=ofname)
+        spec = dict(spec, overrides=overrides)
+        stdout_fname = os.devnull
+    else:
+        ofname = os.path.join(out_dir, "%s.csv" % (spec["tag"]))
+        stdout_fname = ofname
+
+    if cache is not None:
+        t0 = time.time()
+        meta = cache.get(cache_key, ofname)
+        if meta is not None:
+            return {"tag": spec["tag"], "cfg_fname": run_params(spec)[0],
+                    "ofname": ofname, "status": 0,
+                    "wall_time": time.time() - t0,
+                    "stderr": meta.get("stderr", ""), "cached": True}
+
+    if write_cfg:
+        cfg_fname = setup_run(spec)
+        cmd = [exe, "-p", cfg_fname]
+    else:
+        (cfg_fname, _, replace_dict) = run_params(spec)
+        cmd = [exe, "-p", cfg_fname]
+        for key in sorted(replace_dict):
+            cmd += ["--set", "%s=%s" % (key, replace_dict[key])]
+
+    t0 = time.time()
+    with open(stdout_fname, "w") as ofp:
+        p = subprocess.Popen(cmd, stdout=ofp, stderr=subprocess.PIPE)
+        (_, err) = p.communicate()
+    wall = time.time() - t0
+    err = err.decode("utf-8", "replace")
+
+    if cache is not None and p.returncode == 0:
+        (base_cfg, _, replace_dict) = run_params(spec)
+        meta = dict((k, spec[k]) for k in ("tag", "experiment_id", "scheme",
+                                           "treatment"))
+        meta.update(site=spec["experiment_id"],
+                    met_fname=replace_dict["met_fname"],
+                    exe=exe_path(exe), exe_hash=exe_hash(exe),
+                    stderr=err, wall_time=wall)
+        cache.put(cache_key, ofname, meta)
+
+    return {"tag": spec["tag"], "cfg_fname": cfg_fname, "ofname": ofname,
+            "status": p.returncode, "wall_time": wall, "stderr": err,
+            "cached": False}
+
+def run_batch(specs, nprocs=None, exe=GDAY, out_dir="outputs", verbose=True,
+              write_cfg=False, binary=False, store=None, cache=None):
+    """ Run a list of experiment specs concurrently.
+
+    The pool just waits on the child processes, so threads are enough and
+    at most nprocs copies of the model run at once.
+
+    Parameters:
+    ----------
+    specs : list
+        run descriptions, see make_spec. Tags must be unique.
+    nprocs : int
+        number of concurrent runs, defaults to the number of cores
+    exe : string
+        model executable
+    out_dir : string
+        directory for the captured model output
+    verbose : logical
+        print a line per run as it finishes
+    write_cfg : logical
+        write a cfg file per run rather than passing --set overrides
+    binary : logical
+        have the model write .npy output rather than capturing CSV
+    store : ResultsStore
+        if given, each run's output is moved into it as it finishes (see
+        store_run) and the result gets its run_id
+    cache : RunCache
+        reuse the output of runs made before with the same inputs (see
+        run_one)
+
+    Returns:
+    --------
+    results : list
+        one dictionary per spec (see run_one), in the order given
+
+    """
+    tags = [spec["tag"] for spec in specs]
+    if len(set(tags)) != len(tags):
+        raise ValueError("Run tags must be unique: %s" % (tags))
+
+    if nprocs is None:
+        nprocs = multiprocessing.cpu_count()
+    nprocs = max(1, min(nprocs, len(specs)))
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    def worker(spec):
+        result = run_one(spec, exe=exe, out_dir=out_dir, write_cfg=write_cfg,
+                         binary=binary, cache=cache)
+        if store is not None and result["status"] == 0:
+            result["run_id"] = store_run(store, spec, result)
+        if verbose:
+            print("%-30s status=%d %8.2f s%s" % \
+                  (result["tag"], result["status"], result["wall_time"],
+                   " (cached)" if result["cached"] else ""))
+        return result
+
+    pool = ThreadPool(nprocs)
+    try:
+        results = pool.map(worker, specs)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+def run_sweep(spec, param_sets, exe=GDAY, out_dir="outputs", binary=False):
+    """ Run many parameter sets for one spec in a single model process.
+
+    The model reads the forcing (and works out the solar geometry) once and
+    then runs each row of a --runs table, so this is the cheap way to do
+    large g1/vcmax/... sweeps at one site.
+
+    Parameters:
+    ----------
+    spec : dictionary
+        run description, see make_spec
+    param_sets : list
+        (run_id, {key: value}) pairs, every dictionary with the same keys
+    exe : string
+        model executable
+    out_dir : string
+        directory for the table and the long format output, tag_runs.csv
+    binary : logical
+        have the model write tag_runs.npy rather than capturing CSV
+
+    Returns:
+    --------
+    result : dictionary
+        as for run_one, the output has a leading run_id column
+
+    """
+    if binary:
+        ofname = os.path.join(out_dir, "%s_runs.npy" % (spec["tag"]))
+        overrides = dict(spec["overrides"], output_ascii="false",
+                         out_fname=ofname)
+        spec = dict(spec, overrides=overrides)
+        stdout_fname = os.devnull
+    else:
+        ofname = os.path.join(out_dir, "%s_runs.csv" % (spec["tag"]))
+        stdout_fname = ofname
+
+    (cfg_fname, _, replace_dict) = run_params(spec)
+    keys = sorted(param_sets[0][1])
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    table_fname = os.path.join(out_dir, "%s_runs_table.csv" % (spec["tag"]))
+    with open(table_fname, "w") as ofp:
+        ofp.write(",".join(["run_id"] + keys) + "\n")
+        for (run_id, params) in param_sets:
+            ofp.write(",".join([str(run_id)] +
+                               [str(params[key]) for key in keys]) + "\n")
+
+    cmd = [exe, "-p", cfg_fname, "--runs", table_fname]
+    for key in sorted(replace_dict):
+        cmd += ["--set", "%s=%s" % (key, replace_dict[key])]
+
+    t0 = time.time()
+    with open(stdout_fname, "w") as ofp:
+        p = subprocess.Popen(cmd, stdout=ofp, stderr=subprocess.PIPE)
+        (_, err) = p.communicate()
+    wall = time.time() - t0
+
+    return {"tag": spec["tag"], "cfg_fname": cfg_fname, "ofname": ofname,
+            "status": p.returncode, "wall_time": wall,
+            "stderr": err.decode("utf-8", "replace")}
+
+def main(experiment_id, latitude, longitude, treatment, scheme):
+
+    spec = make_spec(experiment_id, latitude, longitude, treatment, scheme)
+
+    return run_batch([spec], nprocs=1)[0]
 
 
 if __name__ == "__main__":
@@ -121,8 +503,13 @@ if __name__ == "__main__":
     latitude = -35.6566
     longitude = 148.152
 
-    #main(experiment_id, latitude, longitude, treatment="AMB", scheme="twoleaf")
-    #main(experiment_id, latitude, longitude, treatment="ELE", scheme="twoleaf")
+    specs = [make_spec(experiment_id, latitude, longitude, treatment=trt,
+                       scheme=scheme)
+             for scheme in ["twoleaf", "mate"] for trt in ["AMB", "ELE"]]
 
-    main(experiment_id, latitude, longitude, treatment="AMB", scheme="mate")
-    main(experiment_id, latitude, longitude, treatment="ELE", scheme="mate")
+    store = ResultsStore(os.path.join("outputs", "store"))
+    cache = RunCache("run_cache")
+    results = run_batch(specs, binary=True, store=store, cache=cache)
+    failed = [r["tag"] for r in results if r["status"] != 0]
+    if failed:
+        sys.exit("Failed runs: %s" % (", ".join(failed)))
@@ -0,0 +1,652 @@
+#!/usr/bin/env python
+
+"""
+The sub-daily two-leaf canopy model (canopy.c) in NumPy, on whole forcing
+arrays.
+
+canopy() works through the forcing one half hour and one leaf at a time.
+Here every half hour is done at once: the absorbed radiation, the leaf N
+scaling and the coupled photosynthesis/stomatal conductance are array
+expressions over all the daylight timesteps, and the leaf temperature
+iteration carries on only for the elements that haven't converged. Any
+leading axes on the forcing or the parameters broadcast, so several sites,
+or several parameter sets, go through in one call.
+
+    met = read_met("../met_data/twoleaf_AMB.csv")
+    params = read_params("../../params/base_start.cfg")
+    solar = solar_arrays(met, params)
+    out = run_twoleaf(met, solar, params)
+    out["an_sunlit"]    # umol m-2 s-1, every half hour
+    out["gpp"]          # g C m-2 d-1 as canopy_scaling writes it
+
+The solar geometry and diffuse fraction are worked out a day at a time by
+solar_arrays, as fill_up_solar_arrays does, or can be taken from the
+model's sub-daily output (cos_zenith, elevation and diffuse_frac in the
+[print] section) with read_solar. The arithmetic follows canopy.c,
+radiation.c and photosynthesis.c step for step, see compare_twoleaf.py
+for the check against the C model.
+"""
+
+import numpy as np
+
+import mate
+from mate import (DEG_TO_KELVIN, RGAS, UMOL_TO_MOL, MOL_C_TO_GRAMS_C,
+                  G_AS_TONNES, M2_AS_HA, KG_AS_G, PA_2_KPA, KPA_2_PA, J_TO_MJ,
+                  J_2_UMOL)
+
+__author__  = "Martin De Kauwe"
+__version__ = "1.0 (18.10.2026)"
+__email__   = "mdekauwe@gmail.com"
+
+# constants.h
+SEC_2_HLFHR = 1800.
+NUM_HLF_HRS = 48
+
+# column order of a sub-daily met CSV, see read_met_file.c
+SUBDAILY_COLUMNS = ["year", "doy", "hod", "rain", "par", "tair", "tsoil",
+                    "vpd", "co2", "ndep", "nfix", "wind", "press"]
+
+# the parameters the model reads, everything else is ignored
+TWOLEAF_PARAMS = ["alpha_j", "cfracts", "delsj", "eac", "eag", "eaj", "eao",
+                  "eav", "edj", "fix_lai", "g1", "gamstar25", "jmax",
+                  "jmaxna", "jmaxnb", "jv_intercept", "jv_slope", "kc25",
+                  "kn", "ko25", "lad", "measurement_temp", "oi",
+                  "prescribed_leaf_NC", "sla", "theta", "vcmax", "vcmaxna",
+                  "vcmaxnb"]
+
+# read for the solar geometry
+SOLAR_PARAMS = ["latitude", "longitude"]
+
+# the leaf temperature loop in canopy()
+ITERMAX = 100
+TLEAF_TOL = 0.02
+AN_MIN = 1E-04
+
+# numerical issues, don't use zero (solve_leaf_C3)
+G0_ZERO = 1E-09
+
+def read_met(fname):
+    """ Read a sub-daily met CSV into a dictionary of columns.
+
+    Parameters:
+    ----------
+    fname : string
+        half-hourly forcing, '#' lines are skipped as by the model
+
+    Returns:
+    --------
+    met : dictionary
+        array for each of SUBDAILY_COLUMNS
+
+    """
+    data = np.loadtxt(fname, delimiter=",", comments="#", ndmin=2)
+    if data.shape[1] < len(SUBDAILY_COLUMNS):
+        raise ValueError('Expected %d met columns, got %d: "%s"' % \
+                         (len(SUBDAILY_COLUMNS), data.shape[1], fname))
+
+    return dict((var, data[:, j]) for j, var in enumerate(SUBDAILY_COLUMNS))
+
+def read_solar(fname):
+    """ cos_zenith, elevation and diffuse_frac from sub-daily model output.
+
+    Parameters:
+    ----------
+    fname : string
+        out_subdaily_fname of a run with print_options = subdaily and the
+        three variables set to yes in [print]
+
+    Returns:
+    --------
+    solar : dictionary
+        array for each of the three
+
+    """
+    from read_output import read_output
+
+    df = read_output(fname)
+    missing = [v for v in ("cos_zenith", "elevation", "diffuse_frac")
+               if v not in df]
+    if missing:
+        raise KeyError('"%s" has no %s column' % (fname, ", ".join(missing)))
+
+    return dict((v, df[v].values) for v in ("cos_zenith", "elevation",
+                                            "diffuse_frac"))
+
+def read_params(cfg_fname, exe=mate.GDAY, overrides=None):
+    """ Parameters as the model sees them, see mate.read_params """
+    return mate.read_params(cfg_fname, exe=exe, overrides=overrides,
+                            keys=TWOLEAF_PARAMS + SOLAR_PARAMS)
+
+def solar_geometry(doy, latitude, longitude):
+    """ calculate_solar_geometry_days: De Pury & Farquhar (1997) PCE, 20,
+    537-557, A13-A18.
+
+    Parameters:
+    ----------
+    doy : array
+        day of year of each day, 0 based as the model counts
+    latitude, longitude : float
+        site (degrees)
+
+    Returns:
+    --------
+    (cos_zenith, elevation) : arrays
+        (ndays, NUM_HLF_HRS), elevation in degrees
+
+    """
+    doy = np.asarray(doy, dtype=np.float64)[:, None]
+    gamma = 2.0 * np.pi * (doy - 1.0) / 365.0
+    rdec = -23.4 * (np.pi / 180.) * np.cos(2.0 * np.pi * (doy + 10.) / 365.)
+    et = (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma) -
+          0.014615 * np.cos(2.0 * gamma) - 0.04089 * np.sin(2.0 * gamma))
+    et *= 229.18
+
+    # solar noon, standard meridians are multiples of 15 deg (C round())
+    Ls = np.copysign(np.floor(np.abs(longitude / 15.) + 0.5),
+                     longitude) * 15.
+    t0 = 12.0 + (4.0 * (Ls - longitude) - et) / 60.0
+
+    rlat = latitude * np.pi / 180.0
+    a = np.sin(rlat) * np.sin(rdec)
+    b = np.cos(rlat) * np.cos(rdec)
+    h = np.pi * (np.arange(NUM_HLF_HRS) / 2.0 - t0) / 12.0
+    cos_zenith = np.clip(a + b * np.cos(h), 0.0, 1.0)
+
+    return (cos_zenith, 90.0 - (180.0 * np.arccos(cos_zenith) / np.pi))
+
+def diffuse_frac(doy, cos_zenith, par):
+    """ calculate_diffuse_frac_days: Spitters et al. (1986) AFM, 38,
+    217-229, eqn 1 and 20a-d.
+
+    Parameters:
+    ----------
+    doy : array
+        day of year of each day, 0 based
+    cos_zenith : array
+        (ndays, NUM_HLF_HRS)
+    par : array
+        incident PAR (umol m-2 s-1), the same shape
+
+    Returns:
+    --------
+    diffuse_frac : array
+        the same shape
+
+    """
+    doy = np.asarray(doy, dtype=np.float64)[:, None]
+    So = np.where(cos_zenith > 0.0,
+                  1370.0 * (1.0 + 0.033 * np.cos(doy / 365.0 * 2.0 * np.pi)) *
+                  cos_zenith, 0.0)
+    sw_rad = par * 1.0 / 2.3
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tau = np.where(So <= 0.0, 0.0, sw_rad / np.where(So <= 0.0, 1.0, So))
+    tau = np.clip(tau, 0.0, 1.0)
+
+    R = 0.847 - 1.61 * cos_zenith + 1.04 * (cos_zenith * cos_zenith)
+    K = (1.47 - R) / 1.66
+    df = np.select([tau <= 0.22, tau <= 0.35, tau <= K],
+                   [1.0, 1.0 - 6.4 * (tau - 0.22) * (tau - 0.22),
+                    1.47 - 1.66 * tau], R)
+    df = np.where(cos_zenith > 0.17, df, 1.0)
+
+    return np.clip(df, 0.0, 1.0)
+
+def solar_arrays(met, params):
+    """ cos_zenith, elevation and diffuse_frac for every half hour of the
+    forcing, as fill_up_solar_arrays works them out: the days are counted
+    from 0 in each year of the model calendar.
+
+    Parameters:
+    ----------
+    met : dictionary
+        sub-daily forcing columns, whole days (see read_met)
+    params : dictionary
+        with latitude and longitude (see read_params)
+
+    Returns:
+    --------
+    solar : dictionary
+        array for each of the three, one value per half hour
+
+    """
+    par = np.asarray(met["par"], dtype=np.float64).reshape(-1, NUM_HLF_HRS)
+    year = np.asarray(met["year"])[::NUM_HLF_HRS]
+    (_, doy, _) = mate.model_calendar({"year": year}, 0.0)
+
+    (cos_zenith, elevation) = solar_geometry(doy, params["latitude"],
+                                             params["longitude"])
+    solar = {"cos_zenith": cos_zenith, "elevation": elevation,
+             "diffuse_frac": diffuse_frac(doy, cos_zenith, par)}
+
+    return dict((var, x.ravel()) for (var, x) in solar.items())
+
+def arrhenius(k25, Ea, T, Tref):
+    """ Arrhenius temperature dependence (deg C), Medlyn et al. 2002 """
+    Tk = T + DEG_TO_KELVIN
+    TrefK = Tref + DEG_TO_KELVIN
+
+    return k25 * np.exp(Ea * (T - Tref) / (RGAS * Tk * TrefK))
+
+def peaked_arrhenius(k25, Ea, T, Tref, deltaS, Hd):
+    """ Peaked Arrhenius temperature dependence (deg C), Medlyn et al. 2002
+    """
+    Tk = T + DEG_TO_KELVIN
+    TrefK = Tref + DEG_TO_KELVIN
+
+    arg1 = arrhenius(k25, Ea, T, Tref)
+    arg2 = 1.0 + np.exp((deltaS * TrefK - Hd) / (RGAS * TrefK))
+    arg3 = 1.0 + np.exp((deltaS * Tk - Hd) / (RGAS * Tk))
+
+    return arg1 * arg2 / arg3
+
+def quad(a, b, c, large):
+    """ Quadratic solution, returns (root, error) as photosynthesis.c quad
+    """
+    d = (b * b) - 4.0 * a * c
+    lin = (a == 0.0) & (b > 0.0)
+    flat = (a == 0.0) & (b == 0.0)
+    error = (d < 0.0) | (flat & (c != 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if large:
+            root = (-b + np.sqrt(d)) / (2.0 * a)
+        else:
+            root = (-b - np.sqrt(d)) / (2.0 * a)
+        root = np.where(lin, -c / np.where(lin, b, 1.0), root)
+
+    return (np.where(flat, 0.0, root), error)
+
+def absorbed_radiation(par, cos_zenith, diffuse_frac, direct_frac, lai, lad):
+    """ calculate_absorbed_radiation, De Pury & Farquhar (1997) PCE, 20,
+    537-557. Returns the sunlit and shaded APAR, the sunlit and shaded LAI
+    and the beam extinction coefficient.
+    """
+    rho_cd = 0.036
+    rho_cb = 0.029
+    omega = 0.15
+    k_dash_b = 0.46 / cos_zenith
+    k_dash_d = 0.719
+
+    # Ross-Goudriaan function
+    psi1 = 0.5 - 0.633 * lad
+    psi2 = 0.877 * (1.0 - 2.0 * psi1)
+    Gross = psi1 + psi2 * cos_zenith
+    kb = Gross / cos_zenith
+
+    # direct-beam, diffuse and scattered-beam absorbed by sunlit leaves
+    Ib = par * direct_frac
+    beam = Ib * (1.0 - omega) * (1.0 - np.exp(-kb * lai))
+
+    Id = par * diffuse_frac
+    arg1 = Id * (1.0 - rho_cd)
+    arg2 = 1.0 - np.exp(-(k_dash_d + kb) * lai)
+    arg3 = k_dash_d / (k_dash_d + kb)
+    shaded = arg1 * arg2 * arg3
+
+    arg1 = (1.0 - rho_cb) * (1.0 - np.exp(-(k_dash_b + kb) * lai))
+    arg2 = k_dash_b / (k_dash_b + kb)
+    arg3 = (1.0 - omega) * (1.0 - np.exp(-2.0 * kb * lai)) / 2.0
+    scattered = Ib * (arg1 * arg2 - arg3)
+
+    # total absorbed by the canopy
+    arg1 = (1.0 - rho_cb) * Ib * (1.0 - np.exp(-k_dash_b * lai))
+    arg2 = (1.0 - rho_cd) * Id * (1.0 - np.exp(-k_dash_d * lai))
+    total_canopy_irradiance = arg1 + arg2
+
+    apar_sun = beam + scattered + shaded
+    apar_sha = total_canopy_irradiance - apar_sun
+    lai_sun = (1.0 - np.exp(-kb * lai)) / kb
+    lai_sha = lai - lai_sun
+
+    return (apar_sun, apar_sha, lai_sun, lai_sha, kb)
+
+def top_of_canopy_leafn(p, lai):
+    """ calculate_top_of_canopy_leafn, Chen et al 93, Oecologia, 93,63-69.
+    The leaf N:C is prescribed (ncycle = false).
+    """
+    LMA = 1.0 / p["sla"] * p["cfracts"] * KG_AS_G
+    Ntot = p["prescribed_leaf_NC"] * LMA * lai
+    with np.errstate(divide="ignore", invalid="ignore"):
+        N0 = Ntot * p["kn"] / (1.0 - np.exp(-p["kn"] * lai))
+
+    return np.where(lai > 0.0, N0, 0.0)
+
+def leaf_to_canopy_scalar(kb, kn, lai_sun, lai_sha):
+    """ calc_leaf_to_canopy_scalar, Wang and Leuning (1998) AFm, 91, 89-111
+    """
+    cscalar_sun = (1.0 - np.exp(-(kb + kn) * lai_sun)) / (kb + kn)
+    cscalar_sha = (1.0 - np.exp(-kn * lai_sha)) / kn - cscalar_sun
+
+    return (cscalar_sun, cscalar_sha)
+
+def jmax25_vcmax25(p, modeljm, N0, cscalar):
+    """ calculate_jmax25_vcmax25 """
+    if modeljm == 0 or modeljm == 3:
+        return (p["jmax"] * cscalar, p["vcmax"] * cscalar)
+    elif modeljm == 1:
+        vcmax25 = (p["vcmaxna"] * N0 + p["vcmaxnb"]) * cscalar
+        jmax25 = (p["jmaxna"] * N0 + p["jmaxnb"]) * cscalar
+        return (jmax25, vcmax25)
+    elif modeljm == 2:
+        # the scalar is only applied to Vcmax
+        vcmax25 = (p["vcmaxna"] * N0 + p["vcmaxnb"]) * cscalar
+        return (p["jv_slope"] * vcmax25 - p["jv_intercept"], vcmax25)
+    raise ValueError("Unknown modeljm: %s" % (modeljm))
+
+def solve_leaf(par, Cs, dleaf, gamma_star, km, jmax, vcmax, theta, alpha_j,
+               g1):
+    """ solve_leaf_C3: coupled Farquhar photosynthesis and Medlyn stomatal
+    conductance. Returns (an, gsc).
+    """
+    rd = 0.015 * vcmax
+
+    # actual electron transport rate and RuBP regeneration rate
+    (J, error) = quad(theta, -(alpha_j * par + jmax), alpha_j * par * jmax,
+                      False)
+    Vj = J / 4.0
+
+    dleaf_kpa = dleaf * PA_2_KPA
+    dleaf_kpa = np.where(dleaf_kpa < 0.05, 0.05, dleaf_kpa)
+    gs_over_a = (1.0 + g1 / np.sqrt(dleaf_kpa)) / Cs
+    g0 = G0_ZERO
+
+    # Rubisco limited
+    A = g0 + gs_over_a * (vcmax - rd)
+    B = ((1.0 - Cs * gs_over_a) * (vcmax - rd) + g0 * (km - Cs) -
+         gs_over_a * (vcmax * gamma_star + km * rd))
+    C = (-(1.0 - Cs * gs_over_a) * (vcmax * gamma_star + km * rd) -
+         g0 * km * Cs)
+    (Ci, error) = quad(A, B, C, True)
+    with np.errstate(invalid="ignore"):
+        bad = error | (Ci <= 0.0) | (Ci > Cs)
+    Ac = np.where(bad, 0.0, vcmax * (Ci - gamma_star) / (Ci + km))
+
+    # electron transport limited
+    A = g0 + gs_over_a * (Vj - rd)
+    B = ((1. - Cs * gs_over_a) * (Vj - rd) + g0 *
+         (2. * gamma_star - Cs) - gs_over_a *
+         (Vj * gamma_star + 2.0 * gamma_star * rd))
+    C = (-(1.0 - Cs * gs_over_a) * gamma_star * (Vj + 2.0 * rd) -
+         g0 * 2.0 * gamma_star * Cs)
+    (Ci, error) = quad(A, B, C, True)
+    Aj = Vj * (Ci - gamma_star) / (Ci + 2.0 * gamma_star)
+
+    # below the light compensation point
+    with np.errstate(invalid="ignore"):
+        Aj = np.where(Aj - rd < 1E-6,
+                      Vj * (Cs - gamma_star) / (Cs + 2.0 * gamma_star), Aj)
+        an = np.where(Ac < Aj, Ac, Aj) - rd
+        gsc = g0 + gs_over_a * an
+        gsc = np.where(g0 > gsc, g0, gsc)
+
+        # extreme cases, no capacity or no electron transport solution
+        extreme = (jmax <= 0.0) | (vcmax <= 0.0) | np.isnan(J)
+
+    return (np.where(extreme, -rd, an), np.where(extreme, G0_ZERO, gsc))
+
+def temperature_response(p, tleaf):
+    """ The parts of photosynthesis_C3 that only depend on leaf temperature:
+    gamma_star, Km, the Arrhenius factor of Vcmax and the three factors of
+    the peaked Arrhenius function of Jmax.
+
+    These are worked out on tleaf's own shape, e.g. once per timestep
+    however many parameter sets are being run, and only the
+    multiplications by the reference rates broadcast.
+    """
+    tref = p["measurement_temp"]
+    Tk = tleaf + DEG_TO_KELVIN
+    TrefK = tref + DEG_TO_KELVIN
+
+    gamma_star = arrhenius(p["gamstar25"], p["eag"], tleaf, tref)
+    km = (arrhenius(p["kc25"], p["eac"], tleaf, tref) *
+          (1.0 + p["oi"] / arrhenius(p["ko25"], p["eao"], tleaf, tref)))
+    vcmax_t = arrhenius(1.0, p["eav"], tleaf, tref)
+    jmax_t = (arrhenius(1.0, p["eaj"], tleaf, tref),
+              1.0 + np.exp((p["delsj"] * TrefK - p["edj"]) / (RGAS * TrefK)),
+              1.0 + np.exp((p["delsj"] * Tk - p["edj"]) / (RGAS * Tk)))
+
+    return (gamma_star, km, vcmax_t, jmax_t)
+
+def photosynthesis(leaf, tleaf, Cs, dleaf):
+    """ photosynthesis_C3 for the leaf elements in leaf (a dictionary of
+    arrays, or scalars where the value is shared), at leaf temperature
+    tleaf (deg C), CO2 Cs (umol mol-1) and VPD dleaf (Pa) at the surface.
+
+    The soil water model isn't run here, so wtfac_root is 1 and neither the
+    BUCKET capacity reduction nor the g1 reduction does anything.
+    """
+    (gamma_star, km, vcmax_t, jmax_t) = temperature_response(leaf, tleaf)
+
+    # k25 * exp(..) and then * arg2 / arg3, in the order arrhenius and
+    # peaked_arrhenius multiply them out
+    (jmax, vcmax) = (leaf["jmax25"], leaf["vcmax25"])
+    if leaf["modeljm"] != 0:
+        vcmax = vcmax * vcmax_t
+        jmax = jmax * jmax_t[0] * jmax_t[1] / jmax_t[2]
+
+    # forced linearly to zero at low temperature
+    ramp = (tleaf - 0.0) / (10.0 - 0.0)
+    jmax = np.where(tleaf < 0.0, 0.0, np.where(tleaf < 10.0, jmax * ramp, jmax))
+    vcmax = np.where(tleaf < 0.0, 0.0,
+                     np.where(tleaf < 10.0, vcmax * ramp, vcmax))
+
+    return solve_leaf(leaf["par"], Cs, dleaf, gamma_star, km, jmax, vcmax,
+                      leaf["theta"], leaf["alpha_j"], leaf["g1"])
+
+def leaf_energy_balance(tair, Ca, vpd, an):
+    """ New leaf temperature, Cs and dleaf (solve_leaf_energy_balance).
+
+    The C version doesn't solve for the conductances yet and assumes the
+    leaf is at air temperature, so this does the same: the leaf
+    temperature loop always stops on the first pass, with Cs and dleaf
+    still at their air values.
+    """
+    return (tair, Ca, vpd)
+
+def _take(x, shape, mask):
+    """ x broadcast to shape, at the mask elements; scalars stay scalars """
+    if np.ndim(x) == 0:
+        return x
+    return np.broadcast_to(x, shape)[mask]
+
+def _columns(x, cols):
+    """ The cols timesteps of x, if it has a time axis """
+    if np.ndim(x) and x.shape[-1] == len(cols) and len(cols) > 1:
+        return x[..., cols]
+    return x
+
+def _solve_leaves(leaf, tair, Ca, vpd, day):
+    """ The leaf temperature loop of canopy() for every element at once.
+
+    The first pass is on the broadcast arrays as they come. An element
+    drops out once its An is below AN_MIN or its leaf temperature has
+    settled to within TLEAF_TOL; the ones left, if any, are gathered into
+    flat arrays and each further pass only touches the elements still
+    going. Returns an, gsc and tleaf, all of the broadcast shape.
+    """
+    (an, gsc) = photosynthesis(leaf, tair, Ca, vpd)
+    shape = np.broadcast(an, gsc, day).shape
+    (an, gsc) = (np.array(np.broadcast_to(an, shape)),
+                 np.array(np.broadcast_to(gsc, shape)))
+    tleaf = np.array(np.broadcast_to(tair, shape))
+
+    # the energy balance is only solved while the leaf is assimilating
+    going = day & (an > AN_MIN)
+    if not going.any():
+        return (an, gsc, tleaf)
+    (tleaf_new, Cs, dleaf) = leaf_energy_balance(tair, Ca, vpd, an)
+    going &= np.abs(tleaf - tleaf_new) >= TLEAF_TOL
+    if not going.any():
+        return (an, gsc, tleaf)
+
+    sub = dict((k, _take(v, shape, going)) for (k, v) in leaf.items())
+    (t, Cs, dleaf) = [_take(x, shape, going) for x in (tleaf_new, Cs, dleaf)]
+    (tair, Ca, vpd) = [_take(x, shape, going) for x in (tair, Ca, vpd)]
+    n = len(t)
+    (a, g) = (np.empty(n), np.empty(n))
+
+    active = np.arange(n)
+    for iteration in range(1, ITERMAX + 1):
+        at = dict((k, v[active] if np.ndim(v) else v) for (k, v) in sub.items())
+        (a[active], g[active]) = photosynthesis(at, t[active], Cs[active],
+                                                dleaf[active])
+
+        active = active[a[active] > AN_MIN]
+        if active.size == 0:
+            break
+        (tleaf_new, Cs[active], dleaf[active]) = \
+            leaf_energy_balance(tair[active], Ca[active], vpd[active],
+                                a[active])
+
+        if iteration >= ITERMAX:
+            raise RuntimeError("No convergence in canopy loop: %d leaves" % \
+                               (active.size))
+        moving = np.abs(t[active] - tleaf_new) >= TLEAF_TOL
+        t[active[moving]] = tleaf_new[moving]
+        active = active[moving]
+        if active.size == 0:
+            break
+    (an[going], gsc[going], tleaf[going]) = (a, g, t)
+
+    return (an, gsc, tleaf)
+
+def _canopy_day(forcing, params, day):
+    """ The daylight part of canopy(), on broadcasting arrays. Returns the
+    sunlit and shaded outputs, valid where day is True.
+    """
+    (par, tair, vpd, Ca) = [forcing[v] for v in ("par", "tair", "vpd", "Ca")]
+    lai = params["fix_lai"]
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        (apar_sun, apar_sha, lai_sun, lai_sha, kb) = \
+            absorbed_radiation(par, forcing["cos_zenith"],
+                               forcing["diffuse_frac"],
+                               forcing["direct_frac"], lai, params["lad"])
+        N0 = top_of_canopy_leafn(params, lai)
+        (cscalar_sun, cscalar_sha) = leaf_to_canopy_scalar(kb, params["kn"],
+                                                           lai_sun, lai_sha)
+
+        out = {}
+        for (tag, apar, cscalar) in (("sunlit", apar_sun, cscalar_sun),
+                                     ("shaded", apar_sha, cscalar_sha)):
+            leaf = dict((k, params[k]) for k in TWOLEAF_PARAMS)
+            (leaf["jmax25"], leaf["vcmax25"]) = \
+                jmax25_vcmax25(params, params["modeljm"], N0, cscalar)
+            leaf["modeljm"] = params["modeljm"]
+            leaf["par"] = apar
+            (out["an_" + tag], out["gsc_" + tag], out["tleaf_" + tag]) = \
+                _solve_leaves(leaf, tair, Ca, vpd, day)
+            out["apar_" + tag] = apar
+
+    return out
+
+def run_twoleaf(met, solar, params, direct_frac=None):
+    """ Sunlit and shaded An, gsc and APAR for every half hour.
+
+    Parameters:
+    ----------
+    met : dictionary or string
+        sub-daily forcing columns (see read_met), or a sub-daily met CSV.
+        Arrays may have leading axes (e.g. sites), time is the last axis.
+    solar : dictionary or string
+        cos_zenith, elevation and diffuse_frac on the same timesteps,
+        sub-daily model output holding them (see read_solar), or None to
+        work them out (see solar_arrays)
+    params : dictionary
+        parameters and control options, see read_params. Any of
+        TWOLEAF_PARAMS can be an array broadcasting against the forcing,
+        e.g. shape (nsets, 1) to run several parameter sets.
+    direct_frac : float or array
+        beam fraction of PAR. canopy() uses cw->direct_frac as
+        get_diffuse_frac left it when the solar arrays were filled, i.e.
+        1 - diffuse_frac of the last half hour of the forcing, for every
+        timestep; that is the default here. Pass 1.0 - diffuse_frac for
+        the fraction at each timestep instead.
+
+    Returns:
+    --------
+    out : dictionary
+        an, gsc, apar and tleaf _sunlit and _shaded, an_canopy,
+        gsc_canopy and apar_canopy, all on the forcing timesteps, and,
+        if the forcing is whole days, the daily year, doy (0 based), gpp
+        (g C m-2 d-1) and apar (MJ m-2 d-1) as written by the model
+
+    """
+    if isinstance(met, str):
+        met = read_met(met)
+    if solar is None:
+        solar = solar_arrays(met, params)
+    elif isinstance(solar, str):
+        solar = read_solar(solar)
+    if not params.get("sub_daily", True):
+        raise ValueError("The two-leaf model is the sub-daily one, "
+                         "sub_daily must be true")
+    if params.get("ncycle", False):
+        raise ValueError("Only a prescribed leaf N:C (ncycle = false) is "
+                         "implemented")
+    if params["ps_pathway"] != "c3":
+        raise ValueError("C4 photosynthesis not implemented")
+    if params["gs_model"] != "medlyn":
+        raise ValueError("Only Belindas gs model is implemented")
+
+    forcing = {}
+    for (var, x) in (("par", met["par"]), ("tair", met["tair"]),
+                     ("vpd", met["vpd"]), ("Ca", met["co2"]),
+                     ("cos_zenith", solar["cos_zenith"]),
+                     ("elevation", solar["elevation"]),
+                     ("diffuse_frac", solar["diffuse_frac"])):
+        forcing[var] = np.asarray(x, dtype=np.float64)
+    forcing["vpd"] = forcing["vpd"] * KPA_2_PA
+    if direct_frac is None:
+        direct_frac = 1.0 - forcing["diffuse_frac"][..., -1:]
+    forcing["direct_frac"] = np.asarray(direct_frac, dtype=np.float64)
+
+    p = dict(params)
+    for k in TWOLEAF_PARAMS:
+        p[k] = np.asarray(p[k], dtype=np.float64)
+    shape = np.broadcast(*(list(forcing.values()) +
+                           [p[k] for k in TWOLEAF_PARAMS])).shape
+    ntimes = shape[-1]
+
+    # only the half hours with daylight somewhere are worked out, so the
+    # arrays keep their broadcasting shapes; the rest are zero
+    day = (forcing["elevation"] > 0.0) & (forcing["par"] > 20.0)
+    cols = np.broadcast_to(day, day.shape[:-1] +
+                           (ntimes,)).reshape(-1, ntimes).any(axis=0)
+    values = _canopy_day(dict((k, _columns(x, cols))
+                              for (k, x) in forcing.items()),
+                         dict((k, _columns(x, cols)) for (k, x) in p.items()),
+                         _columns(day, cols))
+
+    out = {}
+    for tag in ("sunlit", "shaded"):
+        for var in ("an", "gsc", "apar"):
+            name = "%s_%s" % (var, tag)
+            out[name] = np.zeros(shape)
+            out[name][..., cols] = np.where(_columns(day, cols), values[name],
+                                             0.0)
+        # leaves are at air temperature at night
+        name = "tleaf_" + tag
+        out[name] = np.array(np.broadcast_to(forcing["tair"], shape))
+        out[name][..., cols] = np.where(_columns(day, cols), values[name],
+                                        _columns(forcing["tair"], cols))
+
+    for var in ("an", "gsc", "apar"):
+        out[var + "_canopy"] = out[var + "_sunlit"] + out[var + "_shaded"]
+
+    # daily sums, accumulated in time order as sum_hourly_carbon_fluxes
+    if ntimes % NUM_HLF_HRS == 0:
+        days = shape[:-1] + (ntimes // NUM_HLF_HRS, NUM_HLF_HRS)
+        gpp_gCm2 = np.cumsum((out["an_canopy"] * UMOL_TO_MOL *
+                              MOL_C_TO_GRAMS_C *
+                              SEC_2_HLFHR).reshape(days), axis=-1)[..., -1]
+        apar = np.cumsum((out["apar_canopy"] * 1.0 / J_2_UMOL * J_TO_MJ *
+                          SEC_2_HLFHR).reshape(days), axis=-1)[..., -1]
+        out["gpp"] = gpp_gCm2 * G_AS_TONNES / M2_AS_HA * 100.
+        out["apar"] = apar
+        year = np.asarray(met["year"])[..., ::NUM_HLF_HRS]
+        while year.ndim > 1:
+            year = year[0]
+        (out["year"], out["doy"], _) = mate.model_calendar({"year": year},
+                                                           0.0)
+
+    return out
@@ -131,3 +131,89 @@ char *strncpy0(char* dest, char* src, size_t size)
 double round_to_value(double number, double roundto) {
     return (round(number / roundto) * roundto);
 }
+
+double parse_double(const char *s, char **end) {
+    /*
+        Read a decimal number, as strtod would, for the text readers. When
+        the digits fit in a 53-bit integer and the power of ten is within
+        1e22 both are exact doubles, so one multiply or divide gives the
+        correctly rounded result (Clinger's fast path). Anything else,
+        including inf/nan and hex, is handed to strtod.
+    */
+    static const double pow10[] = {
+        1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11,
+        1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22
+    };
+    const char        *p = s;
+    const char        *digits;
+    unsigned long long mantissa = 0;
+    int                negative = FALSE;
+    int                ndigits = 0, exponent = 0, exp_sign = 1, exp_val = 0;
+    double             value;
+
+    while (isspace((unsigned char)*p))
+        p++;
+    if (*p == '-' || *p == '+') {
+        negative = (*p == '-');
+        p++;
+    }
+    digits = p;
+    while (*p >= '0' && *p <= '9') {
+        if (ndigits < 19) {
+            mantissa = mantissa * 10 + (*p - '0');
+            if (mantissa != 0)
+                ndigits++;
+        } else {
+            exponent++;
+            ndigits++;
+        }
+        p++;
+    }
+    if (*p == '.') {
+        p++;
+        while (*p >= '0' && *p <= '9') {
+            if (ndigits < 19) {
+                mantissa = mantissa * 10 + (*p - '0');
+                if (mantissa != 0)
+                    ndigits++;
+                exponent--;
+            } else {
+                ndigits++;
+            }
+            p++;
+        }
+    }
+    if (p == digits || (p == digits + 1 && *digits == '.') ||
+        (*p == 'x' || *p == 'X'))
+        return strtod(s, end);
+    if (*p == 'e' || *p == 'E') {
+        const char *q = p + 1;
+
+        if (*q == '-' || *q == '+') {
+            exp_sign = (*q == '-') ? -1 : 1;
+            q++;
+        }
+        if (*q >= '0' && *q <= '9') {
+            while (*q >= '0' && *q <= '9') {
+                if (exp_val < 10000)
+                    exp_val = exp_val * 10 + (*q - '0');
+                q++;
+            }
+            exponent += exp_sign * exp_val;
+            p = q;
+        }
+    }
+
+    if (ndigits > 19 || mantissa > (1ULL << 53) ||
+        exponent < -22 || exponent > 22)
+        return strtod(s, end);
+
+    value = (double)mantissa;
+    if (exponent < 0)
+        value /= pow10[-exponent];
+    else
+        value *= pow10[exponent];
+    *end = (char *)p;
+
+    return negative ? -value : value;
+}
@@ -0,0 +1,600 @@
+/*
+** Model output
+**
+** The daily (and any other) output goes through an output_sink rather than
+** printf. Which sink is used is set by output_ascii and out_fname:
+**
+**   output_ascii = true    CSV to the standard out, as before, but written
+**                          in large blocks and without printf for the
+**                          numbers
+**   output_ascii = false   float64 to out_fname: column by column, in
+**                          blocks of OUTPUT_ROWS rows, with the layout in
+**                          out_fname_hdr (or out_fname.hdr), or, if
+**                          out_fname ends in .npy, a NumPy structured
+**                          array with one field per column, row by row
+**
+** The binary formats skip the text formatting here and the parsing
+** downstream, see test/simulations/read_output.py.
+**
+** With print_options = subdaily the two-leaf model also writes every half
+** hour to out_subdaily_fname, in the same format. Only the variables set to
+** yes in the [print] section are written (all of them if none are), from
+** the list in subdaily_vars.
+*/
+
+#include "write_output_file.h"
+
+static const char *daily_names[] = {"year", "doy", "gpp", "apar"};
+static const char *daily_run_names[] = {"run", "year", "doy", "gpp", "apar"};
+
+/* where each sub-daily variable is found */
+#define FROM_CANOPY_WK 0
+#define FROM_MET 1
+
+typedef struct {
+    const char *name;
+    int         from;
+    size_t      offset;
+} subdaily_var;
+
+#define SD_LEAF(name, field, leaf) \
+    {name, FROM_CANOPY_WK, offsetof(canopy_wk, field) + leaf * sizeof(double)}
+#define SD_CW(field) {#field, FROM_CANOPY_WK, offsetof(canopy_wk, field)}
+#define SD_MET(name, field) {name, FROM_MET, offsetof(met, field)}
+
+static const subdaily_var subdaily_vars[] = {
+    SD_LEAF("an_sunlit", an_leaf, SUNLIT),
+    SD_LEAF("an_shaded", an_leaf, SHADED),
+    SD_LEAF("gsc_sunlit", gsc_leaf, SUNLIT),
+    SD_LEAF("gsc_shaded", gsc_leaf, SHADED),
+    SD_LEAF("apar_sunlit", apar_leaf, SUNLIT),
+    SD_LEAF("apar_shaded", apar_leaf, SHADED),
+    SD_LEAF("tleaf_sunlit", tleaf, SUNLIT),
+    SD_LEAF("tleaf_shaded", tleaf, SHADED),
+    SD_LEAF("lai_sunlit", lai_leaf, SUNLIT),
+    SD_LEAF("lai_shaded", lai_leaf, SHADED),
+    SD_LEAF("rd_sunlit", rd_leaf, SUNLIT),
+    SD_LEAF("rd_shaded", rd_leaf, SHADED),
+    SD_LEAF("trans_sunlit", trans_leaf, SUNLIT),
+    SD_LEAF("trans_shaded", trans_leaf, SHADED),
+    SD_CW(an_canopy),
+    SD_CW(gsc_canopy),
+    SD_CW(apar_canopy),
+    SD_CW(rd_canopy),
+    SD_CW(trans_canopy),
+    SD_CW(cos_zenith),
+    SD_CW(elevation),
+    SD_CW(diffuse_frac),
+    SD_MET("par", par),
+    SD_MET("tair", tair),
+    SD_MET("vpd", vpd),
+    SD_MET("co2", Ca),
+};
+
+#define NUM_SUBDAILY_VARS ARRAY_SIZE(subdaily_vars)
+
+static int fname_is_set(const char *fname) {
+    /* the cfg files mark unset names with *NOT SET* or -999.9 */
+
+    return (*fname != '\0' && *fname != '*' && strcmp(fname, "-999.9") != 0);
+}
+
+static int has_suffix(const char *s, const char *suffix) {
+    size_t n = strlen(s), m = strlen(suffix);
+
+    return n >= m && strcasecmp(s + n - m, suffix) == 0;
+}
+
+int output_format(control *c) {
+    /* which sink the cfg asks for */
+
+    if (c->output_ascii) {
+        return OUTPUT_CSV;
+    } else if (has_suffix(c->out_fname, ".npy")) {
+        return OUTPUT_NPY;
+    } else {
+        return OUTPUT_BINARY;
+    }
+}
+
+void open_output_files(control *c) {
+    /* open the sinks the cfg asks for, before the run starts */
+
+    open_daily_output(c);
+    if (c->sub_daily && c->print_options == SUBDAILY) {
+        open_subdaily_output(c);
+    }
+
+    return;
+}
+
+void close_output_files(control *c) {
+    /* close the sinks, a failure to write either of them is fatal */
+
+    int error = 0;
+
+    if (c->out != NULL) {
+        error |= close_output_sink(c->out);
+        c->out = NULL;
+    }
+    if (c->out_sd != NULL) {
+        error |= close_output_sink(c->out_sd);
+        c->out_sd = NULL;
+    }
+    if (error) {
+        fprintf(stderr, "Error writing the model output\n");
+        exit(EXIT_FAILURE);
+    }
+
+    return;
+}
+
+void open_daily_output(control *c) {
+    /*
+        Open the sink for the daily output. In --runs mode the CSV output
+        is keyed by run_id; the binary formats get a "run" column holding
+        the row number of the table instead (from 0).
+    */
+    const char *hdr_fname = NULL;
+    int format = output_format(c);
+
+    if (format != OUTPUT_CSV && !fname_is_set(c->out_fname)) {
+        fprintf(stderr, "Binary output (output_ascii = false) needs "
+                        "[files] out_fname\n");
+        exit(EXIT_FAILURE);
+    }
+    if (fname_is_set(c->out_fname_hdr))
+        hdr_fname = c->out_fname_hdr;
+
+    if (format == OUTPUT_CSV && *c->runs_fname != '\0') {
+        c->out = open_output_sink(format, NULL, NULL, daily_names,
+                                  ARRAY_SIZE(daily_names), 2, "run_id");
+    } else if (format == OUTPUT_CSV) {
+        c->out = open_output_sink(format, NULL, NULL, daily_names,
+                                  ARRAY_SIZE(daily_names), 2, NULL);
+    } else if (*c->runs_fname != '\0') {
+        c->out = open_output_sink(format, c->out_fname, hdr_fname,
+                                  daily_run_names,
+                                  ARRAY_SIZE(daily_run_names), 3, NULL);
+    } else {
+        c->out = open_output_sink(format, c->out_fname, hdr_fname,
+                                  daily_names, ARRAY_SIZE(daily_names), 2,
+                                  NULL);
+    }
+    if (c->out == NULL)
+        exit(EXIT_FAILURE);
+
+    return;
+}
+
+void open_subdaily_output(control *c) {
+    /*
+        Open the half-hourly sink: year, doy and hod (plus the run column
+        or label in --runs mode, as for the daily output) followed by the
+        selected variables.
+    */
+    const char *names[NUM_SUBDAILY_VARS + 4];
+    const char *label = NULL;
+    int   format, n = 0, lead;
+    size_t i;
+
+    if (!fname_is_set(c->out_subdaily_fname)) {
+        fprintf(stderr, "Sub-daily output (print_options = subdaily) needs "
+                        "[files] out_subdaily_fname\n");
+        exit(EXIT_FAILURE);
+    }
+    if (c->num_threads > 1) {
+        fprintf(stderr, "Sub-daily output can't be written with -t\n");
+        exit(EXIT_FAILURE);
+    }
+
+    if (c->output_ascii)
+        format = OUTPUT_CSV;
+    else if (has_suffix(c->out_subdaily_fname, ".npy"))
+        format = OUTPUT_NPY;
+    else
+        format = OUTPUT_BINARY;
+
+    if (*c->runs_fname != '\0' && format == OUTPUT_CSV)
+        label = "run_id";
+    else if (*c->runs_fname != '\0')
+        names[n++] = "run";
+    names[n++] = "year";
+    names[n++] = "doy";
+    names[n++] = "hod";
+    lead = n;
+    for (i = 0; i < NUM_SUBDAILY_VARS; i++) {
+        if (c->print_sd_mask == 0 || (c->print_sd_mask >> i) & 1ULL)
+            names[n++] = subdaily_vars[i].name;
+    }
+
+    c->out_sd = open_output_sink(format, c->out_subdaily_fname, NULL, names,
+                                 n, lead, label);
+    if (c->out_sd == NULL)
+        exit(EXIT_FAILURE);
+
+    return;
+}
+
+int select_subdaily_var(control *c, const char *name, const char *value) {
+    /*
+        A [print] section key. Sub-daily variable names set to yes (or
+        true) are added to the selection; anything else is ignored, the
+        section also holds the old daily output switches. Returns FALSE if
+        name isn't a sub-daily variable.
+    */
+    size_t i;
+
+    for (i = 0; i < NUM_SUBDAILY_VARS; i++) {
+        if (strcasecmp(subdaily_vars[i].name, name) == 0)
+            break;
+    }
+    if (i == NUM_SUBDAILY_VARS)
+        return FALSE;
+
+    if (strcasecmp(value, "yes") == 0 || strcasecmp(value, "true") == 0)
+        c->print_sd_mask |= 1ULL << i;
+    else
+        c->print_sd_mask &= ~(1ULL << i);
+
+    return TRUE;
+}
+
+const char *subdaily_var_name(int i) {
+    /* name of the i'th sub-daily variable, or NULL */
+
+    if (i < 0 || i >= (int)NUM_SUBDAILY_VARS)
+        return NULL;
+    return subdaily_vars[i].name;
+}
+
+void write_subdaily_output(control *c, canopy_wk *cw, met *m, double year,
+                           double doy, int hod) {
+    /* one half hour of the two-leaf model, called from canopy() */
+
+    double values[NUM_SUBDAILY_VARS + 4], t0 = 0.0;
+    char  *base;
+    int    n = 0;
+    size_t i;
+
+    if (c->prof != NULL)
+        t0 = profile_clock();
+    if (*c->runs_fname != '\0' && c->out_sd->label == NULL)
+        values[n++] = c->run_idx;
+    values[n++] = year;
+    values[n++] = doy;
+    values[n++] = hod;
+    for (i = 0; i < NUM_SUBDAILY_VARS; i++) {
+        if (c->print_sd_mask != 0 && !((c->print_sd_mask >> i) & 1ULL))
+            continue;
+        base = (subdaily_vars[i].from == FROM_MET) ? (char *)m : (char *)cw;
+        values[n++] = *(double *)(base + subdaily_vars[i].offset);
+    }
+    write_output_row(c->out_sd, c->run_id, values);
+    if (c->prof != NULL)
+        profile_add(c->prof, PROF_OUTPUT_SD, t0);
+
+    return;
+}
+
+static void write_npy_header(output_sink *o) {
+    /*
+        A version 1.0 .npy header for a 1-d structured array of float64
+        fields. The row count isn't known until the end, so the header is
+        padded to leave room for any count and rewritten on closing.
+    */
+    char     dict[STRING_LENGTH];
+    char     preamble[NPY_MAGIC_LEN + 4];
+    uint16_t one = 1, hlen;
+    size_t   n;
+    int      i;
+    char     endian = (*(char *)&one == 1) ? '<' : '>';
+
+    n = snprintf(dict, sizeof(dict), "{'descr': [");
+    for (i = 0; i < o->ncols; i++) {
+        n += snprintf(dict + n, sizeof(dict) - n, "('%s', '%cf8'), ",
+                      o->names[i], endian);
+    }
+    n += snprintf(dict + n, sizeof(dict) - n,
+                  "], 'fortran_order': False, 'shape': (%ld,), }", o->nrows);
+
+    /* room for a 20 digit count, then pad so the data is 64 byte aligned */
+    if (o->npy_header_len == 0) {
+        o->npy_header_len = NPY_MAGIC_LEN + 4 + n + 20 + 1;
+        o->npy_header_len += 64 - o->npy_header_len % 64;
+    }
+    hlen = (uint16_t)(o->npy_header_len - NPY_MAGIC_LEN - 4);
+    while (n < (size_t)hlen - 1)
+        dict[n++] = ' ';
+    dict[n++] = '\n';
+
+    memcpy(preamble, NPY_MAGIC, NPY_MAGIC_LEN);
+    preamble[NPY_MAGIC_LEN] = 1;
+    preamble[NPY_MAGIC_LEN + 1] = 0;
+    preamble[NPY_MAGIC_LEN + 2] = hlen & 0xff;
+    preamble[NPY_MAGIC_LEN + 3] = hlen >> 8;
+
+    fseek(o->fp, 0, SEEK_SET);
+    fwrite(preamble, 1, sizeof(preamble), o->fp);
+    fwrite(dict, 1, n, o->fp);
+
+    return;
+}
+
+output_sink *open_output_sink(int format, const char *fname,
+                              const char *hdr_fname, const char **names,
+                              int ncols, int int_cols, const char *label) {
+    /*
+        Open an output sink with the given column names. fname NULL (or
+        "") means the standard out, which is only allowed for CSV. For CSV,
+        the first int_cols columns are written as integers and label, if
+        not NULL, names a leading text column passed to write_output_row.
+        Returns NULL if the file can't be opened.
+    */
+    output_sink *o;
+    int i;
+
+    if ((o = (output_sink *)calloc(1, sizeof(output_sink))) == NULL) {
+        fprintf(stderr, "Error allocating space for the output sink\n");
+        exit(EXIT_FAILURE);
+    }
+    o->format = format;
+    if ((o->names = (const char **)malloc(ncols * sizeof(char *))) == NULL) {
+        fprintf(stderr, "Error allocating space for the output sink\n");
+        exit(EXIT_FAILURE);
+    }
+    memcpy(o->names, names, ncols * sizeof(char *));
+    o->ncols = ncols;
+    o->int_cols = int_cols;
+    o->label = label;
+
+    if (fname == NULL || *fname == '\0') {
+        if (format != OUTPUT_CSV) {
+            fprintf(stderr, "Binary output has to go to a file\n");
+            exit(EXIT_FAILURE);
+        }
+        o->fp = stdout;
+    } else {
+        strncpy0(o->fname, (char *)fname, sizeof(o->fname));
+        if ((o->fp = fopen(fname, (format == OUTPUT_CSV) ? "w" : "wb")) ==
+            NULL) {
+            fprintf(stderr, "Error opening output file %s for write\n",
+                    fname);
+            free(o->names);
+            free(o);
+            return NULL;
+        }
+    }
+
+    if (format == OUTPUT_CSV) {
+        if ((o->buf = (char *)malloc(OUTPUT_BUFSIZE)) == NULL) {
+            fprintf(stderr, "Error allocating space for the output sink\n");
+            exit(EXIT_FAILURE);
+        }
+
+        if (label != NULL)
+            fprintf(o->fp, "%s,", label);
+        for (i = 0; i < ncols; i++)
+            fprintf(o->fp, "%s%c", names[i], (i < ncols - 1) ? ',' : '\n');
+    } else if (format == OUTPUT_NPY) {
+        write_npy_header(o);
+    } else {
+        if (hdr_fname != NULL && *hdr_fname != '\0')
+            strncpy0(o->hdr_fname, (char *)hdr_fname, sizeof(o->hdr_fname));
+        else
+            snprintf(o->hdr_fname, sizeof(o->hdr_fname), "%s.hdr", fname);
+
+        o->cols = (double *)malloc(OUTPUT_ROWS * ncols * sizeof(double));
+        if (o->cols == NULL) {
+            fprintf(stderr, "Error allocating space for the output sink\n");
+            exit(EXIT_FAILURE);
+        }
+    }
+
+    return o;
+}
+
+static void write_output_block(output_sink *o) {
+    /* write out the columns of the rows held, each one after the other */
+
+    int i;
+
+    for (i = 0; i < o->ncols; i++)
+        fwrite(o->cols + i * OUTPUT_ROWS, sizeof(double), o->block_rows,
+               o->fp);
+    o->block_rows = 0;
+
+    return;
+}
+
+static void reserve_output_buf(output_sink *o, size_t n) {
+    /* flush the CSV buffer unless there are n bytes free in it */
+
+    if (o->buf_used + n > OUTPUT_BUFSIZE) {
+        fwrite(o->buf, 1, o->buf_used, o->fp);
+        o->buf_used = 0;
+    }
+
+    return;
+}
+
+void write_output_row(output_sink *o, const char *label, const double *values) {
+    /*
+        Add a row, label is only used by a CSV sink opened with one. CSV
+        fields go straight into the sink's buffer, which is flushed
+        whenever a field might not fit, so a row can have any number of
+        columns.
+    */
+
+    size_t n, room;
+    int    i;
+
+    if (o->format == OUTPUT_CSV) {
+        if (o->label != NULL) {
+            n = strlen(label);
+            reserve_output_buf(o, n + 1);
+            memcpy(o->buf + o->buf_used, label, n);
+            o->buf_used += n;
+            o->buf[o->buf_used++] = ',';
+        }
+        for (i = 0; i < o->ncols; i++) {
+            reserve_output_buf(o, OUTPUT_FIELD_MAX);
+            /* keep a byte back for the separator */
+            room = OUTPUT_BUFSIZE - o->buf_used - 1;
+            if (i < o->int_cols) {
+                n = snprintf(o->buf + o->buf_used, room, "%d",
+                             (int)values[i]);
+                if (n >= room)
+                    n = room - 1;
+            } else {
+                n = format_fixed6(o->buf + o->buf_used, room,
+                                  values[i]);
+            }
+            o->buf_used += n;
+            o->buf[o->buf_used++] = (i < o->ncols - 1) ? ',' : '\n';
+        }
+    } else if (o->format == OUTPUT_NPY) {
+        fwrite(values, sizeof(double), o->ncols, o->fp);
+    } else {
+        for (i = 0; i < o->ncols; i++)
+            o->cols[i * OUTPUT_ROWS + o->block_rows] = values[i];
+        if (++o->block_rows == OUTPUT_ROWS)
+            write_output_block(o);
+    }
+    o->nrows++;
+
+    return;
+}
+
+int close_output_sink(output_sink *o) {
+    /*
+        Finish off the file: the npy row count, or the binary columns.
+        Returns -1 if anything failed to write, 0 otherwise.
+    */
+
+    FILE  *fp;
+    int    i, error = 0;
+
+    if (o->format == OUTPUT_CSV) {
+        fwrite(o->buf, 1, o->buf_used, o->fp);
+    } else if (o->format == OUTPUT_NPY) {
+        write_npy_header(o);
+    } else if (o->format == OUTPUT_BINARY) {
+        write_output_block(o);
+
+        if ((fp = fopen(o->hdr_fname, "w")) == NULL) {
+            fprintf(stderr, "Error opening output header %s for write\n",
+                    o->hdr_fname);
+            error = -1;
+        } else {
+            fprintf(fp, "# float64, column by column in blocks of "
+                        "block_rows (the last block may be short)\n");
+            fprintf(fp, "nrows = %ld\n", o->nrows);
+            fprintf(fp, "ncols = %d\n", o->ncols);
+            fprintf(fp, "block_rows = %d\n", OUTPUT_ROWS);
+            fprintf(fp, "columns = ");
+            for (i = 0; i < o->ncols; i++)
+                fprintf(fp, "%s%c", o->names[i],
+                        (i < o->ncols - 1) ? ',' : '\n');
+            if (ferror(fp) | fclose(fp))
+                error = -1;
+        }
+    }
+
+    if (ferror(o->fp))
+        error = -1;
+    if (o->fp == stdout) {
+        if (fflush(stdout) != 0)
+            error = -1;
+    } else if (fclose(o->fp) != 0) {
+        error = -1;
+    }
+    free(o->buf);
+    free(o->cols);
+    free(o->names);
+    free(o);
+
+    return error;
+}
+
+int write_output_store(output_store *o, int format, const char *fname) {
+    /*
+        Write daily results kept in memory (libcanopy) through a sink.
+        Returns -1 if the file (or the .hdr for binary output) can't be
+        opened, or if writing fails.
+    */
+
+    output_sink *out;
+    double values[4];
+    long   d;
+
+    if ((out = open_output_sink(format, fname, NULL, daily_names,
+                                ARRAY_SIZE(daily_names), 2, NULL)) == NULL)
+        return -1;
+    for (d = 0; d < o->ndays; d++) {
+        values[0] = o->year[d];
+        values[1] = o->doy[d];
+        values[2] = o->gpp[d];
+        values[3] = o->apar[d];
+        write_output_row(out, NULL, values);
+    }
+    if (close_output_sink(out) != 0) {
+        fprintf(stderr, "Error writing output file %s\n", fname);
+        return -1;
+    }
+
+    return 0;
+}
+
+static int format_fixed6_slow(char *buf, size_t size, double x) {
+    /* printf("%f", x) into size bytes, returns the length written */
+
+    int n;
+
+    if (size == 0)
+        return 0;
+    n = snprintf(buf, size, "%f", x);
+    if (n < 0)
+        n = 0;
+
+    return ((size_t)n < size) ? n : (int)size - 1;
+}
+
+int format_fixed6(char *buf, size_t size, double x) {
+    /*
+        Same text as printf("%f", x), done with integer arithmetic unless
+        x is large, not finite, or x * 1e6 is too close to a rounding tie
+        to be sure which way printf would go. At most size bytes are
+        written, including the '\0', and the text is cut short if it
+        doesn't fit. Returns the length.
+    */
+    double    y, fl, frac;
+    long long n;
+    int       len = 0, i;
+    char      digits[24];
+
+    y = fabs(x) * 1e6;
+    if (!(y < 1e12) || size < FIXED6_FAST_LEN)
+        return format_fixed6_slow(buf, size, x);
+    fl = floor(y);
+    frac = y - fl;
+    if (fabs(frac - 0.5) < 1e-3)
+        return format_fixed6_slow(buf, size, x);
+    n = (long long)fl + (frac > 0.5);
+
+    if (signbit(x))
+        buf[len++] = '-';
+    i = 0;
+    do {
+        digits[i++] = '0' + (int)(n % 10);
+        n /= 10;
+    } while (n > 0 || i < 7);
+    while (i > 6)
+        buf[len++] = digits[--i];
+    buf[len++] = '.';
+    while (i > 0)
+        buf[len++] = digits[--i];
+    buf[len] = '\0';
+
+    return len;
+}